@@ -0,0 +1,11 @@
+"""The PolarizadosYA! HTTP API.
+
+core        process-wide services (database, settings, caches, shared state)
+models      request/response models and enums
+context     per-request context and the auth dependencies that build it
+security    passwords, tokens and login throttling
+common      helpers shared by several routers (detail cache, list queries, transitions)
+side_effects  outbox entries and their delivery handlers
+routers     one APIRouter per domain
+app         configure(), connect() and create_app()
+"""
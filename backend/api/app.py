@@ -0,0 +1,184 @@
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import FastAPI
+from pymongo import UpdateOne
+from starlette.middleware.cors import CORSMiddleware
+
+import archive
+import blobs
+import channels
+import damage
+import events
+import filters
+import forecast
+import jobs
+import outbox
+import quote_pdf
+import ratelimit
+import search
+import shared_state
+import state_machine
+import sync
+import tenancy
+import tokens
+from api import core
+from api.common import apply_remote_invalidation
+from api.models import ServiceType
+from api.routers import ROUTERS
+from api.security import apply_remote_revocation, rate_policy
+from api.side_effects import (
+    deliver_damage_index, deliver_emails, deliver_notifications, deliver_quote_pdfs, deliver_status_events,
+)
+from cache import DocumentCache
+from settings import Settings
+
+
+def configure(app_settings: Settings):
+    """Build the process-wide services in ``api.core`` from ``app_settings``. Opens no connections."""
+    core.settings = app_settings
+    core.token_service = tokens.TokenService(
+        app_settings.jwt_secret, app_settings.jwt_algorithm,
+        timedelta(minutes=app_settings.access_token_minutes), timedelta(days=app_settings.refresh_token_days)
+    )
+    core.document_cache = DocumentCache(max_entries=app_settings.document_cache_size)
+    core.shared = shared_state.create(app_settings.shared_state_url, lambda: core.db,
+                                      poll_interval=app_settings.shared_state_poll_seconds)
+    core.shared.subscribe(core.TOKEN_REVOCATION_CHANNEL, apply_remote_revocation)
+    core.shared.subscribe(core.CACHE_INVALIDATION_CHANNEL, apply_remote_invalidation)
+    core.auth_guard = ratelimit.AuthGuard(core.shared, core.counters, {
+        "login_ip": rate_policy(app_settings.login_rate_ip),
+        "login_email": rate_policy(app_settings.login_rate_email),
+        "register_ip": rate_policy(app_settings.register_rate_ip),
+        "register_email": rate_policy(app_settings.register_rate_email),
+    })
+    core.outbox_consumer = outbox.OutboxConsumer(
+        lambda: core.db, ("service_orders", "vehicles", "appointments", "quotes", "inspections"),
+        poll_interval=app_settings.outbox_poll_seconds
+    )
+    core.outbox_consumer.register("notification", deliver_notifications)
+    core.outbox_consumer.register("email", deliver_emails)
+    core.outbox_consumer.register("status_event", deliver_status_events)
+    core.outbox_consumer.register("quote_pdf", deliver_quote_pdfs)
+    core.outbox_consumer.register("damage_index", deliver_damage_index)
+    core.render_pool = quote_pdf.RenderPool(app_settings.pdf_render_workers)
+    core.forecaster = forecast.DurationForecaster([service.value for service in ServiceType])
+    core.order_status_counts = events.StatusCountProjection(state_machine.SERVICE_ORDER.entity_type)
+    core.quote_status_counts = events.StatusCountProjection(state_machine.QUOTE.entity_type)
+    # Sent by the worker; declared here so /api/metrics reports their cluster totals
+    core.counters.declare(*(name for channel in channels.CHANNELS for name in channels.counter_names(channel)))
+
+def connect(database=None):
+    """Point ``core.db`` at ``database``, or open a Motor client from settings and return it."""
+    if database is not None:
+        core.db = database
+        return None
+    # Motor is only needed once the process actually serves requests
+    from motor.motor_asyncio import AsyncIOMotorClient
+    core.client = AsyncIOMotorClient(core.settings.mongo_url)
+    core.db = core.client[core.settings.db_name]
+    return core.client
+
+async def create_indexes():
+    await core.db.users.create_index("id", unique=True)
+    await core.db.users.create_index("email")
+    await core.db.users.create_index(tenancy.branch_keys([("role", 1)]))
+    await core.db.vehicles.create_index("id", unique=True)
+    await core.db.vehicles.create_index(tenancy.branch_keys([("plate", 1)]))
+    await core.db.vehicles.create_index(tenancy.branch_keys([("search_terms", 1)]))
+    for name in ("appointments", "inspections", "quotes", "service_orders", "notifications"):
+        await core.db[name].create_index("id", unique=True)
+    await core.db.inspections.create_index(tenancy.branch_keys([("vehicle_id", 1), ("created_at", -1)]))
+    await tenancy.create_indexes(core.db)
+    await core.db[events.EVENTS_COLLECTION].create_index("seq", unique=True)
+    await core.db[events.EVENTS_COLLECTION].create_index([("entity_type", 1), ("seq", 1)])
+    await core.db[events.EVENTS_COLLECTION].create_index([("entity_id", 1), ("seq", 1)])
+    # Every list query runs inside one branch
+    for spec in filters.LIST_SPECS:
+        for keys in spec.indexes:
+            await core.db[spec.collection].create_index(tenancy.branch_keys(keys))
+    # Only documents with pending side effects are indexed, so the consumer's scan stays small
+    for name in core.outbox_consumer.collections:
+        await core.db[name].create_index([(outbox.LEASE_FIELD, 1)], partialFilterExpression=outbox.PENDING)
+    await jobs.create_indexes(core.db)
+    await core.token_service.create_indexes(core.db)
+    await sync.create_indexes(core.db)
+    await blobs.create_indexes(core.db)
+    await quote_pdf.create_indexes(core.db)
+    await channels.create_indexes(core.db)
+    await archive.create_indexes(core.db)
+    await damage.create_indexes(core.db)
+
+async def startup():
+    await create_indexes()
+    await core.token_service.load_recent_versions(core.db)
+    await backfill_search_terms()
+    await sync.backfill(core.db)
+    await tenancy.backfill(core.db, core.settings.default_branch_id)
+    # After tenancy: creation events take their document's branch
+    await events.backfill(core.db, status_event_sources())
+    await damage.backfill(core.db)
+    await forecast.backfill_actual_hours(core.db)
+    await core.forecaster.rebuild(core.db)
+    await core.shared.start()
+    core.counters.start(core.shared)
+    core.forecaster.start(lambda: core.db, core.settings.forecast_refresh_seconds)
+    if core.settings.outbox_enabled:
+        core.outbox_consumer.start()
+
+async def shutdown():
+    await core.outbox_consumer.stop()
+    await core.forecaster.stop()
+    await core.counters.stop()
+    await core.counters.flush(core.shared)
+    await core.shared.stop()
+    core.render_pool.shutdown()
+
+def status_event_sources():
+    # Archived documents were counted while hot and keep being counted, so documents archived
+    # before the event log need their creation logged as much as hot ones
+    hot = [(machine.collection, machine.entity_type) for machine in state_machine.MACHINES]
+    return hot + [(archive.archive_name(collection), entity_type) for collection, entity_type in hot
+                  if collection in archive.POLICIES]
+
+async def backfill_search_terms(batch_size: int = 1000):
+    # Vehicles from before search, or with untagged terms from before the rank tiers (no search_name)
+    cursor = core.db.vehicles.find({"search_name": {"$exists": False}}, {"_id": 0})
+    batch = []
+    async for vehicle in cursor:
+        batch.append(UpdateOne({"id": vehicle["id"]}, {"$set": search.search_fields(vehicle)}))
+        if len(batch) >= batch_size:
+            await core.db.vehicles.bulk_write(batch, ordered=False)
+            batch = []
+    if batch:
+        await core.db.vehicles.bulk_write(batch, ordered=False)
+
+def create_app(app_settings: Optional[Settings] = None, database=None) -> FastAPI:
+    """The ASGI app. ``database`` replaces the Motor connection (benchmarks pass an in-memory one)."""
+    if app_settings is not None or core.settings is None:
+        configure(app_settings or Settings.from_env())
+
+    @asynccontextmanager
+    async def lifespan(application: FastAPI):
+        opened = connect(database)
+        await startup()
+        try:
+            yield
+        finally:
+            await shutdown()
+            if opened is not None:
+                opened.close()
+
+    application = FastAPI(title="PolarizadosYA! API", lifespan=lifespan)
+    for router in ROUTERS:
+        application.include_router(router, prefix="/api")
+    application.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=list(core.settings.cors_origins),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    return application
+
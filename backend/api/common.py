@@ -0,0 +1,129 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+from fastapi import HTTPException, Request, Response
+
+import archive
+import blobs
+import filters
+import outbox
+import state_machine
+import tenancy
+from api import core
+from cache import etag_matches, last_modified, not_modified_since
+
+# ==================== RESPONSE CACHE HELPERS ====================
+def conditional_response(request: Request, cached) -> Response:
+    headers = {"ETag": cached.etag, "Last-Modified": cached.last_modified, "Cache-Control": "private, no-cache"}
+    # If-Modified-Since only counts when there is no If-None-Match (RFC 9110 13.2.2)
+    if_none_match = request.headers.get("if-none-match")
+    if (etag_matches(if_none_match, cached.etag) if if_none_match is not None
+            else not_modified_since(request.headers.get("if-modified-since"), cached.last_modified)):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+def apply_remote_invalidation(message: dict):
+    for namespace, key in message["keys"]:
+        core.document_cache.invalidate(namespace, key)
+
+async def invalidate_cached(*keys):
+    """Drop detail responses here and broadcast the keys to the other workers.
+
+    Other workers keep serving their copy until the broadcast reaches them
+    (SHARED_STATE_POLL_SECONDS on the MongoDB backend).
+    """
+    for namespace, key in keys:
+        core.document_cache.invalidate(namespace, key)
+    await core.shared.publish(core.CACHE_INVALIDATION_CHANNEL, {"keys": [list(k) for k in keys]})
+
+async def cached_detail(ctx, request: Request, namespace: str, key: str, query: dict, model, not_found: str) -> Response:
+    cached = core.document_cache.get(namespace, key)
+    if cached is not None and cached.owner != ctx.branch_id:
+        # Cached for another branch: to this one it doesn't exist
+        raise HTTPException(status_code=404, detail=not_found)
+    if cached is None:
+        ticket = core.document_cache.begin()
+        doc = await ctx.db[namespace].find_one(query, {"_id": 0, **outbox.HIDDEN_FIELDS})
+        if not doc:
+            # Finished documents may have moved to the cold archive
+            doc = await archive.find_one(ctx.db, namespace, key)
+        if not doc:
+            raise HTTPException(status_code=404, detail=not_found)
+        cached = core.document_cache.put(namespace, doc["id"], model(**doc).model_dump_json().encode(), ticket,
+                                         last_modified(doc), owner=doc.get(tenancy.BRANCH_FIELD))
+    return conditional_response(request, cached)
+
+# ==================== LIST QUERY HELPERS ====================
+async def run_list_query(ctx, spec: filters.ListSpec, request: Request, projection: dict) -> list:
+    try:
+        q = spec.compile(request.query_params)
+    except filters.FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cursor = ctx.db[spec.collection].find(q.filter, projection).sort(q.sort).skip(q.skip).limit(q.limit)
+    return await cursor.to_list(q.limit)
+
+# ==================== STATUS TRANSITION HELPERS ====================
+@asynccontextmanager
+async def assignment_lock(entity_type: str, entity_id: str, *alongside):
+    """Serialize technician assignment for one document across all workers.
+
+    ``alongside`` lookups run while the lock is being taken; their results are yielded.
+    """
+    name, owner = f"assign:{entity_type}:{entity_id}", uuid.uuid4().hex
+    acquired, *results = await asyncio.gather(core.shared.acquire(name, owner, ttl=10), *alongside, return_exceptions=True)
+    failed = next((r for r in (acquired, *results) if isinstance(r, Exception)), None)
+    if failed is not None:
+        if acquired is True:
+            await core.shared.release(name, owner)
+        raise failed
+    if not acquired:
+        raise HTTPException(status_code=409, detail="Otra asignación está en curso para este registro")
+    try:
+        yield results
+    finally:
+        await core.shared.release(name, owner)
+
+@asynccontextmanager
+async def assignment_locks(entity_type: str, entity_ids: List[str]):
+    # Bulk counterpart of assignment_lock: yields the ids it could lock instead of failing on busy ones
+    owner = uuid.uuid4().hex
+    names = {f"assign:{entity_type}:{entity_id}": entity_id for entity_id in entity_ids}
+    held = await core.shared.acquire_many(list(names), owner, ttl=10)
+    try:
+        yield {names[name] for name in held}
+    finally:
+        await core.shared.release_many(held, owner)
+
+async def apply_transition(operation, not_found: str):
+    try:
+        return await operation
+    except state_machine.EntityNotFound:
+        raise HTTPException(status_code=404, detail=not_found)
+    except state_machine.TransitionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def stale_related(result: state_machine.TransitionResult) -> list:
+    stale = []
+    if "vehicle" in result.related:
+        stale.append(("vehicles", result.related["vehicle"]["id"]))
+    if "appointment" in result.related:
+        stale.append(("appointments", result.related["appointment"]["id"]))
+    return stale
+
+# ==================== UPLOAD HELPERS ====================
+def upload_url(blob_id: str) -> str:
+    return f"/api/uploads/{blob_id}"
+
+async def resolve_uploads(ctx, refs: Dict[str, str]) -> Dict[str, str]:
+    """Check that every ``kind -> upload id`` in ``refs`` exists and is of that kind; returns ``kind -> url``."""
+    refs = {kind: blob_id for kind, blob_id in refs.items() if blob_id}
+    if not refs:
+        return {}
+    found = await ctx.db[blobs.FILES].find({"_id": {"$in": list(refs.values())}}, {"metadata.kind": 1}).to_list(len(refs))
+    kinds = {doc["_id"]: doc["metadata"]["kind"] for doc in found}
+    for kind, blob_id in refs.items():
+        if kinds.get(blob_id) != kind:
+            raise HTTPException(status_code=400, detail=f"Archivo adjunto no encontrado: {blob_id}")
+    return {kind: upload_url(blob_id) for kind, blob_id in refs.items()}
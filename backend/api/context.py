@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+import archive
+import fanout
+import outbox
+import tenancy
+from api import core
+from api.models import UserRole
+from api.security import get_current_user
+
+# What a document looks like when loaded through the context, per collection
+DOCUMENT_PROJECTIONS = {
+    "users": {"_id": 0, "password": 0},
+    "vehicles": core.VEHICLE_EMBED_PROJECTION,
+}
+DEFAULT_PROJECTION = {"_id": 0, **outbox.HIDDEN_FIELDS}
+
+
+class RequestContext:
+    """State shared by the dependencies, handler and helpers of one request.
+
+    Carries the authenticated user and the database handle the request works
+    against, and remembers every document loaded by id: however many helpers
+    ask for the same vehicle or technician, it is fetched once. Nothing here
+    outlives the request, so there is nothing to invalidate.
+
+    Once authenticated, ``db`` only sees the branch in ``branch_id``.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.user: Optional[dict] = None
+        self.branch_id: Optional[str] = None
+        # (collection, id) -> document, or None when it was looked up and doesn't exist
+        self._documents: Dict[Tuple[str, str], Optional[dict]] = {}
+
+    async def documents(self, collection: str, ids: List[str]) -> Dict[str, dict]:
+        """The documents with these ids that exist, keyed by id; one ``$in`` query for the ones not seen yet."""
+        missing = [i for i in dict.fromkeys(ids) if i is not None and (collection, i) not in self._documents]
+        if missing:
+            projection = DOCUMENT_PROJECTIONS.get(collection, DEFAULT_PROJECTION)
+            found = await fanout.find_by_ids(self.db, collection, missing, projection)
+            # Finished documents may have moved to the cold archive
+            found.update(await archive.find_by_ids(self.db, collection, [i for i in missing if i not in found]))
+            for entity_id in missing:
+                self._documents[(collection, entity_id)] = found.get(entity_id)
+        loaded = ((i, self._documents.get((collection, i))) for i in ids)
+        return {i: doc for i, doc in loaded if doc is not None}
+
+    async def document(self, collection: str, entity_id: str) -> Optional[dict]:
+        return (await self.documents(collection, [entity_id])).get(entity_id)
+
+    async def embed(self, docs: List[dict], field: str, key: str, collection: str) -> List[dict]:
+        """Set ``doc[field]`` to the ``collection`` document whose id is ``doc[key]``, for every doc."""
+        found = await self.documents(collection, [doc.get(key) for doc in docs])
+        for doc in docs:
+            doc[field] = found.get(doc.get(key))
+        return docs
+
+
+def get_context(request: Request) -> RequestContext:
+    ctx = getattr(request.state, "context", None)
+    if ctx is None:
+        ctx = request.state.context = RequestContext(core.db)
+    return ctx
+
+async def scope_to_branch(ctx: RequestContext, requested: Optional[str]):
+    """Restrict ``ctx.db`` to the user's branch, or to ``requested`` for an admin."""
+    branch_id = ctx.user.get("branch_id") or core.settings.default_branch_id
+    if requested and requested != branch_id:
+        if ctx.user["role"] != UserRole.ADMIN.value:
+            raise HTTPException(status_code=403, detail="No tiene acceso a esa sucursal")
+        if not await ctx.document(tenancy.BRANCHES_COLLECTION, requested):
+            raise HTTPException(status_code=404, detail="Sucursal no encontrada")
+        branch_id = requested
+    ctx.branch_id = branch_id
+    ctx.db = tenancy.ScopedDatabase(ctx.db, branch_id)
+
+async def authenticated(request: Request, ctx: RequestContext = Depends(get_context),
+                        user: dict = Depends(get_current_user)) -> RequestContext:
+    # FastAPI resolves each dependency once per request, so the token is decoded once however deep this is used.
+    # Batch sub-requests share the batch's context, which is already scoped.
+    if ctx.branch_id is None:
+        ctx.user = user
+        await scope_to_branch(ctx, request.headers.get(tenancy.BRANCH_HEADER))
+    return ctx
+
+def require_roles(allowed_roles: List[UserRole]):
+    allowed = {r.value for r in allowed_roles}
+
+    async def role_checker(ctx: RequestContext = Depends(authenticated)) -> RequestContext:
+        if ctx.user["role"] not in allowed:
+            raise HTTPException(status_code=403, detail="Acceso denegado")
+        return ctx
+    return role_checker
+
+async def find_technician(ctx: RequestContext, technician_id: str) -> Optional[dict]:
+    user = await ctx.document("users", technician_id)
+    return user if user and user["role"] == "tecnico" else None
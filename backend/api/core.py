@@ -0,0 +1,52 @@
+"""Process-wide services shared by every router.
+
+Built by ``api.app.configure()`` from Settings; the MongoDB client is only
+opened when the app starts. Always read these as ``core.db``, ``core.settings``
+and so on: they are replaced when the app is (re)configured.
+"""
+import logging
+import os
+
+import events
+import forecast
+import metrics
+import outbox
+import quote_pdf
+import ratelimit
+import search
+import shared_state
+import tokens
+from cache import DocumentCache
+from settings import Settings
+
+settings: Settings = None
+client = None
+db = None
+token_service: tokens.TokenService = None
+document_cache: DocumentCache = None
+shared: shared_state.SharedState = None
+auth_guard: ratelimit.AuthGuard = None
+outbox_consumer: outbox.OutboxConsumer = None
+render_pool: quote_pdf.RenderPool = None
+forecaster: forecast.DurationForecaster = None
+# Dashboard counts by branch and status, folded from the event log
+order_status_counts: events.StatusCountProjection = None
+quote_status_counts: events.StatusCountProjection = None
+
+# Counters are kept per process and summed in shared state every few seconds
+counters = metrics.Counters()
+
+# Raw vehicle documents embedded in responses must not carry internal fields
+VEHICLE_EMBED_PROJECTION = {"_id": 0, **search.HIDDEN_FIELDS, **outbox.HIDDEN_FIELDS}
+
+# Largest list accepted by the bulk service-order endpoints (part of the request models, so read at import)
+BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', '500'))
+# Largest number of sub-requests in one POST /api/batch
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '20'))
+
+CACHE_INVALIDATION_CHANNEL = "cache.invalidate"
+TOKEN_REVOCATION_CHANNEL = "auth.revoke"
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("server")
@@ -0,0 +1,403 @@
+from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, EmailStr
+
+from api.core import BATCH_MAX_ITEMS, BULK_MAX_ITEMS
+
+# ==================== ENUMS ====================
+class UserRole(str, Enum):
+    ADMIN = "admin"
+    ASESOR = "asesor"
+    TECNICO = "tecnico"
+
+class ServiceType(str, Enum):
+    POLARIZADO = "polarizado"
+    NANOCERAMICA = "nanoceramica"
+    AUTOBAHN_BLACK = "autobahn_black"
+    ULTRASECURE = "ultrasecure"
+
+class ServiceStatus(str, Enum):
+    AGENDADO = "agendado"
+    EN_PROCESO = "en_proceso"
+    EN_REVISION = "en_revision"
+    TERMINADO = "terminado"
+
+class VehicleStatus(str, Enum):
+    AGENDADO = "agendado"
+    INGRESADO = "ingresado"
+    CON_TECNICO = "con_tecnico"
+    EN_PROCESO = "en_proceso"
+    FINALIZADO = "finalizado"
+
+class NotificationType(str, Enum):
+    INTERNAL = "internal"
+    EMAIL = "email"
+    WHATSAPP = "whatsapp"
+
+# ==================== MODELS ====================
+class UserCreate(BaseModel):
+    email: EmailStr
+    password: str
+    name: str
+    role: UserRole = UserRole.ASESOR
+    phone: Optional[str] = None
+    # Defaults to the main branch
+    branch_id: Optional[str] = None
+
+class UserLogin(BaseModel):
+    email: EmailStr
+    password: str
+
+class UserResponse(BaseModel):
+    id: str
+    email: str
+    name: str
+    role: UserRole
+    phone: Optional[str] = None
+    branch_id: Optional[str] = None
+    created_at: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    refresh_token: str
+    token_type: str = "bearer"
+    expires_in: int
+    user: UserResponse
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class VehicleCreate(BaseModel):
+    plate: str
+    brand: str
+    model: str
+    year: int
+    color: str
+    vin: Optional[str] = None
+    client_name: str
+    client_phone: str
+    client_email: Optional[EmailStr] = None
+    client_cedula: Optional[str] = None
+
+class VehicleResponse(BaseModel):
+    id: str
+    plate: str
+    brand: str
+    model: str
+    year: int
+    color: str
+    vin: Optional[str] = None
+    client_name: str
+    client_phone: str
+    client_email: Optional[str] = None
+    client_cedula: Optional[str] = None
+    status: Optional[str] = None
+    assigned_technician_id: Optional[str] = None
+    assigned_technician_name: Optional[str] = None
+    current_service_order_id: Optional[str] = None
+    created_at: str
+    created_by: str
+
+class VehicleSearchResponse(BaseModel):
+    items: List[VehicleResponse]
+    # Every match, not just the ranked page
+    total: int
+    limit: int
+    skip: int
+    has_more: bool
+
+class VehicleTimelineResponse(BaseModel):
+    vehicle: VehicleResponse
+    history: List[dict]
+    total: int
+    limit: int
+    skip: int
+
+class AppointmentCreate(BaseModel):
+    vehicle_id: Optional[str] = None
+    client_name: str
+    client_phone: str
+    client_email: Optional[EmailStr] = None
+    plate: Optional[str] = None
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    date: str
+    time_slot: str
+    services: List[ServiceType]
+    notes: Optional[str] = None
+
+class AppointmentResponse(BaseModel):
+    id: str
+    vehicle_id: Optional[str] = None
+    client_name: str
+    client_phone: str
+    client_email: Optional[str] = None
+    plate: Optional[str] = None
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    date: str
+    time_slot: str
+    services: List[str]
+    notes: Optional[str] = None
+    status: str
+    estimated_hours: Optional[float] = None
+    created_at: str
+    created_by: str
+
+class InspectionItem(BaseModel):
+    area: str
+    condition: str
+    notes: Optional[str] = None
+    has_damage: bool = False
+
+class Inspection360Create(BaseModel):
+    vehicle_id: str
+    service_order_id: Optional[str] = None
+    items: List[InspectionItem]
+    general_notes: Optional[str] = None
+    photos: List[str] = []
+
+class Inspection360Response(BaseModel):
+    id: str
+    vehicle_id: str
+    service_order_id: Optional[str] = None
+    items: List[dict]
+    general_notes: Optional[str] = None
+    photos: List[str]
+    created_at: str
+    created_by: str
+
+class DamageObservation(BaseModel):
+    at: str
+    inspection_id: str
+    condition: Optional[str] = None
+    has_damage: bool
+    notes: Optional[str] = None
+
+class DamageAreaResponse(BaseModel):
+    vehicle_id: str
+    area: str
+    latest: DamageObservation
+    # Oldest first, capped at damage.HISTORY_LIMIT
+    history: List[DamageObservation]
+    inspections: int
+    damaged_inspections: int
+    first_damaged_at: Optional[str] = None
+    last_damaged_at: Optional[str] = None
+
+class DamageStatsResponse(BaseModel):
+    area: Optional[str] = None
+    brand: Optional[str] = None
+    model: Optional[str] = None
+    vehicles: int
+    # Vehicles with damage found here at any inspection, and on their latest one
+    damaged_vehicles: int
+    currently_damaged: int
+    inspections: int
+    damaged_inspections: int
+    damage_rate: float
+
+class QuoteItem(BaseModel):
+    service: ServiceType
+    description: str
+    price: float
+    quantity: int = 1
+
+class QuoteCreate(BaseModel):
+    vehicle_id: str
+    client_name: str
+    client_email: Optional[EmailStr] = None
+    items: List[QuoteItem]
+    notes: Optional[str] = None
+
+class QuoteApproval(BaseModel):
+    # Ids returned by POST /api/uploads/{kind}
+    signature_id: Optional[str] = None
+    cedula_photo_id: Optional[str] = None
+
+class QuoteResponse(BaseModel):
+    id: str
+    vehicle_id: str
+    client_name: str
+    client_email: Optional[str] = None
+    items: List[dict]
+    subtotal: float
+    tax: float
+    total: float
+    notes: Optional[str] = None
+    status: str
+    approved_at: Optional[str] = None
+    signature_url: Optional[str] = None
+    cedula_photo_url: Optional[str] = None
+    created_at: str
+    created_by: str
+
+class ServiceOrderCreate(BaseModel):
+    vehicle_id: str
+    quote_id: Optional[str] = None
+    appointment_id: Optional[str] = None
+    services: List[ServiceType]
+    assigned_technician_id: Optional[str] = None
+    estimated_hours: Optional[float] = None
+    notes: Optional[str] = None
+
+class ServiceOrderResponse(BaseModel):
+    id: str
+    vehicle_id: str
+    quote_id: Optional[str] = None
+    appointment_id: Optional[str] = None
+    services: List[str]
+    status: str
+    assigned_technician_id: Optional[str] = None
+    assigned_technician_name: Optional[str] = None
+    estimated_hours: Optional[float] = None
+    actual_hours: Optional[float] = None
+    notes: Optional[str] = None
+    started_at: Optional[str] = None
+    completed_at: Optional[str] = None
+    created_at: str
+    created_by: str
+    vehicle: Optional[dict] = None
+
+class DurationEstimate(BaseModel):
+    # None until enough finished orders with these services exist
+    estimated_hours: Optional[float] = None
+    estimated_us: Optional[int] = None
+
+class NotificationCreate(BaseModel):
+    recipient_id: Optional[str] = None
+    recipient_email: Optional[EmailStr] = None
+    recipient_phone: Optional[str] = None
+    notification_type: NotificationType
+    title: str
+    message: str
+    related_entity_type: Optional[str] = None
+    related_entity_id: Optional[str] = None
+
+class NotificationResponse(BaseModel):
+    id: str
+    recipient_id: Optional[str] = None
+    recipient_email: Optional[str] = None
+    notification_type: str
+    title: str
+    message: str
+    read: bool
+    sent_at: str
+    created_at: str
+
+class NotificationBulk(BaseModel):
+    items: List[NotificationCreate] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+
+class OutboundMessageResponse(BaseModel):
+    id: str
+    channel: str
+    to: str
+    status: str
+
+class NotificationBulkItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    status_code: int
+    detail: str
+
+class NotificationBulkResponse(BaseModel):
+    queued: int
+    results: List[NotificationBulkItemResult]
+
+# ==================== REQUEST MODELS ====================
+class VehicleStatusUpdate(BaseModel):
+    status: VehicleStatus
+
+class VehicleTechnicianAssign(BaseModel):
+    technician_id: str
+
+class StatusUpdate(BaseModel):
+    status: ServiceStatus
+
+class TechnicianAssign(BaseModel):
+    technician_id: str
+
+# ==================== BULK MODELS ====================
+class BulkStatusItem(BaseModel):
+    order_id: str
+    status: ServiceStatus
+
+class BulkStatusUpdate(BaseModel):
+    items: List[BulkStatusItem] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+
+class BulkAssignItem(BaseModel):
+    order_id: str
+    technician_id: str
+
+class BulkAssign(BaseModel):
+    items: List[BulkAssignItem] = Field(..., min_length=1, max_length=BULK_MAX_ITEMS)
+
+class BulkItemResult(BaseModel):
+    order_id: str
+    status_code: int
+    detail: str
+
+class BulkResponse(BaseModel):
+    updated: int
+    results: List[BulkItemResult]
+
+# ==================== BRANCH MODELS ====================
+class BranchCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+
+class BranchResponse(BaseModel):
+    id: str
+    name: str
+    created_at: str
+
+class UserBranchUpdate(BaseModel):
+    branch_id: str
+
+# ==================== SYNC MODELS ====================
+class SyncResponse(BaseModel):
+    token: str
+    has_more: bool
+    # collection -> documents created or changed since the request token
+    changes: Dict[str, List[dict]]
+    # collection -> ids the device should drop
+    removed: Dict[str, List[str]]
+
+# ==================== BATCH MODELS ====================
+class BatchItem(BaseModel):
+    # Echoed back so the client can match responses to requests
+    id: str
+    # Relative to /api, query string included, e.g. "/service-orders?status=en_proceso"
+    path: str
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+
+class BatchItemResponse(BaseModel):
+    id: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchItemResponse]
+
+# ==================== UPLOAD MODELS ====================
+class UploadKind(str, Enum):
+    SIGNATURE = "signature"
+    CEDULA = "cedula"
+
+class UploadResponse(BaseModel):
+    id: str
+    kind: UploadKind
+    url: str
+    content_type: str
+    size: int
+
+# ==================== EXPORT MODELS ====================
+class ExportKind(str, Enum):
+    QUOTES = "quotes"
+    SERVICE_ORDERS = "service_orders"
+
+class ExportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
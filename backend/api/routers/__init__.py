@@ -0,0 +1,21 @@
+from api.routers import (
+    appointments, auth, batch, branches, dashboard, exports, inspections, notifications, quotes, service_orders, sync, system, uploads, vehicles,
+)
+
+# Mounted under /api in this order
+ROUTERS = (
+    auth.router,
+    branches.router,
+    vehicles.router,
+    appointments.router,
+    inspections.router,
+    quotes.router,
+    uploads.router,
+    service_orders.router,
+    notifications.router,
+    dashboard.router,
+    exports.router,
+    sync.router,
+    batch.router,
+    system.router,
+)
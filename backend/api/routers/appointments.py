@@ -0,0 +1,133 @@
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, Request
+
+import fanout
+import filters
+import mailer
+import outbox
+import search
+import state_machine
+import sync
+from api import core
+from api.common import apply_transition, cached_detail, invalidate_cached, run_list_query
+from api.context import RequestContext, authenticated
+from api.models import AppointmentCreate, AppointmentResponse, ServiceStatus, StatusUpdate, VehicleStatus
+from api.side_effects import created_event_entry
+
+router = APIRouter()
+
+# ==================== APPOINTMENTS ENDPOINTS ====================
+@router.post("/appointments", response_model=AppointmentResponse)
+async def create_appointment(appointment: AppointmentCreate, ctx: RequestContext = Depends(authenticated)):
+    appointment_id = str(uuid.uuid4())
+    vehicle_id = None
+    brand, model = appointment.brand, appointment.model
+    # The vehicle write and the appointment insert don't depend on each other and go out together
+    vehicle_writes = []
+    
+    # If plate is provided, create or update vehicle
+    if appointment.plate:
+        plate_upper = appointment.plate.upper()
+        existing_vehicle = await ctx.db.vehicles.find_one({"plate": plate_upper}, {"_id": 0})
+        
+        if existing_vehicle:
+            # Update existing vehicle with new appointment
+            vehicle_id = existing_vehicle["id"]
+            brand, model = existing_vehicle.get("brand"), existing_vehicle.get("model")
+            client_fields = {
+                "client_name": appointment.client_name,
+                "client_phone": appointment.client_phone,
+                "client_email": appointment.client_email,
+            }
+            client_fields.update(search.search_fields({**existing_vehicle, **client_fields}))
+            
+            async def reschedule_vehicle():
+                moved = await state_machine.try_transition(
+                    ctx.db, state_machine.VEHICLE, vehicle_id, VehicleStatus.AGENDADO.value, ctx.user["id"],
+                    set_fields=client_fields, use_transactions=core.settings.mongo_transactions
+                )
+                if moved is None:
+                    # Vehicle is mid-service: keep its status and only refresh the client details
+                    await ctx.db.vehicles.update_one({"id": vehicle_id}, {"$set": {**client_fields, **sync.stamp()}})
+                await invalidate_cached(("vehicles", vehicle_id))
+            vehicle_writes.append(reschedule_vehicle())
+        else:
+            # Create new vehicle
+            vehicle_id = str(uuid.uuid4())
+            vehicle_doc = {
+                "id": vehicle_id,
+                "plate": plate_upper,
+                "brand": appointment.brand or "",
+                "model": appointment.model or "",
+                "year": datetime.now().year,
+                "color": "",
+                "vin": None,
+                "client_name": appointment.client_name,
+                "client_phone": appointment.client_phone,
+                "client_email": appointment.client_email,
+                "client_cedula": None,
+                "status": VehicleStatus.AGENDADO.value,
+                "assigned_technician_id": None,
+                "assigned_technician_name": None,
+                "current_service_order_id": None,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "created_by": ctx.user["id"]
+            }
+            vehicle_doc.update(search.search_fields(vehicle_doc))
+            vehicle_doc.update(sync.stamp())
+            vehicle_doc[outbox.OUTBOX_FIELD] = [created_event_entry("vehicle", vehicle_id, VehicleStatus.AGENDADO.value, ctx.user["id"], ctx.branch_id)]
+            vehicle_writes.append(ctx.db.vehicles.insert_one(vehicle_doc))
+    
+    appointment_doc = {
+        "id": appointment_id,
+        **appointment.model_dump(),
+        "vehicle_id": vehicle_id,
+        "services": [s.value for s in appointment.services],
+        "status": ServiceStatus.AGENDADO.value,
+        # How long to book the bay for, from the lookup table of finished orders
+        "estimated_hours": core.forecaster.suggest_hours([s.value for s in appointment.services], brand, model),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": ctx.user["id"]
+    }
+    side_effects = [created_event_entry("appointment", appointment_id, ServiceStatus.AGENDADO.value, ctx.user["id"], ctx.branch_id)]
+    
+    # Send email notification
+    if appointment.client_email and mailer.api_key():
+        services_text = ", ".join([s.value.replace("_", " ").title() for s in appointment.services])
+        html_content = f"""
+        <h2>¡Cita Agendada - PolarizadosYA!</h2>
+        <p>Hola {appointment.client_name},</p>
+        <p>Tu cita ha sido agendada exitosamente:</p>
+        <ul>
+            <li><strong>Fecha:</strong> {appointment.date}</li>
+            <li><strong>Hora:</strong> {appointment.time_slot}</li>
+            <li><strong>Servicios:</strong> {services_text}</li>
+        </ul>
+        <p>¡Te esperamos!</p>
+        """
+        side_effects.append(outbox.entry("email", {
+            "to": appointment.client_email, "subject": "Cita Agendada - PolarizadosYA!", "html": html_content
+        }))
+    
+    await fanout.gather(ctx.db.appointments.insert_one({**appointment_doc, **sync.stamp(), outbox.OUTBOX_FIELD: side_effects}), *vehicle_writes)
+    return AppointmentResponse(**{k: v for k, v in appointment_doc.items() if k != "_id"})
+
+@router.get("/appointments", response_model=List[AppointmentResponse], openapi_extra=filters.APPOINTMENTS.openapi())
+async def get_appointments(request: Request, ctx: RequestContext = Depends(authenticated)):
+    appointments = await run_list_query(ctx, filters.APPOINTMENTS, request, {"_id": 0, **outbox.HIDDEN_FIELDS})
+    return [AppointmentResponse(**a) for a in appointments]
+
+@router.get("/appointments/{appointment_id}", response_model=AppointmentResponse)
+async def get_appointment(appointment_id: str, request: Request, ctx: RequestContext = Depends(authenticated)):
+    return await cached_detail(ctx, request, "appointments", appointment_id, {"id": appointment_id}, AppointmentResponse, "Cita no encontrada")
+
+@router.put("/appointments/{appointment_id}/status")
+async def update_appointment_status(appointment_id: str, data: StatusUpdate, ctx: RequestContext = Depends(authenticated)):
+    await apply_transition(state_machine.transition(
+        ctx.db, state_machine.APPOINTMENT, appointment_id, data.status.value, ctx.user["id"], use_transactions=core.settings.mongo_transactions
+    ), "Cita no encontrada")
+    await invalidate_cached(("appointments", appointment_id))
+    return {"message": "Estado actualizado"}
@@ -0,0 +1,123 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pymongo import ReturnDocument
+
+import tenancy
+import tokens
+from api import core
+from api.context import RequestContext, authenticated, get_context, require_roles
+from api.models import RefreshRequest, TokenResponse, UserBranchUpdate, UserCreate, UserLogin, UserResponse, UserRole
+from api.security import (
+    guard_auth_attempt, hash_password, issue_session, revoke_access_tokens, user_response, verify_password,
+)
+
+router = APIRouter()
+
+# ==================== AUTH ENDPOINTS ====================
+@router.post("/auth/register", response_model=TokenResponse)
+async def register(user_data: UserCreate, request: Request, ctx: RequestContext = Depends(get_context)):
+    await guard_auth_attempt("register", request, user_data.email)
+    existing = await ctx.db.users.find_one({"email": user_data.email})
+    if existing:
+        raise HTTPException(status_code=400, detail="El email ya está registrado")
+    branch_id = user_data.branch_id or core.settings.default_branch_id
+    if not await ctx.document(tenancy.BRANCHES_COLLECTION, branch_id):
+        raise HTTPException(status_code=400, detail="Sucursal no encontrada")
+    
+    user_id = str(uuid.uuid4())
+    # bcrypt is deliberately slow; run it off the event loop
+    password_hash = await asyncio.to_thread(hash_password, user_data.password)
+    user_doc = {
+        "id": user_id,
+        "email": user_data.email,
+        "password": password_hash,
+        "name": user_data.name,
+        "role": user_data.role.value,
+        "phone": user_data.phone,
+        tenancy.BRANCH_FIELD: branch_id,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await ctx.db.users.insert_one(user_doc)
+    return await issue_session(ctx.db, user_doc)
+
+@router.post("/auth/login", response_model=TokenResponse)
+async def login(credentials: UserLogin, request: Request, ctx: RequestContext = Depends(get_context)):
+    # Throttled attempts are rejected here, before the user lookup and bcrypt
+    await guard_auth_attempt("login", request, credentials.email)
+    user = await ctx.db.users.find_one({"email": credentials.email}, {"_id": 0})
+    if not user or not await asyncio.to_thread(verify_password, credentials.password, user["password"]):
+        if core.settings.auth_rate_limit_enabled:
+            await core.auth_guard.record_failure(credentials.email)
+        raise HTTPException(status_code=401, detail="Credenciales inválidas")
+    if core.settings.auth_rate_limit_enabled:
+        await core.auth_guard.record_success(credentials.email)
+    return await issue_session(ctx.db, user)
+
+@router.post("/auth/refresh", response_model=TokenResponse)
+async def refresh_session(data: RefreshRequest, ctx: RequestContext = Depends(get_context)):
+    # The one place a session touches the users collection after login: picks up role changes
+    try:
+        record = await core.token_service.rotate_refresh(ctx.db, data.refresh_token)
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    user = await ctx.db.users.find_one({"id": record["user_id"]}, {"_id": 0, "password": 0})
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuario no encontrado")
+    return await issue_session(ctx.db, user, family_id=record["family_id"])
+
+@router.post("/auth/logout")
+async def logout(data: RefreshRequest, ctx: RequestContext = Depends(get_context)):
+    await core.token_service.revoke_refresh(ctx.db, data.refresh_token)
+    return {"message": "Sesión cerrada"}
+
+@router.get("/auth/me", response_model=UserResponse)
+async def get_me(ctx: RequestContext = Depends(authenticated)):
+    return user_response(ctx.user)
+
+# ==================== USERS ENDPOINTS ====================
+@router.get("/users", response_model=List[UserResponse])
+async def get_users(ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    users = await ctx.db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
+    return [user_response(u) for u in users]
+
+@router.get("/users/technicians", response_model=List[UserResponse])
+async def get_technicians(ctx: RequestContext = Depends(authenticated)):
+    users = await ctx.db.users.find({"role": "tecnico"}, {"_id": 0, "password": 0}).to_list(1000)
+    return [user_response(u) for u in users]
+
+@router.put("/users/{user_id}/role")
+async def update_user_role(user_id: str, role: UserRole, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    user = await ctx.db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": {"role": role.value, "token_version_changed_at": datetime.now(timezone.utc).isoformat()},
+         "$inc": {"token_version": 1}},
+        projection={"_id": 0, "password": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if user is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    # Outstanding access tokens carry the old role; force them through /auth/refresh
+    await revoke_access_tokens(user_id, user["token_version"])
+    return {"message": "Rol actualizado correctamente"}
+
+@router.put("/users/{user_id}/branch")
+async def update_user_branch(user_id: str, data: UserBranchUpdate, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    if not await ctx.document(tenancy.BRANCHES_COLLECTION, data.branch_id):
+        raise HTTPException(status_code=404, detail="Sucursal no encontrada")
+    # Looked up in the admin's current branch; the document as it was, since it no longer matches after the move
+    before = await ctx.db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": {tenancy.BRANCH_FIELD: data.branch_id, "token_version_changed_at": datetime.now(timezone.utc).isoformat()},
+         "$inc": {"token_version": 1}},
+        projection={"_id": 0, "id": 1, "token_version": 1},
+        return_document=ReturnDocument.BEFORE
+    )
+    if before is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    # Access tokens carry the branch; force them through /auth/refresh
+    await revoke_access_tokens(user_id, before.get("token_version", 0) + 1)
+    return {"message": "Sucursal actualizada correctamente"}
@@ -0,0 +1,108 @@
+import asyncio
+import json
+from typing import List, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+
+import fanout
+from api import core
+from api.context import RequestContext, authenticated
+from api.models import BatchItem, BatchRequest, BatchResponse
+
+router = APIRouter()
+
+API_PREFIX = "/api"
+
+# ==================== BATCH DISPATCH ====================
+def _invalid_path(path: str) -> str:
+    if not path.startswith("/") or path.startswith("//"):
+        return "La ruta debe comenzar con /"
+    if path.partition("?")[0].rstrip("/") == "/batch":
+        return "Un lote no puede contener otro lote"
+    return ""
+
+def _error_body(detail: str) -> bytes:
+    return json.dumps({"detail": detail}).encode()
+
+async def _dispatch(request: Request, ctx: RequestContext, item: BatchItem) -> Tuple[int, bytes]:
+    """Run ``GET /api{item.path}`` through the app in-process and return its status and JSON body.
+
+    The sub-request shares the batch's context: the token is not decoded again,
+    and a document loaded by one sub-request is reused by the others.
+    """
+    path, _, query = item.path.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": request.scope.get("asgi", {"version": "3.0"}),
+        "http_version": request.scope.get("http_version", "1.1"),
+        "method": "GET",
+        "scheme": request.scope.get("scheme", "http"),
+        "server": request.scope.get("server"),
+        "client": request.scope.get("client"),
+        "root_path": request.scope.get("root_path", ""),
+        "path": API_PREFIX + path,
+        "raw_path": (API_PREFIX + path).encode(),
+        "query_string": query.encode(),
+        # HTTPBearer still wants the header; get_current_user returns the context's user without decoding it
+        "headers": [(b"authorization", request.headers["authorization"].encode()), (b"accept", b"application/json")],
+        "state": {"context": ctx},
+    }
+    received = False
+    never = asyncio.Event()
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # The client stays connected until the batch is answered
+        await never.wait()
+
+    status = 500
+    json_body = True
+    chunks: List[bytes] = []
+
+    async def send(message):
+        nonlocal status, json_body
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+            json_body = content_type.startswith(b"application/json")
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        # The app has already sent its 500; the other sub-requests carry on
+        core.logger.exception("Batch sub-request failed: GET %s", item.path)
+        return 500, _error_body("Error interno del servidor")
+    body = b"".join(chunks)
+    if not json_body:
+        return 406, _error_body("La respuesta no es JSON")
+    return status, body or b"null"
+
+# ==================== BATCH ENDPOINT ====================
+@router.post("/batch", response_model=BatchResponse)
+async def run_batch(data: BatchRequest, request: Request, ctx: RequestContext = Depends(authenticated)):
+    """Several GET requests in one call: authenticated once, run concurrently, one response each.
+
+    Every item gets its own ``status`` and ``body``; a failing item doesn't fail the batch.
+    """
+    ids = [item.id for item in data.requests]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Identificadores repetidos en el lote")
+
+    async def run(item: BatchItem) -> Tuple[int, bytes]:
+        problem = _invalid_path(item.path)
+        if problem:
+            return 400, _error_body(problem)
+        return await _dispatch(request, ctx, item)
+
+    results = await fanout.gather(*(run(item) for item in data.requests))
+    # Sub-responses are already JSON: spliced in as they are instead of parsed and encoded again
+    parts = [
+        b'{"id":' + json.dumps(item.id).encode() + b',"status":' + str(status).encode() + b',"body":' + body + b"}"
+        for item, (status, body) in zip(data.requests, results)
+    ]
+    return Response(content=b'{"responses":[' + b",".join(parts) + b"]}", media_type="application/json")
@@ -0,0 +1,21 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+
+import tenancy
+from api.context import RequestContext, authenticated, require_roles
+from api.models import BranchCreate, BranchResponse, UserRole
+
+router = APIRouter()
+
+# ==================== BRANCH ENDPOINTS ====================
+@router.get("/branches", response_model=List[BranchResponse])
+async def get_branches(ctx: RequestContext = Depends(authenticated)):
+    branches = await ctx.db[tenancy.BRANCHES_COLLECTION].find({}, {"_id": 0}).sort("name", 1).to_list(None)
+    return [BranchResponse(**b) for b in branches]
+
+@router.post("/branches", response_model=BranchResponse, status_code=201)
+async def create_branch(data: BranchCreate, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    branch = tenancy.new_branch(data.name)
+    await ctx.db[tenancy.BRANCHES_COLLECTION].insert_one(branch)
+    return BranchResponse(**branch)
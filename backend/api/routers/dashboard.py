@@ -0,0 +1,64 @@
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends
+
+import fanout
+import tenancy
+from api import core
+from api.context import RequestContext, authenticated, require_roles
+from api.models import UserRole
+
+router = APIRouter()
+
+# ==================== DASHBOARD/STATS ENDPOINTS ====================
+@router.get("/dashboard/stats")
+async def get_dashboard_stats(ctx: RequestContext = Depends(authenticated)):
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    
+    # Today's appointments, total vehicles, and this branch's orders/quotes by status folded from the event log
+    # (archiving doesn't log events, so "terminado" counts every finished order, archived ones included)
+    today_appointments, total_vehicles, order_counts, quote_counts = await fanout.gather(
+        ctx.db.appointments.count_documents({"date": today}),
+        ctx.db.vehicles.count_documents({}),
+        core.order_status_counts.refresh(ctx.db.unscoped),
+        core.quote_status_counts.refresh(ctx.db.unscoped),
+    )
+    order_counts = order_counts.get(ctx.branch_id, {})
+    quote_counts = quote_counts.get(ctx.branch_id, {})
+    agendados = order_counts.get("agendado", 0)
+    en_proceso = order_counts.get("en_proceso", 0)
+    en_revision = order_counts.get("en_revision", 0)
+    terminados = order_counts.get("terminado", 0)
+    
+    # Pending quotes
+    pending_quotes = quote_counts.get("pending", 0)
+    
+    return {
+        "today_appointments": today_appointments,
+        "orders_by_status": {
+            "agendado": agendados,
+            "en_proceso": en_proceso,
+            "en_revision": en_revision,
+            "terminado": terminados
+        },
+        "total_vehicles": total_vehicles,
+        "pending_quotes": pending_quotes,
+        "total_active_orders": agendados + en_proceso + en_revision
+    }
+
+@router.get("/dashboard/branches")
+async def get_branch_stats(ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    # One count per branch on its own index range, plus the status projections that already cover every branch
+    db = ctx.db.unscoped
+    branches = await db[tenancy.BRANCHES_COLLECTION].find({}, {"_id": 0}).sort("name", 1).to_list(None)
+    order_counts, quote_counts, *vehicle_counts = await fanout.gather(
+        core.order_status_counts.refresh(db),
+        core.quote_status_counts.refresh(db),
+        *(db.vehicles.count_documents({tenancy.BRANCH_FIELD: branch["id"]}) for branch in branches),
+    )
+    return [{
+        "branch": branch,
+        "total_vehicles": vehicles,
+        "orders_by_status": order_counts.get(branch["id"], {}),
+        "pending_quotes": quote_counts.get(branch["id"], {}).get("pending", 0),
+    } for branch, vehicles in zip(branches, vehicle_counts)]
@@ -0,0 +1,39 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+import exports
+import filters
+from api.context import RequestContext, require_roles
+from api.models import ExportFormat, ExportKind, UserRole
+
+router = APIRouter()
+
+# ==================== ACCOUNTING EXPORTS ====================
+@router.get("/exports/{kind}")
+async def export_documents(kind: ExportKind, format: ExportFormat = ExportFormat.CSV,
+                           date_from: Optional[str] = Query(None, alias="from"),
+                           date_to: Optional[str] = Query(None, alias="to"),
+                           ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    """Approved quotes (by approval date) or finished orders (by completion date), archived ones included.
+
+    Streamed as it is read, so the response has no Content-Length.
+    """
+    export = exports.EXPORTS[kind.value]
+    try:
+        date_range = filters.date_range(export.date_field, date_from, date_to)
+    except filters.FilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    batches = exports.rows(ctx.db, export, date_range)
+    filename = "_".join(part for part in (export.filename, date_from, date_to) if part)
+    if format == ExportFormat.XLSX:
+        # Checked up front: once streaming has started there is no way to report it
+        total = await exports.count(ctx.db, export, date_range)
+        if total >= exports.XLSX_MAX_ROWS:
+            raise HTTPException(status_code=400, detail=f"{total} filas no caben en una hoja XLSX; use CSV o acote las fechas")
+        body, media_type = exports.xlsx_stream(batches, export.headers, export.filename), exports.XLSX_CONTENT_TYPE
+    else:
+        body, media_type = exports.csv_stream(batches, export.headers), exports.CSV_CONTENT_TYPE
+    headers = {"Content-Disposition": f'attachment; filename="{filename}.{format.value}"', "Cache-Control": "no-store"}
+    return StreamingResponse(body, media_type=media_type, headers=headers)
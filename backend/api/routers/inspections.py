@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+import archive
+import damage
+import fanout
+import outbox
+import state_machine
+from api import core
+from api.common import invalidate_cached
+from api.context import RequestContext, authenticated
+from api.models import DamageAreaResponse, DamageStatsResponse, Inspection360Create, Inspection360Response, VehicleStatus
+from api.side_effects import damage_index_entry
+
+router = APIRouter()
+
+# ==================== INSPECTIONS ENDPOINTS ====================
+@router.post("/inspections", response_model=Inspection360Response)
+async def create_inspection(inspection: Inspection360Create, ctx: RequestContext = Depends(authenticated)):
+    inspection_id = str(uuid.uuid4())
+    inspection_doc = {
+        "id": inspection_id,
+        "vehicle_id": inspection.vehicle_id,
+        "service_order_id": inspection.service_order_id,
+        "items": [item.model_dump() for item in inspection.items],
+        "general_notes": inspection.general_notes,
+        "photos": inspection.photos,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": ctx.user["id"]
+    }
+    # Check the vehicle in (agendado or no status -> ingresado); later stages are left alone.
+    # Neither write depends on the other, so they go out together. The damage index is updated from the outbox.
+    _, moved = await fanout.gather(
+        ctx.db.inspections.insert_one({**inspection_doc, outbox.OUTBOX_FIELD: [damage_index_entry(inspection_id)]}),
+        state_machine.try_transition(
+            ctx.db, state_machine.VEHICLE, inspection.vehicle_id, VehicleStatus.INGRESADO.value, ctx.user["id"],
+            use_transactions=core.settings.mongo_transactions
+        ),
+    )
+    if moved:
+        await invalidate_cached(("vehicles", inspection.vehicle_id))
+    
+    return Inspection360Response(**{k: v for k, v in inspection_doc.items() if k != "_id"})
+
+@router.get("/inspections/vehicle/{vehicle_id}", response_model=List[Inspection360Response])
+async def get_vehicle_inspections(vehicle_id: str, ctx: RequestContext = Depends(authenticated)):
+    # Older ones may be in the cold archive; both reads go out together
+    inspections, archived = await fanout.gather(
+        ctx.db.inspections.find({"vehicle_id": vehicle_id}, {"_id": 0, **outbox.HIDDEN_FIELDS}).to_list(100),
+        archive.find(ctx.db, "inspections", {"vehicle_id": vehicle_id}, 100),
+    )
+    inspections = (inspections + archived)[:100]
+    return [Inspection360Response(**i) for i in inspections]
+
+@router.get("/inspections/vehicle/{vehicle_id}/damage", response_model=List[DamageAreaResponse])
+async def get_vehicle_damage(vehicle_id: str, ctx: RequestContext = Depends(authenticated)):
+    """Per area: the latest condition and what earlier inspections found, from the damage index."""
+    return [DamageAreaResponse(**area) for area in await damage.vehicle_areas(ctx.db, vehicle_id)]
+
+@router.get("/inspections/damage-stats", response_model=List[DamageStatsResponse])
+async def get_damage_stats(group_by: str = Query("area", description="Campos separados por coma: area, brand, model"),
+                           area: Optional[str] = None, brand: Optional[str] = None, model: Optional[str] = None,
+                           ctx: RequestContext = Depends(authenticated)):
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in damage.GROUP_FIELDS]
+    if not fields or invalid:
+        raise HTTPException(status_code=400, detail=f"Agrupación no permitida: '{group_by}' (use {', '.join(damage.GROUP_FIELDS)})")
+    match = {name: value for name, value in (("area", area), ("brand", brand), ("model", model)) if value}
+    return [DamageStatsResponse(**row) for row in await damage.stats(ctx.db, list(dict.fromkeys(fields)), match)]
@@ -0,0 +1,79 @@
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException
+
+import channels
+import sync
+from api.context import RequestContext, authenticated, require_roles
+from api.models import (NotificationBulk, NotificationBulkItemResult, NotificationBulkResponse, NotificationCreate,
+                        NotificationResponse, NotificationType, OutboundMessageResponse, UserRole)
+
+router = APIRouter()
+
+# ==================== NOTIFICATIONS ENDPOINTS ====================
+@router.get("/notifications", response_model=List[NotificationResponse])
+async def get_notifications(ctx: RequestContext = Depends(authenticated)):
+    notifications = await ctx.db.notifications.find(
+        {"recipient_id": ctx.user["id"]},
+        {"_id": 0}
+    ).sort("created_at", -1).to_list(100)
+    return [NotificationResponse(**n) for n in notifications]
+
+@router.put("/notifications/{notification_id}/read")
+async def mark_notification_read(notification_id: str, ctx: RequestContext = Depends(authenticated)):
+    result = await ctx.db.notifications.update_one(
+        {"id": notification_id, "recipient_id": ctx.user["id"]},
+        {"$set": {"read": True, **sync.stamp()}}
+    )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=404, detail="Notificación no encontrada")
+    return {"message": "Notificación marcada como leída"}
+
+@router.get("/notifications/unread-count")
+async def get_unread_count(ctx: RequestContext = Depends(authenticated)):
+    count = await ctx.db.notifications.count_documents({"recipient_id": ctx.user["id"], "read": False})
+    return {"count": count}
+
+# ==================== OUTBOUND NOTIFICATIONS ====================
+def _outbound(item: NotificationCreate, users: Dict[str, dict], sender_id: str) -> Tuple[Optional[dict], int, str]:
+    """The message to queue for ``item``, or (None, status code, reason) when it can't be addressed."""
+    user = users.get(item.recipient_id) if item.recipient_id else None
+    if item.recipient_id and not user:
+        return None, 404, "Usuario no encontrado"
+    if item.notification_type == NotificationType.INTERNAL:
+        to = item.recipient_id
+    elif item.notification_type == NotificationType.EMAIL:
+        to = item.recipient_email or (user or {}).get("email")
+    else:
+        raw = item.recipient_phone or (user or {}).get("phone")
+        to = channels.normalize_phone(raw)
+        if raw and not to:
+            return None, 400, "Número de WhatsApp inválido"
+    if not to:
+        return None, 400, "Falta el destinatario de la notificación"
+    message = channels.new_message(
+        item.notification_type.value, to, item.title, item.message, recipient_id=item.recipient_id,
+        related_entity_type=item.related_entity_type, related_entity_id=item.related_entity_id, created_by=sender_id)
+    return message, 201, "Encolada"
+
+@router.post("/notifications", response_model=OutboundMessageResponse, status_code=201)
+async def send_notification(item: NotificationCreate, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    users = await ctx.documents("users", [item.recipient_id])
+    message, status_code, detail = _outbound(item, users, ctx.user["id"])
+    if message is None:
+        raise HTTPException(status_code=status_code, detail=detail)
+    await channels.queue(ctx.db, [message])
+    return OutboundMessageResponse(**message)
+
+@router.post("/notifications/bulk", response_model=NotificationBulkResponse)
+async def send_notifications_bulk(body: NotificationBulk, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    # One users lookup and one insert for the whole batch; delivery pace is the worker's concern
+    users = await ctx.documents("users", [item.recipient_id for item in body.items])
+    messages, results = [], []
+    for index, item in enumerate(body.items):
+        message, status_code, detail = _outbound(item, users, ctx.user["id"])
+        if message is not None:
+            messages.append(message)
+        results.append(NotificationBulkItemResult(index=index, id=message and message["id"], status_code=status_code, detail=detail))
+    queued = await channels.queue(ctx.db, messages)
+    return NotificationBulkResponse(queued=queued, results=results)
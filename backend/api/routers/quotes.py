@@ -0,0 +1,113 @@
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+
+import blobs
+import fanout
+import filters
+import outbox
+import quote_pdf
+import state_machine
+import sync
+from api import core
+from api.common import apply_transition, cached_detail, invalidate_cached, resolve_uploads, run_list_query
+from api.context import RequestContext, authenticated
+from api.models import QuoteApproval, QuoteCreate, QuoteResponse, UploadKind
+from api.side_effects import created_event_entry, quote_pdf_entry
+from cache import etag_matches
+
+router = APIRouter()
+
+# ==================== QUOTES ENDPOINTS ====================
+@router.post("/quotes", response_model=QuoteResponse)
+async def create_quote(quote: QuoteCreate, ctx: RequestContext = Depends(authenticated)):
+    quote_id = str(uuid.uuid4())
+    items = [item.model_dump() for item in quote.items]
+    for item in items:
+        item["service"] = item["service"].value
+    
+    subtotal = sum(item["price"] * item["quantity"] for item in items)
+    tax = subtotal * 0.19  # 19% IVA
+    total = subtotal + tax
+    
+    quote_doc = {
+        "id": quote_id,
+        "vehicle_id": quote.vehicle_id,
+        "client_name": quote.client_name,
+        "client_email": quote.client_email,
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": total,
+        "notes": quote.notes,
+        "status": "pending",
+        "approved_at": None,
+        "signature_url": None,
+        "cedula_photo_url": None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": ctx.user["id"]
+    }
+    await ctx.db.quotes.insert_one({**quote_doc, **sync.stamp(), outbox.OUTBOX_FIELD: [created_event_entry("quote", quote_id, "pending", ctx.user["id"], ctx.branch_id)]})
+    return QuoteResponse(**{k: v for k, v in quote_doc.items() if k != "_id"})
+
+@router.get("/quotes", response_model=List[QuoteResponse], openapi_extra=filters.QUOTES.openapi())
+async def get_quotes(request: Request, ctx: RequestContext = Depends(authenticated)):
+    quotes = await run_list_query(ctx, filters.QUOTES, request, {"_id": 0, **outbox.HIDDEN_FIELDS})
+    return [QuoteResponse(**q) for q in quotes]
+
+@router.get("/quotes/{quote_id}", response_model=QuoteResponse)
+async def get_quote(quote_id: str, request: Request, ctx: RequestContext = Depends(authenticated)):
+    return await cached_detail(ctx, request, "quotes", quote_id, {"id": quote_id}, QuoteResponse, "Cotización no encontrada")
+
+@router.put("/quotes/{quote_id}/approve")
+async def approve_quote(quote_id: str, approval: Optional[QuoteApproval] = Body(None),
+                        signature_url: Optional[str] = Query(None, deprecated=True),
+                        cedula_photo_url: Optional[str] = Query(None, deprecated=True),
+                        ctx: RequestContext = Depends(authenticated)):
+    # Images are uploaded first (POST /api/uploads/{kind}) and referenced by id; the URL
+    # query parameters are only kept for clients that still send short links
+    update_data = {
+        "approved_at": datetime.now(timezone.utc).isoformat()
+    }
+    if approval:
+        urls = await resolve_uploads(ctx, {UploadKind.SIGNATURE.value: approval.signature_id,
+                                           UploadKind.CEDULA.value: approval.cedula_photo_id})
+        signature_url = urls.get(UploadKind.SIGNATURE.value, signature_url)
+        cedula_photo_url = urls.get(UploadKind.CEDULA.value, cedula_photo_url)
+    if signature_url:
+        update_data["signature_url"] = signature_url
+    if cedula_photo_url:
+        update_data["cedula_photo_url"] = cedula_photo_url
+    
+    await apply_transition(state_machine.transition(
+        ctx.db, state_machine.QUOTE, quote_id, "approved", ctx.user["id"],
+        set_fields=update_data, use_transactions=core.settings.mongo_transactions,
+        # Pre-rendered in the background so the first download is a file read
+        side_effects=[quote_pdf_entry(quote_id)]
+    ), "Cotización no encontrada")
+    await invalidate_cached(("quotes", quote_id))
+    return {"message": "Cotización aprobada"}
+
+@router.get("/quotes/{quote_id}/pdf")
+async def get_quote_pdf(quote_id: str, request: Request, ctx: RequestContext = Depends(authenticated)):
+    """The quote as a PDF. Renders are stored by content hash, which is also the ETag."""
+    quote = await ctx.document("quotes", quote_id)
+    if not quote:
+        raise HTTPException(status_code=404, detail="Cotización no encontrada")
+    vehicle, files = await fanout.gather(
+        ctx.db.vehicles.find_one({"id": quote["vehicle_id"]}, quote_pdf.VEHICLE_PROJECTION),
+        quote_pdf.image_blobs(ctx.db, quote),
+    )
+    digest = quote_pdf.quote_hash(quote, vehicle, files)
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "private, no-cache",
+               "Content-Disposition": f'inline; filename="cotizacion-{quote_id[:8]}.pdf"'}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    stored = await quote_pdf.find_render(ctx.db, quote_id, digest)
+    if stored is None:
+        stored = await quote_pdf.render_and_store(ctx.db, core.render_pool, quote, vehicle, files, digest)
+    headers["Content-Length"] = str(stored["length"])
+    return StreamingResponse(blobs.read_chunks(ctx.db, stored), media_type=quote_pdf.CONTENT_TYPE, headers=headers)
@@ -0,0 +1,240 @@
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pymongo import UpdateOne
+
+import fanout
+import filters
+import forecast
+import mailer
+import outbox
+import state_machine
+import sync
+from api import core
+from api.common import apply_transition, assignment_lock, assignment_locks, invalidate_cached, run_list_query, stale_related
+from api.context import RequestContext, authenticated, find_technician, require_roles
+from api.models import (
+    BulkAssign, BulkItemResult, BulkResponse, BulkStatusUpdate, DurationEstimate, ServiceOrderCreate,
+    ServiceOrderResponse, ServiceStatus, ServiceType, StatusUpdate, TechnicianAssign, UserRole,
+)
+from api.side_effects import created_event_entry, notification_entry
+
+router = APIRouter()
+
+def order_status_changes(order_id: str, new_status: ServiceStatus):
+    """Fields and outbox entries that go with moving an order to ``new_status``."""
+    update_data = {}
+    if new_status == ServiceStatus.EN_PROCESO:
+        update_data["started_at"] = datetime.now(timezone.utc).isoformat()
+    elif new_status == ServiceStatus.TERMINADO:
+        update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
+    
+    # Notify client when completed; the email is rendered by the outbox consumer from the vehicle
+    side_effects = []
+    if new_status == ServiceStatus.TERMINADO and mailer.api_key():
+        side_effects.append(outbox.entry("email", {"template": "vehicle_ready", "service_order_id": order_id}))
+    return update_data, side_effects
+
+# ==================== SERVICE ORDERS ENDPOINTS ====================
+@router.post("/service-orders", response_model=ServiceOrderResponse)
+async def create_service_order(order: ServiceOrderCreate, ctx: RequestContext = Depends(authenticated)):
+    order_id = str(uuid.uuid4())
+    
+    # Technician name if assigned, and the vehicle's model when the duration has to be estimated; no id, no query
+    technician, vehicle = await fanout.gather(
+        ctx.document("users", order.assigned_technician_id),
+        ctx.document("vehicles", order.vehicle_id if order.estimated_hours is None else None),
+    )
+    technician_name = technician["name"] if technician else None
+    estimated_hours = order.estimated_hours
+    if estimated_hours is None:
+        vehicle = vehicle or {}
+        estimated_hours = core.forecaster.suggest_hours([s.value for s in order.services], vehicle.get("brand"), vehicle.get("model"))
+    
+    order_doc = {
+        "id": order_id,
+        "vehicle_id": order.vehicle_id,
+        "quote_id": order.quote_id,
+        "appointment_id": order.appointment_id,
+        "services": [s.value for s in order.services],
+        "status": ServiceStatus.AGENDADO.value,
+        "assigned_technician_id": order.assigned_technician_id,
+        "assigned_technician_name": technician_name,
+        "estimated_hours": estimated_hours,
+        "actual_hours": None,
+        "notes": order.notes,
+        "started_at": None,
+        "completed_at": None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": ctx.user["id"]
+    }
+    side_effects = [created_event_entry(
+        "service_order", order_id, ServiceStatus.AGENDADO.value, ctx.user["id"], ctx.branch_id,
+        data={"vehicle_id": order.vehicle_id}
+    )]
+    
+    # Create internal notification if technician assigned
+    if order.assigned_technician_id:
+        side_effects.append(notification_entry(
+            order.assigned_technician_id, "Nueva Orden de Trabajo Asignada",
+            f"Se te ha asignado una nueva orden de servicio #{order_id[:8]}", "service_order", order_id
+        ))
+    
+    audience = [order.assigned_technician_id] if order.assigned_technician_id else []
+    await ctx.db.service_orders.insert_one({
+        **order_doc, **sync.stamp(), sync.AUDIENCE_FIELD: audience, outbox.OUTBOX_FIELD: side_effects
+    })
+    return ServiceOrderResponse(**{k: v for k, v in order_doc.items() if k != "_id"})
+
+@router.get("/service-orders", response_model=List[ServiceOrderResponse], openapi_extra=filters.SERVICE_ORDERS.openapi())
+async def get_service_orders(request: Request, ctx: RequestContext = Depends(authenticated)):
+    orders = await run_list_query(ctx, filters.SERVICE_ORDERS, request, {"_id": 0, **outbox.HIDDEN_FIELDS})
+    
+    # Enrich with vehicle data in one lookup for the whole page
+    await ctx.embed(orders, "vehicle", "vehicle_id", "vehicles")
+    
+    return [ServiceOrderResponse(**o) for o in orders]
+
+@router.get("/service-orders/estimate", response_model=DurationEstimate)
+async def estimate_service_order(services: List[ServiceType] = Query([]), vehicle_id: Optional[str] = None,
+                                 brand: Optional[str] = None, model: Optional[str] = None,
+                                 ctx: RequestContext = Depends(authenticated)):
+    """Suggested duration for these services, on ``vehicle_id`` or a ``brand``/``model`` not registered yet."""
+    if not services:
+        raise HTTPException(status_code=400, detail="Indique al menos un servicio")
+    vehicle = await ctx.document("vehicles", vehicle_id) or {}
+    estimated_us = core.forecaster.suggest_us([s.value for s in services], vehicle.get("brand", brand), vehicle.get("model", model))
+    return DurationEstimate(estimated_hours=round(estimated_us / forecast.US_PER_HOUR, 2) if estimated_us else None,
+                            estimated_us=estimated_us)
+
+@router.get("/service-orders/{order_id}", response_model=ServiceOrderResponse)
+async def get_service_order(order_id: str, ctx: RequestContext = Depends(authenticated)):
+    order = await ctx.document("service_orders", order_id)
+    if not order:
+        raise HTTPException(status_code=404, detail="Orden no encontrada")
+    
+    order = {**order, "vehicle": await ctx.document("vehicles", order["vehicle_id"])}
+    
+    return ServiceOrderResponse(**order)
+
+@router.put("/service-orders/{order_id}/status")
+async def update_service_order_status(order_id: str, data: StatusUpdate, ctx: RequestContext = Depends(authenticated)):
+    update_data, side_effects = order_status_changes(order_id, data.status)
+    
+    # Validates the move and carries the vehicle/appointment along in the same step
+    result = await apply_transition(state_machine.transition_service_order(
+        ctx.db, order_id, data.status.value, ctx.user["id"], set_fields=update_data, use_transactions=core.settings.mongo_transactions,
+        side_effects=side_effects
+    ), "Orden no encontrada")
+    stale = stale_related(result)
+    if stale:
+        await invalidate_cached(*stale)
+    
+    return {"message": "Estado actualizado"}
+
+@router.put("/service-orders/{order_id}/assign")
+async def assign_technician(order_id: str, data: TechnicianAssign, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    # Notification for the technician is queued in the same write
+    async with assignment_lock("service_order", order_id, find_technician(ctx, data.technician_id)) as (technician,):
+        if not technician:
+            raise HTTPException(status_code=404, detail="Técnico no encontrado")
+        result = await ctx.db.service_orders.update_one(
+            {"id": order_id},
+            {"$set": {"assigned_technician_id": data.technician_id, "assigned_technician_name": technician["name"],
+                      **sync.stamp()},
+             "$addToSet": {sync.AUDIENCE_FIELD: data.technician_id},
+             **outbox.push([notification_entry(data.technician_id, "Nueva Orden Asignada",
+                                               f"Se te ha asignado la orden #{order_id[:8]}", "service_order", order_id)])}
+        )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Orden no encontrada")
+    
+    return {"message": "Técnico asignado correctamente"}
+
+# ==================== BULK SERVICE ORDER ENDPOINTS ====================
+def dedupe_bulk_items(items: list):
+    # The first occurrence of an order is applied; repeats are reported instead of applied twice
+    seen, unique, repeats = set(), [], set()
+    for index, item in enumerate(items):
+        if item.order_id in seen:
+            repeats.add(index)
+        else:
+            seen.add(item.order_id)
+            unique.append(item)
+    return unique, repeats
+
+def bulk_response(items: list, outcomes: dict, repeats: set) -> BulkResponse:
+    # Results come back in request order; outcomes maps order id -> (status_code, detail)
+    results = []
+    for index, item in enumerate(items):
+        status_code, detail = (400, "Orden repetida en la solicitud") if index in repeats else outcomes[item.order_id]
+        results.append(BulkItemResult(order_id=item.order_id, status_code=status_code, detail=detail))
+    return BulkResponse(updated=sum(r.status_code == 200 for r in results), results=results)
+
+@router.post("/service-orders/bulk-status", response_model=BulkResponse)
+async def bulk_update_service_order_status(data: BulkStatusUpdate, ctx: RequestContext = Depends(authenticated)):
+    outcomes = {}
+    items, repeats = dedupe_bulk_items(data.items)
+    changes = []
+    for item in items:
+        update_data, side_effects = order_status_changes(item.order_id, item.status)
+        changes.append(state_machine.StatusChange(item.order_id, item.status.value, update_data, side_effects))
+    
+    # Reads and writes each collection once for the whole batch
+    result = await state_machine.transition_service_orders(ctx.db, changes, ctx.user["id"], use_transactions=core.settings.mongo_transactions)
+    stale = []
+    for order_id, applied in result.applied.items():
+        outcomes[order_id] = (200, "Estado actualizado")
+        stale.extend(stale_related(applied))
+    for order_id, error in result.errors.items():
+        if isinstance(error, state_machine.EntityNotFound):
+            outcomes[order_id] = (404, "Orden no encontrada")
+        else:
+            outcomes[order_id] = (409, str(error))
+    if stale:
+        await invalidate_cached(*stale)
+    
+    return bulk_response(data.items, outcomes, repeats)
+
+@router.post("/service-orders/bulk-assign", response_model=BulkResponse)
+async def bulk_assign_technicians(data: BulkAssign, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    outcomes = {}
+    items, repeats = dedupe_bulk_items(data.items)
+    
+    found = await ctx.documents("users", [item.technician_id for item in items])
+    technicians = {user_id: user for user_id, user in found.items() if user["role"] == "tecnico"}
+    
+    async with assignment_locks("service_order", [item.order_id for item in items]) as locked:
+        ops, targets = [], []
+        for item in items:
+            technician = technicians.get(item.technician_id)
+            if technician is None:
+                outcomes[item.order_id] = (404, "Técnico no encontrado")
+            elif item.order_id not in locked:
+                outcomes[item.order_id] = (409, "Otra asignación está en curso para este registro")
+            else:
+                # Same write as the single endpoint: the technician's notification rides in the outbox
+                ops.append(UpdateOne(
+                    {"id": item.order_id},
+                    {"$set": {"assigned_technician_id": technician["id"], "assigned_technician_name": technician["name"],
+                              **sync.stamp()},
+                     "$addToSet": {sync.AUDIENCE_FIELD: technician["id"]},
+                     **outbox.push([notification_entry(technician["id"], "Nueva Orden Asignada",
+                                                       f"Se te ha asignado la orden #{item.order_id[:8]}",
+                                                       "service_order", item.order_id)])}
+                ))
+                targets.append(item.order_id)
+        missing = set()
+        if ops:
+            result = await ctx.db.service_orders.bulk_write(ops, ordered=False)
+            if result.matched_count < len(ops):
+                existing = await ctx.db.service_orders.find(
+                    {"id": {"$in": targets}}, {"_id": 0, "id": 1}
+                ).to_list(len(targets))
+                missing = set(targets) - {o["id"] for o in existing}
+    for order_id in targets:
+        outcomes[order_id] = (404, "Orden no encontrada") if order_id in missing else (200, "Técnico asignado correctamente")
+    
+    return bulk_response(data.items, outcomes, repeats)
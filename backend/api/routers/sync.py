@@ -0,0 +1,69 @@
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+
+import fanout
+import outbox
+import sync
+from api import core
+from api.context import RequestContext, authenticated
+from api.models import SyncResponse
+
+router = APIRouter()
+
+PROJECTIONS = {
+    "vehicles": {**core.VEHICLE_EMBED_PROJECTION, **sync.HIDDEN_FIELDS},
+    "notifications": {"_id": 0},
+}
+DEFAULT_PROJECTION = {"_id": 0, **outbox.HIDDEN_FIELDS, **sync.HIDDEN_FIELDS}
+
+# ==================== SYNC ENDPOINTS ====================
+async def _changed(ctx: RequestContext, collection: str, since: int, limit: int) -> List[dict]:
+    projection = PROJECTIONS.get(collection, DEFAULT_PROJECTION)
+    query = {**sync.scope(collection, ctx.user), sync.SEQ_FIELD: {"$gt": since}}
+    return await ctx.db[collection].find(query, projection).sort(sync.SEQ_FIELD, 1).limit(limit).to_list(limit)
+
+async def _tombstones(ctx: RequestContext, collections, since: int, limit: int) -> List[dict]:
+    query = {
+        "collection": {"$in": list(collections)}, sync.SEQ_FIELD: {"$gt": since},
+        "$or": [{sync.AUDIENCE_FIELD: None}, {sync.AUDIENCE_FIELD: ctx.user["id"]}],
+    }
+    return await ctx.db[sync.TOMBSTONES_COLLECTION].find(query, {"_id": 0}).sort(sync.SEQ_FIELD, 1).limit(limit).to_list(limit)
+
+@router.get("/sync", response_model=SyncResponse)
+async def get_sync(since: Optional[str] = None, limit: int = 500, ctx: RequestContext = Depends(authenticated)):
+    """Documents created, changed or removed since ``since``; omit it for a full snapshot.
+
+    Pass the returned ``token`` next time, straight away while ``has_more`` is true.
+    """
+    try:
+        since_seq = sync.parse_token(since)
+    except sync.SyncError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    limit = max(1, min(limit, sync.MAX_LIMIT))
+    # Taken before reading: anything stamped up to here has landed by the time the reads run
+    settled = sync.settled_seq()
+    collections = sync.ROLE_COLLECTIONS.get(ctx.user["role"], ())
+
+    *pages, tombstones = await fanout.gather(
+        *(_changed(ctx, name, since_seq, limit) for name in collections),
+        _tombstones(ctx, collections, since_seq, limit),
+    )
+    changes: Dict[str, List[dict]] = {}
+    removed: Dict[str, List[str]] = {}
+    last_seq: Dict[str, Optional[int]] = {}
+    for name, docs in zip(collections, pages):
+        last_seq[name] = docs[-1][sync.SEQ_FIELD] if len(docs) == limit else None
+        for doc in docs:
+            if sync.still_visible(name, doc, ctx.user):
+                changes.setdefault(name, []).append(doc)
+            else:
+                removed.setdefault(name, []).append(doc["id"])
+    last_seq[sync.TOMBSTONES_COLLECTION] = tombstones[-1][sync.SEQ_FIELD] if len(tombstones) == limit else None
+    for stone in tombstones:
+        removed.setdefault(stone["collection"], []).append(stone["id"])
+
+    token = sync.next_token(since_seq, last_seq, settled)
+    # Below the settled point only when a full page held the token back
+    has_more = token < settled
+    return SyncResponse(token=str(token), has_more=has_more, changes=changes, removed=removed)
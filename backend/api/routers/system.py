@@ -0,0 +1,39 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends
+
+import archive
+import channels
+import events
+import jobs
+from api import core
+from api.context import RequestContext, require_roles
+from api.models import UserRole
+
+router = APIRouter()
+
+# ==================== EVENT LOG ENDPOINTS ====================
+@router.get("/events")
+async def get_status_events(after: int = 0, limit: int = 500, entity_type: Optional[str] = None, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    limit = max(1, min(limit, 1000))
+    batch = await events.read_events(ctx.db, after, limit, [entity_type] if entity_type else None)
+    return {"events": batch, "next": batch[-1]["seq"] if batch else after}
+
+@router.get("/metrics")
+async def get_metrics(ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    return {
+        "worker": core.counters.snapshot(),
+        "cluster": await core.counters.totals(core.shared),
+        "document_cache": {"hits": core.document_cache.hits, "misses": core.document_cache.misses},
+        "notifications": await channels.stats(ctx.db),
+        "archive": await archive.stats(ctx.db.unscoped),
+        "forecast": core.forecaster.snapshot(),
+    }
+
+@router.get("/jobs/stats")
+async def get_job_stats(ctx: RequestContext = Depends(require_roles([UserRole.ADMIN]))):
+    return await jobs.stats(ctx.db)
+
+@router.get("/")
+async def root():
+    return {"message": "PolarizadosYA! API v1.0"}
@@ -0,0 +1,158 @@
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+import blobs
+from api import core
+from api.common import upload_url
+from api.context import RequestContext, authenticated
+from api.models import UploadKind, UploadResponse
+
+router = APIRouter()
+
+ALLOWED_TYPES = {
+    UploadKind.SIGNATURE: ("image/png", "image/jpeg", "image/webp"),
+    UploadKind.CEDULA: ("image/jpeg", "image/png", "image/webp"),
+}
+# Boundaries, part headers and small form fields around the file itself
+ENVELOPE_BYTES = 16 * 1024
+# Enough leading bytes to tell the image types apart
+SNIFF_BYTES = 12
+
+# ==================== MULTIPART STREAMING ====================
+class FilePartReader:
+    """Incremental multipart parser that keeps the first file part and ignores the other fields.
+
+    ``feed()`` a piece of the request body, then ``drain()`` the file data it
+    contained. Nothing is kept between pieces except a part's headers.
+    """
+
+    def __init__(self, boundary: bytes):
+        self.headers: Optional[Dict[str, str]] = None
+        self.finished = False
+        self._part_headers: Dict[str, str] = {}
+        self._field = b""
+        self._value = b""
+        self._in_file = False
+        self._pending: List[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._part_begin,
+            "on_header_field": self._header_field,
+            "on_header_value": self._header_value,
+            "on_header_end": self._header_end,
+            "on_headers_finished": self._headers_finished,
+            "on_part_data": self._part_data,
+            "on_part_end": self._part_end,
+        })
+
+    def _part_begin(self):
+        self._part_headers = {}
+
+    def _header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _header_end(self):
+        self._part_headers[self._field.decode("latin-1").lower()] = self._value.decode("latin-1")
+        self._field = self._value = b""
+
+    def _headers_finished(self):
+        _, options = parse_options_header(self._part_headers.get("content-disposition"))
+        if self.headers is None and b"filename" in options:
+            self.headers = {**self._part_headers, "filename": options[b"filename"].decode("utf-8", "replace")}
+            self._in_file = True
+
+    def _part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._pending.append(data[start:end])
+
+    def _part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.finished = True
+
+    def feed(self, chunk: bytes):
+        self._parser.write(chunk)
+
+    def drain(self) -> List[bytes]:
+        pending, self._pending = self._pending, []
+        return pending
+
+def _multipart_boundary(request: Request) -> bytes:
+    content_type, options = parse_options_header(request.headers.get("content-type"))
+    if content_type != b"multipart/form-data" or not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Se esperaba un formulario multipart con un archivo")
+    return options[b"boundary"]
+
+def _check_declared_size(request: Request):
+    # Rejected before reading any of the body when the client says how big it is
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > core.settings.upload_max_bytes + ENVELOPE_BYTES:
+        raise HTTPException(status_code=413, detail=f"El archivo supera el máximo de {blobs.megabytes(core.settings.upload_max_bytes)} MB")
+
+# ==================== UPLOADS ENDPOINTS ====================
+@router.post("/uploads/{kind}", response_model=UploadResponse)
+async def upload_file(kind: UploadKind, request: Request, ctx: RequestContext = Depends(authenticated)):
+    """Store a signature or ID photo sent as ``multipart/form-data`` and return a reference to it.
+
+    The body is parsed and written to the blob store as it arrives, one chunk at
+    a time. Pass the returned ``id`` to ``PUT /api/quotes/{id}/approve``.
+    """
+    reader = FilePartReader(_multipart_boundary(request))
+    _check_declared_size(request)
+    writer: Optional[blobs.BlobWriter] = None
+    head = b""
+    sniffed = False
+    try:
+        async for chunk in request.stream():
+            reader.feed(chunk)
+            if writer is None and reader.headers is not None:
+                content_type = reader.headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type not in ALLOWED_TYPES[kind]:
+                    raise HTTPException(status_code=415, detail="Tipo de archivo no permitido; usa PNG, JPEG o WebP")
+                writer = blobs.BlobWriter(ctx.db, reader.headers["filename"], content_type, core.settings.upload_max_bytes,
+                                          {"kind": kind.value, "uploaded_by": ctx.user["id"]})
+            for piece in reader.drain():
+                if not sniffed:
+                    head += piece[:SNIFF_BYTES]
+                    if len(head) >= SNIFF_BYTES:
+                        sniffed = True
+                        if not blobs.sniff(head, writer.content_type):
+                            raise HTTPException(status_code=415, detail="El contenido no corresponde al tipo de archivo")
+                await writer.write(piece)
+            if reader.finished:
+                # Anything after the file is form noise; stop reading
+                break
+        if writer is None or not reader.finished or writer.length == 0:
+            raise HTTPException(status_code=400, detail="No se recibió ningún archivo")
+        if not sniffed and not blobs.sniff(head, writer.content_type):
+            raise HTTPException(status_code=415, detail="El contenido no corresponde al tipo de archivo")
+        doc = await writer.close()
+    except blobs.BlobTooLarge as e:
+        await writer.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except MultipartParseError:
+        if writer is not None:
+            await writer.abort()
+        raise HTTPException(status_code=400, detail="Formulario multipart mal formado")
+    except Exception:
+        if writer is not None:
+            await writer.abort()
+        raise
+    return UploadResponse(id=doc["_id"], kind=kind, url=upload_url(doc["_id"]),
+                          content_type=writer.content_type, size=doc["length"])
+
+@router.get("/uploads/{blob_id}")
+async def get_upload(blob_id: str, ctx: RequestContext = Depends(authenticated)):
+    doc = await blobs.find(ctx.db, blob_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    # Uploads never change once stored
+    headers = {"Content-Length": str(doc["length"]), "ETag": f'"{doc["metadata"]["sha256"]}"',
+               "Cache-Control": "private, max-age=31536000, immutable"}
+    return StreamingResponse(blobs.read_chunks(ctx.db, doc), media_type=doc["metadata"]["contentType"], headers=headers)
@@ -0,0 +1,181 @@
+import uuid
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+
+import archive
+import fanout
+import filters
+import search
+import state_machine
+import sync
+from api import core
+from api.common import apply_transition, assignment_lock, cached_detail, conditional_response, invalidate_cached, run_list_query
+from api.context import RequestContext, authenticated, find_technician, require_roles
+from api.models import (
+    UserRole, VehicleCreate, VehicleResponse, VehicleSearchResponse, VehicleStatus, VehicleStatusUpdate,
+    VehicleTechnicianAssign, VehicleTimelineResponse,
+)
+from api.side_effects import notification_entry
+from cache import last_modified
+
+router = APIRouter()
+
+# ==================== TIMELINE PIPELINE ====================
+def _not_data_url(field: str) -> dict:
+    # Inspection photos and signatures may be inline data URLs; the timeline only carries references
+    return {"$filter": {
+        "input": {"$ifNull": [field, []]},
+        "cond": {"$not": [{"$regexMatch": {"input": "$$this", "regex": "^data:"}}]}
+    }}
+
+def vehicle_timeline_pipeline(vehicle_id: str, branch_id: str, skip: int, limit: int) -> list:
+    # The sub-pipelines aren't branch-scoped by the request's handle, so they carry the branch themselves
+    match = {"$match": {"branch_id": branch_id, "vehicle_id": vehicle_id}}
+    history = [
+        match,
+        {"$project": {"_id": 0, "type": {"$literal": "appointment"}, "id": 1, "created_at": 1, "status": 1,
+                      "date": 1, "time_slot": 1, "services": 1, "notes": 1}},
+        {"$unionWith": {"coll": "inspections", "pipeline": [
+            match,
+            {"$project": {"_id": 0, "type": {"$literal": "inspection"}, "id": 1, "created_at": 1, "service_order_id": 1,
+                          "items": 1, "general_notes": 1,
+                          "photo_count": {"$size": {"$ifNull": ["$photos", []]}},
+                          "photos": _not_data_url("$photos")}},
+        ]}},
+        {"$unionWith": {"coll": "quotes", "pipeline": [
+            match,
+            {"$project": {"_id": 0, "type": {"$literal": "quote"}, "id": 1, "created_at": 1, "status": 1, "items": 1,
+                          "subtotal": 1, "tax": 1, "total": 1, "approved_at": 1,
+                          "has_signature": {"$gt": ["$signature_url", None]}}},
+        ]}},
+        {"$unionWith": {"coll": "service_orders", "pipeline": [
+            match,
+            {"$project": {"_id": 0, "type": {"$literal": "service_order"}, "id": 1, "created_at": 1, "status": 1,
+                          "services": 1, "quote_id": 1, "appointment_id": 1, "assigned_technician_id": 1,
+                          "assigned_technician_name": 1, "estimated_hours": 1, "actual_hours": 1,
+                          "started_at": 1, "completed_at": 1}},
+        ]}},
+        # Archived documents keep their entry ready-made (archive.timeline_entry)
+        *({"$unionWith": {"coll": name, "pipeline": [match, {"$replaceWith": f"${archive.TIMELINE_FIELD}"}]}}
+          for name in archive.ARCHIVE_COLLECTIONS),
+        {"$sort": {"created_at": -1, "id": 1}},
+        {"$facet": {"total": [{"$count": "n"}], "items": [{"$skip": skip}, {"$limit": limit}]}},
+    ]
+    return [
+        {"$match": {"id": vehicle_id}},
+        {"$project": core.VEHICLE_EMBED_PROJECTION},
+        # Uncorrelated sub-pipeline: every branch matches on a literal vehicle_id and uses its index
+        {"$lookup": {"from": "appointments", "pipeline": history, "as": "history"}},
+    ]
+
+# ==================== VEHICLES ENDPOINTS ====================
+@router.post("/vehicles", response_model=VehicleResponse)
+async def create_vehicle(vehicle: VehicleCreate, ctx: RequestContext = Depends(authenticated)):
+    # Check if vehicle with same plate exists
+    existing = await ctx.db.vehicles.find_one({"plate": vehicle.plate.upper()}, {"_id": 0})
+    if existing:
+        raise HTTPException(status_code=400, detail="Ya existe un vehículo con esta placa")
+    
+    vehicle_id = str(uuid.uuid4())
+    vehicle_doc = {
+        "id": vehicle_id,
+        **vehicle.model_dump(),
+        "plate": vehicle.plate.upper(),
+        "status": None,
+        "assigned_technician_id": None,
+        "assigned_technician_name": None,
+        "current_service_order_id": None,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "created_by": ctx.user["id"]
+    }
+    vehicle_doc.update(search.search_fields(vehicle_doc))
+    await ctx.db.vehicles.insert_one({**vehicle_doc, **sync.stamp()})
+    return VehicleResponse(**{k: v for k, v in vehicle_doc.items() if k != "_id"})
+
+@router.get("/vehicles", response_model=List[VehicleResponse], openapi_extra=filters.VEHICLES.openapi())
+async def get_vehicles(request: Request, ctx: RequestContext = Depends(authenticated)):
+    vehicles = await run_list_query(ctx, filters.VEHICLES, request, core.VEHICLE_EMBED_PROJECTION)
+    return [VehicleResponse(**v) for v in vehicles]
+
+@router.get("/vehicles/search", response_model=VehicleSearchResponse)
+async def search_vehicles(q: str, limit: int = 20, skip: int = 0, ctx: RequestContext = Depends(authenticated)):
+    tokens = search.query_tokens(q)
+    if len("".join(tokens)) < search.MIN_QUERY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"La búsqueda requiere al menos {search.MIN_QUERY_LENGTH} caracteres")
+    limit = max(1, min(limit, 100))
+    skip = max(0, skip)
+    if skip + limit > search.MAX_DEPTH:
+        raise HTTPException(status_code=400, detail=f"La búsqueda solo pagina los primeros {search.MAX_DEPTH} resultados; refine el texto")
+    # Every rank tier brings its own best skip + limit, sorted in the database; all go out together with the count
+    total, *tiers = await fanout.gather(
+        ctx.db.vehicles.count_documents(search.build_query(tokens)),
+        *(ctx.db.vehicles.find(tier, core.VEHICLE_EMBED_PROJECTION).sort(search.SORT).limit(skip + limit).to_list(skip + limit)
+          for tier in search.tier_queries(tokens)),
+    )
+    ranked = [vehicle for tier in tiers for vehicle in tier]
+    return VehicleSearchResponse(
+        items=[VehicleResponse(**v) for v in ranked[skip:skip + limit]],
+        total=total, limit=limit, skip=skip, has_more=skip + limit < total
+    )
+
+@router.get("/vehicles/{vehicle_id}", response_model=VehicleResponse)
+async def get_vehicle(vehicle_id: str, request: Request, ctx: RequestContext = Depends(authenticated)):
+    return await cached_detail(ctx, request, "vehicles", vehicle_id, {"id": vehicle_id}, VehicleResponse, "Vehículo no encontrado")
+
+@router.get("/vehicles/plate/{plate}", response_model=VehicleResponse)
+async def get_vehicle_by_plate(plate: str, request: Request, ctx: RequestContext = Depends(authenticated)):
+    plate_upper = plate.upper()
+    # The same plate can be registered at several branches
+    alias = f"{ctx.branch_id}:{plate_upper}"
+    vehicle_id = core.document_cache.resolve_alias("vehicles", alias)
+    if vehicle_id:
+        return await cached_detail(ctx, request, "vehicles", vehicle_id, {"id": vehicle_id}, VehicleResponse, "Vehículo no encontrado")
+    ticket = core.document_cache.begin()
+    vehicle = await ctx.db.vehicles.find_one({"plate": plate_upper}, core.VEHICLE_EMBED_PROJECTION)
+    if not vehicle:
+        raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+    # Plates never change once registered, so the alias outlives document invalidations
+    core.document_cache.set_alias("vehicles", alias, vehicle["id"])
+    cached = core.document_cache.put("vehicles", vehicle["id"], VehicleResponse(**vehicle).model_dump_json().encode(), ticket,
+                                     last_modified(vehicle), owner=ctx.branch_id)
+    return conditional_response(request, cached)
+
+@router.get("/vehicles/{vehicle_id}/timeline", response_model=VehicleTimelineResponse)
+async def get_vehicle_timeline(vehicle_id: str, limit: int = 50, skip: int = 0, ctx: RequestContext = Depends(authenticated)):
+    limit = max(1, min(limit, 200))
+    skip = max(0, skip)
+    result = await ctx.db.vehicles.aggregate(vehicle_timeline_pipeline(vehicle_id, ctx.branch_id, skip, limit)).to_list(1)
+    if not result:
+        raise HTTPException(status_code=404, detail="Vehículo no encontrado")
+    vehicle = result[0]
+    page = vehicle.pop("history")[0]
+    total = page["total"][0]["n"] if page["total"] else 0
+    return VehicleTimelineResponse(vehicle=VehicleResponse(**vehicle), history=page["items"], total=total, limit=limit, skip=skip)
+
+@router.put("/vehicles/{vehicle_id}/status")
+async def update_vehicle_status(vehicle_id: str, data: VehicleStatusUpdate, ctx: RequestContext = Depends(authenticated)):
+    await apply_transition(state_machine.transition(
+        ctx.db, state_machine.VEHICLE, vehicle_id, data.status.value, ctx.user["id"], use_transactions=core.settings.mongo_transactions
+    ), "Vehículo no encontrado")
+    await invalidate_cached(("vehicles", vehicle_id))
+    return {"message": "Estado actualizado"}
+
+@router.put("/vehicles/{vehicle_id}/assign-technician")
+async def assign_technician_to_vehicle(vehicle_id: str, data: VehicleTechnicianAssign, ctx: RequestContext = Depends(require_roles([UserRole.ADMIN, UserRole.ASESOR]))):
+    # The technician lookup overlaps with taking the lock
+    async with assignment_lock("vehicle", vehicle_id, find_technician(ctx, data.technician_id)) as (technician,):
+        if not technician:
+            raise HTTPException(status_code=404, detail="Técnico no encontrado")
+        await apply_transition(state_machine.transition(
+            ctx.db, state_machine.VEHICLE, vehicle_id, VehicleStatus.CON_TECNICO.value, ctx.user["id"],
+            set_fields={"assigned_technician_id": data.technician_id, "assigned_technician_name": technician["name"]},
+            use_transactions=core.settings.mongo_transactions,
+            # Notification for the technician rides along with the vehicle write
+            side_effects=[notification_entry(data.technician_id, "Vehículo Asignado",
+                                             "Se te ha asignado el vehículo para servicio", "vehicle", vehicle_id)]
+        ), "Vehículo no encontrado")
+    await invalidate_cached(("vehicles", vehicle_id))
+    
+    return {"message": "Técnico asignado correctamente"}
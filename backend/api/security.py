@@ -0,0 +1,85 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+
+import ratelimit
+import tokens
+from api import core
+from api.models import TokenResponse, UserResponse, UserRole
+
+security = HTTPBearer()
+
+# ==================== AUTH HELPERS ====================
+# bcrypt and the JWT library are imported on first use: processes that never log anyone in skip them
+def hash_password(password: str) -> str:
+    import bcrypt
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+
+def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+def create_token(user: dict) -> str:
+    return core.token_service.issue_access(user)
+
+def user_response(user: dict) -> UserResponse:
+    return UserResponse(
+        id=user["id"],
+        email=user["email"],
+        name=user["name"],
+        role=UserRole(user["role"]),
+        phone=user.get("phone"),
+        branch_id=user.get("branch_id"),
+        created_at=user["created_at"]
+    )
+
+async def issue_session(db, user: dict, family_id: Optional[str] = None) -> TokenResponse:
+    return TokenResponse(
+        access_token=create_token(user),
+        refresh_token=await core.token_service.issue_refresh(db, user["id"], family_id),
+        expires_in=core.settings.access_token_minutes * 60,
+        user=user_response(user)
+    )
+
+async def get_current_user(request: Request, credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # Sub-requests of POST /api/batch arrive with the batch's context, already authenticated
+    ctx = getattr(request.state, "context", None)
+    if ctx is not None and ctx.user is not None:
+        return ctx.user
+    # Everything comes from the signed claims; revocations arrive through the version cache
+    try:
+        return core.token_service.authenticate(credentials.credentials)
+    except tokens.TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+def apply_remote_revocation(message: dict):
+    core.token_service.note_version(message["user_id"], message["version"])
+
+async def revoke_access_tokens(user_id: str, version: int):
+    core.token_service.note_version(user_id, version)
+    await core.shared.publish(core.TOKEN_REVOCATION_CHANNEL, {"user_id": user_id, "version": version})
+
+# ==================== AUTH RATE LIMITING ====================
+def rate_policy(spec: str) -> ratelimit.BucketPolicy:
+    burst, per_minute = spec.split("/")
+    return ratelimit.BucketPolicy.per_minute(float(burst), float(per_minute))
+
+def client_ip(request: Request) -> str:
+    if core.settings.trust_forwarded_for:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+async def guard_auth_attempt(action: str, request: Request, email: str):
+    if not core.settings.auth_rate_limit_enabled:
+        return
+    try:
+        await core.auth_guard.check(action, client_ip(request), email)
+    except ratelimit.RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Demasiados intentos. Intenta de nuevo en {e.retry_after} segundos.",
+            headers={"Retry-After": str(e.retry_after)},
+        )
@@ -0,0 +1,98 @@
+from typing import List, Optional
+
+from pymongo.errors import BulkWriteError
+
+import channels
+import damage
+import events
+import jobs
+import outbox
+import sync
+from api import core
+from api.models import NotificationType
+
+# ==================== OUTBOX HANDLERS ====================
+def notification_entry(recipient_id: str, title: str, message: str, entity_type: str, entity_id: str) -> dict:
+    return outbox.entry("notification", {
+        "recipient_id": recipient_id,
+        "notification_type": NotificationType.INTERNAL.value,
+        "title": title,
+        "message": message,
+        "related_entity_type": entity_type,
+        "related_entity_id": entity_id,
+    })
+
+def vehicle_ready_email(vehicle: dict):
+    html_content = f"""
+    <h2>¡Tu vehículo está listo! - PolarizadosYA!</h2>
+    <p>Hola {vehicle['client_name']},</p>
+    <p>Nos complace informarte que el servicio para tu vehículo <strong>{vehicle['brand']} {vehicle['model']}</strong> ({vehicle['plate']}) ha sido completado.</p>
+    <p>¡Puedes pasar a recogerlo cuando gustes!</p>
+    <p>Gracias por confiar en PolarizadosYA!</p>
+    """
+    return vehicle["client_email"], "¡Tu vehículo está listo! - PolarizadosYA!", html_content
+
+async def deliver_notifications(database, entries: List[dict]):
+    # The outbox entry id becomes the notification id, so redelivery is a duplicate-key no-op
+    docs = [{
+        "id": e["id"], **e["payload"], "read": False, "sent_at": e["created_at"], "created_at": e["created_at"],
+        **sync.stamp()
+    } for e in entries]
+    try:
+        await database.notifications.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+async def deliver_emails(database, entries: List[dict]):
+    order_ids = list({e["payload"]["service_order_id"] for e in entries if e["payload"].get("template") == "vehicle_ready"})
+    vehicle_by_order, vehicles = {}, {}
+    if order_ids:
+        orders = await database.service_orders.find(
+            {"id": {"$in": order_ids}}, {"_id": 0, "id": 1, "vehicle_id": 1}
+        ).to_list(len(order_ids))
+        vehicle_by_order = {o["id"]: o["vehicle_id"] for o in orders}
+        vehicle_ids = list(set(vehicle_by_order.values()))
+        found = await database.vehicles.find({"id": {"$in": vehicle_ids}}, core.VEHICLE_EMBED_PROJECTION).to_list(len(vehicle_ids))
+        vehicles = {v["id"]: v for v in found}
+    messages = []
+    for e in entries:
+        payload = e["payload"]
+        if payload.get("template") == "vehicle_ready":
+            vehicle = vehicles.get(vehicle_by_order.get(payload["service_order_id"]))
+            if not (vehicle and vehicle.get("client_email")):
+                continue
+            to, subject, html = vehicle_ready_email(vehicle)
+        else:
+            to, subject, html = payload["to"], payload["subject"], payload["html"]
+        # Sending happens in the worker process; the entry id keeps redelivery from queueing twice
+        messages.append(channels.new_message(channels.EMAIL, to, subject, "", html=html, message_id=e["id"]))
+    await channels.queue(database, messages)
+
+async def deliver_status_events(database, entries: List[dict]):
+    logged = await database[events.EVENTS_COLLECTION].find(
+        {"id": {"$in": [e["payload"]["id"] for e in entries]}}, {"_id": 0, "id": 1}
+    ).to_list(len(entries))
+    seen = {doc["id"] for doc in logged}
+    await events.append_events(database, [e["payload"] for e in entries if e["payload"]["id"] not in seen])
+
+def quote_pdf_entry(quote_id: str) -> dict:
+    return outbox.entry("quote_pdf", {"quote_id": quote_id})
+
+async def deliver_quote_pdfs(database, entries: List[dict]):
+    # Rendering is CPU work for the worker; the API only queues it
+    await jobs.enqueue(database, [
+        jobs.new_job("render_quote_pdf", e["payload"], priority=-1, dedupe_key=e["id"]) for e in entries
+    ])
+
+def damage_index_entry(inspection_id: str) -> dict:
+    return outbox.entry("damage_index", {"inspection_id": inspection_id})
+
+async def deliver_damage_index(database, entries: List[dict]):
+    # Indexing is idempotent per inspection and area, so a redelivered batch changes nothing
+    await damage.index_by_ids(database, list({e["payload"]["inspection_id"] for e in entries}))
+
+def created_event_entry(entity_type: str, entity_id: str, to_status: str, actor_id: str, branch_id: str,
+                        data: Optional[dict] = None) -> dict:
+    return outbox.entry("status_event", events.new_event(entity_type, entity_id, None, to_status, actor_id, data=data,
+                                                         branch_id=branch_id))
@@ -0,0 +1,299 @@
+"""Cold archive: finished orders, quotes and appointments, and old inspections, leave the hot collections.
+
+    cd backend && python -m archive run --older-than-days 365
+    cd backend && python -m archive restore service_orders <id> [<id> ...]
+
+A document is archived once it reached a terminal status more than
+``ARCHIVE_AFTER_DAYS`` ago (inspections: once it is that old). It moves to
+``archive_<collection>`` as one record holding the fields lookups filter on,
+its vehicle-timeline entry, and the whole document as zlib-compressed BSON. The
+hot collections, their indexes and the list queries then only cover active
+business.
+
+Reads by id fall back to the archive, and the vehicle timeline reads archived
+entries from their stored summary. Devices drop archived documents through sync
+tombstones. ``restore`` moves documents back with a new sync stamp, and keeps
+them hot for another ``ARCHIVE_AFTER_DAYS``.
+
+The worker runs ``run`` once a day (``ARCHIVE_JOB``); ``ARCHIVE_AFTER_DAYS=0``
+turns that off.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import bson
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import BulkWriteError
+
+import jobs
+import outbox
+import sync
+
+logger = logging.getLogger("archive")
+
+ARCHIVE_PREFIX = "archive_"
+ARCHIVE_JOB = "archive_documents"
+CODEC = "zlib"
+DATA_FIELD = "data"
+TIMELINE_FIELD = "timeline"
+# Set by restore; the document is not archived again before another full period
+RESTORED_FIELD = "restored_at"
+DEFAULT_AFTER_DAYS = 365
+BATCH_SIZE = 500
+# Daily run, early in the morning (UTC) when the shop is closed
+RUN_AT = time(7, 0)
+
+
+@dataclass(frozen=True)
+class Policy:
+    collection: str
+    # When the document reached its terminal status (or, without statuses, when it was created)
+    age_field: str
+    # Terminal statuses; empty means age alone decides
+    statuses: Tuple[str, ...] = ()
+    # ``age_field`` holds a YYYY-MM-DD date instead of a timestamp
+    date_only: bool = False
+
+    def candidates(self, cutoff: datetime) -> dict:
+        bound = cutoff.date().isoformat() if self.date_only else cutoff.isoformat()
+        query = {
+            self.age_field: {"$lt": bound},
+            RESTORED_FIELD: {"$not": {"$gte": cutoff.isoformat()}},
+            # Side effects still waiting for the outbox consumer keep the document where it can find it
+            f"{outbox.OUTBOX_FIELD}.0": {"$exists": False},
+        }
+        if self.statuses:
+            query["status"] = {"$in": list(self.statuses)}
+        return query
+
+
+POLICIES: Dict[str, Policy] = {policy.collection: policy for policy in (
+    Policy("service_orders", "completed_at", ("terminado",)),
+    Policy("quotes", "approved_at", ("approved",)),
+    Policy("appointments", "date", ("terminado",), date_only=True),
+    Policy("inspections", "created_at"),
+)}
+
+# Same entries as the $project stages of the vehicle timeline (api/routers/vehicles.py)
+TIMELINE_FIELDS = {
+    "appointments": ("appointment", ("id", "created_at", "status", "date", "time_slot", "services", "notes")),
+    "inspections": ("inspection", ("id", "created_at", "service_order_id", "items", "general_notes")),
+    "quotes": ("quote", ("id", "created_at", "status", "items", "subtotal", "tax", "total", "approved_at")),
+    "service_orders": ("service_order", ("id", "created_at", "status", "services", "quote_id", "appointment_id",
+                                         "assigned_technician_id", "assigned_technician_name", "estimated_hours",
+                                         "actual_hours", "started_at", "completed_at")),
+}
+
+
+def archive_name(collection: str) -> str:
+    return ARCHIVE_PREFIX + collection
+
+
+ARCHIVE_COLLECTIONS = tuple(archive_name(name) for name in POLICIES)
+
+
+# ==================== RECORDS ====================
+def timeline_entry(collection: str, doc: dict) -> dict:
+    entry_type, fields = TIMELINE_FIELDS[collection]
+    entry = {"type": entry_type, **{field: doc[field] for field in fields if field in doc}}
+    if collection == "inspections":
+        photos = doc.get("photos") or []
+        entry["photo_count"] = len(photos)
+        entry["photos"] = [photo for photo in photos if not photo.startswith("data:")]
+    elif collection == "quotes":
+        entry["has_signature"] = doc.get("signature_url") is not None
+    return entry
+
+
+def record(collection: str, doc: dict, archived_at: datetime) -> dict:
+    """The archive record for ``doc``. Pass the whole document, ``_id`` included: restore puts it back as it was."""
+    entry = timeline_entry(collection, doc)
+    # Fields the timeline entry already holds aren't stored twice
+    _, shared = TIMELINE_FIELDS[collection]
+    rest = {field: value for field, value in doc.items() if field not in shared}
+    return {
+        "id": doc["id"],
+        "branch_id": doc.get("branch_id"),
+        "vehicle_id": doc.get("vehicle_id"),
+        "status": doc.get("status"),
+        "created_at": doc.get("created_at"),
+        "archived_at": archived_at.isoformat(),
+        TIMELINE_FIELD: entry,
+        "codec": CODEC,
+        DATA_FIELD: zlib.compress(bson.encode(rest)),
+    }
+
+
+def unpack(collection: str, archived: dict) -> dict:
+    _, shared = TIMELINE_FIELDS[collection]
+    entry = archived[TIMELINE_FIELD]
+    return {**{field: entry[field] for field in shared if field in entry}, **bson.decode(zlib.decompress(archived[DATA_FIELD]))}
+
+
+def document(collection: str, archived: dict) -> dict:
+    """The archived document as a read by id returns it."""
+    doc = unpack(collection, archived)
+    for field in ("_id", *outbox.HIDDEN_FIELDS):
+        doc.pop(field, None)
+    return doc
+
+
+# ==================== READS ====================
+async def find_by_ids(db, collection: str, ids: List[str]) -> Dict[str, dict]:
+    """Archived documents with these ids, keyed by id; nothing for collections that aren't archived."""
+    if collection not in POLICIES or not ids:
+        return {}
+    found = await db[archive_name(collection)].find({"id": {"$in": ids}}, {"_id": 0, "id": 1, TIMELINE_FIELD: 1, DATA_FIELD: 1}).to_list(len(ids))
+    return {archived["id"]: document(collection, archived) for archived in found}
+
+
+async def find_one(db, collection: str, entity_id: str) -> Optional[dict]:
+    return (await find_by_ids(db, collection, [entity_id])).get(entity_id)
+
+
+async def find(db, collection: str, query: dict, limit: int) -> List[dict]:
+    """Archived documents matching ``query`` on the record fields (e.g. ``vehicle_id``), newest first."""
+    cursor = db[archive_name(collection)].find(query, {"_id": 0, TIMELINE_FIELD: 1, DATA_FIELD: 1}).sort("created_at", -1).limit(limit)
+    return [document(collection, archived) for archived in await cursor.to_list(limit)]
+
+
+# ==================== ARCHIVING ====================
+async def archive_batch(db, policy: Policy, cutoff: datetime, batch_size: int = BATCH_SIZE) -> Tuple[int, int]:
+    """Move up to ``batch_size`` documents; returns (read, moved)."""
+    hot, cold = db[policy.collection], db[archive_name(policy.collection)]
+    query = policy.candidates(cutoff)
+    docs = await hot.find(query).limit(batch_size).to_list(batch_size)
+    if not docs:
+        return 0, 0
+    now = datetime.now(timezone.utc)
+    # Upserts, so a copy left by an interrupted run is replaced by the current document
+    await cold.bulk_write([ReplaceOne({"id": doc["id"]}, record(policy.collection, doc, now), upsert=True) for doc in docs],
+                          ordered=False)
+    # A document written since it was read (new stamp, new side effects) stays hot, and its copy is dropped
+    await hot.bulk_write([DeleteOne({**query, "id": doc["id"], sync.SEQ_FIELD: doc.get(sync.SEQ_FIELD)}) for doc in docs],
+                         ordered=False)
+    ids = [doc["id"] for doc in docs]
+    kept = {doc["id"] for doc in await hot.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(len(ids))}
+    if kept:
+        await cold.delete_many({"id": {"$in": list(kept)}})
+    moved = [doc for doc in docs if doc["id"] not in kept]
+    if policy.collection in sync.SYNCED_COLLECTIONS:
+        await sync.record_tombstones(db, [sync.tombstone(policy.collection, doc["id"], branch_id=doc.get("branch_id"))
+                                          for doc in moved])
+    return len(docs), len(moved)
+
+
+async def run(db, after_days: int = DEFAULT_AFTER_DAYS, collections: Optional[Iterable[str]] = None,
+              batch_size: int = BATCH_SIZE, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Archive everything past ``after_days``; returns how many documents moved per collection."""
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=after_days)
+    moved: Dict[str, int] = {}
+    for name in collections or POLICIES:
+        moved[name] = 0
+        while True:
+            read, count = await archive_batch(db, POLICIES[name], cutoff, batch_size)
+            moved[name] += count
+            # A short batch is the last one; a batch where nothing moved is being written to right now
+            if read < batch_size or not count:
+                break
+        if moved[name]:
+            logger.info(f"Archived {moved[name]} {name}")
+    return moved
+
+
+async def restore(db, collection: str, ids: List[str]) -> int:
+    """Move archived documents back to ``collection``; returns how many were restored."""
+    cold = db[archive_name(collection)]
+    found = await cold.find({"id": {"$in": ids}}).to_list(len(ids))
+    if not found:
+        return 0
+    restored_at = datetime.now(timezone.utc).isoformat()
+    docs = [{**unpack(collection, archived), RESTORED_FIELD: restored_at} for archived in found]
+    if collection in sync.SYNCED_COLLECTIONS:
+        # Devices that already dropped them pick them up again as changes
+        docs = [{**doc, **sync.stamp()} for doc in docs]
+    try:
+        await db[collection].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Already back (an earlier restore was interrupted before removing the copy)
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+    restored = [doc["id"] for doc in docs]
+    await db[sync.TOMBSTONES_COLLECTION].delete_many({"collection": collection, "id": {"$in": restored}})
+    await cold.delete_many({"id": {"$in": restored}})
+    return len(restored)
+
+
+async def stats(db) -> Dict[str, dict]:
+    hot = await asyncio.gather(*(db[name].estimated_document_count() for name in POLICIES))
+    cold = await asyncio.gather(*(db[archive_name(name)].estimated_document_count() for name in POLICIES))
+    return {name: {"hot": h, "archived": c} for name, h, c in zip(POLICIES, hot, cold)}
+
+
+# ==================== SCHEDULING ====================
+def next_run(day: date) -> dict:
+    """The archive job for ``day``; enqueueing it twice is a no-op."""
+    return jobs.new_job(ARCHIVE_JOB, {}, priority=-1, max_attempts=3,
+                        run_at=datetime.combine(day, RUN_AT, tzinfo=timezone.utc), dedupe_key=f"{ARCHIVE_JOB}:{day.isoformat()}")
+
+
+async def schedule(db, day: Optional[date] = None) -> int:
+    return await jobs.enqueue(db, [next_run(day or jobs._now().date())])
+
+
+async def create_indexes(db):
+    for name in ARCHIVE_COLLECTIONS:
+        await db[name].create_index("id", unique=True)
+        await db[name].create_index([("branch_id", 1), ("vehicle_id", 1), ("created_at", -1)])
+    # Accounting exports read archived quotes and orders by the date they were approved or finished
+    for policy in POLICIES.values():
+        await db[archive_name(policy.collection)].create_index(
+            [("branch_id", 1), (f"{TIMELINE_FIELD}.{policy.age_field}", 1)])
+
+
+# ==================== COMMAND LINE ====================
+async def main_async(args) -> dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'])
+    db = client[args.db_name or os.environ['DB_NAME']]
+    try:
+        await create_indexes(db)
+        if args.command == "run":
+            return await run(db, args.older_than_days, args.collection, args.batch_size)
+        return {args.collection: await restore(db, args.collection, args.ids)}
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Archive finished documents, or bring them back")
+    parser.add_argument("--mongo-url", help="Defaults to MONGO_URL")
+    parser.add_argument("--db-name", help="Defaults to DB_NAME")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Archive everything past the age limit")
+    run_parser.add_argument("--older-than-days", type=int,
+                            default=int(os.environ.get('ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)))
+    run_parser.add_argument("--collection", action="append", choices=sorted(POLICIES), help="Only these (repeatable)")
+    run_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    restore_parser = commands.add_parser("restore", help="Move archived documents back")
+    restore_parser.add_argument("collection", choices=sorted(POLICIES))
+    restore_parser.add_argument("ids", nargs="+")
+    print(json.dumps(asyncio.run(main_async(parser.parse_args(argv)))))
+
+
+if __name__ == "__main__":
+    main()
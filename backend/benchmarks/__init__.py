@@ -0,0 +1,8 @@
+"""Offline benchmark suite for the PolarizadosYA! API.
+
+Run from the ``backend`` directory::
+
+    python -m benchmarks.run --profile small --concurrency 16
+
+See ``benchmarks/README.md`` for the full set of options.
+"""
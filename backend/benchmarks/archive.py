@@ -0,0 +1,106 @@
+"""Hot working set before and after archiving: list-page latency, collection sizes and lookups by id.
+
+    python -m benchmarks.archive --profile small --requests 30
+    python -m benchmarks.archive --older-than-days 180
+    python -m benchmarks.archive --mongo-url mongodb://localhost:27017 --profile medium
+
+Seeds a profile (600 days of history), times the 1000-row list pages, runs
+``archive.run`` and times them again. Sizes are BSON bytes: the hot documents
+that moved against their archive records. Lookups by id compare a hot document
+with an archived one read through the fallback.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from pathlib import Path
+
+import bson
+
+import archive
+from benchmarks.harness import app_client, load_server
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+LIST_PATHS = ("/service-orders?limit=1000", "/quotes?limit=1000", "/appointments?limit=1000")
+
+
+async def timed(client, headers, path: str, requests: int) -> float:
+    await client.get("/api" + path, headers=headers)  # untimed: warms the document cache and code paths
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/api" + path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, response.text
+    return round(statistics.median(latencies), 2)
+
+
+async def collection_bytes(db, name: str) -> int:
+    return sum([len(bson.encode(doc)) async for doc in db[name].find({})])
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    for name in archive.ARCHIVE_COLLECTIONS:
+        await server.db[name].delete_many({})
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+
+    report = {"meta": {"backend": backend, "profile": args.profile, "requests": args.requests,
+                       "older_than_days": args.older_than_days}}
+    async with app_client(server.app) as client:
+        before = {path: await timed(client, headers, path, args.requests) for path in LIST_PATHS}
+        hot_bytes = {name: await collection_bytes(server.db, name) for name in archive.POLICIES}
+
+        started = time.perf_counter()
+        moved = await archive.run(server.db, args.older_than_days)
+        report["archive_seconds"] = round(time.perf_counter() - started, 2)
+        after = {path: await timed(client, headers, path, args.requests) for path in LIST_PATHS}
+
+        report["collections"] = {}
+        for name in archive.POLICIES:
+            left = await collection_bytes(server.db, name)
+            report["collections"][name] = {
+                "documents": len(dataset[name]),
+                "archived": moved[name],
+                "moved_bytes": hot_bytes[name] - left,
+                "archive_bytes": await collection_bytes(server.db, archive.archive_name(name)),
+            }
+        report["list_p50_ms"] = {path: {"before": before[path], "after": after[path]} for path in LIST_PATHS}
+
+        hot = await server.db.service_orders.find_one({}, {"id": 1})
+        cold = await server.db[archive.archive_name("service_orders")].find_one({}, {"id": 1})
+        report["lookup_p50_ms"] = {
+            "hot": await timed(client, headers, f"/service-orders/{hot['id']}", args.requests),
+            "archived": await timed(client, headers, f"/service-orders/{cold['id']}", args.requests),
+        }
+
+    for path, row in report["list_p50_ms"].items():
+        print(f"  {path:32s} p50 {row['before']:8.2f} -> {row['after']:8.2f} ms")
+    for name, row in report["collections"].items():
+        print(f"  {name:16s} {row['archived']:6d}/{row['documents']:<6d} archived"
+              f"  {row['moved_bytes']:>10,d} -> {row['archive_bytes']:>10,d} bytes")
+    print(f"  lookup by id     hot {report['lookup_p50_ms']['hot']:.2f} ms, archived {report['lookup_p50_ms']['archived']:.2f} ms")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cold archive benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--requests", type=int, default=30, help="Timed requests per path")
+    parser.add_argument("--older-than-days", type=int, default=archive.DEFAULT_AFTER_DAYS)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
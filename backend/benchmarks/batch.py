@@ -0,0 +1,125 @@
+"""Page-load latency: the GETs a page fires at once, sent separately vs as one POST /api/batch.
+
+    python -m benchmarks.batch --loads 50
+    python -m benchmarks.batch --rtt-ms 60 --connections 6
+    python -m benchmarks.batch --mongo-url mongodb://localhost:27017
+
+The app runs in-process, so there is no network between the client and it.
+``--rtt-ms`` adds a client-side delay to every HTTP request to stand in for
+one, and ``--connections`` caps how many requests are in flight at once, as a
+browser does per origin over HTTP/1.1. With ``--rtt-ms 0`` only the server
+side is compared: token decoding, routing and request handling.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from datetime import date
+from pathlib import Path
+
+from benchmarks.harness import app_client, count_round_trips, load_server
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+
+def pages(dataset: dict) -> dict:
+    """The GETs each page sends when it loads (see src/pages), including the layout's unread badge."""
+    today = date.today().isoformat()
+    return {
+        "dashboard": ["/dashboard/stats", "/service-orders", f"/appointments?date={today}",
+                      "/notifications/unread-count"],
+        "assign": ["/vehicles", "/users/technicians", "/notifications/unread-count"],
+        "service_orders": ["/service-orders?status=en_proceso", "/vehicles", "/users/technicians",
+                           "/notifications/unread-count"],
+    }
+
+
+class Browser:
+    """Sends requests the way a browser would: a delay per request and a cap on parallel connections."""
+
+    def __init__(self, client, headers, rtt_ms: float, connections: int):
+        self.client = client
+        self.headers = headers
+        self.rtt = rtt_ms / 1000
+        self.slots = asyncio.Semaphore(connections)
+
+    async def request(self, method: str, path: str, **kwargs):
+        async with self.slots:
+            if self.rtt:
+                await asyncio.sleep(self.rtt)
+            response = await self.client.request(method, path, headers=self.headers, **kwargs)
+        assert response.status_code == 200, response.text
+        return response
+
+
+async def separate(browser: Browser, paths) -> int:
+    await asyncio.gather(*(browser.request("GET", "/api" + path) for path in paths))
+    return len(paths)
+
+
+async def batched(browser: Browser, paths) -> int:
+    response = await browser.request("POST", "/api/batch", json={
+        "requests": [{"id": str(i), "path": path} for i, path in enumerate(paths)]})
+    failed = [item for item in response.json()["responses"] if item["status"] != 200]
+    assert not failed, failed
+    return 1
+
+
+async def measure(run, browser: Browser, paths, loads: int) -> dict:
+    await run(browser, paths)  # untimed: cold caches aren't the page's cost
+    latencies = []
+    with count_round_trips() as counts:
+        for _ in range(loads):
+            started = time.perf_counter()
+            requests = await run(browser, paths)
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "http_requests": requests,
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+        "db_round_trips_per_load": round(sum(counts.values()) / loads, 2),
+    }
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+
+    report = {"meta": {"backend": backend, "profile": args.profile, "loads": args.loads,
+                       "rtt_ms": args.rtt_ms, "connections": args.connections}}
+    async with app_client(server.app) as client:
+        browser = Browser(client, headers, args.rtt_ms, args.connections)
+        for page, paths in pages(dataset).items():
+            report[page] = {
+                "separate": await measure(separate, browser, paths, args.loads),
+                "batch": await measure(batched, browser, paths, args.loads),
+            }
+            before, after = report[page]["separate"], report[page]["batch"]
+            print(f"  {page:16s} {len(paths)} GETs  p50 {before['p50_ms']:8.2f} -> {after['p50_ms']:8.2f} ms"
+                  f"  p95 {before['p95_ms']:8.2f} -> {after['p95_ms']:8.2f} ms"
+                  f"  round-trips {before['db_round_trips_per_load']:g} -> {after['db_round_trips_per_load']:g}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched page-load benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--loads", type=int, default=50, help="Page loads measured per page and mode")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="Simulated network delay per HTTP request")
+    parser.add_argument("--connections", type=int, default=6, help="Requests in flight at once, per client")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
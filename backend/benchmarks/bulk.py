@@ -0,0 +1,97 @@
+"""Round-trips and wall time of end-of-shift updates: one request per order vs the bulk endpoints.
+
+    python -m benchmarks.bulk --batch 50
+    python -m benchmarks.bulk --batch 200 --mongo-url mongodb://localhost:27017
+
+Each mode advances its own set of active orders one step (agendado →
+en_proceso → en_revision → terminado, moving vehicles and appointments along)
+and reassigns the same number of orders.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+
+from benchmarks.harness import app_client, count_round_trips, load_server
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+NEXT_STATUS = {"agendado": "en_proceso", "en_proceso": "en_revision", "en_revision": "terminado"}
+
+
+async def single_requests(client, headers, status_orders, assign_orders, technicians, rng):
+    for order in status_orders:
+        response = await client.put(f"/api/service-orders/{order['id']}/status",
+                                    json={"status": NEXT_STATUS[order["status"]]}, headers=headers)
+        assert response.status_code == 200, response.text
+    for order in assign_orders:
+        response = await client.put(f"/api/service-orders/{order['id']}/assign",
+                                    json={"technician_id": rng.choice(technicians)["id"]}, headers=headers)
+        assert response.status_code == 200, response.text
+    return len(status_orders) + len(assign_orders)
+
+
+async def bulk_requests(client, headers, status_orders, assign_orders, technicians, rng):
+    response = await client.post("/api/service-orders/bulk-status", headers=headers, json={
+        "items": [{"order_id": o["id"], "status": NEXT_STATUS[o["status"]]} for o in status_orders]})
+    assert response.json()["updated"] == len(status_orders), response.text
+    response = await client.post("/api/service-orders/bulk-assign", headers=headers, json={
+        "items": [{"order_id": o["id"], "technician_id": rng.choice(technicians)["id"]} for o in assign_orders]})
+    assert response.json()["updated"] == len(assign_orders), response.text
+    return 2
+
+
+async def measure(name, run, *args) -> dict:
+    with count_round_trips() as counts:
+        started = time.perf_counter()
+        requests = await run(*args)
+        wall_ms = (time.perf_counter() - started) * 1000
+    report = {"http_requests": requests, "db_round_trips": sum(counts.values()),
+              "wall_ms": round(wall_ms, 1), "by_operation": dict(sorted(counts.items()))}
+    print(f"  {name:8s} {requests:5d} requests  {report['db_round_trips']:6d} round-trips  {wall_ms:9.1f} ms")
+    return report
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+    technicians = [u for u in dataset["users"] if u["role"] == "tecnico"]
+
+    rng = random.Random(args.seed)
+    active = [o for o in dataset["service_orders"] if o["status"] in NEXT_STATUS]
+    if len(active) < 2 * args.batch:
+        raise SystemExit(f"Profile '{args.profile}' has only {len(active)} active orders; lower --batch")
+    rng.shuffle(active)
+    others = rng.sample(dataset["service_orders"], 2 * args.batch)
+
+    report = {"meta": {"backend": backend, "profile": args.profile, "batch": args.batch}}
+    async with app_client(server.app) as client:
+        report["single"] = await measure("single", single_requests, client, headers, active[:args.batch],
+                                         others[:args.batch], technicians, rng)
+        report["bulk"] = await measure("bulk", bulk_requests, client, headers, active[args.batch:2 * args.batch],
+                                       others[args.batch:], technicians, rng)
+    single, bulk = report["single"]["db_round_trips"], report["bulk"]["db_round_trips"]
+    print(f"  round-trips per order: {single / (2 * args.batch):.1f} -> {bulk / (2 * args.batch):.2f}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk service-order endpoints benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--batch", type=int, default=50, help="Orders per end-of-shift update")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Damage index: a returning car's prior damage and per-area damage stats, from the index against from inspections.
+
+    python -m benchmarks.damage --profile small --requests 30
+    python -m benchmarks.damage --mongo-url mongodb://localhost:27017 --profile medium
+
+Seeds a profile and builds the index with ``damage.rebuild``. For vehicles
+with several inspections, it times the inspections list a damage check used
+to read (photos included) against ``/inspections/vehicle/{id}/damage``.
+Damage frequency per area and per brand/model is timed two ways: an
+aggregation over the inspections (``$unwind`` the items, ``$lookup`` the
+vehicle) and ``/inspections/damage-stats``. Sizes are BSON bytes.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+
+import bson
+
+import damage
+from benchmarks.harness import app_client, load_server
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+# Per area and per brand/model straight from the inspections: what the stats cost without the index
+SCAN_PIPELINES = {
+    "area": [
+        {"$unwind": "$items"},
+        {"$group": {"_id": "$items.area", "inspections": {"$sum": 1},
+                    "damaged_inspections": {"$sum": {"$cond": ["$items.has_damage", 1, 0]}}}},
+    ],
+    "brand,model": [
+        {"$unwind": "$items"},
+        {"$lookup": {"from": "vehicles", "localField": "vehicle_id", "foreignField": "id", "as": "vehicle"}},
+        {"$unwind": "$vehicle"},
+        {"$group": {"_id": {"brand": "$vehicle.brand", "model": "$vehicle.model"}, "inspections": {"$sum": 1},
+                    "damaged_inspections": {"$sum": {"$cond": ["$items.has_damage", 1, 0]}}}},
+    ],
+}
+
+
+async def timed(client, headers, path: str, requests: int, params=None) -> tuple:
+    """(p50 ms, response bytes)."""
+    response = await client.get("/api" + path, headers=headers, params=params)  # untimed warm-up
+    assert response.status_code == 200, response.text
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = await client.get("/api" + path, headers=headers, params=params)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(latencies), 2), len(response.content)
+
+
+async def timed_pipeline(db, pipeline: list, requests: int) -> float:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await db.inspections.aggregate(pipeline).to_list(None)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(latencies), 2)
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+    report = {"meta": {"backend": backend, "profile": args.profile, "requests": args.requests,
+                       "inspections": len(dataset["inspections"])}}
+
+    async with app_client(server.app) as client:
+        # Startup already indexed the seeded inspections; timed again from empty
+        await server.db[damage.DAMAGE_COLLECTION].delete_many({})
+        started = time.perf_counter()
+        await damage.rebuild(server.db)
+        report["rebuild_seconds"] = round(time.perf_counter() - started, 2)
+        inspection_bytes = sum([len(bson.encode(doc)) async for doc in server.db.inspections.find({})])
+        index_bytes = sum([len(bson.encode(doc)) async for doc in server.db[damage.DAMAGE_COLLECTION].find({})])
+        report["sizes"] = {"inspections_bytes": inspection_bytes, "index_bytes": index_bytes,
+                           "index_documents": await server.db[damage.DAMAGE_COLLECTION].count_documents({})}
+
+        # The vehicles a damage check is most expensive for: the most inspections
+        counts = Counter(inspection["vehicle_id"] for inspection in dataset["inspections"])
+        checks = {"inspections_p50_ms": [], "inspections_bytes": [], "index_p50_ms": [], "index_bytes": []}
+        for vehicle_id, _ in counts.most_common(args.vehicles):
+            for name, path in (("inspections", f"/inspections/vehicle/{vehicle_id}"),
+                               ("index", f"/inspections/vehicle/{vehicle_id}/damage")):
+                p50, size = await timed(client, headers, path, args.requests)
+                checks[f"{name}_p50_ms"].append(p50)
+                checks[f"{name}_bytes"].append(size)
+        report["vehicle_check"] = {
+            "vehicles": len(checks["index_bytes"]),
+            "inspections_per_vehicle": round(statistics.fmean(n for _, n in counts.most_common(args.vehicles)), 1),
+            **{key: round(statistics.fmean(values), 2) for key, values in checks.items()},
+        }
+
+        report["stats_p50_ms"] = {}
+        for group_by, pipeline in SCAN_PIPELINES.items():
+            index_p50, _ = await timed(client, headers, "/inspections/damage-stats", args.requests, {"group_by": group_by})
+            report["stats_p50_ms"][group_by] = {"inspections": await timed_pipeline(server.db, pipeline, args.requests),
+                                                "index": index_p50}
+
+    check = report["vehicle_check"]
+    print(f"  rebuild          {report['rebuild_seconds']:.2f} s, {report['sizes']['index_documents']} index documents"
+          f"  {inspection_bytes:,d} inspection bytes -> {index_bytes:,d} index bytes")
+    print(f"  damage check     inspections {check['inspections_p50_ms']:.2f} ms / {check['inspections_bytes']:,.0f} B"
+          f"   index {check['index_p50_ms']:.2f} ms / {check['index_bytes']:,.0f} B"
+          f"   ({check['inspections_per_vehicle']} inspections per vehicle)")
+    for group_by, row in report["stats_p50_ms"].items():
+        print(f"  stats by {group_by:12s} inspections {row['inspections']:8.2f} ms   index {row['index']:8.2f} ms")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Damage index benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--requests", type=int, default=30, help="Timed requests per path")
+    parser.add_argument("--vehicles", type=int, default=10, help="Vehicles the damage check is timed on")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
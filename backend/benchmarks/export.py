@@ -0,0 +1,200 @@
+"""Accounting exports: throughput and worker memory for a large CSV/XLSX export.
+
+    python -m benchmarks.export --rows 500000
+    python -m benchmarks.export --rows 500000 --compare-buffered
+    python -m benchmarks.export --mongo-url mongodb://localhost:27017 --rows 500000
+
+Approved quotes are generated in batches, so the whole set is never held.
+``exports.csv_stream`` and ``exports.xlsx_stream`` are drained as the response
+would drain them, and only the byte counts are kept. A thread samples the
+process RSS (``/proc/self/statm``) every few milliseconds. Growth is the peak
+over the RSS measured just before the export. ``--compare-buffered`` collects
+every row and the whole body before returning, which is what an unstreamed
+export costs.
+
+With ``--mongo-url`` the quotes are seeded and read back through
+``exports.rows``: cursor, plate lookups and all. Without it, the generated
+batches go straight to the encoders. mongomock can't stand in for the cursor:
+on the first read it copies the whole result, and then it re-slices that copy
+for every document. That memory lives in the worker and grows quadratically in
+time, so it would hide exactly what is being measured.
+
+The export is driven in-process rather than through an HTTP client: httpx's
+ASGI transport buffers the whole response body, which would measure the
+client, not the worker.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import exports
+import filters
+from benchmarks.jobs import open_db
+from benchmarks.seed import SERVICE_PRICES, build_dataset
+
+SEED_BATCH = 10000
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRss:
+    """Highest RSS seen while the block runs, sampled from a thread."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def _sample(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, rss_bytes())
+            self._done.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+
+def quotes(vehicles: list, count: int, rng: random.Random, end: datetime, batch_size: int = SEED_BATCH):
+    """Approved quotes over the year before ``end``, ``batch_size`` at a time."""
+    services = list(SERVICE_PRICES)
+    for start in range(0, count, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, count)):
+            vehicle = rng.choice(vehicles)
+            items = [{"service": s, "description": s.replace("_", " ").title(), "price": float(SERVICE_PRICES[s]), "quantity": 1}
+                     for s in rng.sample(services, rng.randint(1, 3))]
+            subtotal = sum(item["price"] for item in items)
+            approved = end - timedelta(days=365 * (count - i) / count)
+            batch.append({
+                "id": str(uuid.uuid4()), "vehicle_id": vehicle["id"], "client_name": vehicle["client_name"],
+                "client_email": vehicle["client_email"], "items": items, "subtotal": subtotal, "tax": subtotal * 0.19,
+                "total": subtotal * 1.19, "notes": None, "status": "approved",
+                "approved_at": approved.isoformat(), "created_at": (approved - timedelta(hours=2)).isoformat(),
+            })
+        yield batch
+
+
+async def generated_rows(export, vehicles: list, count: int, seed: int):
+    """What ``exports.rows`` yields, from generated quotes instead of a cursor."""
+    by_id = {vehicle["id"]: vehicle for vehicle in vehicles}
+    for batch in quotes(vehicles, count, random.Random(seed), datetime.now(timezone.utc), exports.BATCH_SIZE):
+        yield [export.row({**doc, "vehicle": by_id[doc["vehicle_id"]]}) for doc in batch]
+
+
+async def buffered(source) -> dict:
+    """Every row in memory, then the whole body: an export that isn't streamed."""
+    rows = [row async for batch in source for row in batch]
+
+    async def once():
+        yield rows
+
+    body = b"".join([chunk async for chunk in exports.csv_stream(once(), exports.EXPORTS["quotes"].headers)])
+    return {"bytes": len(body), "chunks": 1, "largest_chunk_bytes": len(body)}
+
+
+async def drain(stream, warmup_chunks: int) -> dict:
+    """Consume the export; also the RSS once ``warmup_chunks`` went out, and the most it rose after that."""
+    chunks = size = largest = 0
+    warm = late = None
+    async for chunk in stream:
+        chunks += 1
+        size += len(chunk)
+        largest = max(largest, len(chunk))
+        if chunks == warmup_chunks:
+            warm = late = rss_bytes()
+        elif warm is not None:
+            late = max(late, rss_bytes())
+    report = {"bytes": size, "chunks": chunks, "largest_chunk_bytes": largest}
+    if warm is not None:
+        report["rss_growth_after_warmup_mb"] = round((late - warm) / 2**20, 1)
+    return report
+
+
+async def measure(run) -> dict:
+    gc.collect()
+    before = rss_bytes()
+    started = time.perf_counter()
+    with PeakRss() as rss:
+        result = await run()
+    seconds = time.perf_counter() - started
+    return {**result, "seconds": round(seconds, 2), "rss_before_mb": round(before / 2**20, 1),
+            "rss_growth_mb": round((rss.peak - before) / 2**20, 1)}
+
+
+async def main_async(args) -> dict:
+    export = exports.EXPORTS["quotes"]
+    vehicles = build_dataset("small", seed=args.seed)["vehicles"]
+    date_range = filters.date_range(export.date_field)
+    report = {"meta": {"backend": "mongodb" if args.mongo_url else "generated", "rows": args.rows}}
+    if args.mongo_url:
+        db, _ = open_db(args.mongo_url)
+        for name in ("vehicles", "quotes", "archive_quotes"):
+            await db[name].delete_many({})
+        await db.vehicles.insert_many([dict(v) for v in vehicles])
+        await db.vehicles.create_index("id", unique=True)
+        await db.quotes.create_index([("approved_at", 1)])
+        started = time.perf_counter()
+        for batch in quotes(vehicles, args.rows, random.Random(args.seed), datetime.now(timezone.utc)):
+            await db.quotes.insert_many(batch)
+        report["meta"]["seed_seconds"] = round(time.perf_counter() - started, 1)
+
+        def source():
+            return exports.rows(db, export, date_range)
+    else:
+        def source():
+            return generated_rows(export, vehicles, args.rows, args.seed)
+
+    # The first tenth of the batches: buffers, allocator pools and the cursor's first reads settle
+    warmup = max(1, args.rows // exports.BATCH_SIZE // 10)
+    report["csv"] = await measure(lambda: drain(exports.csv_stream(source(), export.headers), warmup))
+    if args.rows < exports.XLSX_MAX_ROWS:
+        report["xlsx"] = await measure(lambda: drain(exports.xlsx_stream(source(), export.headers, export.filename), warmup))
+    # Last: the memory it takes is kept by the allocator and would inflate the baseline of anything after it
+    if args.compare_buffered:
+        report["buffered_csv"] = await measure(lambda: buffered(source()))
+
+    for name in ("csv", "xlsx", "buffered_csv"):
+        if name in report:
+            row = report[name]
+            rate = args.rows / row["seconds"] if row["seconds"] else 0
+            after = row.get("rss_growth_after_warmup_mb")
+            print(f"  {name:12s} {row['seconds']:7.2f} s  {rate:9,.0f} rows/s  RSS +{row['rss_growth_mb']:6.1f} MB"
+                  + (f" (+{after:.1f} after warm-up)" if after is not None else "")
+                  + f"  {row['bytes'] / 2**20:6.1f} MB in {row['chunks']} chunks (largest {row['largest_chunk_bytes'] / 1024:.0f} KB)")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Accounting export benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--rows", type=int, default=500000)
+    parser.add_argument("--compare-buffered", action="store_true", help="Also build the whole CSV in memory")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
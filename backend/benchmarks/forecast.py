@@ -0,0 +1,123 @@
+"""Duration forecasts: fit time, incremental refresh, lookup cost and accuracy on orders with known durations.
+
+    python -m benchmarks.forecast --orders 20000
+    python -m benchmarks.forecast --mongo-url mongodb://localhost:27017 --orders 200000
+
+Orders are generated with a known duration model: hours per service, a factor
+per vehicle model and log-normal noise. Of those orders, 90% are loaded and the
+forecaster is rebuilt over them. The other 10% then finish and are picked up
+by ``refresh``. The report compares the fitted hours per service with the true
+ones. It gives the mean absolute error on the last orders against a global
+mean, and the cost of one suggestion next to the query a per-request estimate
+would need.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import forecast
+from api.models import ServiceType
+from benchmarks.jobs import open_db
+from benchmarks.seed import build_dataset
+
+TRUE_HOURS = {"polarizado": 2.5, "nanoceramica": 4.0, "autobahn_black": 5.0, "ultrasecure": 6.5}
+
+
+def orders(vehicles: list, count: int, rng: random.Random, end: datetime) -> list:
+    factors = {forecast.model_key(v["brand"], v["model"]): rng.uniform(0.8, 1.3) for v in vehicles}
+    docs = []
+    for i in range(count):
+        vehicle = rng.choice(vehicles)
+        services = rng.sample(list(TRUE_HOURS), rng.choice([1, 1, 1, 2, 2, 3]))
+        hours = (sum(TRUE_HOURS[s] for s in services) * factors[forecast.model_key(vehicle["brand"], vehicle["model"])]
+                 * rng.lognormvariate(0, 0.2))
+        # Spread over the last two years in completion order, so the newest ones are the refresh
+        completed = end - timedelta(days=730 * (count - i) / count)
+        docs.append({
+            "id": str(uuid.uuid4()), "vehicle_id": vehicle["id"], "services": services, "status": "terminado",
+            "started_at": (completed - timedelta(hours=hours)).isoformat(), "completed_at": completed.isoformat(),
+            "true_hours": hours,
+        })
+    return docs
+
+
+async def main_async(args) -> dict:
+    db, backend = open_db(args.mongo_url)
+    rng = random.Random(args.seed)
+    vehicles = build_dataset(args.profile, seed=args.seed)["vehicles"]
+    for name in ("vehicles", "service_orders"):
+        await db[name].delete_many({})
+    await db.vehicles.insert_many([dict(v) for v in vehicles])
+    now = datetime.now(timezone.utc)
+    generated = orders(vehicles, args.orders, rng, now - forecast.SETTLE_WINDOW * 2)
+    split = int(len(generated) * 0.9)
+    await db.service_orders.insert_many([dict(o) for o in generated[:split]])
+
+    forecaster = forecast.DurationForecaster([s.value for s in ServiceType])
+    started = time.perf_counter()
+    await forecaster.rebuild(db)
+    rebuild_s = time.perf_counter() - started
+    # The rest finish after the rebuild: only they are read by the refresh
+    forecaster.watermark = generated[split]["completed_at"]
+    await db.service_orders.insert_many([dict(o) for o in generated[split:]])
+    started = time.perf_counter()
+    await forecaster.refresh(db)
+    refresh_s = time.perf_counter() - started
+
+    models = {v["id"]: (v["brand"], v["model"]) for v in vehicles}
+    held_out = generated[split:]
+    mean = statistics.fmean(o["true_hours"] for o in generated[:split])
+    errors = [abs(forecaster.suggest_hours(o["services"], *models[o["vehicle_id"]]) - o["true_hours"]) for o in held_out]
+
+    lookups = 100_000
+    started = time.perf_counter()
+    for i in range(lookups):
+        order = held_out[i % len(held_out)]
+        forecaster.suggest_us(order["services"], *models[order["vehicle_id"]])
+    lookup_us = (time.perf_counter() - started) / lookups * 1_000_000
+    started = time.perf_counter()
+    await db.service_orders.aggregate([
+        {"$match": {"status": "terminado", "services": held_out[0]["services"]}},
+        {"$group": {"_id": None, "hours": {"$avg": "$true_hours"}}},
+    ]).to_list(1)
+    query_us = (time.perf_counter() - started) * 1_000_000
+
+    report = {
+        "backend": backend,
+        "orders": args.orders,
+        "rebuild_seconds": round(rebuild_s, 3),
+        "refresh_seconds": round(refresh_s, 3),
+        "refreshed_orders": len(held_out),
+        "samples": forecaster.samples,
+        "hours_per_service": {s: {"true": TRUE_HOURS[s], "fitted": fitted}
+                              for s, fitted in forecaster.snapshot()["hours_per_service"].items()},
+        "mae_hours": round(statistics.fmean(errors), 3),
+        "mae_hours_global_mean": round(statistics.fmean(abs(mean - o["true_hours"]) for o in held_out), 3),
+        "lookup_us": round(lookup_us, 2),
+        "aggregation_query_us": round(query_us, 1),
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Duration forecast benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--profile", default="small", help="Dataset profile the vehicles come from")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
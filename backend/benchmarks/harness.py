@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+import functools
+import os
+import statistics
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import httpx
+
+BENCH_DB_NAME = "polarizadosya_bench"
+
+
+def load_server(mongo_url: Optional[str] = None, db_name: str = BENCH_DB_NAME):
+    """Import ``server`` pointed at a benchmark database.
+
+    With ``mongo_url`` the app talks to a real MongoDB (a throwaway database is used,
+    never the one from ``.env``). Without it, the app is built on an in-memory
+    mongomock-motor database so the suite runs fully offline.
+    """
+    os.environ["MONGO_URL"] = mongo_url or "mongodb://localhost:27017"
+    os.environ["DB_NAME"] = db_name
+    import server
+
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client, backend = AsyncIOMotorClient(mongo_url), "mongodb"
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError as e:
+            raise SystemExit("mongomock-motor is required without --mongo-url (pip install mongomock-motor)") from e
+        client, backend = AsyncMongoMockClient(), "mongomock"
+    # Connected now so the benchmark can seed through server.db; the app would otherwise
+    # open its own client from settings when it starts
+    database = client[db_name]
+    server.connect(database)
+    server.app = server.create_app(database=database)
+    return server, backend
+
+
+@asynccontextmanager
+async def app_client(app):
+    """An httpx client bound to the ASGI app in-process, with startup/shutdown hooks run."""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    # Called once per request with a random.Random; returns (path, json_body or None)
+    build: Callable
+    role: str = "admin"
+    expected_status: tuple = (200,)
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+
+    def summary(self) -> dict:
+        lat = sorted(self.latencies_ms)
+        count = len(lat)
+        return {
+            "count": count,
+            "errors": self.errors,
+            "p50_ms": round(percentile(lat, 50), 3),
+            "p95_ms": round(percentile(lat, 95), 3),
+            "p99_ms": round(percentile(lat, 99), 3),
+            "mean_ms": round(statistics.fmean(lat), 3) if lat else 0.0,
+            "max_ms": round(lat[-1], 3) if lat else 0.0,
+            "throughput_rps": round(count / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+        }
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile over an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, headers: dict, rng,
+                       requests: int, concurrency: int) -> ScenarioResult:
+    """Fire ``requests`` calls with at most ``concurrency`` in flight and record latencies."""
+    result = ScenarioResult(name=scenario.name)
+    # Build every request up front so RNG work never lands inside the timed section
+    planned = [scenario.build(rng) for _ in range(requests)]
+    queue = iter(planned)
+
+    async def worker():
+        for path, body in queue:
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, path, json=body, headers=headers)
+                ok = response.status_code in scenario.expected_status
+            except Exception:
+                ok = False
+            result.latencies_ms.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                result.errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    result.wall_seconds = time.perf_counter() - started
+    return result
+
+
+# Driver calls that cost one request/response with the server (a cursor's to_list
+# is counted once, ignoring extra getMore batches)
+COLLECTION_OPS = (
+    "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one",
+    "delete_many", "find_one_and_update", "find_one_and_replace", "find_one_and_delete", "bulk_write",
+    "count_documents", "estimated_document_count", "distinct",
+)
+_round_trips: contextvars.ContextVar = contextvars.ContextVar("round_trips", default=None)
+
+
+def _driver_classes():
+    """(collection classes, cursor classes) of Motor and, when installed, mongomock-motor."""
+    import motor.motor_asyncio as motor
+    collections = [motor.AsyncIOMotorCollection]
+    cursors = [motor.AsyncIOMotorCursor, motor.AsyncIOMotorCommandCursor, motor.AsyncIOMotorLatentCommandCursor]
+    try:
+        import mongomock_motor
+        collections.append(mongomock_motor.AsyncMongoMockCollection)
+        cursors += [mongomock_motor.AsyncCursor, mongomock_motor.AsyncCommandCursor,
+                    mongomock_motor.AsyncLatentCommandCursor]
+    except ImportError:
+        pass
+    return collections, cursors
+
+
+def _counting(method, label: str):
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        counts = _round_trips.get()
+        if counts is not None:
+            counts[label] += 1
+        return await method(self, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def count_round_trips():
+    """Count database round-trips made by code running in this context.
+
+    Yields a Counter keyed by operation. Only the current task and tasks it
+    starts are counted (httpx's ASGITransport runs the request in the caller's
+    context), so the app's background pollers don't pollute the numbers.
+    """
+    collections, cursors = _driver_classes()
+    targets = [(cls, name, name) for cls in collections for name in COLLECTION_OPS]
+    targets += [(cls, "to_list", "cursor") for cls in cursors]
+    patched = {}
+    for cls, name, label in targets:
+        # Patch the class that defines the method so subclasses share one wrapper
+        owner = next((k for k in cls.__mro__ if name in vars(k)), None)
+        if owner is not None and (owner, name) not in patched:
+            patched[(owner, name)] = vars(owner)[name]
+            setattr(owner, name, _counting(vars(owner)[name], label))
+    counts: Counter = Counter()
+    token = _round_trips.set(counts)
+    try:
+        yield counts
+    finally:
+        _round_trips.reset(token)
+        for (owner, name), original in patched.items():
+            setattr(owner, name, original)
@@ -0,0 +1,115 @@
+"""Cold import cost of the API module, measured with ``python -X importtime``.
+
+    python -m benchmarks.importtime               # exits 1 if the app's own import cost is over budget
+    python -m benchmarks.importtime --runs 7 --budget-ms 300 --out importtime.json
+
+Every run is a fresh interpreter (nothing cached in sys.modules) that imports
+``server`` and then builds the app with ``create_app()``, which is what
+``uvicorn server:app`` does. No database is contacted: the connection is only
+opened by the lifespan.
+
+The import is split by where the time goes: our own modules (server, the api
+package, settings, cache, ...), and the third-party packages they pull in.
+FastAPI/pydantic and pymongo alone cost more than the budget on small
+containers and we can't make them cheaper, so the budget is checked against
+what this repository controls: the self time of its modules plus building the app.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+APP_MODULES = ({path.stem for path in BACKEND_DIR.glob("*.py")}
+               | {path.parent.name for path in BACKEND_DIR.glob("*/__init__.py")})
+
+PROBE = (
+    "import json, time\n"
+    "started = time.perf_counter()\n"
+    "import server\n"
+    "imported = time.perf_counter()\n"
+    "server.create_app()\n"
+    "print(json.dumps({'import_ms': (imported - started) * 1000,"
+    " 'create_app_ms': (time.perf_counter() - imported) * 1000}))\n"
+)
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Self time (ms) per top-level package and the total, from ``-X importtime`` output."""
+    by_package = defaultdict(float)
+    total_us = 0
+    for line in stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = int(match[1]), int(match[2]), match[3], match[4]
+        by_package[module.split(".")[0]] += self_us / 1000
+        if len(indent) == 1:
+            total_us += cumulative_us
+    return {"total_ms": total_us / 1000, "by_package": dict(by_package)}
+
+
+def run_once(python: str) -> dict:
+    env = {**os.environ, "MONGO_URL": "mongodb://localhost:27017", "DB_NAME": "polarizadosya_importtime",
+           "PYTHONDONTWRITEBYTECODE": "1"}
+    done = subprocess.run([python, "-X", "importtime", "-c", PROBE], cwd=BACKEND_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+    parsed = parse_importtime(done.stderr)
+    parsed.update(json.loads(done.stdout.strip().splitlines()[-1]))
+    parsed["app_import_ms"] = sum(ms for name, ms in parsed["by_package"].items() if name in APP_MODULES)
+    return parsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API import-time check")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=300.0,
+                        help="Most the app's own import self time plus create_app() may take")
+    parser.add_argument("--top", type=int, default=12, help="Packages to list")
+    parser.add_argument("--python", default=sys.executable)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    # One unmeasured run so .pyc files exist and the disk cache is warm
+    run_once(args.python)
+    runs = [run_once(args.python) for _ in range(args.runs)]
+
+    def median(key):
+        return round(statistics.median(run[key] for run in runs), 1)
+
+    packages = {name: round(statistics.median(run["by_package"].get(name, 0.0) for run in runs), 1)
+                for name in {name for run in runs for name in run["by_package"]}}
+    report = {
+        "runs": args.runs,
+        "total_import_ms": median("total_ms"),
+        "app_import_ms": median("app_import_ms"),
+        "third_party_import_ms": round(median("total_ms") - median("app_import_ms"), 1),
+        "create_app_ms": median("create_app_ms"),
+        "by_package": dict(sorted(packages.items(), key=lambda item: -item[1])),
+    }
+    owned = round(report["app_import_ms"] + report["create_app_ms"], 1)
+    report["app_owned_ms"] = owned
+
+    print(f"  import server (total)      {report['total_import_ms']:8.1f} ms")
+    print(f"    third-party packages     {report['third_party_import_ms']:8.1f} ms")
+    print(f"    app modules (self)       {report['app_import_ms']:8.1f} ms")
+    print(f"  create_app()               {report['create_app_ms']:8.1f} ms")
+    print(f"  app-owned                  {owned:8.1f} ms  budget {args.budget_ms:.0f} ms")
+    print("  slowest packages (self time):")
+    for name, ms in list(report["by_package"].items())[:args.top]:
+        print(f"    {name:24s} {ms:8.1f} ms{'  (app)' if name in APP_MODULES else ''}")
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    if owned > args.budget_ms:
+        print("OVER BUDGET")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
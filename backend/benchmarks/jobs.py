@@ -0,0 +1,73 @@
+"""Measure job-queue throughput and queue lag for the background worker.
+
+    python -m benchmarks.jobs --jobs 2000 --concurrency 8 --work-ms 5
+    python -m benchmarks.jobs --mongo-url mongodb://localhost:27017 --jobs 20000 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+
+import jobs
+from benchmarks.harness import BENCH_DB_NAME
+from worker import Worker
+
+
+def open_db(mongo_url):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        return AsyncIOMotorClient(mongo_url)[BENCH_DB_NAME], "mongodb"
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()[BENCH_DB_NAME], "mongomock"
+
+
+async def main_async(args) -> dict:
+    db, backend = open_db(args.mongo_url)
+    await db[jobs.JOBS_COLLECTION].drop()
+    await jobs.create_indexes(db)
+
+    async def simulated_io(db, payload):
+        await asyncio.sleep(payload["work_ms"] / 1000)
+
+    rng = random.Random(args.seed)
+    batch = [jobs.new_job("bench", {"work_ms": args.work_ms}, priority=rng.choice([0, 0, 0, 5]))
+             for _ in range(args.jobs)]
+    started = time.perf_counter()
+    for i in range(0, len(batch), 1000):
+        await jobs.enqueue(db, batch[i:i + 1000])
+    enqueue_seconds = time.perf_counter() - started
+
+    worker = Worker(db, {"bench": simulated_io}, concurrency=args.concurrency, poll_interval=0.05)
+    started = time.perf_counter()
+    await worker.run(asyncio.Event(), exit_when_idle=True)
+    drain_seconds = time.perf_counter() - started
+
+    return {
+        "meta": {"backend": backend, "jobs": args.jobs, "concurrency": args.concurrency, "work_ms": args.work_ms},
+        "enqueue_per_s": round(args.jobs / enqueue_seconds, 1),
+        "drain_seconds": round(drain_seconds, 2),
+        "worker": worker.metrics.snapshot(),
+        "queue": await jobs.stats(db),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Background worker throughput benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--work-ms", type=float, default=5.0, help="Simulated I/O per job")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
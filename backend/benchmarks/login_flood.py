@@ -0,0 +1,156 @@
+"""Latency of ordinary endpoints while /api/auth/login is flooded with bad passwords.
+
+    python -m benchmarks.login_flood --rate 1000
+    python -m benchmarks.login_flood --rate 1000 --compare-disabled   # also run without the limiter
+    python -m benchmarks.login_flood --mongo-url mongodb://localhost:27017
+
+The flood targets a real account whose password hash uses bcrypt's default
+cost, so every attempt that gets through costs what it would in production.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.harness import Scenario, app_client, load_server, run_scenario
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+VICTIM_EMAIL = "victima@bench.example.com"
+
+
+def legit_scenarios(dataset: dict) -> list:
+    vehicles = dataset["vehicles"]
+    return [
+        Scenario("auth_me", "GET", lambda rng: ("/api/auth/me", None)),
+        Scenario("get_vehicle", "GET", lambda rng: (f"/api/vehicles/{rng.choice(vehicles)['id']}", None)),
+        Scenario("list_vehicles", "GET", lambda rng: ("/api/vehicles?limit=50", None)),
+    ]
+
+
+async def flood(app, rate: float, attacker_ips: int, stop: asyncio.Event, statuses: Counter, max_in_flight: int = 2000):
+    """Send ``rate`` login attempts per second, spread over ``attacker_ips`` client addresses."""
+    clients = [
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(f"203.0.113.{i % 250 + 1}", 40000 + i)),
+                          base_url="http://bench")
+        for i in range(attacker_ips)
+    ]
+    slots = asyncio.Semaphore(max_in_flight)
+    rng = random.Random(7)
+    pending = set()
+
+    async def attempt(client):
+        try:
+            email = VICTIM_EMAIL if rng.random() < 0.5 else f"user{rng.randrange(10_000)}@bench.example.com"
+            response = await client.post("/api/auth/login", json={"email": email, "password": "wrong-password"})
+            statuses[response.status_code] += 1
+        except Exception:
+            statuses["error"] += 1
+        finally:
+            slots.release()
+
+    started = time.perf_counter()
+    sent = 0
+    try:
+        while not stop.is_set():
+            # Pace against the wall clock so slow responses don't lower the offered load
+            due = int((time.perf_counter() - started) * rate)
+            while sent < due:
+                if slots.locked():
+                    statuses["dropped_client_side"] += 1
+                else:
+                    await slots.acquire()
+                    task = asyncio.create_task(attempt(clients[sent % len(clients)]))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                sent += 1
+            await asyncio.sleep(0.005)
+        await asyncio.gather(*pending)
+    finally:
+        for client in clients:
+            await client.aclose()
+    return sent / (time.perf_counter() - started)
+
+
+async def measure(client, scenarios, headers, args) -> dict:
+    rng = random.Random(args.seed)
+    out = {}
+    for scenario in scenarios:
+        result = await run_scenario(client, scenario, headers, rng, args.requests, args.concurrency)
+        out[scenario.name] = result.summary()
+    return out
+
+
+async def phase(server, client, scenarios, headers, args, with_flood: bool) -> dict:
+    statuses: Counter = Counter()
+    stop = asyncio.Event()
+    flood_task = asyncio.create_task(flood(server.app, args.rate, args.attacker_ips, stop, statuses)) if with_flood else None
+    if flood_task:
+        await asyncio.sleep(1.0)  # let the flood reach steady state
+    legit = await measure(client, scenarios, headers, args)
+    report = {"legit": legit}
+    if flood_task:
+        stop.set()
+        report["flood"] = {"offered_rps": round(await flood_task, 1),
+                           "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))}}
+    for name, s in legit.items():
+        print(f"    {name:16s} p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f} ms")
+    if flood_task:
+        print(f"    flood: {report['flood']}")
+    return report
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    await server.db.users.insert_one({
+        "id": str(uuid.uuid4()), "email": VICTIM_EMAIL, "password": server.hash_password("correct-horse"),
+        "name": "Víctima Bench", "role": "asesor", "phone": None, "created_at": datetime.now(timezone.utc).isoformat(),
+    })
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+    scenarios = legit_scenarios(dataset)
+
+    report = {"meta": {"backend": backend, "profile": args.profile, "rate": args.rate,
+                       "attacker_ips": args.attacker_ips, "requests": args.requests,
+                       "concurrency": args.concurrency}}
+    async with app_client(server.app) as client:
+        print("  baseline (no flood)")
+        report["baseline"] = await phase(server, client, scenarios, headers, args, with_flood=False)
+        print("  flood, limiter enabled")
+        report["flood_limited"] = await phase(server, client, scenarios, headers, args, with_flood=True)
+        if args.compare_disabled:
+            server.settings.auth_rate_limit_enabled = False
+            print("  flood, limiter disabled")
+            report["flood_unlimited"] = await phase(server, client, scenarios, headers, args, with_flood=True)
+            server.settings.auth_rate_limit_enabled = True
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Login flood benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--rate", type=float, default=1000, help="Flood login attempts per second")
+    parser.add_argument("--attacker-ips", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=300, help="Legitimate requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--compare-disabled", action="store_true", help="Also measure with the limiter off")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
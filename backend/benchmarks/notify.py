@@ -0,0 +1,121 @@
+"""Notify a whole client list over WhatsApp through several workers and check the provider's rate is kept.
+
+    python -m benchmarks.notify --messages 2000 --workers 4 --rate 80/4800
+    python -m benchmarks.notify --messages 2000 --workers 4 --compare-local   # also run with per-worker buckets
+
+The provider is a fake with ``--latency-ms`` per request. Every send is
+timestamped, and the report gives the busiest one-second window next to what
+the rate allows in a second (burst plus refill).
+"""
+import argparse
+import asyncio
+import json
+import time
+from bisect import bisect_right
+from pathlib import Path
+
+import channels
+import jobs
+import metrics
+import ratelimit
+import shared_state
+from benchmarks.jobs import open_db
+from worker import Worker
+
+
+class TimedTransport(channels.FakeTransport):
+    def __init__(self, stamps: list, **kwargs):
+        super().__init__(channels.WHATSAPP, **kwargs)
+        self.stamps = stamps
+
+    async def send_batch(self, messages):
+        results = await super().send_batch(messages)
+        now = time.perf_counter()
+        self.stamps.extend(now for result in results if result.ok)
+        return results
+
+
+def peak_per_second(stamps: list) -> int:
+    stamps = sorted(stamps)
+    return max((bisect_right(stamps, t + 1.0) - i for i, t in enumerate(stamps)), default=0)
+
+
+async def run(args, shared_limits: bool) -> dict:
+    db, backend = open_db(args.mongo_url)
+    for name in (jobs.JOBS_COLLECTION, channels.MESSAGES_COLLECTION):
+        await db[name].drop()
+    await jobs.create_indexes(db)
+    await channels.create_indexes(db)
+
+    burst, per_minute = (float(v) for v in args.rate.split("/"))
+    policy = ratelimit.BucketPolicy.per_minute(burst, per_minute)
+    shared = shared_state.create("memory", lambda: db)
+    counters = metrics.Counters()
+    stamps = []
+    workers = []
+    for _ in range(args.workers):
+        transport = TimedTransport(stamps, latency=args.latency_ms / 1000, fail_every=args.fail_every,
+                                   concurrency=args.concurrency, policy=policy)
+        limiter = channels.SharedLimiter(shared) if shared_limits else channels.LocalLimiter()
+        dispatcher = channels.Dispatcher({channels.WHATSAPP: transport}, limiter, counters)
+
+        async def handler(db, payload, dispatcher=dispatcher):
+            await channels.dispatch(db, dispatcher, payload["message_ids"])
+
+        workers.append(Worker(db, {channels.DISPATCH_JOB: handler}, concurrency=4, poll_interval=0.05))
+
+    messages = [channels.new_message(channels.WHATSAPP, f"57300{i:07d}", "Tu vehículo está listo", "Puedes recogerlo hoy")
+                for i in range(args.messages)]
+    started = time.perf_counter()
+    await channels.queue(db, messages)
+    stop = asyncio.Event()
+    await asyncio.gather(*(w.run(stop, exit_when_idle=True) for w in workers))
+    # Retries wait out their backoff; finish them here so the run always ends with every message settled
+    while await db[channels.MESSAGES_COLLECTION].count_documents({"status": channels.QUEUED}):
+        await db[jobs.JOBS_COLLECTION].update_many({"status": jobs.QUEUED}, {"$set": {"run_at": jobs._now().isoformat()}})
+        await asyncio.gather(*(w.run(stop, exit_when_idle=True) for w in workers))
+    elapsed = time.perf_counter() - started
+
+    snapshot = counters.snapshot()
+    return {
+        "backend": backend,
+        "limiter": "shared" if shared_limits else "per-worker",
+        "workers": args.workers,
+        "messages": args.messages,
+        "seconds": round(elapsed, 2),
+        "sent_per_second": round(len(stamps) / elapsed, 1) if elapsed else 0.0,
+        "allowed_per_second": round(policy.capacity + policy.refill_per_second, 1),
+        "peak_per_second": peak_per_second(stamps),
+        "retried": snapshot.get("notify.whatsapp.retried", 0),
+        "throttled_ms": snapshot.get("notify.whatsapp.throttled_ms", 0),
+        "by_status": (await channels.stats(db)).get(channels.WHATSAPP, {}),
+    }
+
+
+async def main_async(args) -> dict:
+    report = {"shared": await run(args, shared_limits=True)}
+    if args.compare_local:
+        report["per_worker"] = await run(args, shared_limits=False)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Notification dispatch benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", default="80/4800", help="Provider limit as burst/per-minute")
+    parser.add_argument("--latency-ms", type=float, default=40, help="Fake provider latency per request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight per worker")
+    parser.add_argument("--fail-every", type=int, default=50, help="Every Nth send fails and is retried (0: never)")
+    parser.add_argument("--compare-local", action="store_true", help="Also run with per-worker buckets")
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
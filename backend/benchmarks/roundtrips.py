@@ -0,0 +1,103 @@
+"""Database round-trips per request for every benchmark scenario, checked against a budget.
+
+    python -m benchmarks.roundtrips             # exits 1 if any endpoint is over budget
+    python -m benchmarks.roundtrips --requests 20 --mongo-url mongodb://localhost:27017
+
+Requests run one at a time so the counts are exact per request. A handler that
+starts looping over find_one again, or stops fanning out a batch lookup, shows
+up here long before it shows up in latency.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+from pathlib import Path
+
+from benchmarks.harness import app_client, count_round_trips, load_server
+from benchmarks.run import build_scenarios
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+# Most round-trips a single request of each scenario may make. Raise a budget
+# only together with the change that needs it.
+BUDGETS = {
+    "auth_me": 0,
+    "list_vehicles": 1,
+    "get_vehicle": 1,
+    "get_vehicle_by_plate": 1,
+    # The match count plus one query per rank tier, fanned out
+    "search_vehicles": 7,
+    "list_appointments": 1,
+    "get_appointment": 1,
+    # Hot and archived inspections, fanned out
+    "vehicle_inspections": 2,
+    # One query on the damage index, archived inspections already folded in
+    "vehicle_damage": 1,
+    "list_quotes": 1,
+    "get_quote": 1,
+    "list_service_orders": 2,
+    "technician_service_orders": 2,
+    "get_service_order": 2,
+    "notifications": 1,
+    "unread_count": 1,
+    "dashboard_stats": 4,
+    "create_vehicle": 2,
+    "update_order_status": 6,
+    # Technician and vehicle (its model, for the duration estimate) read together, then the insert
+    "create_service_order": 3,
+    # One query per synced collection plus tombstones, all fanned out
+    "technician_sync": 4,
+}
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    await seed_database(server.db, dataset)
+    users = {u["role"]: u for u in dataset["users"]}
+    tokens = {role: server.create_token(u) for role, u in users.items()}
+
+    rng = random.Random(args.seed)
+    report = {}
+    async with app_client(server.app) as client:
+        for scenario in build_scenarios(dataset):
+            headers = {"Authorization": f"Bearer {tokens[scenario.role]}"}
+            # One untimed request first: cold caches and startup work aren't the handler's cost
+            path, body = scenario.build(rng)
+            await client.request(scenario.method, path, json=body, headers=headers)
+            per_request = []
+            for _ in range(args.requests):
+                path, body = scenario.build(rng)
+                with count_round_trips() as counts:
+                    await client.request(scenario.method, path, json=body, headers=headers)
+                per_request.append(sum(counts.values()))
+            report[scenario.name] = {"max": max(per_request), "mean": round(sum(per_request) / len(per_request), 2)}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-trip budget check")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per scenario")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the counts to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    over = []
+    for name, counts in report.items():
+        budget = BUDGETS.get(name)
+        status = "no budget" if budget is None else ("OVER BUDGET" if counts["max"] > budget else "ok")
+        print(f"  {name:32s} max {counts['max']:3d}  mean {counts['mean']:6.2f}  budget {budget if budget is not None else '-':>3}  {status}")
+        if budget is not None and counts["max"] > budget:
+            over.append(name)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    if over:
+        print(f"Over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Seed a benchmark database, drive the API in-process and write a JSON report.
+
+    python -m benchmarks.run --profile small --concurrency 16 --requests 200
+    python -m benchmarks.run --mongo-url mongodb://localhost:27017 --profile medium
+    python -m benchmarks.run --compare benchmarks/results/abc1234.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import string
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from benchmarks.harness import Scenario, app_client, load_server, run_scenario
+from benchmarks.seed import PROFILES, SERVICES, build_dataset, seed_database
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def build_scenarios(dataset: dict) -> list:
+    vehicles = dataset["vehicles"]
+    quotes = dataset["quotes"]
+    appointments = dataset["appointments"]
+    orders = dataset["service_orders"]
+    technicians = [u for u in dataset["users"] if u["role"] == "tecnico"]
+
+    def new_vehicle(rng):
+        plate = "Z" + "".join(rng.choices(string.ascii_uppercase, k=2)) + "".join(rng.choices(string.digits, k=4))
+        return "/api/vehicles", {
+            "plate": plate, "brand": "Mazda", "model": "3", "year": 2022, "color": "Gris",
+            "client_name": "Cliente Bench", "client_phone": "3009998877",
+        }
+
+    return [
+        Scenario("auth_me", "GET", lambda rng: ("/api/auth/me", None)),
+        Scenario("list_vehicles", "GET", lambda rng: ("/api/vehicles", None)),
+        Scenario("get_vehicle", "GET", lambda rng: (f"/api/vehicles/{rng.choice(vehicles)['id']}", None)),
+        Scenario("get_vehicle_by_plate", "GET", lambda rng: (f"/api/vehicles/plate/{rng.choice(vehicles)['plate'].lower()}", None)),
+        # Typeahead at the front desk: three characters of a plate or of a client's name
+        Scenario("search_vehicles", "GET",
+                 lambda rng: ("/api/vehicles/search?q=" + rng.choice((rng.choice(vehicles)["plate"][:3],
+                                                                     rng.choice(vehicles)["client_name"][:3])), None)),
+        Scenario("list_appointments", "GET", lambda rng: ("/api/appointments", None)),
+        Scenario("get_appointment", "GET", lambda rng: (f"/api/appointments/{rng.choice(appointments)['id']}", None)),
+        Scenario("vehicle_inspections", "GET", lambda rng: (f"/api/inspections/vehicle/{rng.choice(vehicles)['id']}", None)),
+        Scenario("vehicle_damage", "GET", lambda rng: (f"/api/inspections/vehicle/{rng.choice(vehicles)['id']}/damage", None)),
+        Scenario("list_quotes", "GET", lambda rng: ("/api/quotes", None)),
+        Scenario("get_quote", "GET", lambda rng: (f"/api/quotes/{rng.choice(quotes)['id']}", None)),
+        Scenario("list_service_orders", "GET", lambda rng: ("/api/service-orders", None)),
+        Scenario("technician_service_orders", "GET",
+                 lambda rng: (f"/api/service-orders?technician_id={rng.choice(technicians)['id']}", None)),
+        Scenario("get_service_order", "GET", lambda rng: (f"/api/service-orders/{rng.choice(orders)['id']}", None)),
+        Scenario("notifications", "GET", lambda rng: ("/api/notifications", None)),
+        Scenario("unread_count", "GET", lambda rng: ("/api/notifications/unread-count", None)),
+        Scenario("dashboard_stats", "GET", lambda rng: ("/api/dashboard/stats", None)),
+        Scenario("create_vehicle", "POST", new_vehicle),
+        # Status changes go through the state machine; a random pick is often not a legal move
+        Scenario("update_order_status", "PUT",
+                 lambda rng: (f"/api/service-orders/{rng.choice(orders)['id']}/status", {"status": rng.choice(["en_proceso", "en_revision"])}),
+                 expected_status=(200, 409)),
+        Scenario("create_service_order", "POST",
+                 lambda rng: ("/api/service-orders", {"vehicle_id": rng.choice(vehicles)["id"],
+                                                      "services": [rng.choice(SERVICES)],
+                                                      "assigned_technician_id": rng.choice(technicians)["id"]})),
+        # A tablet coming back online: a token from a few minutes ago, so mostly recent writes
+        Scenario("technician_sync", "GET",
+                 lambda rng: (f"/api/sync?since={int((time.time() - 300) * 1_000_000)}", None), role="tecnico"),
+    ]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=Path(__file__).parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """Return endpoints whose p95 got worse than ``threshold`` (e.g. 0.2 = 20%)."""
+    regressions = []
+    for name, stats in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+        marker = "REGRESSION" if change > threshold else ""
+        print(f"  {name:32s} p95 {base['p95_ms']:9.2f} -> {stats['p95_ms']:9.2f} ms ({change:+.1%}) {marker}")
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    seed_started = time.perf_counter()
+    counts = await seed_database(server.db, dataset)
+    seed_seconds = time.perf_counter() - seed_started
+
+    users = {u["role"]: u for u in dataset["users"]}
+    tokens = {role: server.create_token(u) for role, u in users.items()}
+
+    scenarios = build_scenarios(dataset)
+    if args.only:
+        wanted = set(args.only.split(","))
+        scenarios = [s for s in scenarios if s.name in wanted]
+
+    rng = random.Random(args.seed)
+    endpoints = {}
+    async with app_client(server.app) as client:
+        for scenario in scenarios:
+            headers = {"Authorization": f"Bearer {tokens[scenario.role]}"}
+            # Warm-up pass keeps first-request costs (imports, cursors) out of the numbers
+            await run_scenario(client, scenario, headers, rng, min(args.warmup, args.requests), args.concurrency)
+            result = await run_scenario(client, scenario, headers, rng, args.requests, args.concurrency)
+            endpoints[scenario.name] = result.summary()
+            s = endpoints[scenario.name]
+            print(f"  {scenario.name:32s} p50 {s['p50_ms']:8.2f}  p95 {s['p95_ms']:8.2f}  p99 {s['p99_ms']:8.2f} ms"
+                  f"  {s['throughput_rps']:8.1f} req/s  errors {s['errors']}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend,
+            "profile": args.profile,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests_per_endpoint": args.requests,
+            "seeded": counts,
+            "seed_seconds": round(seed_seconds, 2),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PolarizadosYA! API benchmark")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--only", help="Comma-separated scenario names")
+    parser.add_argument("--out", help="Output JSON path (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Baseline JSON to compare p95 against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed p95 regression ratio")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{report['meta']['commit']}-{args.profile}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"Comparing against {args.compare} ({baseline['meta'].get('commit')})")
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Throughput of real uvicorn deployments with 1..N worker processes.
+
+Needs a real MongoDB: every worker is a separate process, so they must share a
+database (and, through SHARED_STATE_URL, caches and locks).
+
+    python -m benchmarks.scaling --mongo-url mongodb://localhost:27017 --workers 1,2,4,8
+    python -m benchmarks.scaling --mongo-url mongodb://localhost:27017 --shared-state redis://localhost:6379
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import httpx
+
+from benchmarks.harness import BENCH_DB_NAME, load_server, percentile
+from benchmarks.run import RESULTS_DIR, build_scenarios, git_commit
+from benchmarks.seed import PROFILES, build_dataset, seed_database
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+# Read-heavy mix plus the write that fans out cache invalidations
+MIX = ("get_vehicle", "get_quote", "list_service_orders", "dashboard_stats", "update_order_status")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(base_url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/api/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise SystemExit(f"Server at {base_url} did not start within {timeout:.0f}s")
+
+
+async def _drive(base_url: str, headers: dict, planned: list, concurrency: int):
+    latencies, errors = [], 0
+    queue = iter(planned)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            for method, path, body, expected in queue:
+                started = time.perf_counter()
+                try:
+                    ok = (await client.request(method, path, json=body)).status_code in expected
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - started) * 1000)
+                errors += not ok
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors
+
+
+def drive(base_url: str, headers: dict, planned: list, concurrency: int):
+    """Load-generator process entry point; one event loop per process."""
+    return asyncio.run(_drive(base_url, headers, planned, concurrency))
+
+
+def run_level(workers: int, args, env: dict, headers: dict, planned: list) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        asyncio.run(wait_ready(base_url))
+        chunks = [planned[i::args.load_processes] for i in range(args.load_processes)]
+        per_process = max(1, args.concurrency // args.load_processes)
+        started = time.perf_counter()
+        with ProcessPoolExecutor(args.load_processes) as pool:
+            results = list(pool.map(drive, [base_url] * len(chunks), [headers] * len(chunks),
+                                    chunks, [per_process] * len(chunks)))
+        wall = time.perf_counter() - started
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    latencies = sorted(l for lat, _ in results for l in lat)
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(e for _, e in results),
+        "throughput_rps": round(len(latencies) / wall, 1),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-worker scaling benchmark")
+    parser.add_argument("--mongo-url", required=True, help="Shared MongoDB every worker connects to")
+    parser.add_argument("--shared-state", default="mongodb", help="SHARED_STATE_URL for the workers")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="small")
+    parser.add_argument("--requests", type=int, default=4000, help="Requests per worker count")
+    parser.add_argument("--concurrency", type=int, default=64, help="Connections across all load processes")
+    parser.add_argument("--load-processes", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Load generator processes (one asyncio loop can't saturate many workers)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Output JSON path")
+    args = parser.parse_args(argv)
+
+    server, _ = load_server(args.mongo_url)
+    dataset = build_dataset(args.profile, seed=args.seed)
+    asyncio.run(seed_database(server.db, dataset))
+    admin = next(u for u in dataset["users"] if u["role"] == "admin")
+    headers = {"Authorization": f"Bearer {server.create_token(admin)}"}
+
+    scenarios = [s for s in build_scenarios(dataset) if s.name in MIX]
+    rng = random.Random(args.seed)
+    planned = []
+    for _ in range(args.requests):
+        scenario = rng.choice(scenarios)
+        path, body = scenario.build(rng)
+        planned.append((scenario.method, path, body, scenario.expected_status))
+
+    env = {**os.environ, "MONGO_URL": args.mongo_url, "DB_NAME": BENCH_DB_NAME,
+           "SHARED_STATE_URL": args.shared_state}
+    levels = []
+    for workers in (int(w) for w in args.workers.split(",")):
+        level = run_level(workers, args, env, headers, planned)
+        base = levels[0]["throughput_rps"] if levels else level["throughput_rps"]
+        level["speedup"] = round(level["throughput_rps"] / base, 2) if base else 0.0
+        levels.append(level)
+        print(f"  workers {workers:3d}  {level['throughput_rps']:9.1f} req/s  x{level['speedup']:<5}"
+              f"  p50 {level['p50_ms']:8.2f}  p95 {level['p95_ms']:8.2f} ms  errors {level['errors']}")
+
+    report = {
+        "meta": {"commit": git_commit(), "profile": args.profile, "shared_state": args.shared_state,
+                 "requests": args.requests, "concurrency": args.concurrency,
+                 "load_processes": args.load_processes, "mix": list(MIX)},
+        "levels": levels,
+    }
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{report['meta']['commit']}-scaling-{args.profile}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(f"Report written to {out}")
+
+
+if __name__ == "__main__":
+    main()
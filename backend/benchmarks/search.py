@@ -0,0 +1,103 @@
+"""Vehicle search: ranked typeahead latency over a large fleet.
+
+    python -m benchmarks.search --vehicles 100000 --requests 20
+    python -m benchmarks.search --mongo-url mongodb://localhost:27017 --vehicles 100000
+
+Generates vehicles the way ``seed`` does (with their search fields, branch and
+sync stamp already set, so startup has nothing to backfill) and times
+``/vehicles/search`` for the queries the front desk types. Shapes range from a
+whole plate to two letters of a client's first name, the broadest prefix
+allowed. Every request ranks all of its matches, however many there are.
+``total`` is the average match count per query.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import search
+import sync
+from benchmarks.harness import app_client, load_server
+from benchmarks.seed import _client, _plate
+
+# Shape -> query built from one of the generated vehicles
+QUERIES = {
+    "plate": lambda v: v["plate"],
+    "plate_prefix": lambda v: v["plate"][:3],
+    "phone_prefix": lambda v: v["client_phone"][:6],
+    "name_2_letters": lambda v: v["client_name"][:2],
+    "first_name_last_prefix": lambda v: v["client_name"].split()[0] + " " + v["client_name"].split()[1][:2],
+}
+
+
+def vehicles(count: int, branch_id: str, rng: random.Random) -> list:
+    plates, now = set(), datetime.now(timezone.utc).isoformat()
+    docs = []
+    for _ in range(count):
+        doc = {"id": str(uuid.uuid4()), "branch_id": branch_id, "plate": _plate(rng, plates), "brand": "Mazda",
+               "model": "3", "year": 2020, "color": "Gris", "vin": None, **_client(rng), "status": None,
+               "assigned_technician_id": None, "assigned_technician_name": None, "current_service_order_id": None,
+               "created_at": now, "created_by": "bench"}
+        docs.append({**doc, **search.search_fields(doc), **sync.stamp()})
+    return docs
+
+
+async def main_async(args) -> dict:
+    server, backend = load_server(args.mongo_url)
+    rng = random.Random(args.seed)
+    branch_id = server.core.settings.default_branch_id
+    fleet = vehicles(args.vehicles, branch_id, rng)
+    await server.db.vehicles.delete_many({})
+    for start in range(0, len(fleet), 5000):
+        await server.db.vehicles.insert_many(fleet[start:start + 5000])
+    user = {"id": str(uuid.uuid4()), "email": "asesor@bench.example.com", "name": "Asesor Bench", "role": "asesor",
+            "branch_id": branch_id, "created_at": datetime.now(timezone.utc).isoformat()}
+    headers = {"Authorization": f"Bearer {server.create_token(user)}"}
+
+    report = {"meta": {"backend": backend, "vehicles": args.vehicles, "requests": args.requests}, "queries": {}}
+    async with app_client(server.app) as client:
+        for shape, build in QUERIES.items():
+            queries = [build(rng.choice(fleet)) for _ in range(args.requests)]
+            await client.get("/api/vehicles/search", headers=headers, params={"q": queries[0]})  # untimed warm-up
+            latencies, totals = [], []
+            for q in queries:
+                started = time.perf_counter()
+                response = await client.get("/api/vehicles/search", headers=headers, params={"q": q})
+                latencies.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.text
+                totals.append(response.json()["total"])
+            latencies.sort()
+            report["queries"][shape] = {
+                "example": queries[0],
+                "p50_ms": round(statistics.median(latencies), 2),
+                "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+                "total": round(statistics.fmean(totals), 1),
+            }
+
+    for shape, row in report["queries"].items():
+        print(f"  {shape:24s} p50 {row['p50_ms']:8.2f} ms   p95 {row['p95_ms']:8.2f} ms"
+              f"   {row['total']:9.1f} matches   e.g. {row['example']!r}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vehicle search benchmark")
+    parser.add_argument("--mongo-url", help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--vehicles", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests per query shape")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", help="Also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
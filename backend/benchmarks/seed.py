@@ -0,0 +1,236 @@
+import random
+import string
+import uuid
+from datetime import datetime, timezone, timedelta
+
+import bcrypt
+
+# Dataset sizes per profile. "large" mirrors a busy shop after a few years of history.
+PROFILES = {
+    "small": {"technicians": 8, "vehicles": 500, "appointments": 600, "inspections": 400, "quotes": 700, "service_orders": 800, "notifications": 2000},
+    "medium": {"technicians": 15, "vehicles": 5000, "appointments": 6000, "inspections": 4000, "quotes": 7000, "service_orders": 8000, "notifications": 20000},
+    "large": {"technicians": 30, "vehicles": 50000, "appointments": 60000, "inspections": 40000, "quotes": 70000, "service_orders": 80000, "notifications": 200000},
+}
+
+SERVICES = ["polarizado", "nanoceramica", "autobahn_black", "ultrasecure"]
+SERVICE_PRICES = {"polarizado": 250000, "nanoceramica": 480000, "autobahn_black": 650000, "ultrasecure": 900000}
+ORDER_STATUSES = ["agendado", "en_proceso", "en_revision", "terminado"]
+VEHICLE_STATUSES = [None, "agendado", "ingresado", "con_tecnico", "en_proceso", "finalizado"]
+TIME_SLOTS = ["08:00", "09:00", "10:00", "11:00", "14:00", "15:00", "16:00", "17:00"]
+BRANDS = {
+    "Toyota": ["Corolla", "Hilux", "Prado", "Yaris"],
+    "Mazda": ["2", "3", "CX-30", "CX-5"],
+    "Chevrolet": ["Onix", "Tracker", "Spark GT"],
+    "Renault": ["Logan", "Duster", "Sandero"],
+    "Kia": ["Picanto", "Sportage", "Rio"],
+    "Nissan": ["Versa", "Frontier", "Kicks"],
+}
+COLORS = ["Blanco", "Negro", "Gris", "Rojo", "Azul", "Plata"]
+FIRST_NAMES = ["Juan", "María", "Carlos", "Laura", "Andrés", "Camila", "Santiago", "Valentina", "Felipe", "Daniela", "Jorge", "Natalia"]
+LAST_NAMES = ["Pérez", "Gómez", "Rodríguez", "Martínez", "López", "García", "Hernández", "Ramírez", "Torres", "Castro", "Vargas", "Rojas"]
+INSPECTION_AREAS = ["capo", "techo", "baul", "puerta_del_izq", "puerta_del_der", "puerta_tras_izq", "puerta_tras_der", "parabrisas", "vidrio_trasero", "espejo_izq", "espejo_der"]
+
+BENCH_PASSWORD = "bench123"
+
+
+def _iso(dt: datetime) -> str:
+    return dt.isoformat()
+
+
+def _plate(rng: random.Random, used: set) -> str:
+    while True:
+        plate = "".join(rng.choices(string.ascii_uppercase, k=3)) + "".join(rng.choices(string.digits, k=3))
+        if plate not in used:
+            used.add(plate)
+            return plate
+
+
+def _client(rng: random.Random) -> dict:
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        "client_name": f"{first} {last}",
+        "client_phone": "3" + "".join(rng.choices(string.digits, k=9)),
+        "client_email": f"{first.lower()}.{last.lower()}{rng.randint(1, 9999)}@example.com".encode("ascii", "ignore").decode(),
+        "client_cedula": "".join(rng.choices(string.digits, k=10)),
+    }
+
+
+def build_dataset(profile: str = "small", seed: int = 1234) -> dict:
+    """Generate documents shaped exactly like the ones server.py writes."""
+    sizes = PROFILES[profile]
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    # Hash once: bcrypt cost dominates seeding time otherwise
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds=4)).decode("utf-8")
+
+    def ago(max_days: int) -> datetime:
+        return now - timedelta(days=rng.uniform(0, max_days), seconds=rng.randint(0, 86400))
+
+    users = [
+        {"id": str(uuid.uuid4()), "email": "admin@bench.example.com", "password": password_hash, "name": "Admin Bench",
+         "role": "admin", "phone": "3000000000", "created_at": _iso(ago(900))},
+        {"id": str(uuid.uuid4()), "email": "asesor@bench.example.com", "password": password_hash, "name": "Asesor Bench",
+         "role": "asesor", "phone": "3000000001", "created_at": _iso(ago(900))},
+    ]
+    for i in range(sizes["technicians"]):
+        users.append({"id": str(uuid.uuid4()), "email": f"tecnico{i}@bench.example.com", "password": password_hash,
+                      "name": f"Técnico {i}", "role": "tecnico", "phone": f"31000000{i:02d}", "created_at": _iso(ago(900))})
+    creator_ids = [users[0]["id"], users[1]["id"]]
+    technicians = [u for u in users if u["role"] == "tecnico"]
+
+    plates = set()
+    vehicles = []
+    for _ in range(sizes["vehicles"]):
+        brand = rng.choice(list(BRANDS))
+        technician = rng.choice(technicians) if rng.random() < 0.3 else None
+        vehicles.append({
+            "id": str(uuid.uuid4()),
+            "plate": _plate(rng, plates),
+            "brand": brand,
+            "model": rng.choice(BRANDS[brand]),
+            "year": rng.randint(2005, now.year),
+            "color": rng.choice(COLORS),
+            "vin": None,
+            **_client(rng),
+            "status": rng.choice(VEHICLE_STATUSES),
+            "assigned_technician_id": technician["id"] if technician else None,
+            "assigned_technician_name": technician["name"] if technician else None,
+            "current_service_order_id": None,
+            "created_at": _iso(ago(900)),
+            "created_by": rng.choice(creator_ids),
+        })
+
+    appointments = []
+    for _ in range(sizes["appointments"]):
+        vehicle = rng.choice(vehicles)
+        day = now + timedelta(days=rng.randint(-600, 30))
+        appointments.append({
+            "id": str(uuid.uuid4()),
+            "vehicle_id": vehicle["id"],
+            "client_name": vehicle["client_name"],
+            "client_phone": vehicle["client_phone"],
+            "client_email": vehicle["client_email"],
+            "plate": vehicle["plate"],
+            "brand": vehicle["brand"],
+            "model": vehicle["model"],
+            "date": day.strftime("%Y-%m-%d"),
+            "time_slot": rng.choice(TIME_SLOTS),
+            "services": rng.sample(SERVICES, rng.randint(1, 2)),
+            "notes": None,
+            "status": rng.choice(ORDER_STATUSES),
+            "created_at": _iso(ago(600)),
+            "created_by": rng.choice(creator_ids),
+        })
+
+    inspections = []
+    for _ in range(sizes["inspections"]):
+        vehicle = rng.choice(vehicles)
+        items = []
+        for area in INSPECTION_AREAS:
+            damaged = rng.random() < 0.12
+            items.append({"area": area, "condition": "rayado" if damaged else "bueno", "notes": None, "has_damage": damaged})
+        inspections.append({
+            "id": str(uuid.uuid4()),
+            "vehicle_id": vehicle["id"],
+            "service_order_id": None,
+            "items": items,
+            "general_notes": None,
+            # Real inspections carry data URLs from the camera; keep them small but non-trivial
+            "photos": ["data:image/jpeg;base64," + "A" * 2048 for _ in range(rng.randint(0, 3))],
+            "created_at": _iso(ago(600)),
+            "created_by": rng.choice(creator_ids),
+        })
+
+    quotes = []
+    for _ in range(sizes["quotes"]):
+        vehicle = rng.choice(vehicles)
+        items = []
+        for service in rng.sample(SERVICES, rng.randint(1, 3)):
+            items.append({"service": service, "description": service.replace("_", " ").title(),
+                          "price": float(SERVICE_PRICES[service]), "quantity": 1})
+        subtotal = sum(item["price"] * item["quantity"] for item in items)
+        approved = rng.random() < 0.6
+        created = ago(600)
+        quotes.append({
+            "id": str(uuid.uuid4()),
+            "vehicle_id": vehicle["id"],
+            "client_name": vehicle["client_name"],
+            "client_email": vehicle["client_email"],
+            "items": items,
+            "subtotal": subtotal,
+            "tax": subtotal * 0.19,
+            "total": subtotal * 1.19,
+            "notes": None,
+            "status": "approved" if approved else "pending",
+            "approved_at": _iso(created + timedelta(hours=2)) if approved else None,
+            "signature_url": None,
+            "cedula_photo_url": None,
+            "created_at": _iso(created),
+            "created_by": rng.choice(creator_ids),
+        })
+
+    service_orders = []
+    for _ in range(sizes["service_orders"]):
+        vehicle = rng.choice(vehicles)
+        technician = rng.choice(technicians) if rng.random() < 0.85 else None
+        status = rng.choices(ORDER_STATUSES, weights=[1, 1, 1, 6])[0]
+        created = ago(600)
+        started = created + timedelta(hours=rng.uniform(1, 48)) if status != "agendado" else None
+        completed = started + timedelta(hours=rng.uniform(1, 10)) if status == "terminado" else None
+        service_orders.append({
+            "id": str(uuid.uuid4()),
+            "vehicle_id": vehicle["id"],
+            "quote_id": None,
+            "appointment_id": None,
+            "services": rng.sample(SERVICES, rng.randint(1, 2)),
+            "status": status,
+            "assigned_technician_id": technician["id"] if technician else None,
+            "assigned_technician_name": technician["name"] if technician else None,
+            "estimated_hours": rng.choice([None, 2.0, 3.0, 4.0, 6.0]),
+            "actual_hours": None,
+            "notes": None,
+            "started_at": _iso(started) if started else None,
+            "completed_at": _iso(completed) if completed else None,
+            "created_at": _iso(created),
+            "created_by": rng.choice(creator_ids),
+        })
+
+    notifications = []
+    recipients = [u["id"] for u in users]
+    for _ in range(sizes["notifications"]):
+        order = rng.choice(service_orders)
+        created = _iso(ago(300))
+        notifications.append({
+            "id": str(uuid.uuid4()),
+            "recipient_id": rng.choice(recipients),
+            "notification_type": "internal",
+            "title": "Nueva Orden Asignada",
+            "message": f"Se te ha asignado la orden #{order['id'][:8]}",
+            "read": rng.random() < 0.7,
+            "related_entity_type": "service_order",
+            "related_entity_id": order["id"],
+            "sent_at": created,
+            "created_at": created,
+        })
+
+    return {
+        "users": users,
+        "vehicles": vehicles,
+        "appointments": appointments,
+        "inspections": inspections,
+        "quotes": quotes,
+        "service_orders": service_orders,
+        "notifications": notifications,
+    }
+
+
+async def seed_database(db, dataset: dict, batch_size: int = 5000) -> dict:
+    """Drop and refill every collection in ``dataset``. Returns the inserted counts."""
+    counts = {}
+    for name, docs in dataset.items():
+        await db[name].delete_many({})
+        for start in range(0, len(docs), batch_size):
+            # insert_many mutates the dicts with an _id; hand it copies so the dataset stays reusable
+            await db[name].insert_many([dict(d) for d in docs[start:start + batch_size]])
+        counts[name] = len(docs)
+    return counts
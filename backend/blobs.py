@@ -0,0 +1,132 @@
+"""Binary uploads (signatures, ID photos) stored in MongoDB with the GridFS layout.
+
+Files live in ``blobs.files`` and their content in ``blobs.chunks``, exactly as
+a GridFS bucket named ``blobs`` would store them, so ``mongofiles`` and any
+driver's GridFS API can read them. They are written with plain collection calls
+instead of Motor's GridFS bucket so they work on whatever database handle the
+app was given (including the in-memory one the benchmarks use).
+
+A ``BlobWriter`` takes data in pieces of any size and inserts a chunk whenever
+one fills up: at most one chunk of a file is held in memory.
+
+Files belong to a branch (``metadata.branch_id``). Through a request's
+branch-scoped database handle, ``find`` only sees the caller's branch and new
+files are stamped with it. Without one (the worker), pass the branch in
+``metadata``.
+"""
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+
+BUCKET = "blobs"
+FILES = BUCKET + ".files"
+CHUNKS = BUCKET + ".chunks"
+BRANCH_FIELD = "metadata.branch_id"
+# GridFS' default chunk size: stays well under the 16 MB document limit
+CHUNK_SIZE = 255 * 1024
+
+# Leading bytes of the image types accepted as uploads
+SIGNATURES = {
+    "image/png": (b"\x89PNG\r\n\x1a\n",),
+    "image/jpeg": (b"\xff\xd8\xff",),
+    "image/webp": (b"RIFF",),
+}
+
+
+class BlobError(Exception):
+    pass
+
+
+class BlobTooLarge(BlobError):
+    pass
+
+
+def megabytes(size: int) -> str:
+    return f"{size / (1024 * 1024):.1f}".rstrip("0").rstrip(".")
+
+
+def sniff(head: bytes, content_type: str) -> bool:
+    """Whether ``head`` (the first bytes of a file) looks like ``content_type``."""
+    if content_type == "image/webp":
+        return head[:4] == b"RIFF" and head[8:12] == b"WEBP"
+    return any(head.startswith(magic) for magic in SIGNATURES.get(content_type, ()))
+
+
+class BlobWriter:
+    """Writes one file chunk by chunk; ``close()`` makes it visible, ``abort()`` removes what was written."""
+
+    def __init__(self, db, filename: str, content_type: str, max_size: int, metadata: Optional[dict] = None):
+        self.db = db
+        self.id = str(uuid.uuid4())
+        self.filename = filename
+        self.content_type = content_type
+        self.max_size = max_size
+        self.metadata = metadata or {}
+        self.length = 0
+        self._buffer = bytearray()
+        self._chunks = 0
+        self._sha256 = hashlib.sha256()
+
+    async def write(self, data: bytes):
+        self.length += len(data)
+        if self.length > self.max_size:
+            raise BlobTooLarge(f"El archivo supera el máximo de {megabytes(self.max_size)} MB")
+        self._sha256.update(data)
+        self._buffer += data
+        while len(self._buffer) >= CHUNK_SIZE:
+            await self._flush(bytes(self._buffer[:CHUNK_SIZE]))
+            del self._buffer[:CHUNK_SIZE]
+
+    async def _flush(self, data: bytes):
+        await self.db[CHUNKS].insert_one({"files_id": self.id, "n": self._chunks, "data": data})
+        self._chunks += 1
+
+    async def close(self) -> dict:
+        if self._buffer:
+            await self._flush(bytes(self._buffer))
+            self._buffer.clear()
+        doc = {
+            "_id": self.id,
+            "length": self.length,
+            "chunkSize": CHUNK_SIZE,
+            "uploadDate": datetime.now(timezone.utc),
+            "filename": self.filename,
+            "metadata": {**self.metadata, "contentType": self.content_type, "sha256": self._sha256.hexdigest()},
+        }
+        await self.db[FILES].insert_one(doc)
+        return doc
+
+    async def abort(self):
+        self._buffer.clear()
+        if self._chunks:
+            await self.db[CHUNKS].delete_many({"files_id": self.id})
+
+
+async def put(db, data: bytes, filename: str, content_type: str, metadata: Optional[dict] = None) -> dict:
+    """Store bytes already in memory (e.g. a rendered document); returns the file document."""
+    writer = BlobWriter(db, filename, content_type, len(data), metadata)
+    try:
+        for start in range(0, len(data), CHUNK_SIZE):
+            await writer.write(data[start:start + CHUNK_SIZE])
+        return await writer.close()
+    except Exception:
+        await writer.abort()
+        raise
+
+
+async def find(db, blob_id: str) -> Optional[dict]:
+    return await db[FILES].find_one({"_id": blob_id})
+
+
+async def read_chunks(db, file_doc: dict) -> AsyncIterator[bytes]:
+    """The content of a file, one chunk at a time. ``file_doc`` comes from a branch-scoped lookup (``find``)."""
+    cursor = db[CHUNKS].find({"files_id": file_doc["_id"]}, {"_id": 0, "data": 1}).sort("n", 1)
+    async for chunk in cursor:
+        yield bytes(chunk["data"])
+
+
+async def create_indexes(db):
+    # The indexes every GridFS driver expects
+    await db[CHUNKS].create_index([("files_id", 1), ("n", 1)], unique=True)
+    await db[FILES].create_index([("filename", 1), ("uploadDate", 1)])
@@ -0,0 +1,136 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+
+
+@dataclass(frozen=True)
+class CachedDocument:
+    body: bytes
+    etag: str
+    last_modified: str
+    # Branch the document belongs to; a hit from another branch must not be served
+    owner: Optional[str] = None
+
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """RFC 9110 weak comparison of an If-None-Match header against our strong ETag."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def last_modified(doc: dict) -> str:
+    """HTTP date of the document's last write (``updated_at``, else ``created_at``)."""
+    moment = datetime.fromisoformat(doc.get("updated_at") or doc["created_at"])
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return formatdate(moment.timestamp(), usegmt=True)
+
+
+def not_modified_since(if_modified_since: Optional[str], modified: str) -> bool:
+    """True when an If-Modified-Since header is at or after ``modified``; unparseable dates never match."""
+    if not if_modified_since:
+        return False
+    try:
+        return parsedate_to_datetime(modified) <= parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+
+class DocumentCache:
+    """In-process LRU of serialized detail responses keyed by (namespace, document id).
+
+    Each entry holds the already-encoded JSON body plus its ETag, so a hit costs
+    neither a database read nor a re-serialization. Reads that race with a write
+    are handled with a logical clock: ``begin()`` returns a ticket before the
+    database read, ``invalidate()`` stamps the key, and ``put()`` refuses to
+    store a body whose ticket predates the last invalidation.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_tombstones: int = 16384):
+        self.max_entries = max_entries
+        self.max_tombstones = max_tombstones
+        self._entries: "OrderedDict[Tuple[str, str], CachedDocument]" = OrderedDict()
+        self._aliases: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._invalidated: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        # Highest stamp ever evicted from _invalidated; unknown keys are treated as invalidated then
+        self._floor = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: str) -> Optional[CachedDocument]:
+        with self._lock:
+            entry = self._entries.get((namespace, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((namespace, key))
+            self.hits += 1
+            return entry
+
+    def begin(self) -> int:
+        with self._lock:
+            return self._clock
+
+    def put(self, namespace: str, key: str, body: bytes, ticket: int, last_modified: str,
+            owner: Optional[str] = None) -> CachedDocument:
+        """``last_modified`` comes from the document, so a refilled entry revalidates like the evicted one."""
+        entry = CachedDocument(body=body, etag=make_etag(body), last_modified=last_modified, owner=owner)
+        with self._lock:
+            stamp = self._invalidated.get((namespace, key), self._floor)
+            if ticket < stamp:
+                # A write landed while this body was being read; serve it once but don't keep it
+                return entry
+            self._entries[(namespace, key)] = entry
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, namespace: str, key: str) -> None:
+        with self._lock:
+            self._clock += 1
+            self._entries.pop((namespace, key), None)
+            self._invalidated[(namespace, key)] = self._clock
+            self._invalidated.move_to_end((namespace, key))
+            while len(self._invalidated) > self.max_tombstones:
+                _, stamp = self._invalidated.popitem(last=False)
+                self._floor = max(self._floor, stamp)
+
+    def set_alias(self, namespace: str, alias: str, key: str) -> None:
+        """Map a secondary lookup key (e.g. a plate) to the document id it resolves to."""
+        with self._lock:
+            self._aliases[(namespace, alias)] = key
+            self._aliases.move_to_end((namespace, alias))
+            while len(self._aliases) > self.max_entries:
+                self._aliases.popitem(last=False)
+
+    def resolve_alias(self, namespace: str, alias: str) -> Optional[str]:
+        with self._lock:
+            return self._aliases.get((namespace, alias))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clock += 1
+            self._floor = self._clock
+            self._entries.clear()
+            self._aliases.clear()
+            self._invalidated.clear()
@@ -0,0 +1,464 @@
+"""Outbound notifications: routed by channel to pluggable transports, within each provider's limits.
+
+A notification for a person outside the app (email, WhatsApp) is stored as an
+``outbound_messages`` document and delivered by the worker through a
+``Dispatcher``:
+
+- messages are claimed with one update, so two jobs never send the same message;
+- each channel's transport gets its messages in batches of ``max_batch`` (one
+  provider request each), with at most ``concurrency`` requests in flight;
+- before a window of messages goes out, its tokens are taken from the channel's
+  bucket in one call. With a shared limiter the bucket is cluster-wide, so
+  every worker together stays under the provider's rate;
+- delivered and permanently rejected messages are recorded. The others stay
+  queued and the job is retried with backoff, up to ``MAX_ATTEMPTS`` per message.
+
+Per-channel counters (sent, failed, retried, throttled time and a latency
+histogram) are plain increments, so they add up across workers in shared state.
+"""
+import asyncio
+import logging
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Mapping, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import jobs
+import mailer
+import ratelimit
+import sync
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_COLLECTION = "outbound_messages"
+DISPATCH_JOB = "dispatch_notifications"
+# Messages handed to one dispatch job
+JOB_SIZE = 100
+MAX_ATTEMPTS = 5
+# A claim older than this belongs to a worker that died mid-send
+CLAIM_SECONDS = 300
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+
+INTERNAL = "internal"
+EMAIL = "email"
+WHATSAPP = "whatsapp"
+CHANNELS = (INTERNAL, EMAIL, WHATSAPP)
+
+# Upper bounds (ms) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def counter_names(channel: str) -> List[str]:
+    names = [f"notify.{channel}.{outcome}" for outcome in ("sent", "failed", "retried", "throttled_ms")]
+    names += [f"notify.{channel}.latency_le_{ms}ms" for ms in LATENCY_BUCKETS_MS]
+    return names + [f"notify.{channel}.latency_over_{LATENCY_BUCKETS_MS[-1]}ms"]
+
+
+def normalize_phone(raw: Optional[str], default_country: str = "57") -> Optional[str]:
+    """Digits in international format (no +) as WhatsApp expects; local Colombian mobiles get the country code."""
+    digits = re.sub(r"\D", "", raw or "")
+    if len(digits) == 10 and digits.startswith("3"):
+        digits = default_country + digits
+    return digits if 8 <= len(digits) <= 15 else None
+
+
+def new_message(channel: str, to: str, title: str, message: str, html: Optional[str] = None,
+                recipient_id: Optional[str] = None, related_entity_type: Optional[str] = None,
+                related_entity_id: Optional[str] = None, created_by: Optional[str] = None,
+                message_id: Optional[str] = None) -> dict:
+    return {
+        "id": message_id or str(uuid.uuid4()),
+        "channel": channel,
+        "to": to,
+        "recipient_id": recipient_id,
+        "title": title,
+        "message": message,
+        "html": html,
+        "related_entity_type": related_entity_type,
+        "related_entity_id": related_entity_id,
+        "status": QUEUED,
+        "attempts": 0,
+        "provider_message_id": None,
+        "last_error": None,
+        "created_by": created_by,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "sent_at": None,
+    }
+
+
+async def queue(db, messages: List[dict]) -> int:
+    """Store messages and queue the jobs that deliver them. Safe to repeat with the same message ids."""
+    if not messages:
+        return 0
+    try:
+        await db[MESSAGES_COLLECTION].insert_many(messages, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+    ids = [m["id"] for m in messages]
+    await jobs.enqueue(db, [
+        jobs.new_job(DISPATCH_JOB, {"message_ids": ids[start:start + JOB_SIZE]}, max_attempts=MAX_ATTEMPTS,
+                     dedupe_key=f"{DISPATCH_JOB}:{ids[start]}")
+        for start in range(0, len(ids), JOB_SIZE)
+    ])
+    return len(messages)
+
+
+# ==================== TRANSPORTS ====================
+@dataclass
+class Delivery:
+    ok: bool
+    # Worth trying again later (timeouts, 5xx, provider throttling)
+    retryable: bool = False
+    error: Optional[str] = None
+    provider_id: Optional[str] = None
+    # Provider asked us to slow down for this long
+    retry_after: float = 0.0
+
+
+class Transport:
+    """Sends messages of one channel. ``send_batch`` gets at most ``max_batch`` and returns one Delivery each."""
+
+    name: str = ""
+    max_batch: int = 1
+    concurrency: int = 4
+    policy = ratelimit.BucketPolicy.per_minute(60, 600)
+
+    async def send_batch(self, messages: List[dict]) -> List[Delivery]:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class InternalTransport(Transport):
+    """In-app notifications: one insert per batch into ``notifications``."""
+
+    name = INTERNAL
+    max_batch = 500
+    concurrency = 2
+    policy = ratelimit.BucketPolicy(capacity=5000, refill_per_second=5000)
+
+    def __init__(self, db):
+        self.db = db
+
+    async def send_batch(self, messages):
+        now = datetime.now(timezone.utc).isoformat()
+        docs = [{
+            "id": m["id"], "recipient_id": m["to"], "notification_type": INTERNAL, "title": m["title"],
+            "message": m["message"], "related_entity_type": m.get("related_entity_type"),
+            "related_entity_id": m.get("related_entity_id"), "read": False, "sent_at": now, "created_at": now,
+            **sync.stamp(),
+        } for m in messages]
+        try:
+            await self.db.notifications.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # A message redelivered after a crash is already in the inbox
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                return [Delivery(ok=False, retryable=True, error=str(e)) for _ in messages]
+        return [Delivery(ok=True, provider_id=m["id"]) for m in messages]
+
+
+class EmailTransport(Transport):
+    """SendGrid through ``mailer``; its client blocks, so each send runs in a thread."""
+
+    name = EMAIL
+
+    def __init__(self, policy: ratelimit.BucketPolicy, concurrency: int = 4):
+        self.policy = policy
+        self.concurrency = concurrency
+
+    async def send_batch(self, messages):
+        results = []
+        for m in messages:
+            html = m.get("html") or f"<h2>{m['title']}</h2><p>{m['message']}</p>"
+            try:
+                await asyncio.to_thread(mailer.send_email, m["to"], m["title"], html)
+                results.append(Delivery(ok=True))
+            except mailer.EmailError as e:
+                results.append(Delivery(ok=False, retryable=True, error=str(e)))
+        return results
+
+
+class WhatsAppTransport(Transport):
+    """WhatsApp Business Cloud API style: ``POST {base_url}/{phone_number_id}/messages`` per message.
+
+    Business-initiated messages outside a customer service window must use an
+    approved template; set ``template`` and the title and message become its
+    two body parameters. Without it, plain text messages are sent.
+    """
+
+    name = WHATSAPP
+
+    def __init__(self, token: str, phone_number_id: str, policy: ratelimit.BucketPolicy, concurrency: int = 8,
+                 base_url: str = "https://graph.facebook.com/v19.0", template: Optional[str] = None,
+                 language: str = "es", timeout: float = 10.0):
+        self.token = token
+        self.phone_number_id = phone_number_id
+        self.policy = policy
+        self.concurrency = concurrency
+        self.base_url = base_url.rstrip("/")
+        self.template = template
+        self.language = language
+        self.timeout = timeout
+        self._client = None
+
+    def _payload(self, m: dict) -> dict:
+        if self.template:
+            return {"messaging_product": "whatsapp", "to": m["to"], "type": "template", "template": {
+                "name": self.template, "language": {"code": self.language},
+                "components": [{"type": "body", "parameters": [{"type": "text", "text": m["title"]},
+                                                               {"type": "text", "text": m["message"]}]}],
+            }}
+        return {"messaging_product": "whatsapp", "to": m["to"], "type": "text",
+                "text": {"body": f"*{m['title']}*\n{m['message']}"}}
+
+    async def send_batch(self, messages):
+        import httpx
+
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, timeout=self.timeout, headers={"Authorization": f"Bearer {self.token}"},
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency))
+        results = []
+        for m in messages:
+            try:
+                response = await self._client.post(f"/{self.phone_number_id}/messages", json=self._payload(m))
+            except httpx.HTTPError as e:
+                results.append(Delivery(ok=False, retryable=True, error=f"{type(e).__name__}: {e}"))
+                continue
+            if response.status_code == 200:
+                ids = response.json().get("messages") or [{}]
+                results.append(Delivery(ok=True, provider_id=ids[0].get("id")))
+            elif response.status_code == 429 or response.status_code >= 500:
+                retry_after = float(response.headers.get("retry-after", 0) or 0)
+                results.append(Delivery(ok=False, retryable=True, error=f"HTTP {response.status_code}",
+                                        retry_after=retry_after))
+            else:
+                results.append(Delivery(ok=False, error=f"HTTP {response.status_code}: {response.text[:200]}"))
+        return results
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class FakeTransport(Transport):
+    """Records what would have been sent. For development and tests; ``fail_every`` makes every Nth send fail."""
+
+    def __init__(self, name: str, latency: float = 0.0, fail_every: int = 0, max_batch: int = 1,
+                 concurrency: int = 8, policy: Optional[ratelimit.BucketPolicy] = None):
+        self.name = name
+        self.latency = latency
+        self.fail_every = fail_every
+        self.max_batch = max_batch
+        self.concurrency = concurrency
+        self.policy = policy or ratelimit.BucketPolicy(capacity=1000, refill_per_second=1000)
+        self.sent: List[dict] = []
+        self._calls = 0
+
+    async def send_batch(self, messages):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        results = []
+        for m in messages:
+            self._calls += 1
+            if self.fail_every and self._calls % self.fail_every == 0:
+                results.append(Delivery(ok=False, retryable=True, error="fake failure"))
+            else:
+                self.sent.append(m)
+                results.append(Delivery(ok=True, provider_id=f"fake-{m['id']}"))
+        return results
+
+
+def transports_from_env(db, env: Mapping[str, str]) -> Dict[str, Transport]:
+    """Transports for the worker. ``NOTIFY_FAKE=1`` replaces email and WhatsApp with fakes."""
+    def policy(key: str, default: str) -> ratelimit.BucketPolicy:
+        burst, per_minute = env.get(key, default).split("/")
+        return ratelimit.BucketPolicy.per_minute(float(burst), float(per_minute))
+
+    email_policy = policy("EMAIL_RATE", "20/1200")
+    whatsapp_policy = policy("WHATSAPP_RATE", "80/4800")
+    transports: Dict[str, Transport] = {INTERNAL: InternalTransport(db)}
+    if env.get("NOTIFY_FAKE", "").lower() in ("1", "true", "yes"):
+        transports[EMAIL] = FakeTransport(EMAIL, policy=email_policy)
+        transports[WHATSAPP] = FakeTransport(WHATSAPP, policy=whatsapp_policy)
+        return transports
+    transports[EMAIL] = EmailTransport(email_policy, concurrency=int(env.get("EMAIL_CONCURRENCY", "4")))
+    if env.get("WHATSAPP_TOKEN") and env.get("WHATSAPP_PHONE_NUMBER_ID"):
+        transports[WHATSAPP] = WhatsAppTransport(
+            env["WHATSAPP_TOKEN"], env["WHATSAPP_PHONE_NUMBER_ID"], whatsapp_policy,
+            concurrency=int(env.get("WHATSAPP_CONCURRENCY", "8")),
+            base_url=env.get("WHATSAPP_API_URL", "https://graph.facebook.com/v19.0"),
+            template=env.get("WHATSAPP_TEMPLATE") or None)
+    return transports
+
+
+# ==================== RATE LIMITERS ====================
+class LocalLimiter:
+    """Buckets in this process: each worker gets the full rate."""
+
+    def __init__(self):
+        self.buckets = ratelimit.LocalBuckets()
+
+    async def take(self, key: str, policy: ratelimit.BucketPolicy, tokens: float):
+        return self.buckets.take(key, policy, tokens)
+
+
+class SharedLimiter:
+    """Buckets in shared state: all workers together get the rate."""
+
+    def __init__(self, shared):
+        self.shared = shared
+
+    async def take(self, key: str, policy: ratelimit.BucketPolicy, tokens: float):
+        return await self.shared.take(key, policy.capacity, policy.refill_per_second, tokens)
+
+
+# ==================== DISPATCHER ====================
+class Dispatcher:
+    def __init__(self, transports: Dict[str, Transport], limiter=None, counters=None):
+        self.transports = transports
+        self.limiter = limiter or LocalLimiter()
+        self.counters = counters
+        self._slots = {name: asyncio.Semaphore(t.concurrency) for name, t in transports.items()}
+        if counters is not None:
+            counters.declare(*(name for channel in transports for name in counter_names(channel)))
+
+    def _inc(self, name: str, amount: int = 1):
+        if self.counters is not None:
+            self.counters.inc(name, amount)
+
+    def _observe(self, channel: str, elapsed_ms: float, count: int):
+        bucket = next((f"latency_le_{ms}ms" for ms in LATENCY_BUCKETS_MS if elapsed_ms <= ms),
+                      f"latency_over_{LATENCY_BUCKETS_MS[-1]}ms")
+        self._inc(f"notify.{channel}.{bucket}", count)
+
+    async def _permit(self, transport: Transport, tokens: int):
+        """Wait until the channel's bucket has ``tokens``; one limiter call per attempt."""
+        waited = 0.0
+        while True:
+            allowed, retry_after = await self.limiter.take(f"notify:{transport.name}", transport.policy, tokens)
+            if allowed:
+                break
+            await asyncio.sleep(retry_after)
+            waited += retry_after
+        if waited:
+            self._inc(f"notify.{transport.name}.throttled_ms", int(waited * 1000))
+
+    async def _send(self, transport: Transport, batch: List[dict]) -> List[Delivery]:
+        async with self._slots[transport.name]:
+            started = time.perf_counter()
+            try:
+                results = await transport.send_batch(batch)
+            except Exception as e:
+                logger.exception(f"{transport.name} transport failed")
+                results = [Delivery(ok=False, retryable=True, error=f"{type(e).__name__}: {e}") for _ in batch]
+            self._observe(transport.name, (time.perf_counter() - started) * 1000, len(batch))
+        # A provider that asks us to slow down holds this channel's slot for that long
+        pause = max((r.retry_after for r in results), default=0.0)
+        if pause:
+            async with self._slots[transport.name]:
+                await asyncio.sleep(min(pause, 60))
+        return results
+
+    async def deliver(self, messages: List[dict]) -> Dict[str, Delivery]:
+        """Send messages on their channels; message id -> Delivery."""
+        by_channel: Dict[str, List[dict]] = {}
+        for m in messages:
+            by_channel.setdefault(m["channel"], []).append(m)
+        outcome: Dict[str, Delivery] = {}
+
+        async def run_channel(channel: str, pending: List[dict]):
+            transport = self.transports.get(channel)
+            if transport is None:
+                for m in pending:
+                    outcome[m["id"]] = Delivery(ok=False, error=f"Canal '{channel}' no configurado")
+                return
+            window = max(1, int(transport.policy.capacity))
+            for start in range(0, len(pending), window):
+                chunk = pending[start:start + window]
+                await self._permit(transport, len(chunk))
+                batches = [chunk[i:i + transport.max_batch] for i in range(0, len(chunk), transport.max_batch)]
+                results = await asyncio.gather(*(self._send(transport, batch) for batch in batches))
+                for batch, batch_results in zip(batches, results):
+                    for m, result in zip(batch, batch_results):
+                        outcome[m["id"]] = result
+
+        await asyncio.gather(*(run_channel(channel, pending) for channel, pending in by_channel.items()))
+        for m in messages:
+            result = outcome[m["id"]]
+            state = "sent" if result.ok else ("retried" if result.retryable else "failed")
+            self._inc(f"notify.{m['channel']}.{state}")
+        return outcome
+
+    async def close(self):
+        for transport in self.transports.values():
+            await transport.close()
+
+
+class DispatchIncomplete(Exception):
+    pass
+
+
+async def dispatch(db, dispatcher: Dispatcher, message_ids: List[str]) -> Dict[str, int]:
+    """Deliver the queued messages among ``message_ids`` and record the outcome of each.
+
+    Raises DispatchIncomplete when some can be retried, so the job backs off and tries again.
+    """
+    now = datetime.now(timezone.utc)
+    claim = str(uuid.uuid4())
+    claimable = {"$or": [{"status": QUEUED},
+                         {"status": SENDING, "claimed_until": {"$lt": now.isoformat()}}]}
+    await db[MESSAGES_COLLECTION].update_many(
+        {"id": {"$in": message_ids}, **claimable},
+        {"$set": {"status": SENDING, "claim": claim,
+                  "claimed_until": (now + timedelta(seconds=CLAIM_SECONDS)).isoformat()},
+         "$inc": {"attempts": 1}})
+    messages = await db[MESSAGES_COLLECTION].find({"claim": claim}, {"_id": 0}).to_list(len(message_ids))
+    if not messages:
+        return {"sent": 0, "failed": 0, "retry": 0}
+
+    outcome = await dispatcher.deliver(messages)
+    sent_at = datetime.now(timezone.utc).isoformat()
+    updates, counts = [], {"sent": 0, "failed": 0, "retry": 0}
+    for m in messages:
+        result = outcome[m["id"]]
+        if result.ok:
+            fields, counts["sent"] = {"status": SENT, "sent_at": sent_at, "provider_message_id": result.provider_id}, counts["sent"] + 1
+        elif result.retryable and m["attempts"] < MAX_ATTEMPTS:
+            fields, counts["retry"] = {"status": QUEUED, "last_error": result.error}, counts["retry"] + 1
+        else:
+            fields, counts["failed"] = {"status": FAILED, "last_error": result.error}, counts["failed"] + 1
+        updates.append(UpdateOne({"id": m["id"], "claim": claim}, {"$set": {**fields, "claim": None, "claimed_until": None}}))
+    await db[MESSAGES_COLLECTION].bulk_write(updates, ordered=False)
+    if counts["retry"]:
+        raise DispatchIncomplete(f"{counts['retry']} of {len(messages)} messages will be retried")
+    return counts
+
+
+async def stats(db) -> Dict[str, Dict[str, int]]:
+    """Message counts per channel and status."""
+    rows = await db[MESSAGES_COLLECTION].aggregate([
+        {"$group": {"_id": {"channel": "$channel", "status": "$status"}, "n": {"$sum": 1}}},
+    ]).to_list(None)
+    result: Dict[str, Dict[str, int]] = {}
+    for row in rows:
+        result.setdefault(row["_id"]["channel"], {})[row["_id"]["status"]] = row["n"]
+    return result
+
+
+async def create_indexes(db):
+    await db[MESSAGES_COLLECTION].create_index("id", unique=True)
+    await db[MESSAGES_COLLECTION].create_index("claim", sparse=True)
+    await db[MESSAGES_COLLECTION].create_index([("channel", 1), ("status", 1)])
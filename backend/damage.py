@@ -0,0 +1,260 @@
+"""Damage index: per vehicle and area, the latest condition and the history of what inspections found.
+
+    cd backend && python -m damage rebuild
+
+Inspections store their findings as an ``items`` array next to the photos, so
+"was this door already scratched?" meant reading every inspection of the car
+in full. ``damage_index`` holds one document per (vehicle, area):
+
+- ``latest``: the most recent observation;
+- ``history``: the last ``HISTORY_LIMIT`` observations, oldest first;
+- counters (inspections, damaged ones, first and last damage);
+- the vehicle's brand and model, so damage frequencies per area/brand/model
+  are one aggregation over this collection.
+
+``create_inspection`` queues the indexing as an outbox side effect in the same
+insert. The consumer then calls ``index_by_ids``. Every write is idempotent: an
+inspection already in an area's history isn't counted again, and ``latest``
+only moves forward in time, so redelivery is harmless. ``rebuild`` fills an
+empty index from every inspection, archived ones included, one vehicle at a
+time: each document is inserted once instead of updated per inspection. The
+API runs it at startup while the index is still empty.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import AsyncIterator, Dict, List
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+import archive
+import fanout
+
+logger = logging.getLogger("damage")
+
+DAMAGE_COLLECTION = "damage_index"
+# Observations kept per vehicle and area; a car inspected more often than this only loses the oldest
+HISTORY_LIMIT = 50
+BATCH_SIZE = 500
+# Fields an area can be grouped by in the stats
+GROUP_FIELDS = ("area", "brand", "model")
+
+_INSPECTION_PROJECTION = {"_id": 0, "id": 1, "branch_id": 1, "vehicle_id": 1, "created_at": 1, "items": 1}
+_VEHICLE_PROJECTION = {"_id": 0, "id": 1, "brand": 1, "model": 1}
+
+
+def entry_id(vehicle_id: str, area: str) -> str:
+    return f"{vehicle_id}:{area}"
+
+
+def observation(inspection: dict, item: dict) -> dict:
+    return {
+        "at": inspection["created_at"],
+        "inspection_id": inspection["id"],
+        "condition": item.get("condition"),
+        "has_damage": bool(item.get("has_damage")),
+        "notes": item.get("notes"),
+    }
+
+
+def updates(inspection: dict, vehicle: dict) -> List[UpdateOne]:
+    """The writes that fold one inspection into the index, to be sent in order."""
+    # An area listed twice in one inspection: the last one is what was recorded
+    items = {item["area"]: item for item in inspection.get("items") or [] if item.get("area")}
+    ops = []
+    for area, item in items.items():
+        key = {"id": entry_id(inspection["vehicle_id"], area), "branch_id": inspection.get("branch_id")}
+        seen = observation(inspection, item)
+        counters = {"$inc": {"inspections": 1, "damaged_inspections": int(seen["has_damage"])},
+                    "$push": {"history": {"$each": [seen], "$sort": {"at": 1}, "$slice": -HISTORY_LIMIT}}}
+        if seen["has_damage"]:
+            counters["$min"] = {"first_damaged_at": seen["at"]}
+            counters["$max"] = {"last_damaged_at": seen["at"]}
+        ops += [
+            UpdateOne(key, {"$setOnInsert": {"vehicle_id": inspection["vehicle_id"], "area": area,
+                                             "brand": vehicle.get("brand"), "model": vehicle.get("model")}}, upsert=True),
+            UpdateOne({**key, "history.inspection_id": {"$ne": inspection["id"]}}, counters),
+            UpdateOne({**key, "latest.at": {"$not": {"$gt": seen["at"]}}}, {"$set": {"latest": seen}}),
+        ]
+    return ops
+
+
+# ==================== INDEXING ====================
+async def index(db, inspections: List[dict]) -> int:
+    """Fold inspections (``{id, branch_id, vehicle_id, created_at, items}``) into the index; one read, one write."""
+    if not inspections:
+        return 0
+    vehicles = await fanout.find_by_ids(db, "vehicles", [i["vehicle_id"] for i in inspections], _VEHICLE_PROJECTION)
+    ops = [op for inspection in inspections for op in updates(inspection, vehicles.get(inspection["vehicle_id"]) or {})]
+    if ops:
+        # Ordered: each area's document has to exist before its counters and latest are applied
+        await db[DAMAGE_COLLECTION].bulk_write(ops, ordered=True)
+    return len(inspections)
+
+
+async def index_by_ids(db, inspection_ids: List[str]) -> int:
+    found = await db.inspections.find({"id": {"$in": inspection_ids}}, _INSPECTION_PROJECTION).to_list(len(inspection_ids))
+    return await index(db, found)
+
+
+def documents(inspections: List[dict], vehicle: dict) -> List[dict]:
+    """The index documents of one vehicle, computed from all of its inspections at once."""
+    areas: Dict[str, dict] = {}
+    for inspection in sorted(inspections, key=lambda i: i["created_at"]):
+        items = {item["area"]: item for item in inspection.get("items") or [] if item.get("area")}
+        for area, item in items.items():
+            seen = observation(inspection, item)
+            doc = areas.setdefault(area, {
+                "id": entry_id(inspection["vehicle_id"], area), "branch_id": inspection.get("branch_id"),
+                "vehicle_id": inspection["vehicle_id"], "area": area, "brand": vehicle.get("brand"),
+                "model": vehicle.get("model"), "inspections": 0, "damaged_inspections": 0, "history": [],
+            })
+            doc["inspections"] += 1
+            doc["history"].append(seen)
+            doc["latest"] = seen
+            if seen["has_damage"]:
+                doc["damaged_inspections"] += 1
+                doc.setdefault("first_damaged_at", seen["at"])
+                doc["last_damaged_at"] = seen["at"]
+    for doc in areas.values():
+        doc["history"] = doc["history"][-HISTORY_LIMIT:]
+    return list(areas.values())
+
+
+def _vehicle_key(inspection: dict) -> tuple:
+    # Same order as the cursors' sort: a missing branch sorts first, like null in MongoDB
+    return inspection.get("branch_id") or "", inspection["vehicle_id"]
+
+
+async def _vehicle_groups(*cursors) -> AsyncIterator[List[dict]]:
+    """All inspections of one vehicle at a time, merged from cursors sorted by (branch_id, vehicle_id)."""
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heads = [await anext(iterator, None) for iterator in iterators]
+    while any(head is not None for head in heads):
+        key = min(_vehicle_key(head) for head in heads if head is not None)
+        group = []
+        for i, iterator in enumerate(iterators):
+            while heads[i] is not None and _vehicle_key(heads[i]) == key:
+                group.append(heads[i])
+                heads[i] = await anext(iterator, None)
+        yield group
+
+
+async def _insert_vehicles(db, groups: List[List[dict]]) -> None:
+    vehicles = await fanout.find_by_ids(db, "vehicles", [group[0]["vehicle_id"] for group in groups], _VEHICLE_PROJECTION)
+    docs = [doc for group in groups for doc in documents(group, vehicles.get(group[0]["vehicle_id"]) or {})]
+    try:
+        await db[DAMAGE_COLLECTION].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+            raise
+        # An inspection indexed meanwhile (outbox) got there first: fold these vehicles in incrementally instead
+        taken = {docs[error["index"]]["vehicle_id"] for error in e.details["writeErrors"]}
+        await index(db, [inspection for group in groups if group[0]["vehicle_id"] in taken for inspection in group])
+
+
+async def rebuild(db) -> int:
+    """Build the index from every inspection, archived ones included, into an empty collection.
+
+    Inspections are read per vehicle (hot and archived merged), so each index document is computed
+    once and inserted, instead of updated once per inspection. ``db`` must see every branch.
+    """
+    order = [("branch_id", 1), ("vehicle_id", 1)]
+    fields = ("id", "created_at", "items")
+    cold = db[archive.archive_name("inspections")].find(
+        {}, {"_id": 0, "branch_id": 1, "vehicle_id": 1, **{f"{archive.TIMELINE_FIELD}.{f}": 1 for f in fields}}).sort(order)
+    hot = db.inspections.find({}, _INSPECTION_PROJECTION).sort(order)
+    archived = ({"branch_id": r.get("branch_id"), "vehicle_id": r.get("vehicle_id"), **r[archive.TIMELINE_FIELD]}
+                async for r in cold)
+    done, pending, batch = 0, 0, []
+    async for group in _vehicle_groups(archived, hot):
+        batch.append(group)
+        pending += len(group)
+        if pending >= BATCH_SIZE:
+            await _insert_vehicles(db, batch)
+            done, pending, batch = done + pending, 0, []
+    if batch:
+        await _insert_vehicles(db, batch)
+    return done + pending
+
+
+async def backfill(db) -> int:
+    """Build the index for inspections written before it existed: only while it is still empty."""
+    if await db[DAMAGE_COLLECTION].find_one({}, {"_id": 1}):
+        return 0
+    indexed = await rebuild(db)
+    if indexed:
+        logger.info(f"Indexed damage from {indexed} inspections")
+    return indexed
+
+
+async def create_indexes(db):
+    # (branch_id, id) is unique through tenancy.create_indexes
+    await db[DAMAGE_COLLECTION].create_index([("branch_id", 1), ("vehicle_id", 1)])
+    await db[DAMAGE_COLLECTION].create_index([("branch_id", 1), ("brand", 1), ("model", 1), ("area", 1)])
+
+
+# ==================== READS ====================
+async def vehicle_areas(db, vehicle_id: str) -> List[dict]:
+    return await db[DAMAGE_COLLECTION].find({"vehicle_id": vehicle_id}, {"_id": 0, "branch_id": 0}).sort("area", 1).to_list(None)
+
+
+def stats_pipeline(group_by: List[str], match: Dict[str, str]) -> List[dict]:
+    """Damage frequency per combination of ``group_by`` fields, most damaged first."""
+    return [
+        {"$match": match},
+        {"$group": {
+            "_id": {field: f"${field}" for field in group_by},
+            "vehicles": {"$sum": 1},
+            "damaged_vehicles": {"$sum": {"$cond": [{"$gt": ["$damaged_inspections", 0]}, 1, 0]}},
+            "currently_damaged": {"$sum": {"$cond": ["$latest.has_damage", 1, 0]}},
+            "inspections": {"$sum": "$inspections"},
+            "damaged_inspections": {"$sum": "$damaged_inspections"},
+        }},
+        {"$sort": {"damaged_inspections": -1, "_id": 1}},
+    ]
+
+
+async def stats(db, group_by: List[str], match: Dict[str, str]) -> List[dict]:
+    rows = await db[DAMAGE_COLLECTION].aggregate(stats_pipeline(group_by, match)).to_list(None)
+    for row in rows:
+        row.update(row.pop("_id"))
+        row["damage_rate"] = round(row["damaged_inspections"] / row["inspections"], 4) if row["inspections"] else 0.0
+    return rows
+
+
+# ==================== COMMAND LINE ====================
+async def main_async(args) -> dict:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'])
+    db = client[args.db_name or os.environ['DB_NAME']]
+    try:
+        await create_indexes(db)
+        # Counted again from scratch, so counts a bug or a manual edit threw off are fixed too
+        await db[DAMAGE_COLLECTION].delete_many({})
+        return {"indexed": await rebuild(db)}
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Rebuild the inspection damage index")
+    parser.add_argument("--mongo-url", help="Defaults to MONGO_URL")
+    parser.add_argument("--db-name", help="Defaults to DB_NAME")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild", help="Drop the index and build it again from every inspection")
+    print(json.dumps(asyncio.run(main_async(parser.parse_args(argv)))))
+
+
+if __name__ == "__main__":
+    main()
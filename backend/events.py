@@ -0,0 +1,283 @@
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import fanout
+import outbox
+
+EVENTS_COLLECTION = "status_events"
+# A sequence number allocated but still missing after this long belongs to a writer that died
+GAP_TIMEOUT = timedelta(seconds=30)
+# In counters: set once every document written before the log has its creation event
+BACKFILL_MARKER = "status_events_backfill"
+BACKFILL_LEASE = timedelta(minutes=10)
+# One checkpoint per entity type: its status counts folded up to a settled seq
+COUNTS_COLLECTION = "status_counts"
+COUNTS_PAGE_SIZE = 1000
+
+
+def new_event(entity_type: str, entity_id: str, from_status: Optional[str], to_status: str,
+              actor_id: Optional[str], cause: Optional[str] = None, data: Optional[dict] = None,
+              branch_id: Optional[str] = None) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "entity_type": entity_type,
+        "entity_id": entity_id,
+        "branch_id": branch_id,
+        "from_status": from_status,
+        "to_status": to_status,
+        "actor_id": actor_id,
+        "cause": cause,
+        "data": data or {},
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+async def append_events(db, events: List[dict], session=None) -> List[dict]:
+    """Assign dense, monotonically increasing ``seq`` numbers and insert the events."""
+    if not events:
+        return events
+    counter = await db.counters.find_one_and_update(
+        {"_id": EVENTS_COLLECTION}, {"$inc": {"seq": len(events)}},
+        upsert=True, return_document=ReturnDocument.AFTER, session=session
+    )
+    first = counter["seq"] - len(events) + 1
+    # Stamped after the allocation: any lower seq was allocated before this moment
+    logged = datetime.now(timezone.utc).isoformat()
+    for offset, event in enumerate(events):
+        event["seq"] = first + offset
+        event["logged_at"] = logged
+    await db[EVENTS_COLLECTION].insert_many(events, session=session)
+    for event in events:
+        event.pop("_id", None)
+    return events
+
+
+def logged_at(event: dict) -> datetime:
+    # Events from before ``logged_at`` was stamped only carry ``created_at``, which is never later
+    return datetime.fromisoformat(event.get("logged_at") or event["created_at"])
+
+
+def contiguous(events: List[dict], after_seq: int, now: Optional[datetime] = None) -> List[dict]:
+    """Trim ``events`` (sorted by seq) at the first gap that may still be filled.
+
+    Sequence numbers are allocated before the insert lands, so a reader can see
+    seq N+1 while N is still in flight. Stopping at the gap and retrying later
+    keeps incremental consumers from skipping N forever; gaps older than
+    GAP_TIMEOUT are crossed.
+    """
+    now = now or datetime.now(timezone.utc)
+    expected = after_seq + 1
+    result = []
+    for event in events:
+        if event["seq"] != expected and now - logged_at(event) < GAP_TIMEOUT:
+            break
+        result.append(event)
+        expected = event["seq"] + 1
+    return result
+
+
+async def read_events(db, after_seq: int = 0, limit: int = 500, entity_types: Optional[List[str]] = None,
+                      up_to_seq: Optional[int] = None) -> List[dict]:
+    query: dict = {"seq": {"$gt": after_seq} if up_to_seq is None else {"$gt": after_seq, "$lte": up_to_seq}}
+    if entity_types:
+        query["entity_type"] = {"$in": entity_types}
+        # Filtered reads can't see other types' seqs, so gaps are expected and not meaningful
+        return await db[EVENTS_COLLECTION].find(query, {"_id": 0}).sort("seq", 1).limit(limit).to_list(limit)
+    events = await db[EVENTS_COLLECTION].find(query, {"_id": 0}).sort("seq", 1).limit(limit).to_list(limit)
+    return contiguous(events, after_seq)
+
+
+async def last_seq(db, session=None) -> int:
+    counter = await db.counters.find_one({"_id": EVENTS_COLLECTION}, session=session)
+    return counter["seq"] if counter else 0
+
+
+async def settled_seq(db, now: Optional[datetime] = None) -> int:
+    """The highest seq that no missing event can still land below.
+
+    Seqs are allocated in order, so every seq below one logged more than
+    GAP_TIMEOUT ago was allocated earlier still: its event landed, or its writer
+    died. Walks back from the newest event, so it reads only the last
+    GAP_TIMEOUT of the log.
+    """
+    now = now or datetime.now(timezone.utc)
+    async for event in db[EVENTS_COLLECTION].find({}, {"_id": 0, "seq": 1, "logged_at": 1, "created_at": 1}).sort("seq", -1):
+        if now - logged_at(event) >= GAP_TIMEOUT:
+            return event["seq"]
+    return 0
+
+
+async def _lease_backfill(db) -> bool:
+    now = datetime.now(timezone.utc)
+    try:
+        # Upserting over a marker that is done, or leased by another process, is a duplicate key
+        await db.counters.update_one(
+            {"_id": BACKFILL_MARKER, "done": {"$ne": True}, "leased_until": {"$not": {"$gt": now.isoformat()}}},
+            {"$set": {"leased_until": (now + BACKFILL_LEASE).isoformat()}}, upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def backfill(db, sources: List[Tuple[str, str]], batch_size: int = 1000) -> int:
+    """Log creation events for documents written before the log existed, so folding it counts them too.
+
+    ``sources`` pairs a collection with its entity type. A document whose
+    earliest event starts from a status gets a creation event into that status;
+    one without events, into its current status. Documents whose creation event
+    still waits in the outbox are left to it. Branch-less events get their
+    document's branch. Runs once, under a lease, so workers starting together
+    don't log the same creation twice.
+    """
+    if not await _lease_backfill(db):
+        return 0
+    logged = 0
+    for collection, entity_type in sources:
+        cursor = db[collection].find({f"{outbox.OUTBOX_FIELD}.kind": {"$ne": "status_event"}},
+                                     {"_id": 0, "id": 1, "status": 1, "branch_id": 1})
+        batch = []
+        async for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                logged += await _backfill_batch(db, entity_type, batch)
+                batch = []
+        if batch:
+            logged += await _backfill_batch(db, entity_type, batch)
+    await db.counters.update_one({"_id": BACKFILL_MARKER}, {"$set": {"done": True}})
+    return logged
+
+
+async def _backfill_batch(db, entity_type: str, docs: List[dict]) -> int:
+    await db.counters.update_one({"_id": BACKFILL_MARKER},
+                                 {"$set": {"leased_until": (datetime.now(timezone.utc) + BACKFILL_LEASE).isoformat()}})
+    ids = [doc["id"] for doc in docs]
+    logged = await db[EVENTS_COLLECTION].find(
+        {"entity_type": entity_type, "entity_id": {"$in": ids}}, {"_id": 0, "entity_id": 1, "from_status": 1}
+    ).sort("seq", 1).to_list(None)
+    first: Dict[str, dict] = {}
+    created = set()
+    for event in logged:
+        first.setdefault(event["entity_id"], event)
+        if event["from_status"] is None:
+            created.add(event["entity_id"])
+    missing = []
+    for doc in docs:
+        if doc["id"] in created:
+            continue
+        status = first[doc["id"]]["from_status"] if doc["id"] in first else doc.get("status")
+        if status is not None:
+            missing.append(new_event(entity_type, doc["id"], None, status, None, cause="backfill", branch_id=doc.get("branch_id")))
+    branches: Dict[str, List[str]] = {}
+    for doc in docs:
+        if doc.get("branch_id"):
+            branches.setdefault(doc["branch_id"], []).append(doc["id"])
+    await fanout.gather(
+        append_events(db, missing),
+        *(db[EVENTS_COLLECTION].update_many({"entity_type": entity_type, "entity_id": {"$in": branch_ids}, "branch_id": None},
+                                            {"$set": {"branch_id": branch}})
+          for branch, branch_ids in branches.items()),
+    )
+    return len(missing)
+
+
+@asynccontextmanager
+async def transaction(db, enabled: bool):
+    """Yield a session inside a multi-document transaction, or None when disabled.
+
+    Transactions need a replica set; standalone deployments run the writes
+    without one and rely on the compare-and-set filters for consistency.
+    """
+    if not enabled:
+        yield None
+        return
+    async with await db.client.start_session() as session:
+        async with session.start_transaction():
+            yield session
+
+
+class StatusCountProjection:
+    """Per-branch, per-status document counts for one entity type, folded from the event log.
+
+    The counts up to ``settled_seq`` are a checkpoint stored in
+    ``COUNTS_COLLECTION``. Each ``refresh()`` folds the events settled since
+    into it and saves it, then applies the events still inside the gap window
+    to a copy. So a refresh reads the events since the last one, and the full
+    log is only read when no checkpoint exists yet (or by ``rebuild``).
+    Counting documents instead would race the log: a creation still in the
+    outbox, or a transition whose event is still being appended, is already in
+    the collection and would be counted again when its event lands.
+    """
+
+    def __init__(self, entity_type: str):
+        self.entity_type = entity_type
+        # branch id -> status -> count, up to ``seq``; None until loaded
+        self.counts: Dict[Optional[str], Dict[str, int]] = {}
+        self.seq: Optional[int] = None
+
+    async def load(self, db) -> None:
+        saved = await db[COUNTS_COLLECTION].find_one({"_id": self.entity_type})
+        self.counts, self.seq = {}, 0
+        if saved:
+            for row in saved["counts"]:
+                self.counts.setdefault(row["branch_id"], {})[row["status"]] = row["n"]
+            self.seq = saved["seq"]
+
+    def _document(self, seq: int, counts: Dict[Optional[str], Dict[str, int]]) -> dict:
+        # Rows rather than nested keys: branch ids aren't safe as field names (None, dots)
+        return {"seq": seq, "counts": [{"branch_id": branch, "status": status, "n": n}
+                                       for branch, by_status in counts.items() for status, n in by_status.items()]}
+
+    async def _fold(self, db, counts: Dict[Optional[str], Dict[str, int]], after_seq: int,
+                    up_to_seq: Optional[int] = None) -> None:
+        """Apply this type's events after ``after_seq`` (up to ``up_to_seq``) to ``counts``, a page at a time."""
+        while True:
+            page = await read_events(db, after_seq, COUNTS_PAGE_SIZE, [self.entity_type], up_to_seq=up_to_seq)
+            for event in page:
+                apply(counts, event)
+            if len(page) < COUNTS_PAGE_SIZE:
+                return
+            after_seq = page[-1]["seq"]
+
+    async def rebuild(self, db) -> None:
+        """Fold the whole log again and overwrite the checkpoint."""
+        seq, counts = await settled_seq(db), {}
+        await self._fold(db, counts, 0, seq)
+        await db[COUNTS_COLLECTION].replace_one({"_id": self.entity_type}, self._document(seq, counts), upsert=True)
+        self.counts, self.seq = counts, seq
+
+    async def _advance(self, db, seq: int) -> None:
+        counts = {branch: dict(by_status) for branch, by_status in self.counts.items()}
+        await self._fold(db, counts, self.seq, seq)
+        try:
+            # Only over the checkpoint this one started from; another worker may have saved a newer one
+            await db[COUNTS_COLLECTION].update_one({"_id": self.entity_type, "seq": self.seq},
+                                                   {"$set": self._document(seq, counts)}, upsert=True)
+        except DuplicateKeyError:
+            await self.load(db)
+            return
+        self.counts, self.seq = counts, seq
+
+    async def refresh(self, db) -> Dict[Optional[str], Dict[str, int]]:
+        """Counts by branch, then status. ``db`` must see every branch: the projection covers all of them."""
+        if self.seq is None:
+            await self.load(db)
+        settled = await settled_seq(db)
+        if settled > self.seq:
+            await self._advance(db, settled)
+        counts = {branch: dict(by_status) for branch, by_status in self.counts.items()}
+        await self._fold(db, counts, self.seq)
+        return counts
+
+
+def apply(counts: Dict[Optional[str], Dict[str, int]], event: dict) -> None:
+    """Fold one event into per-branch status counts: one more in the status it enters, one less in the one it left."""
+    by_status = counts.setdefault(event.get("branch_id"), {})
+    if event["from_status"]:
+        by_status[event["from_status"]] = by_status.get(event["from_status"], 0) - 1
+    by_status[event["to_status"]] = by_status.get(event["to_status"], 0) + 1
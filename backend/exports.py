@@ -0,0 +1,263 @@
+"""Accounting exports: approved quotes and finished service orders as CSV or XLSX, streamed.
+
+Documents are read from a cursor in batches of ``BATCH_SIZE``. Each batch gets
+its vehicles' plates in one query and is encoded and handed to the response.
+That response has no length and goes out with chunked transfer encoding.
+Whatever the date range, a worker holds one batch and one encoded chunk at a
+time. Archived documents are part of the export: the archive is read first
+(everything in it is older than what is still hot), then the hot collection,
+each in date order.
+
+XLSX is written without a spreadsheet library. A workbook is a zip of a few
+fixed XML parts and one worksheet. The worksheet is deflated as rows arrive,
+and its strings are inline, so no shared-string table has to be held until the
+end.
+"""
+import csv
+import io
+import re
+import zipfile
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+import archive
+import fanout
+
+BATCH_SIZE = 1000
+# Rows in one Excel worksheet, header included
+XLSX_MAX_ROWS = 1_048_576
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_VEHICLE_PROJECTION = {"_id": 0, "id": 1, "plate": 1}
+
+
+def _field(name: str) -> Callable[[dict], object]:
+    return lambda doc: doc.get(name)
+
+
+def _plate(doc: dict) -> str:
+    return (doc.get("vehicle") or {}).get("plate")
+
+
+@dataclass(frozen=True)
+class Export:
+    collection: str
+    # Filtered and sorted on; the same field the archive ages documents by
+    date_field: str
+    statuses: Tuple[str, ...]
+    columns: Tuple[Tuple[str, Callable[[dict], object]], ...]
+    projection: dict
+    filename: str
+
+    @property
+    def headers(self) -> List[str]:
+        return [header for header, _ in self.columns]
+
+    def row(self, doc: dict) -> list:
+        return [value(doc) for _, value in self.columns]
+
+    def hot_query(self, date_range: dict) -> dict:
+        return {"status": {"$in": list(self.statuses)}, **date_range}
+
+    def archive_query(self, date_range: dict) -> dict:
+        # Archive records keep the status at the top and the dates in their timeline entry
+        return {"status": {"$in": list(self.statuses)},
+                **{f"{archive.TIMELINE_FIELD}.{field}": condition for field, condition in date_range.items()}}
+
+
+EXPORTS: Dict[str, Export] = {export.collection: export for export in (
+    Export(
+        collection="quotes",
+        date_field="approved_at",
+        statuses=("approved",),
+        columns=(
+            ("id", _field("id")),
+            ("fecha_creacion", _field("created_at")),
+            ("fecha_aprobacion", _field("approved_at")),
+            ("cliente", _field("client_name")),
+            ("email", _field("client_email")),
+            ("placa", _plate),
+            ("servicios", lambda doc: "; ".join(item["service"] for item in doc.get("items") or [])),
+            ("subtotal", _field("subtotal")),
+            ("iva", _field("tax")),
+            ("total", _field("total")),
+        ),
+        projection={"_id": 0, "id": 1, "vehicle_id": 1, "created_at": 1, "approved_at": 1, "client_name": 1,
+                    "client_email": 1, "items.service": 1, "subtotal": 1, "tax": 1, "total": 1},
+        filename="cotizaciones",
+    ),
+    Export(
+        collection="service_orders",
+        date_field="completed_at",
+        statuses=("terminado",),
+        columns=(
+            ("id", _field("id")),
+            ("fecha_creacion", _field("created_at")),
+            ("fecha_inicio", _field("started_at")),
+            ("fecha_termino", _field("completed_at")),
+            ("placa", _plate),
+            ("servicios", lambda doc: "; ".join(doc.get("services") or [])),
+            ("tecnico", _field("assigned_technician_name")),
+            ("horas_estimadas", _field("estimated_hours")),
+            ("horas_reales", _field("actual_hours")),
+            ("cotizacion", _field("quote_id")),
+        ),
+        projection={"_id": 0, "id": 1, "vehicle_id": 1, "created_at": 1, "started_at": 1, "completed_at": 1,
+                    "services": 1, "assigned_technician_name": 1, "estimated_hours": 1, "actual_hours": 1, "quote_id": 1},
+        filename="ordenes",
+    ),
+)}
+
+
+# ==================== READING ====================
+async def count(db, export: Export, date_range: dict) -> int:
+    hot, cold = await fanout.gather(
+        db[export.collection].count_documents(export.hot_query(date_range)),
+        db[archive.archive_name(export.collection)].count_documents(export.archive_query(date_range)),
+    )
+    return hot + cold
+
+
+async def documents(db, export: Export, date_range: dict) -> AsyncIterator[dict]:
+    cold = db[archive.archive_name(export.collection)].find(
+        export.archive_query(date_range), {"_id": 0, archive.TIMELINE_FIELD: 1, archive.DATA_FIELD: 1},
+        batch_size=BATCH_SIZE).sort(f"{archive.TIMELINE_FIELD}.{export.date_field}", 1)
+    async for record in cold:
+        yield archive.document(export.collection, record)
+    hot = db[export.collection].find(export.hot_query(date_range), export.projection,
+                                     batch_size=BATCH_SIZE).sort(export.date_field, 1)
+    async for doc in hot:
+        yield doc
+
+
+async def rows(db, export: Export, date_range: dict) -> AsyncIterator[List[list]]:
+    """Export rows, a batch at a time."""
+    batch = []
+    async for doc in documents(db, export, date_range):
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            yield await _rows(db, export, batch)
+            batch = []
+    if batch:
+        yield await _rows(db, export, batch)
+
+
+async def _rows(db, export: Export, batch: List[dict]) -> List[list]:
+    vehicles = await fanout.find_by_ids(db, "vehicles", [doc.get("vehicle_id") for doc in batch], _VEHICLE_PROJECTION)
+    for doc in batch:
+        doc["vehicle"] = vehicles.get(doc.get("vehicle_id"))
+    return [export.row(doc) for doc in batch]
+
+
+# ==================== CSV ====================
+def _csv_cell(value):
+    # Text that a spreadsheet would run as a formula (client names are typed by hand)
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return "'" + value
+    return value
+
+
+async def csv_stream(batches: AsyncIterator[List[list]], headers: List[str]) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # Excel only reads the file as UTF-8 (accents in names) with a byte order mark
+    buffer.write("\ufeff")
+    writer.writerow(headers)
+    async for batch in batches:
+        writer.writerows([_csv_cell(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+# ==================== XLSX ====================
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_END = '</sheetData></worksheet>'
+# Control characters XML 1.0 can't carry at all
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _Sink:
+    """A write-only, unseekable file for ``zipfile``: keeps what it is given until drained."""
+
+    def __init__(self):
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f"<c><v>{value!r}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_rows(rows: List[list]) -> bytes:
+    return "".join(f"<row>{''.join(_xlsx_cell(v) for v in row)}</row>" for row in rows).encode("utf-8")
+
+
+async def xlsx_stream(batches: AsyncIterator[List[list]], headers: List[str], sheet_name: str) -> AsyncIterator[bytes]:
+    """A one-sheet workbook. Entries use data descriptors, since sizes aren't known until a part is written."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as book:
+        book.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        book.writestr("_rels/.rels", _ROOT_RELS)
+        book.writestr("xl/workbook.xml", _WORKBOOK.format(name=escape(sheet_name, {'"': "&quot;"})))
+        book.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        with book.open("xl/worksheets/sheet1.xml", "w") as sheet:
+            sheet.write(_SHEET_START.encode("utf-8") + _xlsx_rows([headers]))
+            async for batch in batches:
+                sheet.write(_xlsx_rows(batch))
+                chunk = sink.drain()
+                # Deflate may still be holding all of a small batch
+                if chunk:
+                    yield chunk
+            sheet.write(_SHEET_END.encode("utf-8"))
+    yield sink.drain()
@@ -0,0 +1,26 @@
+"""Helpers for handlers that need several database results at once.
+
+Independent operations are started together and awaited as a group, so a
+handler waits for the slowest of them instead of their sum. Operations that
+share a session run one after another: a session may not be used by
+concurrent operations.
+"""
+import asyncio
+from typing import Awaitable, Dict, List
+
+
+async def gather(*operations: Awaitable, session=None) -> list:
+    """Await independent operations concurrently (sequentially inside a session)."""
+    if session is None:
+        return list(await asyncio.gather(*operations))
+    return [await operation for operation in operations]
+
+
+async def find_by_ids(db, collection: str, ids: List[str], projection: dict, session=None) -> Dict[str, dict]:
+    """One ``$in`` query for many ``id`` values; returns the documents keyed by id."""
+    unique = list(dict.fromkeys(i for i in ids if i is not None))
+    if not unique:
+        return {}
+    docs = await db[collection].find({"id": {"$in": unique}}, projection, session=session).to_list(len(unique))
+    return {doc["id"]: doc for doc in docs}
+
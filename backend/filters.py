@@ -0,0 +1,288 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Mapping, Optional, Tuple
+
+# Deep skips make MongoDB walk and discard every preceding index entry
+MAX_SKIP = 10000
+PAGINATION_PARAMS = {"sort", "limit", "skip"}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _as_str(value: str) -> str:
+    return value
+
+
+def _as_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise FilterError(f"'{value}' no es un número válido")
+
+
+def _as_day(value: str) -> str:
+    return _parse_date(value).date().isoformat()
+
+
+def _as_date_start(value: str) -> str:
+    return _parse_date(value).isoformat() if len(value) > 10 else _as_day(value)
+
+
+def _as_date_end(value: str) -> str:
+    # Date-only upper bounds are inclusive: compare against the next day with $lt
+    parsed = _parse_date(value)
+    if len(value) <= 10:
+        return (parsed.date() + timedelta(days=1)).isoformat()
+    return parsed.isoformat()
+
+
+def _parse_date(value: str) -> datetime:
+    try:
+        if len(value) <= 10:
+            return datetime.combine(date.fromisoformat(value), datetime.min.time())
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise FilterError(f"'{value}' no es una fecha válida (use AAAA-MM-DD)")
+
+
+def date_range(field: str, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    """Query on ``field`` between ``start`` and ``end``, parsed like the ``*_from``/``*_to`` list filters."""
+    bounds = {}
+    if start:
+        bounds["$gte"] = _as_date_start(start)
+    if end:
+        bounds["$lt"] = _as_date_end(end)
+    if "$gte" in bounds and "$lt" in bounds and bounds["$gte"] >= bounds["$lt"]:
+        raise FilterError("La fecha inicial debe ser anterior a la final")
+    # A field that is set at all: documents that never reached it stay out of an open range too
+    return {field: bounds or {"$ne": None}}
+
+
+@dataclass(frozen=True)
+class FilterField:
+    """A whitelisted query parameter and how it maps onto a document field.
+
+    ``op`` is one of ``eq``, ``in`` (comma-separated values), ``gte``, ``lt``,
+    ``lte`` or ``contains`` (array field holds any of the comma-separated values).
+    """
+    field: str
+    op: str = "eq"
+    cast: Callable[[str], object] = _as_str
+    choices: Optional[Tuple[str, ...]] = None
+
+
+_OP_DESCRIPTIONS = {
+    "eq": "Igual a",
+    "in": "Uno o varios, separados por coma",
+    "contains": "Contiene alguno, separados por coma",
+    "gte": "Desde (incluido)",
+    "lt": "Hasta (incluido si es solo fecha)",
+    "lte": "Hasta (incluido)",
+}
+
+
+@dataclass(frozen=True)
+class ListQuery:
+    filter: dict
+    sort: List[Tuple[str, int]]
+    skip: int
+    limit: int
+
+
+@dataclass(frozen=True)
+class ListSpec:
+    """Declarative filter/sort contract for one list endpoint.
+
+    Every compiled query must be able to start from one of ``indexes``: at least
+    one filtered field or the sort field has to be the leading key of a declared
+    index, otherwise the shape is rejected instead of scanning the collection.
+    """
+    collection: str
+    filters: Dict[str, FilterField]
+    sorts: Tuple[str, ...]
+    default_sort: str
+    indexes: Tuple[Tuple[Tuple[str, int], ...], ...]
+    max_limit: int = 1000
+
+    def leading_fields(self) -> set:
+        return {keys[0][0] for keys in self.indexes}
+
+    def openapi(self) -> dict:
+        """The query parameters ``compile`` accepts, as the ``openapi_extra`` of the list route."""
+        parameters = []
+        for name, spec in self.filters.items():
+            schema = {"type": "number" if spec.cast is _as_float else "string"}
+            if spec.cast in (_as_day, _as_date_start, _as_date_end):
+                schema["format"] = "date"
+            if spec.choices and spec.op == "eq":
+                schema["enum"] = list(spec.choices)
+            description = _OP_DESCRIPTIONS[spec.op]
+            if spec.choices and spec.op != "eq":
+                description += f": {', '.join(spec.choices)}"
+            parameters.append({"name": name, "in": "query", "required": False, "schema": schema,
+                               "description": description})
+        parameters += [
+            {"name": "sort", "in": "query", "required": False,
+             "schema": {"type": "string", "enum": [f"{p}{s}" for s in self.sorts for p in ("", "-")],
+                        "default": self.default_sort},
+             "description": "Campo de orden; con '-' delante, descendente"},
+            {"name": "limit", "in": "query", "required": False,
+             "schema": {"type": "integer", "minimum": 1, "maximum": self.max_limit, "default": self.max_limit}},
+            {"name": "skip", "in": "query", "required": False,
+             "schema": {"type": "integer", "minimum": 0, "maximum": MAX_SKIP, "default": 0}},
+        ]
+        return {"parameters": parameters}
+
+    def compile(self, params: Mapping[str, str]) -> ListQuery:
+        query: dict = {}
+        for name, raw_value in params.items():
+            if name in PAGINATION_PARAMS:
+                continue
+            spec = self.filters.get(name)
+            if spec is None:
+                raise FilterError(f"Filtro no permitido: '{name}'")
+            if raw_value == "":
+                continue
+            self._apply(query, spec, raw_value)
+
+        sort_param = params.get("sort") or self.default_sort
+        direction = -1 if sort_param.startswith("-") else 1
+        sort_field = sort_param.lstrip("-+")
+        if sort_field not in self.sorts:
+            raise FilterError(f"Orden no permitido: '{sort_param}'")
+
+        limit = self._int_param(params, "limit", self.max_limit)
+        skip = self._int_param(params, "skip", 0)
+        if not 1 <= limit <= self.max_limit:
+            raise FilterError(f"'limit' debe estar entre 1 y {self.max_limit}")
+        if not 0 <= skip <= MAX_SKIP:
+            raise FilterError(f"'skip' debe estar entre 0 y {MAX_SKIP}; use filtros de fecha para paginar más atrás")
+
+        used = set(query) | {sort_field}
+        if not used & self.leading_fields():
+            raise FilterError("La combinación de filtros requiere recorrer toda la colección")
+        return ListQuery(filter=query, sort=[(sort_field, direction)], skip=skip, limit=limit)
+
+    @staticmethod
+    def _int_param(params: Mapping[str, str], name: str, default: int) -> int:
+        raw = params.get(name)
+        if raw in (None, ""):
+            return default
+        try:
+            return int(raw)
+        except ValueError:
+            raise FilterError(f"'{name}' debe ser un número entero")
+
+    @staticmethod
+    def _apply(query: dict, spec: FilterField, raw_value: str) -> None:
+        values = [v.strip() for v in raw_value.split(",") if v.strip()] if spec.op in ("in", "contains") else [raw_value]
+        if spec.choices:
+            invalid = [v for v in values if v not in spec.choices]
+            if invalid:
+                raise FilterError(f"Valor no permitido para '{spec.field}': {', '.join(invalid)}")
+        values = [spec.cast(v) for v in values]
+        if spec.op == "eq":
+            query[spec.field] = values[0]
+        elif spec.op in ("in", "contains"):
+            query[spec.field] = values[0] if len(values) == 1 else {"$in": values}
+        else:
+            query.setdefault(spec.field, {})
+            if not isinstance(query[spec.field], dict):
+                raise FilterError(f"Filtros contradictorios sobre '{spec.field}'")
+            query[spec.field]["$" + spec.op] = values[0]
+
+
+ORDER_STATUSES = ("agendado", "en_proceso", "en_revision", "terminado")
+VEHICLE_STATUSES = ("agendado", "ingresado", "con_tecnico", "en_proceso", "finalizado")
+QUOTE_STATUSES = ("pending", "approved")
+SERVICES = ("polarizado", "nanoceramica", "autobahn_black", "ultrasecure")
+
+SERVICE_ORDERS = ListSpec(
+    collection="service_orders",
+    filters={
+        "status": FilterField("status", "in", choices=ORDER_STATUSES),
+        "technician_id": FilterField("assigned_technician_id"),
+        "vehicle_id": FilterField("vehicle_id"),
+        "quote_id": FilterField("quote_id"),
+        "service": FilterField("services", "contains", choices=SERVICES),
+        "created_from": FilterField("created_at", "gte", _as_date_start),
+        "created_to": FilterField("created_at", "lt", _as_date_end),
+        "completed_from": FilterField("completed_at", "gte", _as_date_start),
+        "completed_to": FilterField("completed_at", "lt", _as_date_end),
+    },
+    sorts=("created_at", "completed_at", "started_at"),
+    default_sort="-created_at",
+    indexes=(
+        (("created_at", -1),),
+        (("status", 1), ("created_at", -1)),
+        (("assigned_technician_id", 1), ("status", 1), ("created_at", -1)),
+        (("vehicle_id", 1), ("created_at", -1)),
+        (("completed_at", -1),),
+    ),
+)
+
+QUOTES = ListSpec(
+    collection="quotes",
+    filters={
+        "status": FilterField("status", "in", choices=QUOTE_STATUSES),
+        "vehicle_id": FilterField("vehicle_id"),
+        "created_from": FilterField("created_at", "gte", _as_date_start),
+        "created_to": FilterField("created_at", "lt", _as_date_end),
+        "approved_from": FilterField("approved_at", "gte", _as_date_start),
+        "approved_to": FilterField("approved_at", "lt", _as_date_end),
+        "total_min": FilterField("total", "gte", _as_float),
+        "total_max": FilterField("total", "lte", _as_float),
+    },
+    sorts=("created_at", "approved_at", "total"),
+    default_sort="-created_at",
+    indexes=(
+        (("created_at", -1),),
+        (("status", 1), ("created_at", -1)),
+        (("vehicle_id", 1), ("created_at", -1)),
+        (("approved_at", -1),),
+    ),
+)
+
+APPOINTMENTS = ListSpec(
+    collection="appointments",
+    filters={
+        "date": FilterField("date", cast=_as_day),
+        "date_from": FilterField("date", "gte", _as_day),
+        "date_to": FilterField("date", "lte", _as_day),
+        "status": FilterField("status", "in", choices=ORDER_STATUSES),
+        "vehicle_id": FilterField("vehicle_id"),
+        "service": FilterField("services", "contains", choices=SERVICES),
+    },
+    sorts=("date", "created_at"),
+    default_sort="date",
+    indexes=(
+        (("date", 1), ("time_slot", 1)),
+        (("status", 1), ("date", 1)),
+        (("vehicle_id", 1), ("date", 1)),
+        (("created_at", -1),),
+    ),
+)
+
+VEHICLES = ListSpec(
+    collection="vehicles",
+    filters={
+        "status": FilterField("status", "in", choices=VEHICLE_STATUSES),
+        "technician_id": FilterField("assigned_technician_id"),
+        "brand": FilterField("brand"),
+        "created_from": FilterField("created_at", "gte", _as_date_start),
+        "created_to": FilterField("created_at", "lt", _as_date_end),
+    },
+    sorts=("created_at", "plate"),
+    default_sort="-created_at",
+    indexes=(
+        (("created_at", -1),),
+        (("status", 1), ("created_at", -1)),
+        (("assigned_technician_id", 1), ("created_at", -1)),
+        (("brand", 1), ("model", 1)),
+        (("plate", 1),),
+    ),
+)
+
+LIST_SPECS = (SERVICE_ORDERS, QUOTES, APPOINTMENTS, VEHICLES)
@@ -0,0 +1,280 @@
+"""Service-order duration forecasts learned from finished orders.
+
+An order's duration is ``completed_at - started_at`` (stored as
+``actual_hours``). The model is linear in the order's services: the hours of
+a combination are the sum of a per-service coefficient, fitted by least squares
+over every finished order. Each vehicle model then scales the estimate by how
+its own orders compare with the fit, shrunk towards 1 while it has few of
+them.
+
+Both parts only need running sums: ``XᵀX`` and ``Xᵀy`` over the service
+indicators, and per vehicle model the order count, total hours and summed
+indicators. ``rebuild`` computes them over the full history (hot and archived
+orders). ``refresh`` adds the orders finished since, and the periodic task calls
+it. After each update every (services, vehicle model) pair is evaluated into
+``table``, in microseconds. Suggestions are lookups in that table and never
+touch the database.
+
+NumPy is imported on first use, so importing this module costs nothing at start.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from pymongo import UpdateOne
+
+import archive
+import fanout
+import sync
+
+logger = logging.getLogger(__name__)
+
+US_PER_HOUR = 3_600_000_000
+# Orders left open longer than this (forgotten over a weekend) or clicked through in minutes
+# (entered after the fact) say nothing about how long the work took
+MIN_HOURS = 0.1
+MAX_HOURS = 72.0
+# Fewer finished orders than this with a service, and combinations with it get no suggestion
+MIN_SAMPLES = 5
+# A vehicle model counts as this many orders at the plain fit before its own orders move it
+MODEL_PRIOR = 10
+# Same reasoning as sync.SETTLE_WINDOW: orders completing right now may not have landed yet
+SETTLE_WINDOW = timedelta(seconds=5)
+BATCH_SIZE = 5000
+
+_ORDER_PROJECTION = {"_id": 0, "id": 1, "services": 1, "vehicle_id": 1, "started_at": 1, "completed_at": 1}
+
+
+def model_key(brand: Optional[str], model: Optional[str]) -> str:
+    return f"{brand or ''} {model or ''}".strip().lower()
+
+
+def durations_hours(started: Sequence[str], completed: Sequence[str]):
+    """``completed - started`` in hours for aligned lists of UTC ISO timestamps."""
+    import numpy as np
+
+    def parse(values):
+        # Stored as datetime.now(timezone.utc).isoformat(); numpy reads them once the offset is dropped
+        return np.array([v[:-6] if v.endswith("+00:00") else v.rstrip("Z") for v in values], dtype="datetime64[us]")
+
+    return (parse(completed) - parse(started)) / np.timedelta64(1, "h")
+
+
+def actual_hours(started_at: Optional[str], completed_at: Optional[str]) -> Optional[float]:
+    """``actual_hours`` of one order; None if it never went through ``en_proceso``."""
+    if not started_at or not completed_at:
+        return None
+    elapsed = datetime.fromisoformat(completed_at) - datetime.fromisoformat(started_at)
+    return round(elapsed / timedelta(hours=1), 2)
+
+
+async def fill_actual_hours(db, orders: List[dict], stamp: bool = True) -> int:
+    """Set ``actual_hours`` on finished orders given as ``{id, started_at, completed_at}``.
+
+    Only the backfill needs this: orders finished now get it with their transition.
+    Orders that never went through ``en_proceso`` have no start and are left alone.
+    """
+    timed = [o for o in orders if o.get("started_at") and o.get("completed_at")]
+    if not timed:
+        return 0
+    hours = durations_hours([o["started_at"] for o in timed], [o["completed_at"] for o in timed])
+    fields = sync.stamp if stamp else dict
+    await db.service_orders.bulk_write([
+        UpdateOne({"id": order["id"], "actual_hours": None}, {"$set": {"actual_hours": round(float(h), 2), **fields()}})
+        for order, h in zip(timed, hours)
+    ], ordered=False)
+    return len(timed)
+
+
+async def backfill_actual_hours(db, batch_size: int = 1000):
+    """Fill ``actual_hours`` on orders finished before it was recorded.
+
+    Not stamped for sync: history isn't worth sending to every device again.
+    """
+    cursor = db.service_orders.find({"status": "terminado", "actual_hours": None, "started_at": {"$ne": None}},
+                                    {"_id": 0, "id": 1, "started_at": 1, "completed_at": 1})
+    batch = []
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            await fill_actual_hours(db, batch, stamp=False)
+            batch = []
+    await fill_actual_hours(db, batch, stamp=False)
+
+
+class DurationForecaster:
+    """Suggested durations per service combination and vehicle model, kept in memory."""
+
+    def __init__(self, services: Sequence[str], min_samples: int = MIN_SAMPLES, model_prior: float = MODEL_PRIOR):
+        self.services = tuple(services)
+        self.index = {service: i for i, service in enumerate(self.services)}
+        self.min_samples = min_samples
+        self.model_prior = model_prior
+        self.models: Dict[str, int] = {}
+        # Running sums and the fit; None until the first orders are added
+        self.xtx = self.xty = self.model_n = self.model_y = self.model_x = self.coef = None
+        # [services bitmask, vehicle model] -> microseconds, 0 where there's no suggestion; last column: unknown model
+        self.table = None
+        self.samples = 0
+        self.watermark: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def _reset(self) -> None:
+        import numpy as np
+
+        size = len(self.services)
+        # Row m of ``combos`` holds the service indicators of bitmask m
+        self.combos = ((np.arange(2 ** size)[:, None] >> np.arange(size)) & 1).astype(float)
+        self.xtx = np.zeros((size, size))
+        self.xty = np.zeros(size)
+        self.models = {}
+        self.model_n = np.zeros(0)
+        self.model_y = np.zeros(0)
+        self.model_x = np.zeros((0, size))
+        self.samples = 0
+
+    def mask(self, services: Iterable[str]) -> int:
+        return sum(1 << self.index[s] for s in set(services) if s in self.index)
+
+    # ==================== LOOKUPS ====================
+    def suggest_us(self, services: Iterable[str], brand: Optional[str] = None, model: Optional[str] = None) -> Optional[int]:
+        if self.table is None:
+            return None
+        column = self.models.get(model_key(brand, model), self.table.shape[1] - 1)
+        value = int(self.table[self.mask(services), column])
+        return value or None
+
+    def suggest_hours(self, services: Iterable[str], brand: Optional[str] = None, model: Optional[str] = None) -> Optional[float]:
+        value = self.suggest_us(services, brand, model)
+        return round(value / US_PER_HOUR, 2) if value else None
+
+    def snapshot(self) -> dict:
+        return {
+            "samples": self.samples,
+            "vehicle_models": len(self.models),
+            "hours_per_service": {s: round(float(c), 2) for s, c in zip(self.services, self.coef)} if self.coef is not None else {},
+            "watermark": self.watermark,
+        }
+
+    # ==================== FITTING ====================
+    def add(self, masks: Sequence[int], hours, keys: Sequence[str]) -> None:
+        """Fold finished orders (services bitmask, hours, vehicle model key) into the running sums."""
+        import numpy as np
+
+        if self.xtx is None:
+            self._reset()
+        hours = np.asarray(hours, dtype=float)
+        masks = np.asarray(masks, dtype=np.int64)
+        keep = (hours >= MIN_HOURS) & (hours <= MAX_HOURS) & (masks > 0)
+        hours, masks = hours[keep], masks[keep]
+        keys = [key for key, kept in zip(keys, keep) if kept]
+        if not len(hours):
+            return
+        x = self.combos[masks]
+        self.xtx += x.T @ x
+        self.xty += x.T @ hours
+        for key in keys:
+            if key not in self.models:
+                self.models[key] = len(self.models)
+        grow = len(self.models) - len(self.model_n)
+        if grow:
+            self.model_n = np.pad(self.model_n, (0, grow))
+            self.model_y = np.pad(self.model_y, (0, grow))
+            self.model_x = np.pad(self.model_x, ((0, grow), (0, 0)))
+        rows = np.fromiter((self.models[key] for key in keys), dtype=np.int64, count=len(keys))
+        np.add.at(self.model_n, rows, 1)
+        np.add.at(self.model_y, rows, hours)
+        np.add.at(self.model_x, rows, x)
+        self.samples += len(hours)
+        self._fit()
+
+    def _fit(self) -> None:
+        import numpy as np
+
+        self.coef = np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+        # A model's predicted total over its own orders, against what they actually took
+        predicted = self.model_x @ self.coef
+        mean = np.divide(predicted, self.model_n, out=np.zeros_like(predicted), where=self.model_n > 0)
+        factor = np.divide(self.model_y + self.model_prior * mean, predicted + self.model_prior * mean,
+                           out=np.ones_like(predicted), where=predicted > 0)
+        base = self.combos @ self.coef
+        # Every service in the combination needs enough history
+        known = np.diag(self.xtx) >= self.min_samples
+        valid = (base > 0) & ~((self.combos > 0) & ~known).any(axis=1)
+        table = base[:, None] * np.append(factor, 1.0)[None, :] * US_PER_HOUR
+        self.table = np.where(valid[:, None], table, 0).astype(np.int64)
+
+    # ==================== LOADING ====================
+    async def _load(self, db, orders: List[dict]) -> None:
+        """``orders``: ``{services, vehicle_id, started_at, completed_at}``; vehicles are read in one query."""
+        orders = [o for o in orders if o.get("started_at") and o.get("completed_at")]
+        if not orders:
+            return
+        vehicles = await fanout.find_by_ids(db, "vehicles", [o["vehicle_id"] for o in orders],
+                                            {"_id": 0, "id": 1, "brand": 1, "model": 1})
+        keys = []
+        for order in orders:
+            vehicle = vehicles.get(order["vehicle_id"]) or {}
+            keys.append(model_key(vehicle.get("brand"), vehicle.get("model")))
+        hours = durations_hours([o["started_at"] for o in orders], [o["completed_at"] for o in orders])
+        self.add([self.mask(o.get("services") or ()) for o in orders], hours, keys)
+
+    async def _load_cursor(self, db, cursor) -> None:
+        batch = []
+        async for order in cursor:
+            batch.append(order)
+            if len(batch) >= BATCH_SIZE:
+                await self._load(db, batch)
+                batch = []
+        await self._load(db, batch)
+
+    async def rebuild(self, db) -> None:
+        """Fit over every finished order, archived ones included. ``db`` must see every branch.
+
+        Built aside and swapped in at the end, so lookups meanwhile use the previous fit.
+        """
+        fresh = DurationForecaster(self.services, self.min_samples, self.model_prior)
+        bound = (datetime.now(timezone.utc) - SETTLE_WINDOW).isoformat()
+        await fresh._load_cursor(db, db.service_orders.find(
+            {"status": "terminado", "completed_at": {"$lt": bound}}, _ORDER_PROJECTION))
+        # Archive records keep the same fields in their timeline entry
+        fields = ("services", "started_at", "completed_at")
+        cursor = db[archive.archive_name("service_orders")].find(
+            {}, {"_id": 0, "vehicle_id": 1, **{f"{archive.TIMELINE_FIELD}.{f}": 1 for f in fields}})
+        await fresh._load_cursor(db, ({"vehicle_id": r.get("vehicle_id"), **r[archive.TIMELINE_FIELD]} async for r in cursor))
+        for name in ("combos", "xtx", "xty", "models", "model_n", "model_y", "model_x", "coef", "table", "samples"):
+            setattr(self, name, getattr(fresh, name, None))
+        self.watermark = bound
+
+    async def refresh(self, db) -> None:
+        """Add the orders finished since the last rebuild or refresh."""
+        if self.watermark is None:
+            return await self.rebuild(db)
+        bound = (datetime.now(timezone.utc) - SETTLE_WINDOW).isoformat()
+        await self._load_cursor(db, db.service_orders.find(
+            {"status": "terminado", "completed_at": {"$gte": self.watermark, "$lt": bound}}, _ORDER_PROJECTION))
+        self.watermark = bound
+
+    async def _refresh_forever(self, db_provider, interval: float) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.refresh(db_provider())
+            except Exception:
+                logger.exception("Could not refresh duration forecasts")
+
+    def start(self, db_provider, interval: float = 300.0) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._refresh_forever(db_provider, interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
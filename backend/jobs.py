@@ -0,0 +1,186 @@
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+JOBS_COLLECTION = "jobs"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Finished jobs are kept this long for inspection, then removed by a TTL index
+RETENTION = timedelta(days=7)
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 15 * 60
+# Queue-head jobs a claim tries before giving up to a concurrent worker
+CLAIM_CANDIDATES = 5
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def new_job(kind: str, payload: dict, priority: int = 0, max_attempts: int = 5,
+            run_at: Optional[datetime] = None, dedupe_key: Optional[str] = None) -> dict:
+    """Build a job document. Higher ``priority`` runs first; ``dedupe_key`` makes enqueueing idempotent."""
+    now = _now()
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "payload": payload,
+        "priority": priority,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": (run_at or now).isoformat(),
+        "enqueued_at": now.isoformat(),
+        "lease_until": None,
+        "worker_id": None,
+        "started_at": None,
+        "finished_at": None,
+        "last_error": None,
+    }
+    if dedupe_key:
+        job["dedupe_key"] = dedupe_key
+    return job
+
+
+async def enqueue(db, jobs: Iterable[dict]) -> int:
+    """Insert jobs in one round trip; jobs whose ``dedupe_key`` already exists are skipped."""
+    jobs = list(jobs)
+    if not jobs:
+        return 0
+    try:
+        result = await db[JOBS_COLLECTION].insert_many(jobs, ordered=False)
+        return len(result.inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        return e.details.get("nInserted", len(jobs) - len(errors))
+
+
+async def claim(db, worker_id: str, kinds: List[str], lease_seconds: int) -> Optional[dict]:
+    """Lease the most urgent runnable job of one of ``kinds``; None when the queue is empty."""
+    if not kinds:
+        return None
+    now = _now()
+    lease = {"status": RUNNING, "worker_id": worker_id, "started_at": now.isoformat(),
+             "lease_until": (now + timedelta(seconds=lease_seconds)).isoformat()}
+    # Peek at the head of the queue, then compare-and-set one candidate. A sorted
+    # find_one_and_update would save the peek, but mongomock (used by the offline
+    # benchmarks) ignores its sort and would lease the wrong job.
+    candidates = await db[JOBS_COLLECTION].find(
+        {"status": QUEUED, "run_at": {"$lte": now.isoformat()}, "kind": {"$in": kinds}}, {"_id": 0, "id": 1}
+    ).sort([("priority", -1), ("run_at", 1)]).limit(CLAIM_CANDIDATES).to_list(CLAIM_CANDIDATES)
+    for candidate in candidates:
+        before = await db[JOBS_COLLECTION].find_one_and_update(
+            {"id": candidate["id"], "status": QUEUED},
+            {"$set": lease, "$inc": {"attempts": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if before is not None:
+            return {**before, **lease, "attempts": before["attempts"] + 1}
+    # Every candidate was taken by another worker; the caller polls again
+    return None
+
+
+async def extend_lease(db, job: dict, worker_id: str, lease_seconds: int) -> bool:
+    result = await db[JOBS_COLLECTION].update_one(
+        {"id": job["id"], "status": RUNNING, "worker_id": worker_id},
+        {"$set": {"lease_until": (_now() + timedelta(seconds=lease_seconds)).isoformat()}}
+    )
+    return result.matched_count == 1
+
+
+async def complete(db, job: dict, worker_id: str) -> None:
+    now = _now()
+    await db[JOBS_COLLECTION].update_one(
+        {"id": job["id"], "status": RUNNING, "worker_id": worker_id},
+        {"$set": {"status": DONE, "finished_at": now.isoformat(), "lease_until": None, "purge_at": now + RETENTION}}
+    )
+
+
+def queue_lag_seconds(job: dict, now: Optional[datetime] = None) -> float:
+    """How long a job waited past its ``run_at`` before a worker picked it up."""
+    return max(((now or _now()) - datetime.fromisoformat(job["run_at"])).total_seconds(), 0.0)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS))
+
+
+async def fail(db, job: dict, worker_id: str, error: str) -> str:
+    """Record a failed attempt: back off and requeue, or give up after ``max_attempts``."""
+    now = _now()
+    if job["attempts"] < job["max_attempts"]:
+        update = {"status": QUEUED, "run_at": (now + retry_delay(job["attempts"])).isoformat(),
+                  "lease_until": None, "worker_id": None, "last_error": error}
+    else:
+        update = {"status": FAILED, "finished_at": now.isoformat(), "lease_until": None,
+                  "last_error": error, "purge_at": now + RETENTION}
+    await db[JOBS_COLLECTION].update_one({"id": job["id"], "status": RUNNING, "worker_id": worker_id}, {"$set": update})
+    return update["status"]
+
+
+async def recover_expired(db) -> int:
+    """Requeue jobs whose worker died mid-run; ones out of attempts are marked failed."""
+    now = _now().isoformat()
+    expired = {"status": RUNNING, "lease_until": {"$lt": now}}
+    failed = await db[JOBS_COLLECTION].update_many(
+        {**expired, "$expr": {"$gte": ["$attempts", "$max_attempts"]}},
+        {"$set": {"status": FAILED, "finished_at": now, "lease_until": None,
+                  "last_error": "lease expired", "purge_at": _now() + RETENTION}}
+    )
+    requeued = await db[JOBS_COLLECTION].update_many(
+        expired, {"$set": {"status": QUEUED, "run_at": now, "lease_until": None, "worker_id": None,
+                           "last_error": "lease expired"}}
+    )
+    return failed.modified_count + requeued.modified_count
+
+
+async def stats(db) -> dict:
+    """Queue depth per status and kind, queue lag of the oldest runnable job and recent throughput."""
+    now = _now()
+    # Finished jobs pile up until the TTL removes them; only open work is grouped
+    by_status = await db[JOBS_COLLECTION].aggregate([
+        {"$match": {"status": {"$in": [QUEUED, RUNNING, FAILED]}}},
+        {"$group": {"_id": {"status": "$status", "kind": "$kind"}, "count": {"$sum": 1}}},
+    ]).to_list(None)
+    counts = {s: 0 for s in (QUEUED, RUNNING, FAILED)}
+    kinds: dict = {}
+    for row in by_status:
+        status, kind = row["_id"]["status"], row["_id"]["kind"]
+        counts[status] += row["count"]
+        kinds.setdefault(kind, {})[status] = row["count"]
+
+    oldest = await db[JOBS_COLLECTION].find(
+        {"status": QUEUED, "run_at": {"$lte": now.isoformat()}}, {"_id": 0, "run_at": 1}
+    ).sort("run_at", 1).limit(1).to_list(1)
+    lag = queue_lag_seconds(oldest[0], now) if oldest else 0.0
+
+    finished_last_minute = await db[JOBS_COLLECTION].count_documents(
+        {"status": DONE, "finished_at": {"$gte": (now - timedelta(minutes=1)).isoformat()}}
+    )
+    return {
+        "counts": counts,
+        "by_kind": kinds,
+        "queue_lag_seconds": round(lag, 3),
+        "done_last_minute": finished_last_minute,
+    }
+
+
+async def create_indexes(db) -> None:
+    jobs = db[JOBS_COLLECTION]
+    await jobs.create_index("id", unique=True)
+    await jobs.create_index([("status", 1), ("priority", -1), ("run_at", 1)])
+    await jobs.create_index([("status", 1), ("lease_until", 1)])
+    await jobs.create_index([("status", 1), ("run_at", 1)])
+    await jobs.create_index([("status", 1), ("finished_at", 1)])
+    await jobs.create_index("dedupe_key", unique=True, partialFilterExpression={"dedupe_key": {"$exists": True}})
+    await jobs.create_index("purge_at", expireAfterSeconds=0)
@@ -0,0 +1,35 @@
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class EmailError(Exception):
+    pass
+
+
+def api_key() -> str:
+    # Read at call time: the API and the worker load .env after importing this module
+    return os.environ.get('SENDGRID_API_KEY', '')
+
+
+def sender() -> str:
+    return os.environ.get('SENDER_EMAIL', 'noreply@polarizadosya.com')
+
+
+def send_email(to_email: str, subject: str, html_content: str) -> None:
+    """Send one email through SendGrid. Blocking; raises EmailError so the caller can retry."""
+    key = api_key()
+    if not key:
+        logger.warning("SendGrid API key not configured, skipping email")
+        return
+    from sendgrid import SendGridAPIClient
+    from sendgrid.helpers.mail import Mail
+
+    message = Mail(from_email=sender(), to_emails=to_email, subject=subject, html_content=html_content)
+    try:
+        response = SendGridAPIClient(key).send(message)
+    except Exception as e:
+        raise EmailError(str(e)) from e
+    if response.status_code != 202:
+        raise EmailError(f"SendGrid returned {response.status_code}")
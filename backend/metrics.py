@@ -0,0 +1,69 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+SHARED_PREFIX = "metrics:"
+
+
+class Counters:
+    """Process-local counters that are periodically added to shared totals.
+
+    ``inc`` only touches a dict, so it is safe on hot and rejection paths; the
+    cluster-wide view lags by at most one flush interval.
+    """
+
+    def __init__(self):
+        self._local: Dict[str, int] = defaultdict(int)
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def declare(self, *names: str) -> None:
+        """Report these counters (as 0) even before this process has incremented them."""
+        for name in names:
+            self._local.setdefault(name, 0)
+
+    def inc(self, name: str, amount: int = 1) -> None:
+        self._local[name] += amount
+        self._pending[name] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        return dict(sorted(self._local.items()))
+
+    async def flush(self, shared) -> None:
+        pending, self._pending = self._pending, defaultdict(int)
+        for name, amount in pending.items():
+            try:
+                await shared.incr(SHARED_PREFIX + name, amount)
+            except Exception:
+                # Keep the delta for the next flush rather than losing it
+                self._pending[name] += amount
+                logger.exception(f"Could not flush metric '{name}'")
+
+    async def totals(self, shared) -> Dict[str, int]:
+        names = sorted(self._local)
+        values = await asyncio.gather(*(shared.get(SHARED_PREFIX + name) for name in names))
+        return {name: value or 0 for name, value in zip(names, values)}
+
+    async def _flush_forever(self, shared, interval: float) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush(shared)
+
+    def start(self, shared, interval: float = 5.0) -> None:
+        if self._task is None:
+            # Created here: an app started again in another event loop (tests, benchmarks) gets a fresh one
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_forever(shared, interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+import fanout
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_FIELD = "_outbox"
+LEASE_FIELD = "_outbox_lease"
+OWNER_FIELD = "_outbox_owner"
+# Keep the bookkeeping fields out of any raw document handed to clients
+HIDDEN_FIELDS = {OUTBOX_FIELD: 0, LEASE_FIELD: 0, OWNER_FIELD: 0}
+PENDING = {OUTBOX_FIELD + ".0": {"$exists": True}}
+
+Handler = Callable[[object, List[dict]], Awaitable[None]]
+
+
+def entry(kind: str, payload: dict) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "payload": payload,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def push(entries: Iterable[dict]) -> dict:
+    """Update fragment that appends side effects to a document in the same write."""
+    return {"$push": {OUTBOX_FIELD: {"$each": list(entries)}}}
+
+
+class OutboxConsumer:
+    """Drains side effects that handlers stored next to the document they wrote.
+
+    Writers put pending work in the document's ``_outbox`` array as part of the
+    primary insert/update, so the request pays for one write and the work can't
+    be lost between two. This consumer leases documents with pending entries,
+    hands every entry of a kind to its handler as one batch, then pulls the
+    processed entries. Delivery is at-least-once: handlers must be idempotent
+    (entries carry a stable ``id`` for that).
+    """
+
+    def __init__(self, db_provider: Callable[[], object], collections: Iterable[str],
+                 batch_size: int = 200, poll_interval: float = 1.0, lease_seconds: int = 60):
+        self.db_provider = db_provider
+        self.collections = tuple(collections)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = timedelta(seconds=lease_seconds)
+        self.handlers: Dict[str, Handler] = {}
+        self.owner = str(uuid.uuid4())
+        self.processed = 0
+        self.failed_batches = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    async def _claim(self, db, collection: str) -> List[dict]:
+        now = datetime.now(timezone.utc)
+        candidates = await db[collection].find(
+            {**PENDING, "$or": [{LEASE_FIELD: None}, {LEASE_FIELD: {"$lt": now.isoformat()}}]},
+            {"_id": 0, "id": 1}
+        ).limit(self.batch_size).to_list(self.batch_size)
+        if not candidates:
+            return []
+        ids = [c["id"] for c in candidates]
+        await db[collection].update_many(
+            {"id": {"$in": ids}, "$or": [{LEASE_FIELD: None}, {LEASE_FIELD: {"$lt": now.isoformat()}}]},
+            {"$set": {LEASE_FIELD: (now + self.lease).isoformat(), OWNER_FIELD: self.owner}}
+        )
+        return await db[collection].find(
+            {"id": {"$in": ids}, OWNER_FIELD: self.owner, **PENDING},
+            {"_id": 0, "id": 1, OUTBOX_FIELD: 1}
+        ).to_list(self.batch_size)
+
+    async def run_once(self) -> int:
+        """Process one batch per collection. Returns how many entries were completed."""
+        db = self.db_provider()
+        # Collections share nothing, so their batches are claimed and delivered side by side
+        completed = sum(await fanout.gather(*(self._process(db, collection) for collection in self.collections)))
+        self.processed += completed
+        return completed
+
+    async def _process(self, db, collection: str) -> int:
+        docs = await self._claim(db, collection)
+        if not docs:
+            return 0
+        by_kind: Dict[str, List[dict]] = defaultdict(list)
+        for doc in docs:
+            for item in doc.get(OUTBOX_FIELD, []):
+                by_kind[item["kind"]].append({**item, "source_collection": collection, "source_id": doc["id"]})
+
+        delivered = await fanout.gather(*(self._deliver(db, kind, items) for kind, items in by_kind.items()))
+        done: Dict[str, List[str]] = defaultdict(list)
+        for items, ok in zip(by_kind.values(), delivered):
+            if ok:
+                for item in items:
+                    done[item["source_id"]].append(item["id"])
+
+        ops = [
+            UpdateOne({"id": doc["id"], OWNER_FIELD: self.owner},
+                      {"$pull": {OUTBOX_FIELD: {"id": {"$in": done.get(doc["id"], [])}}},
+                       "$unset": {LEASE_FIELD: "", OWNER_FIELD: ""}})
+            for doc in docs
+        ]
+        await db[collection].bulk_write(ops, ordered=False)
+        return sum(len(v) for v in done.values())
+
+    async def _deliver(self, db, kind: str, items: List[dict]) -> bool:
+        handler = self.handlers.get(kind)
+        if handler is None:
+            logger.error(f"No outbox handler for '{kind}', leaving {len(items)} entries pending")
+            return False
+        try:
+            await handler(db, items)
+        except Exception:
+            self.failed_batches += 1
+            logger.exception(f"Outbox handler '{kind}' failed; {len(items)} entries will be retried")
+            return False
+        return True
+
+    async def run_forever(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                completed = await self.run_once()
+            except Exception:
+                logger.exception("Outbox consumer iteration failed")
+                completed = 0
+            if completed:
+                # More may be waiting; go again right away
+                continue
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
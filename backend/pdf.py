@@ -0,0 +1,128 @@
+"""A small PDF writer: text in the standard Helvetica fonts, lines, filled boxes and JPEG images.
+
+Enough for business documents without a PDF dependency. Text uses the
+built-in Type 1 fonts with WinAnsiEncoding (cp1252), which covers Spanish, so
+nothing has to be embedded. JPEG data is embedded as-is (DCTDecode) and page
+content is deflated, which keeps a one-page quote to a few KB plus its images.
+
+Coordinates are PDF points from the bottom-left corner of the page.
+"""
+import zlib
+from typing import List, Optional, Tuple
+
+A4 = (595.28, 841.89)
+
+FONTS = {"regular": "Helvetica", "bold": "Helvetica-Bold"}
+
+# Helvetica advance widths (1/1000 em) for the characters measured most; others use the average
+_WIDTHS = {
+    " ": 278, ".": 278, ",": 278, ":": 278, "-": 333, "$": 556, "%": 889, "#": 556, "/": 278, "(": 333, ")": 333,
+    **{d: 556 for d in "0123456789"},
+}
+_AVERAGE_WIDTH = 520
+
+
+def text_width(text: str, size: float) -> float:
+    """Approximate rendered width; exact for digits and the punctuation used in amounts."""
+    return sum(_WIDTHS.get(ch, _AVERAGE_WIDTH) for ch in text) * size / 1000
+
+
+def _escape(text: str) -> bytes:
+    raw = text.encode("cp1252", "replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"").replace(b"\n", b" ")
+
+
+def _num(value: float) -> bytes:
+    return (b"%.2f" % value).rstrip(b"0").rstrip(b".") or b"0"
+
+
+class Page:
+    def __init__(self, size: Tuple[float, float]):
+        self.size = size
+        self._ops: List[bytes] = []
+        self.images: List[str] = []
+
+    def text(self, x: float, y: float, text: str, size: float = 10, font: str = "regular",
+             gray: float = 0.0, align: str = "left"):
+        if align == "right":
+            x -= text_width(text, size)
+        elif align == "center":
+            x -= text_width(text, size) / 2
+        self._ops.append(b"BT %s g /%s %s Tf %s %s Td (%s) Tj ET" % (
+            _num(gray), font.encode(), _num(size), _num(x), _num(y), _escape(text)))
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, width: float = 0.5, gray: float = 0.0):
+        self._ops.append(b"%s G %s w %s %s m %s %s l S" % (_num(gray), _num(width), _num(x1), _num(y1), _num(x2), _num(y2)))
+
+    def box(self, x: float, y: float, width: float, height: float, gray: float):
+        self._ops.append(b"%s g %s %s %s %s re f" % (_num(gray), _num(x), _num(y), _num(width), _num(height)))
+
+    def image(self, name: str, x: float, y: float, width: float, height: float):
+        """Draw an image added with ``Document.add_jpeg`` into the given box."""
+        self.images.append(name)
+        self._ops.append(b"q %s 0 0 %s %s %s cm /%s Do Q" % (_num(width), _num(height), _num(x), _num(y), name.encode()))
+
+    def content(self) -> bytes:
+        return b"\n".join(self._ops)
+
+
+class Document:
+    def __init__(self, title: str = "", size: Tuple[float, float] = A4):
+        self.title = title
+        self.size = size
+        self.pages: List[Page] = []
+        # name -> (jpeg bytes, width px, height px)
+        self._images = {}
+
+    def add_page(self) -> Page:
+        page = Page(self.size)
+        self.pages.append(page)
+        return page
+
+    def add_jpeg(self, data: bytes, width: int, height: int, name: Optional[str] = None) -> str:
+        name = name or f"Im{len(self._images) + 1}"
+        self._images[name] = (data, width, height)
+        return name
+
+    def render(self) -> bytes:
+        objects: List[bytes] = []
+
+        def add(body: bytes) -> int:
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(b"")  # filled in once the page tree exists
+        pages_id = add(b"")
+        font_ids = {key: add(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name.encode())
+                    for key, name in FONTS.items()}
+        image_ids = {}
+        for name, (data, width, height) in self._images.items():
+            image_ids[name] = add(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n%s\nendstream" % (width, height, len(data), data))
+        fonts = b" ".join(b"/%s %d 0 R" % (key.encode(), oid) for key, oid in font_ids.items())
+        page_ids = []
+        for page in self.pages:
+            stream = zlib.compress(page.content())
+            content_id = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(stream), stream))
+            xobjects = b" ".join(b"/%s %d 0 R" % (name.encode(), image_ids[name]) for name in dict.fromkeys(page.images))
+            page_ids.append(add(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s] /Contents %d 0 R "
+                b"/Resources << /Font << %s >> /XObject << %s >> >> >>"
+                % (pages_id, _num(page.size[0]), _num(page.size[1]), content_id, fonts, xobjects)))
+        objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % pid for pid in page_ids), len(page_ids))
+        objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+        info = add(b"<< /Title (%s) /Producer (PolarizadosYA!) >>" % _escape(self.title))
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+            len(objects) + 1, catalog, info, xref)
+        return bytes(out)
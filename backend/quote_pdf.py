@@ -0,0 +1,275 @@
+"""Printable quotes: layout, content hashing and the process pool that renders them.
+
+``render()`` is a pure function of the quote, its vehicle and the signature and
+ID photo bytes, so it can run in another process. Its output is stored in the
+blob store under ``content_hash()`` of everything it draws: a quote that
+hasn't changed is rendered once, and the hash doubles as the download's ETag.
+Bump ``RENDERER_VERSION`` whenever the layout changes so old renders stop matching.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+import blobs
+import fanout
+import pdf
+
+RENDERER_VERSION = 1
+KIND = "quote_pdf"
+CONTENT_TYPE = "application/pdf"
+
+QUOTE_FIELDS = ("id", "client_name", "client_email", "items", "subtotal", "tax", "total", "notes", "status",
+                "approved_at", "created_at")
+VEHICLE_FIELDS = ("plate", "brand", "model", "year", "color", "client_phone", "client_cedula")
+VEHICLE_PROJECTION = {"_id": 0, **{field: 1 for field in VEHICLE_FIELDS}}
+# Quote fields that may point at an upload to draw on the page, and its caption
+IMAGE_FIELDS = {"signature_url": "Firma del cliente", "cedula_photo_url": "Cédula"}
+UPLOAD_PREFIX = "/api/uploads/"
+
+SERVICE_NAMES = {"polarizado": "Polarizado", "nanoceramica": "Nanocerámica", "autobahn_black": "Autobahn Black CE",
+                 "ultrasecure": "Ultrasecure"}
+STATUS_NAMES = {"pending": "Pendiente", "approved": "Aprobada"}
+
+# Images are downscaled to this many pixels on their longest side before embedding
+IMAGE_MAX_PIXELS = 800
+
+# ==================== CONTENT HASH ====================
+def upload_id(url: Optional[str]) -> Optional[str]:
+    """The blob id behind an ``/api/uploads/{id}`` URL; None for anything else (e.g. legacy external links)."""
+    if url and url.startswith(UPLOAD_PREFIX):
+        return url[len(UPLOAD_PREFIX):]
+    return None
+
+def content_hash(quote: dict, vehicle: Optional[dict], image_hashes: Dict[str, str]) -> str:
+    """sha256 of everything the rendered PDF shows; ``image_hashes`` maps quote field -> blob sha256."""
+    material = {
+        "v": RENDERER_VERSION,
+        "quote": {f: quote.get(f) for f in QUOTE_FIELDS},
+        "vehicle": {f: (vehicle or {}).get(f) for f in VEHICLE_FIELDS},
+        "images": image_hashes,
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode()).hexdigest()
+
+# ==================== LAYOUT ====================
+def _money(value: float) -> str:
+    return "$" + f"{value:,.0f}".replace(",", ".")
+
+def _date(iso: Optional[str]) -> str:
+    if not iso:
+        return ""
+    try:
+        return datetime.fromisoformat(iso).strftime("%d/%m/%Y %H:%M")
+    except ValueError:
+        return iso
+
+def _jpeg(data: bytes):
+    """(jpeg bytes, width, height) for any image Pillow reads, flattened onto white and downscaled."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img = img.convert("RGBA")
+        img.thumbnail((IMAGE_MAX_PIXELS, IMAGE_MAX_PIXELS))
+        flat = Image.new("RGB", img.size, "white")
+        flat.paste(img, mask=img.getchannel("A"))
+        out = io.BytesIO()
+        flat.save(out, "JPEG", quality=85)
+        return out.getvalue(), flat.width, flat.height
+
+def render(quote: dict, vehicle: Optional[dict], images: Dict[str, bytes]) -> bytes:
+    """The quote as a PDF. ``images`` maps an ``IMAGE_FIELDS`` key to the image bytes. CPU-bound."""
+    doc = pdf.Document(title=f"Cotización {quote['id'][:8].upper()}")
+    width, height = doc.size
+    left, right = 50, width - 50
+    vehicle = vehicle or {}
+
+    page = doc.add_page()
+    y = height - 60
+
+    def new_page():
+        nonlocal page, y
+        page = doc.add_page()
+        y = height - 60
+
+    page.text(left, y, "PolarizadosYA!", size=20, font="bold")
+    page.text(right, y, "COTIZACIÓN", size=14, font="bold", align="right")
+    y -= 18
+    page.text(right, y, f"N.° {quote['id'][:8].upper()}", size=10, gray=0.35, align="right")
+    page.text(left, y, f"Fecha: {_date(quote.get('created_at'))}", size=10, gray=0.35)
+    y -= 14
+    page.text(left, y, f"Estado: {STATUS_NAMES.get(quote.get('status'), quote.get('status') or '')}", size=10, gray=0.35)
+    y -= 16
+    page.line(left, y, right, y, width=1)
+
+    y -= 24
+    page.text(left, y, "Cliente", size=11, font="bold")
+    page.text(width / 2, y, "Vehículo", size=11, font="bold")
+    client_lines = [quote.get("client_name") or "", quote.get("client_email") or "",
+                    vehicle.get("client_phone") or "", f"C.C. {vehicle['client_cedula']}" if vehicle.get("client_cedula") else ""]
+    vehicle_lines = [vehicle.get("plate") or "",
+                     " ".join(str(v) for v in (vehicle.get("brand"), vehicle.get("model"), vehicle.get("year")) if v),
+                     vehicle.get("color") or ""]
+    for offset in range(max(len(client_lines), len(vehicle_lines))):
+        y -= 14
+        if offset < len(client_lines) and client_lines[offset]:
+            page.text(left, y, client_lines[offset], size=10)
+        if offset < len(vehicle_lines) and vehicle_lines[offset]:
+            page.text(width / 2, y, vehicle_lines[offset], size=10)
+
+    columns = (left + 6, left + 100, right - 150, right - 85, right - 6)
+
+    def table_header():
+        nonlocal y
+        y -= 30
+        page.box(left, y - 6, right - left, 20, gray=0.9)
+        page.text(columns[0], y, "Servicio", size=9, font="bold")
+        page.text(columns[1], y, "Descripción", size=9, font="bold")
+        page.text(columns[2], y, "Cant.", size=9, font="bold", align="right")
+        page.text(columns[3], y, "Precio", size=9, font="bold", align="right")
+        page.text(columns[4], y, "Total", size=9, font="bold", align="right")
+        y -= 8
+
+    table_header()
+    for item in quote.get("items", []):
+        description = textwrap.wrap(item.get("description") or "", 48) or [""]
+        if y - 16 * len(description) < 120:
+            new_page()
+            table_header()
+        y -= 16
+        service = item.get("service")
+        page.text(columns[0], y, SERVICE_NAMES.get(service, str(service)), size=9)
+        page.text(columns[2], y, str(item.get("quantity", 1)), size=9, align="right")
+        page.text(columns[3], y, _money(item.get("price", 0)), size=9, align="right")
+        page.text(columns[4], y, _money(item.get("price", 0) * item.get("quantity", 1)), size=9, align="right")
+        for index, line in enumerate(description):
+            if index:
+                y -= 12
+            page.text(columns[1], y, line, size=9)
+        page.line(left, y - 6, right, y - 6, width=0.3, gray=0.75)
+
+    if y < 200:
+        new_page()
+    y -= 24
+    for label, key, font in (("Subtotal", "subtotal", "regular"), ("IVA (19%)", "tax", "regular"), ("Total", "total", "bold")):
+        page.text(columns[3], y, label, size=10, font=font, align="right")
+        page.text(columns[4], y, _money(quote.get(key, 0)), size=10, font=font, align="right")
+        y -= 16
+
+    if quote.get("notes"):
+        y -= 10
+        page.text(left, y, "Notas", size=10, font="bold")
+        for line in textwrap.wrap(quote["notes"], 95)[:12]:
+            y -= 13
+            page.text(left, y, line, size=9, gray=0.25)
+
+    drawn = [(field, images[field]) for field in IMAGE_FIELDS if images.get(field)]
+    if drawn:
+        box_width, box_height = (right - left - 20) / 2, 110
+        if y - box_height - 60 < 40:
+            new_page()
+        y -= 30 + box_height
+        for index, (field, data) in enumerate(drawn):
+            jpeg, px_width, px_height = _jpeg(data)
+            name = doc.add_jpeg(jpeg, px_width, px_height)
+            scale = min(box_width / px_width, box_height / px_height)
+            x = left + index * (box_width + 20)
+            page.image(name, x, y + box_height - px_height * scale, px_width * scale, px_height * scale)
+            page.line(x, y - 4, x + box_width, y - 4, width=0.5)
+            page.text(x, y - 16, IMAGE_FIELDS[field], size=9, gray=0.35)
+        if quote.get("approved_at"):
+            page.text(left, y - 32, f"Aprobada el {_date(quote['approved_at'])}", size=9, gray=0.35)
+
+    for number, each in enumerate(doc.pages, start=1):
+        each.text(width / 2, 30, f"Página {number} de {len(doc.pages)}", size=8, gray=0.5, align="center")
+    return doc.render()
+
+# ==================== RENDER POOL ====================
+class RenderPool:
+    """Runs ``render`` in worker processes, started on first use, so layout work never blocks the event loop."""
+
+    def __init__(self, workers: int = 2):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def render(self, quote: dict, vehicle: Optional[dict], images: Dict[str, bytes]) -> bytes:
+        if self._executor is None:
+            # spawn: forking a process that runs Motor's threads can deadlock the child
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return await asyncio.get_running_loop().run_in_executor(self._executor, render, quote, vehicle, images)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# ==================== STORED RENDERS ====================
+async def image_blobs(db, quote: dict) -> Dict[str, dict]:
+    """Quote field -> blob file document, for the images stored in the blob store."""
+    ids = {field: upload_id(quote.get(field)) for field in IMAGE_FIELDS}
+    ids = {field: blob_id for field, blob_id in ids.items() if blob_id}
+    if not ids:
+        return {}
+    # The worker reads without a branch-scoped handle; only the quote's own branch counts
+    found = await db[blobs.FILES].find({"_id": {"$in": list(ids.values())}, blobs.BRANCH_FIELD: quote.get("branch_id")}).to_list(len(ids))
+    by_id = {doc["_id"]: doc for doc in found}
+    return {field: by_id[blob_id] for field, blob_id in ids.items() if blob_id in by_id}
+
+def quote_hash(quote: dict, vehicle: Optional[dict], files: Dict[str, dict]) -> str:
+    return content_hash(quote, vehicle, {field: doc["metadata"]["sha256"] for field, doc in files.items()})
+
+async def find_render(db, quote_id: str, digest: str) -> Optional[dict]:
+    return await db[blobs.FILES].find_one({"metadata.kind": KIND, "metadata.quote_id": quote_id, "metadata.content_hash": digest})
+
+async def render_and_store(db, pool: RenderPool, quote: dict, vehicle: Optional[dict],
+                           files: Dict[str, dict], digest: str) -> dict:
+    """Render the quote and store it under ``digest``; returns the blob file document."""
+    images = {}
+    for field, file_doc in files.items():
+        images[field] = b"".join([chunk async for chunk in blobs.read_chunks(db, file_doc)])
+    data = await pool.render(quote, vehicle, images)
+    try:
+        return await blobs.put(db, data, f"cotizacion-{quote['id'][:8]}.pdf", CONTENT_TYPE,
+                               {"kind": KIND, "quote_id": quote["id"], "content_hash": digest, "branch_id": quote.get("branch_id")})
+    except DuplicateKeyError:
+        # A concurrent first download stored the same render first; its chunks are already gone (blobs.put aborts)
+        return await find_render(db, quote["id"], digest)
+
+async def ensure_rendered(db, pool: RenderPool, quote_id: str) -> Optional[dict]:
+    """Make sure the current version of a quote has a stored render (used to pre-render approved quotes)."""
+    quote = await db.quotes.find_one({"id": quote_id}, {"_id": 0})
+    if not quote:
+        return None
+    vehicle, files = await fanout.gather(
+        db.vehicles.find_one({"id": quote["vehicle_id"]}, VEHICLE_PROJECTION), image_blobs(db, quote))
+    digest = quote_hash(quote, vehicle, files)
+    return await find_render(db, quote_id, digest) or await render_and_store(db, pool, quote, vehicle, files, digest)
+
+async def remove_duplicate_renders(db) -> int:
+    """Keep one stored render per quote and content hash (concurrent renders could store several)."""
+    groups = await db[blobs.FILES].aggregate([
+        {"$match": {"metadata.kind": KIND}},
+        {"$group": {"_id": {"quote_id": "$metadata.quote_id", "content_hash": "$metadata.content_hash"},
+                    "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]).to_list(None)
+    extra = [blob_id for group in groups for blob_id in group["ids"][1:]]
+    if extra:
+        await fanout.gather(db[blobs.FILES].delete_many({"_id": {"$in": extra}}),
+                            db[blobs.CHUNKS].delete_many({"files_id": {"$in": extra}}))
+    return len(extra)
+
+async def create_indexes(db):
+    # Superseded by the unique index below
+    if "metadata.content_hash_1" in await db[blobs.FILES].index_information():
+        await db[blobs.FILES].drop_index("metadata.content_hash_1")
+    await remove_duplicate_renders(db)
+    # One render per quote version: a concurrent first download that loses the insert serves the winner's copy.
+    # Sparse leaves out uploads, which have neither field
+    await db[blobs.FILES].create_index([("metadata.quote_id", 1), ("metadata.content_hash", 1)], unique=True, sparse=True)
@@ -0,0 +1,147 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import shared_state
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    capacity: float
+    refill_per_second: float
+
+    @classmethod
+    def per_minute(cls, burst: float, per_minute: float) -> "BucketPolicy":
+        return cls(capacity=burst, refill_per_second=per_minute / 60)
+
+
+class RateLimited(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"{reason}: retry in {self.retry_after}s")
+
+
+class LocalBuckets:
+    """Token buckets in this process only, bounded by LRU eviction. No I/O at all."""
+
+    def __init__(self, max_keys: int = 50_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, policy: BucketPolicy, tokens: float = 1) -> Tuple[bool, float]:
+        now = time.monotonic()
+        left, updated = self._buckets.get(key, (policy.capacity, now))
+        allowed, left, retry_after = shared_state.refill_bucket(left, updated, now, policy.capacity,
+                                                                 policy.refill_per_second, tokens)
+        self._buckets[key] = (left, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class AuthGuard:
+    """Rate limits and lockouts for login/registration, checked before any password or user lookup.
+
+    Each attempt first passes process-local buckets, so a flood from one address
+    is turned away without touching the database or shared state. Attempts that
+    get through are then checked against the cluster-wide buckets and lockout in
+    ``shared``. Repeated failed logins for one email lock it out with an
+    exponentially growing delay.
+    """
+
+    def __init__(self, shared: shared_state.SharedState, counters, policies: Dict[str, BucketPolicy],
+                 max_failures: int = 5, failure_window: float = 900, lockout_base: float = 30,
+                 lockout_max: float = 900):
+        self.shared = shared
+        self.counters = counters
+        self.policies = policies
+        self.max_failures = max_failures
+        self.failure_window = failure_window
+        self.lockout_base = lockout_base
+        self.lockout_max = lockout_max
+        self.local = LocalBuckets()
+        # email -> monotonic time the lockout ends, so known lockouts are rejected without I/O
+        self._lockouts: "OrderedDict[str, float]" = OrderedDict()
+        counters.declare(*(f"auth.{action}.{outcome}" for action in ("login", "register")
+                           for outcome in ("allowed", "rejected_ip", "rejected_email")),
+                         "auth.login.locked_out", "auth.login.failed", "auth.login.lockouts")
+
+    def _reject(self, action: str, outcome: str, retry_after: float):
+        self.counters.inc(f"auth.{action}.{outcome}")
+        raise RateLimited(outcome, retry_after)
+
+    def _locked_locally(self, email: str) -> Optional[float]:
+        until = self._lockouts.get(email)
+        if until is None:
+            return None
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            del self._lockouts[email]
+            return None
+        return remaining
+
+    def _remember_lockout(self, email: str, seconds: float) -> None:
+        self._lockouts[email] = time.monotonic() + seconds
+        self._lockouts.move_to_end(email)
+        while len(self._lockouts) > 50_000:
+            self._lockouts.popitem(last=False)
+
+    async def check(self, action: str, ip: str, email: str) -> None:
+        """Raise RateLimited if this attempt must be turned away."""
+        email = email.lower()
+        ip_policy, email_policy = self.policies[f"{action}_ip"], self.policies[f"{action}_email"]
+
+        # Cheap path: process-local state only
+        if action == "login":
+            remaining = self._locked_locally(email)
+            if remaining:
+                self.counters.inc("auth.login.locked_out")
+                raise RateLimited("locked_out", remaining)
+        allowed, retry_after = self.local.take(f"{action}:ip:{ip}", ip_policy)
+        if not allowed:
+            self._reject(action, "rejected_ip", retry_after)
+        allowed, retry_after = self.local.take(f"{action}:email:{email}", email_policy)
+        if not allowed:
+            self._reject(action, "rejected_email", retry_after)
+
+        # Cluster-wide view for attempts spread over several workers
+        if action == "login":
+            lockout = await self.shared.get(f"auth:lockout:{email}")
+            if lockout and lockout["until"] > time.time():
+                remaining = lockout["until"] - time.time()
+                self._remember_lockout(email, remaining)
+                self.counters.inc("auth.login.locked_out")
+                raise RateLimited("locked_out", remaining)
+        allowed, retry_after = await self.shared.take(f"auth:{action}:ip:{ip}", ip_policy.capacity,
+                                                      ip_policy.refill_per_second)
+        if not allowed:
+            self._reject(action, "rejected_ip", retry_after)
+        allowed, retry_after = await self.shared.take(f"auth:{action}:email:{email}", email_policy.capacity,
+                                                      email_policy.refill_per_second)
+        if not allowed:
+            self._reject(action, "rejected_email", retry_after)
+        self.counters.inc(f"auth.{action}.allowed")
+
+    def lockout_seconds(self, failures: int) -> float:
+        if failures < self.max_failures:
+            return 0.0
+        return min(self.lockout_base * 2 ** (failures - self.max_failures), self.lockout_max)
+
+    async def record_failure(self, email: str) -> float:
+        """Count a failed login; returns the lockout it triggered in seconds (0 for none)."""
+        email = email.lower()
+        self.counters.inc("auth.login.failed")
+        failures = await self.shared.incr(f"auth:failures:{email}", ttl=self.failure_window)
+        seconds = self.lockout_seconds(failures)
+        if seconds:
+            self.counters.inc("auth.login.lockouts")
+            await self.shared.set(f"auth:lockout:{email}", {"until": time.time() + seconds}, ttl=seconds)
+            self._remember_lockout(email, seconds)
+        return seconds
+
+    async def record_success(self, email: str) -> None:
+        email = email.lower()
+        await self.shared.delete(f"auth:failures:{email}")
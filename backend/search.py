@@ -0,0 +1,107 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+# Deepest result a page can reach: every rank tier sorts at most this many matches
+MAX_DEPTH = 500
+MIN_QUERY_LENGTH = 2
+
+# Stored terms are tagged with the field they came from, so each rank tier is its own index range
+PLATE, ID, WORD, NAME = "p:", "i:", "w:", "n:"
+ANY_FIELD = (PLATE, ID, WORD, NAME)
+# Within a tier, by client name then plate
+SORT = [("search_name", 1), ("plate", 1)]
+HIDDEN_FIELDS = {"search_terms": 0, "search_name": 0}
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_NON_DIGIT = re.compile(r"\D+")
+
+def normalize_text(value: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse everything that isn't a letter or digit to spaces."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    ascii_only = "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+    return _NON_ALNUM.sub(" ", ascii_only).strip()
+
+
+def normalize_plate(value: Optional[str]) -> str:
+    return normalize_text(value).replace(" ", "")
+
+
+def normalize_digits(value: Optional[str]) -> str:
+    return _NON_DIGIT.sub("", value or "")
+
+
+def search_terms(vehicle: dict) -> List[str]:
+    """Prefix-searchable keys stored on each vehicle under ``search_terms`` (multikey index)."""
+    terms = set()
+    plate = normalize_plate(vehicle.get("plate"))
+    if plate:
+        terms.add(PLATE + plate)
+    name = normalize_text(vehicle.get("client_name"))
+    if name:
+        terms.update(WORD + word for word in name.split())
+        # The full name lets "juan pe" match as a single prefix too
+        terms.add(NAME + name.replace(" ", ""))
+    for field in ("client_phone", "client_cedula"):
+        digits = normalize_digits(vehicle.get(field))
+        if digits:
+            terms.add(ID + digits)
+            # Colombian mobiles are often typed without the leading country code
+            if field == "client_phone" and digits.startswith("57") and len(digits) > 10:
+                terms.add(ID + digits[2:])
+    return sorted(terms)
+
+
+def search_fields(vehicle: dict) -> dict:
+    """What to ``$set`` on a vehicle whenever its plate, client name, phone or cédula is written."""
+    return {"search_terms": search_terms(vehicle), "search_name": normalize_text(vehicle.get("client_name"))}
+
+
+def query_tokens(q: str) -> List[str]:
+    tokens = normalize_text(q).split()
+    if not tokens:
+        return []
+    # Digits-only input is a phone/cédula: glue the groups ("300 123 4567" -> "3001234567")
+    if all(t.isdigit() for t in tokens):
+        return ["".join(tokens)]
+    return tokens
+
+
+def _prefix(tags, token: str) -> dict:
+    clauses = [{"search_terms": {"$regex": "^" + re.escape(tag + token)}} for tag in tags]
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+def _all(clauses: List[dict]) -> dict:
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def build_query(tokens: List[str]) -> dict:
+    """Every token must prefix-match some search term; anchored regexes walk the index.
+
+    Multi-token input also matches as one glued prefix so "abc 123" finds plate
+    ABC123 and "juan pe" finds the full-name key "juanperez".
+    """
+    if len(tokens) == 1:
+        return _prefix(ANY_FIELD, tokens[0])
+    return {"$or": [_all([_prefix(ANY_FIELD, t) for t in tokens]), _prefix(ANY_FIELD, "".join(tokens))]}
+
+
+def tier_queries(tokens: List[str]) -> List[dict]:
+    """The matches of ``build_query`` split into rank tiers, best first; each excludes the ones above it.
+
+    Exact plate, exact phone/cédula, plate prefix, phone/cédula prefix, every
+    token prefixing a word of the client name, then everything else.
+    """
+    joined = "".join(tokens)
+    tiers = [
+        {"search_terms": PLATE + joined},
+        {"search_terms": ID + joined},
+        _prefix((PLATE,), joined),
+        _prefix((ID,), joined),
+        _all([_prefix((WORD,), t) for t in tokens]),
+        build_query(tokens),
+    ]
+    return [{"$and": [tier, {"$nor": tiers[:i]}]} if i else tier for i, tier in enumerate(tiers)]
@@ -0,0 +1,81 @@
+import os
+from dataclasses import dataclass, field
+from typing import Mapping, Optional, Tuple
+
+
+def _flag(value: Optional[str], default: bool) -> bool:
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
+
+@dataclass
+class Settings:
+    """Everything the API process reads from its environment.
+
+    ``Settings.from_env()`` is what a normal start uses; tests and benchmarks can
+    build one directly and hand it to ``server.create_app``.
+    """
+    mongo_url: str
+    db_name: str
+    jwt_secret: str = 'polarizadosya-secret-key-2024'
+    jwt_algorithm: str = "HS256"
+    # Access tokens are checked without a database read, so keep them short-lived
+    access_token_minutes: int = 15
+    refresh_token_days: int = 30
+    # Multi-document transactions need a replica set; standalone servers rely on compare-and-set writes
+    mongo_transactions: bool = False
+    # Side-effect outbox consumer
+    outbox_enabled: bool = True
+    outbox_poll_seconds: float = 1.0
+    # Detail-response cache (vehicles, quotes, appointments)
+    document_cache_size: int = 2048
+    # State shared between uvicorn workers: memory | mongodb | redis://... (see shared_state.py)
+    shared_state_url: str = 'mongodb'
+    shared_state_poll_seconds: float = 0.5
+    # Login/registration throttling (burst/sustained attempts per minute)
+    auth_rate_limit_enabled: bool = True
+    # Only honour X-Forwarded-For when the app sits behind a proxy that sets it
+    trust_forwarded_for: bool = False
+    login_rate_ip: str = '20/20'
+    login_rate_email: str = '5/5'
+    register_rate_ip: str = '5/5'
+    register_rate_email: str = '3/3'
+    # Largest signature or ID photo accepted by POST /api/uploads
+    upload_max_bytes: int = 5 * 1024 * 1024
+    # Processes rendering quote PDFs, started on the first render
+    pdf_render_workers: int = 2
+    # How often finished orders are folded into the duration forecasts
+    forecast_refresh_seconds: float = 300.0
+    # Branch given to users without one and to documents written before branches existed
+    default_branch_id: str = 'principal'
+    cors_origins: Tuple[str, ...] = field(default_factory=lambda: ('*',))
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        env = os.environ if environ is None else environ
+        defaults = cls(mongo_url="", db_name="")
+        return cls(
+            mongo_url=env['MONGO_URL'],
+            db_name=env['DB_NAME'],
+            jwt_secret=env.get('JWT_SECRET', defaults.jwt_secret),
+            access_token_minutes=int(env.get('ACCESS_TOKEN_MINUTES', defaults.access_token_minutes)),
+            refresh_token_days=int(env.get('REFRESH_TOKEN_DAYS', defaults.refresh_token_days)),
+            mongo_transactions=_flag(env.get('MONGO_TRANSACTIONS'), defaults.mongo_transactions),
+            outbox_enabled=_flag(env.get('OUTBOX_ENABLED'), defaults.outbox_enabled),
+            outbox_poll_seconds=float(env.get('OUTBOX_POLL_SECONDS', defaults.outbox_poll_seconds)),
+            document_cache_size=int(env.get('DOCUMENT_CACHE_SIZE', defaults.document_cache_size)),
+            shared_state_url=env.get('SHARED_STATE_URL', defaults.shared_state_url),
+            shared_state_poll_seconds=float(env.get('SHARED_STATE_POLL_SECONDS', defaults.shared_state_poll_seconds)),
+            auth_rate_limit_enabled=_flag(env.get('AUTH_RATE_LIMIT_ENABLED'), defaults.auth_rate_limit_enabled),
+            trust_forwarded_for=_flag(env.get('TRUST_FORWARDED_FOR'), defaults.trust_forwarded_for),
+            login_rate_ip=env.get('LOGIN_RATE_IP', defaults.login_rate_ip),
+            login_rate_email=env.get('LOGIN_RATE_EMAIL', defaults.login_rate_email),
+            register_rate_ip=env.get('REGISTER_RATE_IP', defaults.register_rate_ip),
+            register_rate_email=env.get('REGISTER_RATE_EMAIL', defaults.register_rate_email),
+            upload_max_bytes=int(env.get('UPLOAD_MAX_BYTES', defaults.upload_max_bytes)),
+            pdf_render_workers=int(env.get('PDF_RENDER_WORKERS', defaults.pdf_render_workers)),
+            forecast_refresh_seconds=float(env.get('FORECAST_REFRESH_SECONDS', defaults.forecast_refresh_seconds)),
+            default_branch_id=env.get('DEFAULT_BRANCH_ID', defaults.default_branch_id),
+            cors_origins=tuple(env.get('CORS_ORIGINS', '*').split(',')),
+        )
@@ -0,0 +1,485 @@
+"""State shared by every API process: small key/value entries, counters, token
+buckets, locks and a broadcast channel.
+
+Anything kept in a module global only works with a single uvicorn worker. Code
+that needs to agree across workers goes through a ``SharedState``:
+
+* ``MemoryState``: one process only (tests, ``--workers 1``).
+* ``MongoState``: uses the application's MongoDB; needs nothing extra.
+* ``RedisState``: optional, needs the ``redis`` package. ``fakeredis://`` gives
+  an in-process stand-in for development.
+
+Pick one with ``SHARED_STATE_URL`` (``memory``, ``mongodb``, ``redis://...``,
+``fakeredis://``).
+"""
+import asyncio
+import inspect
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+Subscriber = Callable[[dict], Any]
+
+
+class LockBusy(Exception):
+    """Raised by ``SharedState.lock`` when another holder has the lock."""
+
+
+class SharedState:
+    """Interface every backend implements. Values must be JSON-serializable."""
+
+    def __init__(self):
+        # Identifies this process so it can ignore its own broadcasts
+        self.instance_id = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter and return the new value. ``ttl`` starts when the counter is created."""
+        raise NotImplementedError
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, tokens: float = 1) -> Tuple[bool, float]:
+        """Token bucket: returns (allowed, seconds until enough tokens would be available)."""
+        raise NotImplementedError
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    async def release(self, name: str, owner: str) -> None:
+        raise NotImplementedError
+
+    async def acquire_many(self, names: List[str], owner: str, ttl: float) -> List[str]:
+        """Try every lock in ``names`` for ``owner``; returns the ones that were acquired."""
+        taken = await asyncio.gather(*(self.acquire(name, owner, ttl) for name in names))
+        return [name for name, ok in zip(names, taken) if ok]
+
+    async def release_many(self, names: List[str], owner: str) -> None:
+        await asyncio.gather(*(self.release(name, owner) for name in names))
+
+    @asynccontextmanager
+    async def lock(self, name: str, ttl: float = 10.0):
+        """Hold ``name`` for the duration of the block, or raise LockBusy right away.
+
+        ``ttl`` bounds how long a crashed holder can keep others out.
+        """
+        owner = uuid.uuid4().hex
+        if not await self.acquire(name, owner, ttl):
+            raise LockBusy(name)
+        try:
+            yield owner
+        finally:
+            await self.release(name, owner)
+
+    async def publish(self, channel: str, message: dict) -> None:
+        """Deliver ``message`` to subscribers in every other process.
+
+        The publisher applies its own change directly; it does not get the message back.
+        """
+        raise NotImplementedError
+
+    def subscribe(self, channel: str, handler: Subscriber) -> None:
+        self._subscribers.setdefault(channel, []).append(handler)
+
+    async def _dispatch(self, channel: str, message: dict) -> None:
+        for handler in self._subscribers.get(channel, []):
+            try:
+                result = handler(message)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception(f"Shared-state subscriber for '{channel}' failed")
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+def refill_bucket(tokens: float, updated: float, now: float, capacity: float, rate: float, wanted: float):
+    """Refill and try to take from a bucket. Returns (allowed, tokens left, retry_after)."""
+    available = min(capacity, tokens + max(now - updated, 0.0) * rate)
+    if available >= wanted:
+        return True, available - wanted, 0.0
+    return False, available, (wanted - available) / rate if rate else float("inf")
+
+
+# ==================== IN-MEMORY ====================
+class MemoryState(SharedState):
+    """Single-process backend. Broadcasts go nowhere because there is no one else."""
+
+    def __init__(self, max_entries: int = 100_000):
+        super().__init__()
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._locks: Dict[str, Tuple[str, float]] = {}
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[1] is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def _store(self, key: str, value: Any, expires: Optional[float]) -> None:
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    async def get(self, key: str) -> Any:
+        item = self._live(key)
+        return item[0] if item else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._store(key, value, time.monotonic() + ttl if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        item = self._live(key)
+        if item is None:
+            item = (0, time.monotonic() + ttl if ttl else None)
+        value = item[0] + amount
+        self._store(key, value, item[1])
+        return value
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, tokens: float = 1) -> Tuple[bool, float]:
+        now = time.time()
+        item = self._live(key)
+        left, updated = item[0] if item else (capacity, now)
+        allowed, left, retry_after = refill_bucket(left, updated, now, capacity, refill_per_second, tokens)
+        self._store(key, (left, now), time.monotonic() + capacity / refill_per_second + 1)
+        return allowed, retry_after
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        held = self._locks.get(name)
+        if held and held[1] > time.monotonic():
+            return False
+        self._locks[name] = (owner, time.monotonic() + ttl)
+        return True
+
+    async def release(self, name: str, owner: str) -> None:
+        if self._locks.get(name, (None,))[0] == owner:
+            del self._locks[name]
+
+    async def publish(self, channel: str, message: dict) -> None:
+        pass
+
+
+# ==================== MONGODB ====================
+class MongoState(SharedState):
+    """Backend on the application's MongoDB.
+
+    Keys live in ``shared_state``, locks in ``shared_locks`` and broadcasts in
+    ``shared_messages``; expired documents are removed by TTL indexes and
+    ignored until then. Other processes see a broadcast after at most
+    ``poll_interval`` seconds.
+    """
+
+    # Broadcasts are re-read this far back so clock skew between hosts can't hide one
+    OVERLAP = timedelta(seconds=5)
+    MAX_CAS_RETRIES = 8
+
+    def __init__(self, db_provider: Callable[[], Any], poll_interval: float = 0.5,
+                 message_ttl: int = 3600):
+        super().__init__()
+        self.db_provider = db_provider
+        self.poll_interval = poll_interval
+        self.message_ttl = message_ttl
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._since: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+
+    @property
+    def db(self):
+        return self.db_provider()
+
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _expiry(self, ttl: Optional[float]) -> Optional[datetime]:
+        return self._now() + timedelta(seconds=ttl) if ttl else None
+
+    def _live_filter(self, key: str) -> dict:
+        return {"_id": key, "$or": [{"expires_at": None}, {"expires_at": {"$gt": self._now()}}]}
+
+    async def get(self, key: str) -> Any:
+        doc = await self.db.shared_state.find_one(self._live_filter(key), {"value": 1})
+        return doc["value"] if doc else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.db.shared_state.update_one(
+            {"_id": key}, {"$set": {"value": value, "expires_at": self._expiry(ttl)}}, upsert=True
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.db.shared_state.delete_one({"_id": key})
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        for _ in range(self.MAX_CAS_RETRIES):
+            try:
+                doc = await self.db.shared_state.find_one_and_update(
+                    self._live_filter(key), {"$inc": {"value": amount}}, return_document=ReturnDocument.AFTER
+                )
+                if doc is not None:
+                    return doc["value"]
+                # Missing or expired (the TTL monitor runs once a minute): start a new window
+                await self.db.shared_state.update_one(
+                    {"_id": key, "expires_at": {"$lte": self._now()}},
+                    {"$set": {"value": amount, "expires_at": self._expiry(ttl)}}, upsert=True
+                )
+                return amount
+            except DuplicateKeyError:
+                # Another process created the counter between our two steps
+                continue
+        raise RuntimeError(f"Counter '{key}' is too contended")
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, tokens: float = 1) -> Tuple[bool, float]:
+        # Optimistic read-modify-write on a versioned document
+        for _ in range(self.MAX_CAS_RETRIES):
+            now = time.time()
+            doc = await self.db.shared_state.find_one(self._live_filter(key))
+            current = doc["value"] if doc else {"tokens": capacity, "updated": now}
+            allowed, left, retry_after = refill_bucket(current["tokens"], current["updated"], now,
+                                                 capacity, refill_per_second, tokens)
+            update = {"$set": {"value": {"tokens": left, "updated": now},
+                               "expires_at": self._expiry(capacity / refill_per_second + 1)},
+                      "$inc": {"version": 1}}
+            try:
+                if doc is None:
+                    result = await self.db.shared_state.update_one(
+                        {"_id": key, "expires_at": {"$lte": self._now()}}, update, upsert=True
+                    )
+                else:
+                    result = await self.db.shared_state.update_one({"_id": key, "version": doc.get("version")}, update)
+                    if result.matched_count == 0:
+                        continue
+            except DuplicateKeyError:
+                continue
+            return allowed, retry_after
+        # Heavy contention on one bucket is itself a sign of abuse: fail closed
+        return False, 1 / refill_per_second if refill_per_second else 1.0
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        expires_at = self._expiry(ttl)
+        try:
+            await self.db.shared_locks.insert_one({"_id": name, "owner": owner, "expires_at": expires_at})
+            return True
+        except DuplicateKeyError:
+            pass
+        # Take over a lock whose holder died without releasing it
+        taken = await self.db.shared_locks.update_one(
+            {"_id": name, "expires_at": {"$lte": self._now()}}, {"$set": {"owner": owner, "expires_at": expires_at}}
+        )
+        return taken.modified_count == 1
+
+    async def release(self, name: str, owner: str) -> None:
+        await self.db.shared_locks.delete_one({"_id": name, "owner": owner})
+
+    async def acquire_many(self, names: List[str], owner: str, ttl: float) -> List[str]:
+        if not names:
+            return []
+        expires_at = self._expiry(ttl)
+        busy = set()
+        try:
+            await self.db.shared_locks.insert_many(
+                [{"_id": name, "owner": owner, "expires_at": expires_at} for name in names], ordered=False
+            )
+        except BulkWriteError as e:
+            busy = {names[err["index"]] for err in e.details.get("writeErrors", []) if err.get("code") == 11000}
+            if len(busy) != len(e.details.get("writeErrors", [])):
+                raise
+        # Held names may belong to a holder that died; those get the same takeover as acquire()
+        retaken = [name for name in busy if await self.acquire(name, owner, ttl)] if busy else []
+        return [name for name in names if name not in busy or name in retaken]
+
+    async def release_many(self, names: List[str], owner: str) -> None:
+        if names:
+            await self.db.shared_locks.delete_many({"_id": {"$in": list(names)}, "owner": owner})
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self.db.shared_messages.insert_one({
+            "_id": uuid.uuid4().hex, "channel": channel, "message": message,
+            "origin": self.instance_id, "created_at": self._now(),
+        })
+
+    async def poll_once(self) -> int:
+        since = self._since - self.OVERLAP
+        self._since = self._now()
+        docs = await self.db.shared_messages.find(
+            {"created_at": {"$gte": since}, "origin": {"$ne": self.instance_id},
+             "channel": {"$in": list(self._subscribers)}}
+        ).sort("created_at", 1).to_list(None)
+        delivered = 0
+        for doc in docs:
+            if doc["_id"] in self._seen:
+                continue
+            self._seen[doc["_id"]] = None
+            await self._dispatch(doc["channel"], doc["message"])
+            delivered += 1
+        while len(self._seen) > 10_000:
+            self._seen.popitem(last=False)
+        return delivered
+
+    async def _poll_forever(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await self.poll_once()
+            except Exception:
+                logger.exception("Shared-state broadcast poll failed")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        db = self.db
+        await db.shared_state.create_index("expires_at", expireAfterSeconds=0)
+        await db.shared_locks.create_index("expires_at", expireAfterSeconds=0)
+        await db.shared_messages.create_index("created_at", expireAfterSeconds=self.message_ttl)
+        await db.shared_messages.create_index([("channel", 1), ("created_at", 1)])
+        # Only messages sent from now on matter to a fresh process
+        self._since = self._now()
+        if self._subscribers and self._task is None:
+            self._stopping.clear()
+            self._task = asyncio.create_task(self._poll_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._stopping.set()
+            await self._task
+            self._task = None
+
+
+# ==================== REDIS ====================
+_TAKE_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local capacity, rate, now, wanted = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens, updated = tonumber(state[1]) or capacity, tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= wanted then tokens = tokens - wanted; allowed = 1 end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity / rate + 1) * 1000))
+return {allowed, tostring(tokens)}
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+
+class RedisState(SharedState):
+    """Backend on Redis (``redis`` package, asyncio client). Broadcasts use Redis pub/sub."""
+
+    def __init__(self, redis_client, prefix: str = "pya:"):
+        super().__init__()
+        self.redis = redis_client
+        self.prefix = prefix
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _k(self, key: str) -> str:
+        return self.prefix + key
+
+    async def get(self, key: str) -> Any:
+        raw = await self.redis.get(self._k(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self.redis.set(self._k(key), json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    async def delete(self, key: str) -> None:
+        await self.redis.delete(self._k(key))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        value = await self.redis.incrby(self._k(key), amount)
+        if ttl and value == amount:
+            await self.redis.pexpire(self._k(key), int(ttl * 1000))
+        return value
+
+    async def take(self, key: str, capacity: float, refill_per_second: float, tokens: float = 1) -> Tuple[bool, float]:
+        allowed, left = await self.redis.eval(_TAKE_SCRIPT, 1, self._k(key), capacity, refill_per_second, time.time(), tokens)
+        if allowed:
+            return True, 0.0
+        return False, (tokens - float(left)) / refill_per_second
+
+    async def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        return bool(await self.redis.set(self._k("lock:" + name), owner, nx=True, px=int(ttl * 1000)))
+
+    async def release(self, name: str, owner: str) -> None:
+        await self.redis.eval(_RELEASE_SCRIPT, 1, self._k("lock:" + name), owner)
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self.redis.publish(self._k(channel), json.dumps({"origin": self.instance_id, "message": message}))
+
+    async def _listen(self) -> None:
+        async for item in self._pubsub.listen():
+            if item.get("type") != "message":
+                continue
+            envelope = json.loads(item["data"])
+            if envelope["origin"] == self.instance_id:
+                continue
+            channel = item["channel"].decode() if isinstance(item["channel"], bytes) else item["channel"]
+            await self._dispatch(channel[len(self.prefix):], envelope["message"])
+
+    async def start(self) -> None:
+        if self._subscribers and self._task is None:
+            self._pubsub = self.redis.pubsub()
+            await self._pubsub.subscribe(*(self._k(c) for c in self._subscribers))
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            await self._pubsub.aclose()
+
+
+def create(url: str, db_provider: Callable[[], Any], poll_interval: float = 0.5) -> SharedState:
+    if url in ("", "mongodb", "mongo"):
+        return MongoState(db_provider, poll_interval=poll_interval)
+    if url == "memory":
+        return MemoryState()
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        try:
+            import redis.asyncio as aioredis
+        except ImportError as e:
+            raise RuntimeError("SHARED_STATE_URL points at Redis but the 'redis' package is not installed") from e
+        return RedisState(aioredis.from_url(url))
+    if url.startswith("fakeredis://"):
+        try:
+            import fakeredis
+        except ImportError as e:
+            raise RuntimeError("fakeredis:// needs the 'fakeredis' package (development only)") from e
+        return RedisState(fakeredis.FakeAsyncRedis())
+    raise ValueError(f"Unknown SHARED_STATE_URL '{url}'")
@@ -0,0 +1,334 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+
+import events
+import fanout
+import forecast
+import outbox
+import sync
+
+
+class TransitionError(Exception):
+    """Raised when a status change is not allowed from the document's current status."""
+
+    def __init__(self, entity_type: str, entity_id: str, from_status: Optional[str], to_status: str):
+        self.entity_type = entity_type
+        self.entity_id = entity_id
+        self.from_status = from_status
+        self.to_status = to_status
+        super().__init__(f"Transición de estado no permitida: {from_status or 'sin estado'} → {to_status}")
+
+
+class EntityNotFound(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class StateMachine:
+    entity_type: str
+    collection: str
+    # to_status -> statuses it may be entered from (None = document without status)
+    sources: Dict[str, FrozenSet[Optional[str]]]
+
+    def allowed_from(self, to_status: str) -> List[Optional[str]]:
+        return sorted(self.sources.get(to_status, frozenset()), key=lambda s: s or "")
+
+    def can(self, from_status: Optional[str], to_status: str) -> bool:
+        return from_status in self.sources.get(to_status, frozenset())
+
+
+def _machine(entity_type: str, collection: str, edges: List[Tuple[Optional[str], str]]) -> StateMachine:
+    sources: Dict[str, set] = {}
+    for from_status, to_status in edges:
+        sources.setdefault(to_status, set()).add(from_status)
+    return StateMachine(entity_type, collection, {k: frozenset(v) for k, v in sources.items()})
+
+
+# agendado → en_proceso → en_revision → terminado, with rework steps back
+SERVICE_ORDER = _machine("service_order", "service_orders", [
+    ("agendado", "en_proceso"),
+    ("en_proceso", "agendado"),
+    ("en_proceso", "en_revision"),
+    ("en_revision", "en_proceso"),
+    ("en_revision", "terminado"),
+])
+
+APPOINTMENT = _machine("appointment", "appointments", [
+    ("agendado", "en_proceso"),
+    ("agendado", "terminado"),
+    ("en_proceso", "en_revision"),
+    ("en_proceso", "terminado"),
+    ("en_revision", "en_proceso"),
+    ("en_revision", "terminado"),
+])
+
+VEHICLE = _machine("vehicle", "vehicles", [
+    # Vehicles registered without a booking have no status until their first order moves them
+    (None, "agendado"), (None, "ingresado"), (None, "con_tecnico"), (None, "en_proceso"), (None, "finalizado"),
+    ("agendado", "ingresado"), ("agendado", "con_tecnico"), ("agendado", "en_proceso"),
+    ("ingresado", "con_tecnico"), ("ingresado", "en_proceso"),
+    # Re-assigning a technician keeps the vehicle in con_tecnico
+    ("con_tecnico", "con_tecnico"), ("con_tecnico", "en_proceso"),
+    ("en_proceso", "con_tecnico"),
+    # Completing its service order finishes the car from any active status
+    ("agendado", "finalizado"), ("ingresado", "finalizado"), ("con_tecnico", "finalizado"), ("en_proceso", "finalizado"),
+    # A finished car that books again starts over
+    ("finalizado", "agendado"),
+])
+
+QUOTE = _machine("quote", "quotes", [
+    ("pending", "approved"),
+])
+
+MACHINES = (SERVICE_ORDER, APPOINTMENT, VEHICLE, QUOTE)
+
+# Related documents that follow a service order's status
+ORDER_CASCADE = {
+    "en_proceso": {"vehicle": "en_proceso", "appointment": "en_proceso"},
+    "en_revision": {"appointment": "en_revision"},
+    "terminado": {"vehicle": "finalizado", "appointment": "terminado"},
+}
+
+
+@dataclass
+class TransitionResult:
+    before: dict
+    events: List[dict]
+    related: Dict[str, dict]
+
+
+@dataclass
+class StatusChange:
+    entity_id: str
+    to_status: str
+    set_fields: Optional[dict] = None
+    side_effects: Optional[List[dict]] = None
+
+
+@dataclass
+class BulkTransitionResult:
+    applied: Dict[str, TransitionResult]
+    # entity id -> EntityNotFound or TransitionError
+    errors: Dict[str, Exception]
+
+
+async def _compare_and_set(db, machine: StateMachine, entity_id: str, to_status: str,
+                           set_fields: Optional[dict], session, required: bool,
+                           side_effects: Optional[List[dict]] = None) -> Optional[dict]:
+    """Move one document to ``to_status`` only if its current status allows it.
+
+    The status check and the write are a single atomic find_one_and_update; the
+    document as it was before the update is returned (None if it didn't apply).
+    """
+    update = {"$set": {"status": to_status, **(set_fields or {}), **sync.stamp()}}
+    if side_effects:
+        update.update(outbox.push(side_effects))
+    before = await db[machine.collection].find_one_and_update(
+        {"id": entity_id, "status": {"$in": machine.allowed_from(to_status)}},
+        update,
+        projection={"_id": 0, **outbox.HIDDEN_FIELDS},
+        return_document=ReturnDocument.BEFORE,
+        session=session,
+    )
+    if before is None and required:
+        current = await db[machine.collection].find_one({"id": entity_id}, {"_id": 0, "status": 1}, session=session)
+        if current is None:
+            raise EntityNotFound(entity_id)
+        raise TransitionError(machine.entity_type, entity_id, current.get("status"), to_status)
+    return before
+
+
+async def transition(db, machine: StateMachine, entity_id: str, to_status: str, actor_id: Optional[str],
+                     set_fields: Optional[dict] = None, use_transactions: bool = False,
+                     side_effects: Optional[List[dict]] = None) -> TransitionResult:
+    """Validate and apply a single status change and log it.
+
+    ``side_effects`` are outbox entries stored with the status write itself.
+    """
+    async with events.transaction(db, use_transactions) as session:
+        before = await _compare_and_set(db, machine, entity_id, to_status, set_fields, session, required=True,
+                                        side_effects=side_effects)
+        event = events.new_event(machine.entity_type, entity_id, before.get("status"), to_status, actor_id,
+                                 branch_id=before.get("branch_id"))
+        await events.append_events(db, [event], session=session)
+    return TransitionResult(before=before, events=[event], related={})
+
+
+async def try_transition(db, machine: StateMachine, entity_id: str, to_status: str, actor_id: Optional[str],
+                         set_fields: Optional[dict] = None, use_transactions: bool = False,
+                         side_effects: Optional[List[dict]] = None) -> Optional[TransitionResult]:
+    """Like ``transition`` but a disallowed or missing document is a no-op instead of an error."""
+    try:
+        return await transition(db, machine, entity_id, to_status, actor_id, set_fields, use_transactions, side_effects)
+    except (TransitionError, EntityNotFound):
+        return None
+
+
+def _order_timing(before: dict, to_status: str, set_fields: Optional[dict]) -> dict:
+    """``actual_hours`` for an order being finished, from its start and the completion being set."""
+    if to_status != "terminado" or not set_fields:
+        return {}
+    hours = forecast.actual_hours(before.get("started_at"), set_fields.get("completed_at"))
+    return {} if hours is None else {"actual_hours": hours}
+
+
+async def transition_service_order(db, order_id: str, to_status: str, actor_id: Optional[str],
+                                   set_fields: Optional[dict] = None, use_transactions: bool = False,
+                                   side_effects: Optional[List[dict]] = None) -> TransitionResult:
+    """Move an order and the vehicle/appointment that follow it, then log every change.
+
+    The order write is the compare-and-set that decides the transition; related
+    documents only move when their own machine allows it.
+    """
+    async with events.transaction(db, use_transactions) as session:
+        before = await _compare_and_set(db, SERVICE_ORDER, order_id, to_status, set_fields, session, required=True,
+                                        side_effects=side_effects)
+        primary = events.new_event(SERVICE_ORDER.entity_type, order_id, before.get("status"), to_status, actor_id,
+                                   data={"vehicle_id": before.get("vehicle_id")}, branch_id=before.get("branch_id"))
+        logged = [primary]
+        related: Dict[str, dict] = {}
+
+        cascade = ORDER_CASCADE.get(to_status, {})
+        targets = []
+        if "vehicle" in cascade and before.get("vehicle_id"):
+            fields = {"current_service_order_id": None} if to_status == "terminado" else {"current_service_order_id": order_id}
+            targets.append(("vehicle", VEHICLE, before["vehicle_id"], cascade["vehicle"], fields))
+        if "appointment" in cascade and before.get("appointment_id"):
+            targets.append(("appointment", APPOINTMENT, before["appointment_id"], cascade["appointment"], None))
+
+        writes = [_compare_and_set(db, machine, entity_id, status, fields, session, required=False)
+                  for _, machine, entity_id, status, fields in targets]
+        # The start is only known once the move has applied; the hours go in with the cascade, in the same session
+        timing = _order_timing(before, to_status, set_fields)
+        if timing:
+            writes.append(db[SERVICE_ORDER.collection].update_one(
+                {"id": order_id}, {"$set": {**timing, **sync.stamp()}}, session=session))
+        results = await fanout.gather(*writes, session=session)
+        for (name, machine, entity_id, status, _), doc in zip(targets, results):
+            if doc is None:
+                continue
+            related[name] = doc
+            logged.append(events.new_event(machine.entity_type, entity_id, doc.get("status"), status, actor_id,
+                                           cause=primary["id"], branch_id=doc.get("branch_id")))
+        await events.append_events(db, logged, session=session)
+    return TransitionResult(before=before, events=logged, related=related)
+
+
+# Fields the bulk path needs from a service order to validate, cascade and time it
+_ORDER_FIELDS = {"_id": 0, "id": 1, "status": 1, "vehicle_id": 1, "appointment_id": 1, "branch_id": 1, "started_at": 1}
+
+
+async def _bulk_compare_and_set(db, machine: StateMachine, planned: List[Tuple[dict, StatusChange, dict]],
+                                session) -> set:
+    """Apply many compare-and-set moves in one bulk_write; returns the ids that applied.
+
+    Each update only matches while the document still has the status it was
+    validated against. The event id is stamped on the document so that, when
+    some updates lose a race, one read tells which ones landed.
+    """
+    if not planned:
+        return set()
+    ops = []
+    for doc, change, event in planned:
+        update = {"$set": {"status": change.to_status, "status_event_id": event["id"], **(change.set_fields or {}),
+                           **sync.stamp()}}
+        if change.side_effects:
+            update.update(outbox.push(change.side_effects))
+        ops.append(UpdateOne({"id": doc["id"], "status": doc.get("status")}, update))
+    result = await db[machine.collection].bulk_write(ops, ordered=False, session=session)
+    if result.matched_count == len(ops):
+        return {doc["id"] for doc, _, _ in planned}
+    landed = await db[machine.collection].find(
+        {"id": {"$in": [doc["id"] for doc, _, _ in planned]},
+         "status_event_id": {"$in": [event["id"] for _, _, event in planned]}},
+        {"_id": 0, "id": 1}, session=session
+    ).to_list(None)
+    return {doc["id"] for doc in landed}
+
+
+async def transition_service_orders(db, changes: List[StatusChange], actor_id: Optional[str],
+                                    use_transactions: bool = False) -> BulkTransitionResult:
+    """``transition_service_order`` for many orders with a fixed number of round-trips.
+
+    Orders, then their vehicles and appointments, are read with one ``$in``
+    query per collection and written with one ``bulk_write`` each; every event
+    goes into a single append. Orders that are missing or can't make their move
+    are reported in ``errors`` and don't stop the rest.
+    """
+    applied: Dict[str, TransitionResult] = {}
+    errors: Dict[str, Exception] = {}
+    async with events.transaction(db, use_transactions) as session:
+        orders = await fanout.find_by_ids(db, SERVICE_ORDER.collection, [c.entity_id for c in changes], _ORDER_FIELDS,
+                                          session=session)
+        planned = []
+        for change in changes:
+            doc = orders.get(change.entity_id)
+            if doc is None:
+                errors[change.entity_id] = EntityNotFound(change.entity_id)
+            elif not SERVICE_ORDER.can(doc.get("status"), change.to_status):
+                errors[change.entity_id] = TransitionError(SERVICE_ORDER.entity_type, change.entity_id,
+                                                           doc.get("status"), change.to_status)
+            else:
+                event = events.new_event(SERVICE_ORDER.entity_type, change.entity_id, doc.get("status"),
+                                         change.to_status, actor_id, data={"vehicle_id": doc.get("vehicle_id")},
+                                         branch_id=doc.get("branch_id"))
+                # The start was read with the status, so the hours are written by the move itself
+                timing = _order_timing(doc, change.to_status, change.set_fields)
+                if timing:
+                    change = StatusChange(change.entity_id, change.to_status, {**change.set_fields, **timing},
+                                          change.side_effects)
+                planned.append((doc, change, event))
+
+        landed = await _bulk_compare_and_set(db, SERVICE_ORDER, planned, session)
+        logged = []
+        # (related name, entity id) -> (status, fields, order id, cause event id)
+        cascades: Dict[Tuple[str, str], Tuple[str, Optional[dict], str, str]] = {}
+        for doc, change, event in planned:
+            if doc["id"] not in landed:
+                # Moved by someone else between our read and write
+                errors[doc["id"]] = TransitionError(SERVICE_ORDER.entity_type, doc["id"], doc.get("status"),
+                                                    change.to_status)
+                continue
+            logged.append(event)
+            applied[doc["id"]] = TransitionResult(before=doc, events=[event], related={})
+            cascade = ORDER_CASCADE.get(change.to_status, {})
+            if "vehicle" in cascade and doc.get("vehicle_id"):
+                fields = {"current_service_order_id": None if change.to_status == "terminado" else doc["id"]}
+                cascades[("vehicle", doc["vehicle_id"])] = (cascade["vehicle"], fields, doc["id"], event["id"])
+            if "appointment" in cascade and doc.get("appointment_id"):
+                cascades[("appointment", doc["appointment_id"])] = (cascade["appointment"], None, doc["id"], event["id"])
+
+        related_machines = ((VEHICLE, "vehicle"), (APPOINTMENT, "appointment"))
+        current = await fanout.gather(*(
+            fanout.find_by_ids(db, machine.collection, [entity_id for kind, entity_id in cascades if kind == name],
+                               {"_id": 0, "id": 1, "status": 1, "branch_id": 1}, session=session)
+            for machine, name in related_machines
+        ), session=session)
+
+        plans = []
+        for (machine, name), docs in zip(related_machines, current):
+            related_planned = []
+            for (kind, entity_id), (status, fields, order_id, cause) in cascades.items():
+                doc = docs.get(entity_id)
+                if kind != name or doc is None or not machine.can(doc.get("status"), status):
+                    continue
+                event = events.new_event(machine.entity_type, entity_id, doc.get("status"), status, actor_id,
+                                         cause=cause, branch_id=doc.get("branch_id"))
+                related_planned.append((doc, StatusChange(entity_id, status, fields), event, order_id))
+            plans.append((machine, name, related_planned))
+        results = await fanout.gather(*(
+            _bulk_compare_and_set(db, machine, [p[:3] for p in related_planned], session)
+            for machine, _, related_planned in plans
+        ), session=session)
+        for (machine, name, related_planned), related_landed in zip(plans, results):
+            for doc, change, event, order_id in related_planned:
+                if doc["id"] not in related_landed:
+                    continue
+                logged.append(event)
+                applied[order_id].events.append(event)
+                applied[order_id].related[name] = doc
+
+        await events.append_events(db, logged, session=session)
+    return BulkTransitionResult(applied=applied, errors=errors)
@@ -0,0 +1,157 @@
+"""Change tracking for the offline-first clients (GET /api/sync).
+
+Every user-visible write stamps the document with ``sync_seq``, a hybrid
+logical clock value: wall-clock microseconds, bumped so one process never hands
+out the same or a smaller value twice. It costs no extra round-trip (unlike the
+event log's counter), and values from different workers interleave in time order
+up to clock skew.
+
+A client keeps the token from its last sync and asks for everything stamped
+after it. A value is stamped before its write lands, so a reader can see a
+later stamp while an earlier one is still in flight. The returned token
+therefore never moves past ``now - SETTLE_WINDOW``. Documents newer than that
+may be sent twice, so clients apply changes as upserts by id.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+SEQ_FIELD = "sync_seq"
+UPDATED_FIELD = "updated_at"
+# Everyone who has ever been assigned a document; a device whose user left it is told to drop it
+AUDIENCE_FIELD = "sync_audience"
+TOMBSTONES_COLLECTION = "sync_tombstones"
+
+# Covers write latency and clock skew between workers
+SETTLE_WINDOW = timedelta(seconds=5)
+MAX_LIMIT = 1000
+
+HIDDEN_FIELDS = {AUDIENCE_FIELD: 0}
+
+# Collections synced per role, and how each is narrowed to the caller
+ROLE_COLLECTIONS = {
+    "tecnico": ("service_orders", "vehicles", "notifications"),
+    "asesor": ("vehicles", "appointments", "quotes", "service_orders", "notifications"),
+    "admin": ("vehicles", "appointments", "quotes", "service_orders", "notifications"),
+}
+SYNCED_COLLECTIONS = ("vehicles", "appointments", "quotes", "service_orders", "notifications")
+
+
+class SyncError(Exception):
+    pass
+
+
+class SyncClock:
+    """Strictly increasing microsecond timestamps for this process."""
+
+    def __init__(self):
+        self._last = 0
+
+    def next(self) -> int:
+        self._last = max(time.time_ns() // 1000, self._last + 1)
+        return self._last
+
+
+clock = SyncClock()
+
+
+def stamp() -> dict:
+    """Fields to ``$set`` (or include in an insert) on every user-visible write."""
+    return {SEQ_FIELD: clock.next(), UPDATED_FIELD: datetime.now(timezone.utc).isoformat()}
+
+
+def parse_token(token: Optional[str]) -> int:
+    if not token:
+        return 0
+    try:
+        value = int(token)
+    except ValueError:
+        raise SyncError("Token de sincronización inválido")
+    if value < 0:
+        raise SyncError("Token de sincronización inválido")
+    return value
+
+
+def settled_seq(now: Optional[float] = None) -> int:
+    """Highest sequence value whose write can be assumed to have landed."""
+    now = time.time() if now is None else now
+    return int((now - SETTLE_WINDOW.total_seconds()) * 1_000_000)
+
+
+def scope(collection: str, user: dict) -> dict:
+    """Filter restricting ``collection`` to what ``user``'s device keeps."""
+    if collection == "notifications":
+        return {"recipient_id": user["id"]}
+    if collection == "service_orders" and user["role"] == "tecnico":
+        return {AUDIENCE_FIELD: user["id"]}
+    return {}
+
+
+def still_visible(collection: str, doc: dict, user: dict) -> bool:
+    # A technician keeps receiving an order after it is reassigned, as a removal
+    if collection == "service_orders" and user["role"] == "tecnico":
+        return doc.get("assigned_technician_id") == user["id"]
+    return True
+
+
+def next_token(since: int, last_seq: Dict[str, Optional[int]], settled: int) -> int:
+    """The token a client may resume from.
+
+    ``last_seq`` maps every collection read with a full page to the seq of its
+    last document, and those without a full page to None. A full page means more
+    documents may follow, so the token can't pass its last seq.
+    """
+    bound = min([settled] + [seq for seq in last_seq.values() if seq is not None])
+    return max(since, bound)
+
+
+def tombstone(collection: str, entity_id: str, audience: Optional[List[str]] = None,
+              branch_id: Optional[str] = None) -> dict:
+    """A record telling devices to drop a document that no longer exists (e.g. archived).
+
+    Pass ``branch_id`` when writing without a branch-scoped database handle.
+    """
+    stone = {"collection": collection, "id": entity_id, AUDIENCE_FIELD: audience, **stamp()}
+    if branch_id is not None:
+        stone["branch_id"] = branch_id
+    return stone
+
+
+async def record_tombstones(db, tombstones: List[dict], session=None):
+    if tombstones:
+        await db[TOMBSTONES_COLLECTION].insert_many(tombstones, session=session)
+        for doc in tombstones:
+            doc.pop("_id", None)
+
+
+async def create_indexes(db):
+    # Devices sync one branch; notifications follow their recipient instead
+    for name in SYNCED_COLLECTIONS:
+        if name != "notifications":
+            await db[name].create_index([("branch_id", 1), (SEQ_FIELD, 1)])
+    await db.service_orders.create_index([("branch_id", 1), (AUDIENCE_FIELD, 1), (SEQ_FIELD, 1)])
+    await db.notifications.create_index([("recipient_id", 1), (SEQ_FIELD, 1)])
+    await db[TOMBSTONES_COLLECTION].create_index([("branch_id", 1), (SEQ_FIELD, 1)])
+
+
+async def backfill(db, batch_size: int = 1000):
+    """Stamp documents written before change tracking existed so a first full sync includes them.
+
+    Each document gets its own value: a page boundary inside a run of equal
+    values would skip the rest of the run.
+    """
+    for name in SYNCED_COLLECTIONS:
+        cursor = db[name].find({SEQ_FIELD: {"$exists": False}}, {"_id": 0, "id": 1, "assigned_technician_id": 1})
+        batch = []
+        async for doc in cursor:
+            fields = stamp()
+            if name == "service_orders":
+                fields[AUDIENCE_FIELD] = [doc["assigned_technician_id"]] if doc.get("assigned_technician_id") else []
+            batch.append(UpdateOne({"id": doc["id"]}, {"$set": fields}))
+            if len(batch) >= batch_size:
+                await db[name].bulk_write(batch, ordered=False)
+                batch = []
+        if batch:
+            await db[name].bulk_write(batch, ordered=False)
@@ -0,0 +1,196 @@
+"""Branch scoping: each shop location works on its own users, vehicles, orders, appointments and quotes.
+
+Every document in ``SCOPED_COLLECTIONS`` carries a ``branch_id``. Requests
+don't add it themselves: once a user is authenticated the request's database
+handle is a ``ScopedDatabase``, which adds ``branch_id`` to every filter and
+aggregation and stamps it on every insert. A query written without branches in
+mind still only touches the caller's branch.
+
+Indexes on scoped collections lead with ``branch_id``, so a branch's lists and
+counts read only its own index range. ``{branch_id: 1, id: 1}`` is unique and
+is the intended shard key: documents of one branch stay together, and lookups
+by id from a request carry the branch. Code without a request (the outbox
+consumer, the worker) uses the plain database and finds documents by ``id``
+alone; on a sharded cluster those reads go to every shard, and the
+``id`` unique index has to be dropped first (MongoDB only enforces unique
+indexes that start with the shard key).
+
+Stored files are scoped too. GridFS keeps custom fields under ``metadata``,
+so ``blobs.files`` carries its branch in ``metadata.branch_id``
+(``SCOPE_FIELDS``). A file is found, and its chunks read, only through a
+lookup in the caller's branch.
+"""
+import copy
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from pymongo import InsertOne, ReplaceOne
+
+import archive
+import blobs
+import damage
+import sync
+
+BRANCH_FIELD = "branch_id"
+BRANCHES_COLLECTION = "branches"
+SCOPED_COLLECTIONS = frozenset({
+    "users", "vehicles", "appointments", "inspections", "quotes", "service_orders", sync.TOMBSTONES_COLLECTION,
+    damage.DAMAGE_COLLECTION, *archive.ARCHIVE_COLLECTIONS, blobs.FILES,
+})
+# Scoped collections that keep the branch somewhere other than BRANCH_FIELD
+SCOPE_FIELDS = {blobs.FILES: blobs.BRANCH_FIELD}
+SHARD_KEY = ((BRANCH_FIELD, 1), ("id", 1))
+# Header an admin sends to work on a branch other than their own
+BRANCH_HEADER = "x-branch-id"
+
+
+def branch_keys(keys: Sequence[Tuple[str, int]]) -> List[Tuple[str, int]]:
+    """Index keys with ``branch_id`` in front."""
+    return [(BRANCH_FIELD, 1), *keys]
+
+
+def new_branch(name: str, branch_id: Optional[str] = None) -> dict:
+    return {"id": branch_id or str(uuid.uuid4()), "name": name, "created_at": datetime.now(timezone.utc).isoformat()}
+
+
+class ScopedCollection:
+    """A collection that only reads and writes documents of one branch; anything else passes through."""
+
+    def __init__(self, collection, branch_id: str, field: str = BRANCH_FIELD):
+        self._collection = collection
+        self.branch_id = branch_id
+        self.field = field
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def _scope(self, filter: Optional[dict]) -> dict:
+        return {**(filter or {}), self.field: self.branch_id}
+
+    def _stamp(self, doc: dict) -> dict:
+        *parents, leaf = self.field.split(".")
+        target = doc
+        for key in parents:
+            target = target.setdefault(key, {})
+        target[leaf] = self.branch_id
+        return doc
+
+    def find(self, filter=None, *args, **kwargs):
+        return self._collection.find(self._scope(filter), *args, **kwargs)
+
+    def find_one(self, filter=None, *args, **kwargs):
+        return self._collection.find_one(self._scope(filter), *args, **kwargs)
+
+    def count_documents(self, filter, *args, **kwargs):
+        return self._collection.count_documents(self._scope(filter), *args, **kwargs)
+
+    def estimated_document_count(self, **kwargs):
+        return self._collection.count_documents(self._scope(None), **kwargs)
+
+    def distinct(self, key, filter=None, *args, **kwargs):
+        return self._collection.distinct(key, self._scope(filter), *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        return self._collection.aggregate([{"$match": {self.field: self.branch_id}}, *pipeline], *args, **kwargs)
+
+    def update_one(self, filter, *args, **kwargs):
+        return self._collection.update_one(self._scope(filter), *args, **kwargs)
+
+    def update_many(self, filter, *args, **kwargs):
+        return self._collection.update_many(self._scope(filter), *args, **kwargs)
+
+    def replace_one(self, filter, replacement, *args, **kwargs):
+        return self._collection.replace_one(self._scope(filter), self._stamp(replacement), *args, **kwargs)
+
+    def delete_one(self, filter, *args, **kwargs):
+        return self._collection.delete_one(self._scope(filter), *args, **kwargs)
+
+    def delete_many(self, filter, *args, **kwargs):
+        return self._collection.delete_many(self._scope(filter), *args, **kwargs)
+
+    def find_one_and_update(self, filter, *args, **kwargs):
+        return self._collection.find_one_and_update(self._scope(filter), *args, **kwargs)
+
+    def find_one_and_replace(self, filter, replacement, *args, **kwargs):
+        return self._collection.find_one_and_replace(self._scope(filter), self._stamp(replacement), *args, **kwargs)
+
+    def find_one_and_delete(self, filter, *args, **kwargs):
+        return self._collection.find_one_and_delete(self._scope(filter), *args, **kwargs)
+
+    def insert_one(self, document, *args, **kwargs):
+        return self._collection.insert_one(self._stamp(document), *args, **kwargs)
+
+    def insert_many(self, documents, *args, **kwargs):
+        return self._collection.insert_many([self._stamp(doc) for doc in documents], *args, **kwargs)
+
+    def bulk_write(self, requests, *args, **kwargs):
+        scoped = []
+        for request in requests:
+            # pymongo's write models keep their arguments in these attributes
+            request = copy.copy(request)
+            if hasattr(request, "_filter"):
+                request._filter = self._scope(request._filter)
+            if isinstance(request, (InsertOne, ReplaceOne)):
+                request._doc = self._stamp(dict(request._doc))
+            scoped.append(request)
+        return self._collection.bulk_write(scoped, *args, **kwargs)
+
+
+class ScopedDatabase:
+    """A database handle whose scoped collections are restricted to ``branch_id``."""
+
+    def __init__(self, db, branch_id: str):
+        self._db = db
+        self.branch_id = branch_id
+
+    def _scoped(self, name: str, collection):
+        if name not in SCOPED_COLLECTIONS:
+            return collection
+        return ScopedCollection(collection, self.branch_id, SCOPE_FIELDS.get(name, BRANCH_FIELD))
+
+    def __getitem__(self, name: str):
+        return self._scoped(name, self._db[name])
+
+    def __getattr__(self, name: str):
+        if name in SCOPED_COLLECTIONS:
+            return self[name]
+        return getattr(self._db, name)
+
+    def get_collection(self, name: str, **kwargs):
+        return self._scoped(name, self._db.get_collection(name, **kwargs))
+
+    @property
+    def unscoped(self):
+        return self._db
+
+
+async def backfill(db, default_branch: str):
+    """Give documents written before branches existed the default branch, and make sure it exists."""
+    await db[BRANCHES_COLLECTION].update_one(
+        {"id": default_branch}, {"$setOnInsert": new_branch("Principal", default_branch)}, upsert=True)
+    for name in sorted(SCOPED_COLLECTIONS - SCOPE_FIELDS.keys()):
+        await db[name].update_many({BRANCH_FIELD: {"$exists": False}}, {"$set": {BRANCH_FIELD: default_branch}})
+    await _backfill_files(db, default_branch)
+
+
+async def _backfill_files(db, default_branch: str):
+    # A rendered PDF belongs to its quote's branch, an upload to its uploader's; anything else to the default
+    files = db[blobs.FILES]
+    unscoped = {blobs.BRANCH_FIELD: {"$exists": False}}
+    for owner_field, collection in (("metadata.quote_id", "quotes"), ("metadata.uploaded_by", "users")):
+        owner_ids = await files.distinct(owner_field, unscoped)
+        owners = await db[collection].find({"id": {"$in": owner_ids}}, {"_id": 0, "id": 1, BRANCH_FIELD: 1}).to_list(None)
+        by_branch = {}
+        for owner in owners:
+            by_branch.setdefault(owner.get(BRANCH_FIELD) or default_branch, []).append(owner["id"])
+        for branch_id, ids in by_branch.items():
+            await files.update_many({**unscoped, owner_field: {"$in": ids}}, {"$set": {blobs.BRANCH_FIELD: branch_id}})
+    await files.update_many(unscoped, {"$set": {blobs.BRANCH_FIELD: default_branch}})
+
+
+async def create_indexes(db):
+    await db[BRANCHES_COLLECTION].create_index("id", unique=True)
+    # Tombstones and files aren't looked up by ``id``
+    for name in sorted(SCOPED_COLLECTIONS - {sync.TOMBSTONES_COLLECTION, blobs.FILES}):
+        await db[name].create_index(list(SHARD_KEY), unique=True)
@@ -0,0 +1,146 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+
+REFRESH_COLLECTION = "refresh_tokens"
+# A refresh token presented again this soon after rotation is a racing tab, not a thief
+REUSE_GRACE = timedelta(seconds=10)
+
+
+class TokenError(Exception):
+    """Authentication failure; the message is safe to show to the client."""
+
+
+def hash_refresh(raw: str) -> str:
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TokenService:
+    """Short-lived access JWTs plus rotating refresh tokens.
+
+    Access tokens carry everything a request handler needs about the user, so
+    validating one is CPU only. Revocation works through a per-user
+    ``token_version``: bumping it in the database (and in every worker's
+    ``min_versions`` cache via broadcast) rejects older access tokens at once,
+    and the client falls back to its refresh token to get one with the new
+    claims. Refresh tokens are random strings stored hashed; each use replaces
+    it with a new one in the same family, and presenting a replaced token
+    revokes the whole family.
+    """
+
+    def __init__(self, secret: str, algorithm: str, access_ttl: timedelta, refresh_ttl: timedelta):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.access_ttl = access_ttl
+        self.refresh_ttl = refresh_ttl
+        # user id -> lowest token_version still accepted
+        self.min_versions: Dict[str, int] = {}
+
+    # ---------- access tokens ----------
+    def issue_access(self, user: dict) -> str:
+        now = datetime.now(timezone.utc)
+        payload = {
+            "type": "access",
+            "sub": user["id"],
+            "email": user["email"],
+            "name": user["name"],
+            "role": user["role"],
+            "phone": user.get("phone"),
+            "branch": user.get("branch_id"),
+            "created_at": user["created_at"],
+            "ver": user.get("token_version", 0),
+            "iat": now,
+            "exp": now + self.access_ttl,
+        }
+        import jwt
+        return jwt.encode(payload, self.secret, algorithm=self.algorithm)
+
+    def authenticate(self, token: str) -> dict:
+        """Validate an access token and return the user it describes, without any I/O."""
+        import jwt
+        try:
+            payload = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except jwt.ExpiredSignatureError:
+            raise TokenError("Token expirado")
+        except jwt.InvalidTokenError:
+            raise TokenError("Token inválido")
+        if payload.get("type") != "access":
+            raise TokenError("Token inválido")
+        if payload.get("ver", 0) < self.min_versions.get(payload["sub"], 0):
+            raise TokenError("Token revocado")
+        return {
+            "id": payload["sub"],
+            "email": payload["email"],
+            "name": payload["name"],
+            "role": payload["role"],
+            "phone": payload.get("phone"),
+            "branch_id": payload.get("branch"),
+            "created_at": payload["created_at"],
+        }
+
+    def note_version(self, user_id: str, version: int) -> None:
+        if version > self.min_versions.get(user_id, 0):
+            self.min_versions[user_id] = version
+
+    async def load_recent_versions(self, db) -> int:
+        """Prime the cache with revocations whose old access tokens may still be unexpired."""
+        since = (datetime.now(timezone.utc) - self.access_ttl).isoformat()
+        users = await db.users.find(
+            {"token_version_changed_at": {"$gte": since}}, {"_id": 0, "id": 1, "token_version": 1}
+        ).to_list(None)
+        for user in users:
+            self.note_version(user["id"], user["token_version"])
+        return len(users)
+
+    # ---------- refresh tokens ----------
+    async def issue_refresh(self, db, user_id: str, family_id: Optional[str] = None) -> str:
+        raw = secrets.token_urlsafe(32)
+        now = datetime.now(timezone.utc)
+        await db[REFRESH_COLLECTION].insert_one({
+            "id": str(uuid.uuid4()),
+            "token_hash": hash_refresh(raw),
+            "user_id": user_id,
+            "family_id": family_id or str(uuid.uuid4()),
+            "created_at": now.isoformat(),
+            "rotated_at": None,
+            "revoked": False,
+            "expires_at": now + self.refresh_ttl,
+        })
+        return raw
+
+    async def rotate_refresh(self, db, raw: str) -> dict:
+        """Consume a refresh token; returns its record so the caller can issue the replacement."""
+        token_hash = hash_refresh(raw)
+        now = datetime.now(timezone.utc)
+        record = await db[REFRESH_COLLECTION].find_one_and_update(
+            {"token_hash": token_hash, "rotated_at": None, "revoked": False, "expires_at": {"$gt": now}},
+            {"$set": {"rotated_at": now.isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if record is not None:
+            return record
+        spent = await db[REFRESH_COLLECTION].find_one({"token_hash": token_hash}, {"_id": 0})
+        if spent and spent["rotated_at"] and not spent["revoked"]:
+            if now - datetime.fromisoformat(spent["rotated_at"]) > REUSE_GRACE:
+                # Someone replayed an already rotated token: end every session of that login
+                await self.revoke_family(db, spent["family_id"])
+        raise TokenError("Sesión expirada, inicia sesión nuevamente")
+
+    async def revoke_family(self, db, family_id: str) -> None:
+        await db[REFRESH_COLLECTION].update_many({"family_id": family_id}, {"$set": {"revoked": True}})
+
+    async def revoke_refresh(self, db, raw: str) -> None:
+        record = await db[REFRESH_COLLECTION].find_one({"token_hash": hash_refresh(raw)}, {"_id": 0, "family_id": 1})
+        if record:
+            await self.revoke_family(db, record["family_id"])
+
+    async def create_indexes(self, db) -> None:
+        await db[REFRESH_COLLECTION].create_index("token_hash", unique=True)
+        await db[REFRESH_COLLECTION].create_index("family_id")
+        await db[REFRESH_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+        await db.users.create_index("token_version_changed_at", sparse=True)
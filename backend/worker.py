@@ -0,0 +1,256 @@
+"""Background job worker. Runs next to the API and drains the ``jobs`` collection.
+
+    cd backend && python -m worker --concurrency 8
+    cd backend && python -m worker --mongo-url mongodb://localhost:27017 --db-name polarizadosya
+"""
+import argparse
+import asyncio
+import functools
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import archive
+import channels
+import jobs
+import mailer
+import metrics
+import quote_pdf
+import shared_state
+
+logger = logging.getLogger("worker")
+
+Handler = Callable[[object, dict], Awaitable[None]]
+
+
+# ==================== JOB HANDLERS ====================
+async def send_email_job(db, payload: dict) -> None:
+    # Jobs queued before emails went through the notification channels; SendGrid's client is blocking
+    await asyncio.to_thread(mailer.send_email, payload["to"], payload["subject"], payload["html"])
+
+
+async def render_quote_pdf_job(render_pool: quote_pdf.RenderPool, db, payload: dict) -> None:
+    await quote_pdf.ensure_rendered(db, render_pool, payload["quote_id"])
+
+
+async def dispatch_notifications_job(dispatcher: channels.Dispatcher, db, payload: dict) -> None:
+    counts = await channels.dispatch(db, dispatcher, payload["message_ids"])
+    if counts["failed"]:
+        logger.warning(f"{counts['failed']} notifications could not be delivered")
+
+
+async def archive_documents_job(after_days: int, db, payload: dict) -> None:
+    await archive.run(db, after_days)
+    # Each run books the next one; the dedupe key keeps it to one job per day across workers
+    await archive.schedule(db, jobs._now().date() + timedelta(days=1))
+
+
+HANDLERS: Dict[str, Handler] = {
+    "send_email": send_email_job,
+}
+
+# Per-kind caps below the worker-wide concurrency, e.g. to stay under a provider's rate limit
+KIND_LIMITS: Dict[str, int] = {
+    "send_email": 4,
+    "render_quote_pdf": 2,
+    # Each job already sends up to channels.JOB_SIZE messages concurrently, within the provider's rate
+    channels.DISPATCH_JOB: 4,
+    archive.ARCHIVE_JOB: 1,
+}
+
+
+# ==================== WORKER ====================
+class WorkerMetrics:
+    def __init__(self, window: int = 1000):
+        self.started = time.monotonic()
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+        # Recent samples only, so a long-running worker reports current behaviour
+        self.lag_ms = deque(maxlen=window)
+        self.run_ms = deque(maxlen=window)
+
+    def snapshot(self) -> dict:
+        elapsed = time.monotonic() - self.started
+
+        def pct(values, p):
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2) if ordered else 0.0
+
+        return {
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "throughput_per_s": round(self.completed / elapsed, 2) if elapsed else 0.0,
+            "lag_p50_ms": pct(self.lag_ms, 50),
+            "lag_p95_ms": pct(self.lag_ms, 95),
+            "run_p50_ms": pct(self.run_ms, 50),
+            "run_p95_ms": pct(self.run_ms, 95),
+        }
+
+
+class Worker:
+    """Leases jobs and runs up to ``concurrency`` of them at once.
+
+    A lease is renewed while its handler runs; if the process dies the lease
+    lapses and another worker requeues the job. Failed jobs back off
+    exponentially until ``max_attempts`` and then stay ``failed``.
+    """
+
+    def __init__(self, db, handlers: Dict[str, Handler], concurrency: int = 4,
+                 kind_limits: Optional[Dict[str, int]] = None, lease_seconds: int = 60,
+                 poll_interval: float = 0.5, worker_id: Optional[str] = None):
+        self.db = db
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.kind_limits = kind_limits or {}
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.metrics = WorkerMetrics()
+        self.running: Dict[str, int] = {kind: 0 for kind in handlers}
+
+    def _open_kinds(self) -> List[str]:
+        return [kind for kind in self.handlers
+                if self.running[kind] < self.kind_limits.get(kind, self.concurrency)]
+
+    async def _heartbeat(self, job: dict) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await jobs.extend_lease(self.db, job, self.worker_id, self.lease_seconds):
+                logger.warning(f"Lost lease on job {job['id']}")
+                return
+
+    async def _execute(self, job: dict, slots: asyncio.Semaphore) -> None:
+        started = time.perf_counter()
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self.handlers[job["kind"]](self.db, job["payload"])
+        except Exception as e:
+            outcome = await jobs.fail(self.db, job, self.worker_id, f"{type(e).__name__}: {e}")
+            if outcome == jobs.FAILED:
+                self.metrics.failed += 1
+                logger.error(f"Job {job['id']} ({job['kind']}) failed after {job['attempts']} attempts: {e}")
+            else:
+                self.metrics.retried += 1
+                logger.warning(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed, will retry: {e}")
+        else:
+            await jobs.complete(self.db, job, self.worker_id)
+            self.metrics.completed += 1
+        finally:
+            heartbeat.cancel()
+            self.metrics.run_ms.append((time.perf_counter() - started) * 1000)
+            self.running[job["kind"]] -= 1
+            slots.release()
+
+    async def run(self, stop: asyncio.Event, exit_when_idle: bool = False) -> None:
+        slots = asyncio.Semaphore(self.concurrency)
+        in_flight: set = set()
+        last_recovery = 0.0
+        while not stop.is_set():
+            if time.monotonic() - last_recovery > self.lease_seconds / 2:
+                last_recovery = time.monotonic()
+                recovered = await jobs.recover_expired(self.db)
+                if recovered:
+                    logger.info(f"Recovered {recovered} jobs with expired leases")
+
+            await slots.acquire()
+            job = await jobs.claim(self.db, self.worker_id, self._open_kinds(), self.lease_seconds)
+            if job is None:
+                slots.release()
+                if exit_when_idle and not in_flight:
+                    break
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self.metrics.lag_ms.append(jobs.queue_lag_seconds(job) * 1000)
+            self.running[job["kind"]] += 1
+            task = asyncio.create_task(self._execute(job, slots))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        # Let leased jobs finish instead of waiting for their leases to lapse
+        await asyncio.gather(*in_flight)
+
+
+async def report_metrics(worker: Worker, stop: asyncio.Event, interval: float) -> None:
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=interval)
+        except asyncio.TimeoutError:
+            logger.info(f"Worker metrics: {worker.metrics.snapshot()}")
+
+
+async def main_async(args) -> None:
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url or os.environ['MONGO_URL'])
+    db = client[args.db_name or os.environ['DB_NAME']]
+    await jobs.create_indexes(db)
+    await channels.create_indexes(db)
+    await archive.create_indexes(db)
+
+    # Provider rate limits are shared with every other worker through the same state the API uses
+    shared = shared_state.create(os.environ.get('SHARED_STATE_URL', 'mongodb'), lambda: db)
+    await shared.start()
+    counters = metrics.Counters()
+    counters.start(shared)
+    dispatcher = channels.Dispatcher(channels.transports_from_env(db, os.environ),
+                                     channels.SharedLimiter(shared), counters)
+    # Started by the first render; rendering happens in these processes, not on the event loop
+    render_pool = quote_pdf.RenderPool(int(os.environ.get('PDF_RENDER_WORKERS', '2')))
+    handlers = {**HANDLERS, channels.DISPATCH_JOB: functools.partial(dispatch_notifications_job, dispatcher),
+                "render_quote_pdf": functools.partial(render_quote_pdf_job, render_pool)}
+    archive_after_days = int(os.environ.get('ARCHIVE_AFTER_DAYS', archive.DEFAULT_AFTER_DAYS))
+    if archive_after_days > 0:
+        handlers[archive.ARCHIVE_JOB] = functools.partial(archive_documents_job, archive_after_days)
+        await archive.schedule(db)
+
+    worker = Worker(db, handlers, concurrency=args.concurrency, kind_limits=KIND_LIMITS,
+                    lease_seconds=args.lease_seconds, poll_interval=args.poll_interval)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    logger.info(f"Worker {worker.worker_id} started (concurrency {args.concurrency}, kinds {sorted(handlers)})")
+    reporter = asyncio.create_task(report_metrics(worker, stop, args.stats_interval))
+    await worker.run(stop)
+    await reporter
+    logger.info(f"Worker stopped: {worker.metrics.snapshot()}")
+    render_pool.shutdown()
+    await dispatcher.close()
+    await counters.stop()
+    await counters.flush(shared)
+    await shared.stop()
+    client.close()
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="PolarizadosYA! background job worker")
+    parser.add_argument("--mongo-url", help="Defaults to MONGO_URL")
+    parser.add_argument("--db-name", help="Defaults to DB_NAME")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get('WORKER_CONCURRENCY', '8')))
+    parser.add_argument("--lease-seconds", type=int, default=60)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--stats-interval", type=float, default=60.0, help="Seconds between metric log lines")
+    asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
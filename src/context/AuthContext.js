@@ -27,6 +27,7 @@ export const AuthProvider = ({ children }) => {
                     localStorage.setItem('user', JSON.stringify(response.data));
                 } catch (error) {
                     localStorage.removeItem('token');
+                    localStorage.removeItem('refreshToken');
                     localStorage.removeItem('user');
                 }
             }
@@ -34,13 +35,19 @@ export const AuthProvider = ({ children }) => {
         };
 
         initAuth();
+
+        // The API client refreshes expired tokens on its own; pick up any new role or name
+        const onRefreshed = (event) => setUser(event.detail);
+        window.addEventListener('auth:refreshed', onRefreshed);
+        return () => window.removeEventListener('auth:refreshed', onRefreshed);
     }, []);
 
     const login = async (email, password) => {
         const response = await authAPI.login({ email, password });
-        const { access_token, user: userData } = response.data;
+        const { access_token, refresh_token, user: userData } = response.data;
         
         localStorage.setItem('token', access_token);
+        localStorage.setItem('refreshToken', refresh_token);
         localStorage.setItem('user', JSON.stringify(userData));
         setUser(userData);
         
@@ -49,9 +56,10 @@ export const AuthProvider = ({ children }) => {
 
     const register = async (data) => {
         const response = await authAPI.register(data);
-        const { access_token, user: userData } = response.data;
+        const { access_token, refresh_token, user: userData } = response.data;
         
         localStorage.setItem('token', access_token);
+        localStorage.setItem('refreshToken', refresh_token);
         localStorage.setItem('user', JSON.stringify(userData));
         setUser(userData);
         
@@ -59,7 +67,13 @@ export const AuthProvider = ({ children }) => {
     };
 
     const logout = () => {
+        const refreshToken = localStorage.getItem('refreshToken');
+        if (refreshToken) {
+            // Best effort: the session ends locally even if the server can't be reached
+            authAPI.logout(refreshToken).catch(() => {});
+        }
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         localStorage.removeItem('user');
         setUser(null);
     };
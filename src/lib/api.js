@@ -16,16 +16,62 @@ api.interceptors.request.use((config) => {
     if (token) {
         config.headers.Authorization = `Bearer ${token}`;
     }
+    // Admins can work on another branch; everyone else always gets their own
+    const branchId = localStorage.getItem('branchId');
+    if (branchId) {
+        config.headers['X-Branch-Id'] = branchId;
+    }
     return config;
 });
 
+const clearSession = () => {
+    localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
+    localStorage.removeItem('user');
+    localStorage.removeItem('branchId');
+};
+
+// Access tokens are short-lived: one refresh call is shared by every request that got a 401
+let refreshing = null;
+const refreshSession = () => {
+    if (!refreshing) {
+        const refreshToken = localStorage.getItem('refreshToken');
+        refreshing = (refreshToken
+            ? axios.post(`${API_BASE}/auth/refresh`, { refresh_token: refreshToken })
+            : Promise.reject(new Error('No refresh token'))
+        ).then((response) => {
+            const { access_token, refresh_token, user } = response.data;
+            localStorage.setItem('token', access_token);
+            localStorage.setItem('refreshToken', refresh_token);
+            localStorage.setItem('user', JSON.stringify(user));
+            window.dispatchEvent(new CustomEvent('auth:refreshed', { detail: user }));
+            return access_token;
+        }).finally(() => {
+            refreshing = null;
+        });
+    }
+    return refreshing;
+};
+
+const AUTH_PATHS = ['/auth/login', '/auth/register', '/auth/refresh', '/auth/logout'];
+
 // Handle auth errors
 api.interceptors.response.use(
     (response) => response,
-    (error) => {
-        if (error.response?.status === 401) {
-            localStorage.removeItem('token');
-            localStorage.removeItem('user');
+    async (error) => {
+        const original = error.config;
+        if (error.response?.status === 401 && original && !AUTH_PATHS.includes(original.url)) {
+            if (!original._retried) {
+                original._retried = true;
+                try {
+                    const token = await refreshSession();
+                    original.headers.Authorization = `Bearer ${token}`;
+                    return api(original);
+                } catch (refreshError) {
+                    // fall through to the login redirect
+                }
+            }
+            clearSession();
             window.location.href = '/login';
         }
         return Promise.reject(error);
@@ -37,6 +83,8 @@ export const authAPI = {
     login: (data) => api.post('/auth/login', data),
     register: (data) => api.post('/auth/register', data),
     me: () => api.get('/auth/me'),
+    refresh: (refreshToken) => api.post('/auth/refresh', { refresh_token: refreshToken }),
+    logout: (refreshToken) => api.post('/auth/logout', { refresh_token: refreshToken }),
 };
 
 // Users endpoints
@@ -44,6 +92,16 @@ export const usersAPI = {
     getAll: () => api.get('/users'),
     getTechnicians: () => api.get('/users/technicians'),
     updateRole: (userId, role) => api.put(`/users/${userId}/role`, null, { params: { role } }),
+    updateBranch: (userId, branchId) => api.put(`/users/${userId}/branch`, { branch_id: branchId }),
+};
+
+// Branches endpoints
+export const branchesAPI = {
+    getAll: () => api.get('/branches'),
+    create: (name) => api.post('/branches', { name }),
+    getStats: () => api.get('/dashboard/branches'),
+    // null goes back to the admin's own branch
+    select: (branchId) => (branchId ? localStorage.setItem('branchId', branchId) : localStorage.removeItem('branchId')),
 };
 
 // Vehicles endpoints
@@ -51,7 +109,9 @@ export const vehiclesAPI = {
     create: (data) => api.post('/vehicles', data),
     getAll: (status) => api.get('/vehicles', { params: status ? { status } : {} }),
     getById: (id) => api.get(`/vehicles/${id}`),
+    getTimeline: (id, params) => api.get(`/vehicles/${id}/timeline`, { params }),
     getByPlate: (plate) => api.get(`/vehicles/plate/${plate}`),
+    search: (q, params) => api.get('/vehicles/search', { params: { q, ...params } }),
     updateStatus: (id, status) => api.put(`/vehicles/${id}/status`, { status }),
     assignTechnician: (vehicleId, technicianId) => 
         api.put(`/vehicles/${vehicleId}/assign-technician`, { technician_id: technicianId }),
@@ -69,15 +129,31 @@ export const appointmentsAPI = {
 export const inspectionsAPI = {
     create: (data) => api.post('/inspections', data),
     getByVehicle: (vehicleId) => api.get(`/inspections/vehicle/${vehicleId}`),
+    // Latest condition and damage history per area, without loading the inspections
+    getDamage: (vehicleId) => api.get(`/inspections/vehicle/${vehicleId}/damage`),
+    // params: { group_by: 'area' | 'area,brand' | ..., area, brand, model }
+    getDamageStats: (params) => api.get('/inspections/damage-stats', { params }),
 };
 
 // Quotes endpoints
 export const quotesAPI = {
     create: (data) => api.post('/quotes', data),
-    getAll: () => api.get('/quotes'),
+    getAll: (params) => api.get('/quotes', { params }),
     getById: (id) => api.get(`/quotes/${id}`),
-    approve: (id, signatureUrl, cedulaPhotoUrl) => 
-        api.put(`/quotes/${id}/approve`, null, { params: { signature_url: signatureUrl, cedula_photo_url: cedulaPhotoUrl } }),
+    // Printable PDF as a Blob (open it with URL.createObjectURL)
+    getPdf: (id) => api.get(`/quotes/${id}/pdf`, { responseType: 'blob' }),
+    // Ids from uploadsAPI.upload; images never travel in the URL
+    approve: (id, { signatureId, cedulaPhotoId } = {}) =>
+        api.put(`/quotes/${id}/approve`, { signature_id: signatureId, cedula_photo_id: cedulaPhotoId }),
+};
+
+// Signatures and ID photos: `file` is a Blob (e.g. from canvas.toBlob) or a File; kind is 'signature' or 'cedula'
+export const uploadsAPI = {
+    upload: (kind, file, filename = 'upload') => {
+        const form = new FormData();
+        form.append('file', file, file.name || filename);
+        return api.post(`/uploads/${kind}`, form, { headers: { 'Content-Type': 'multipart/form-data' } });
+    },
 };
 
 // Service Orders endpoints
@@ -85,9 +161,14 @@ export const serviceOrdersAPI = {
     create: (data) => api.post('/service-orders', data),
     getAll: (params) => api.get('/service-orders', { params }),
     getById: (id) => api.get(`/service-orders/${id}`),
+    // params: { services: [...], vehicle_id } or { services, brand, model }; estimated_hours is null without enough history
+    estimate: (params) => api.get('/service-orders/estimate', { params, paramsSerializer: { indexes: null } }),
     updateStatus: (id, status) => api.put(`/service-orders/${id}/status`, { status }),
     assignTechnician: (orderId, technicianId) => 
         api.put(`/service-orders/${orderId}/assign`, { technician_id: technicianId }),
+    // items: [{ order_id, status }] / [{ order_id, technician_id }]; the response has one result per item
+    bulkUpdateStatus: (items) => api.post('/service-orders/bulk-status', { items }),
+    bulkAssignTechnicians: (items) => api.post('/service-orders/bulk-assign', { items }),
 };
 
 // Notifications endpoints
@@ -95,6 +176,8 @@ export const notificationsAPI = {
     getAll: () => api.get('/notifications'),
     markRead: (id) => api.put(`/notifications/${id}/read`),
     getUnreadCount: () => api.get('/notifications/unread-count'),
+    send: (data) => api.post('/notifications', data),
+    sendBulk: (items) => api.post('/notifications/bulk', { items }),
 };
 
 // Dashboard endpoints
@@ -102,4 +185,42 @@ export const dashboardAPI = {
     getStats: () => api.get('/dashboard/stats'),
 };
 
+// Accounting exports: kind is 'quotes' or 'service_orders', params { format: 'csv' | 'xlsx', from, to }
+export const exportsAPI = {
+    download: (kind, params) => api.get(`/exports/${kind}`, { params, responseType: 'blob' }),
+};
+
+// Delta sync: pass the token from the previous call (none for a full snapshot)
+// and call again straight away while has_more is true
+export const syncAPI = {
+    changes: (since, limit) => api.get('/sync', { params: { since, limit } }),
+};
+
+const withQuery = (path, params) => {
+    const query = new URLSearchParams(
+        Object.entries(params || {}).filter(([, value]) => value !== undefined && value !== null)
+    ).toString();
+    return query ? `${path}?${query}` : path;
+};
+
+// Several GETs in one request, authenticated once. `requests` maps an id to [path, params];
+// resolves to { id: { status, data } } and, like Promise.all, rejects if any of them failed
+export const batchAPI = {
+    get: async (requests) => {
+        const response = await api.post('/batch', {
+            requests: Object.entries(requests).map(([id, [path, params]]) => ({ id, path: withQuery(path, params) })),
+        });
+        const results = {};
+        for (const { id, status, body } of response.data.responses) {
+            if (status >= 400) {
+                throw Object.assign(new Error(`Batch request '${id}' failed with status ${status}`), {
+                    response: { status, data: body },
+                });
+            }
+            results[id] = { status, data: body };
+        }
+        return results;
+    },
+};
+
 export default api;
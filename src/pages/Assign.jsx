@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback } from 'react';
-import { vehiclesAPI, usersAPI } from '../lib/api';
+import { vehiclesAPI, batchAPI } from '../lib/api';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
@@ -20,10 +20,10 @@ export const Assign = () => {
     const fetchData = useCallback(async () => {
         try {
             setLoading(true);
-            const [vehiclesRes, techniciansRes] = await Promise.all([
-                vehiclesAPI.getAll(),
-                usersAPI.getTechnicians(),
-            ]);
+            const { vehicles: vehiclesRes, technicians: techniciansRes } = await batchAPI.get({
+                vehicles: ['/vehicles'],
+                technicians: ['/users/technicians'],
+            });
             // Filter vehicles that need assignment (ingresado or agendado)
             const pendingVehicles = vehiclesRes.data.filter(v => 
                 v.status && ['agendado', 'ingresado'].includes(v.status)
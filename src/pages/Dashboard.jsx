@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
-import { dashboardAPI, serviceOrdersAPI, appointmentsAPI } from '../lib/api';
+import { batchAPI } from '../lib/api';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { StatusBadge } from '../components/StatusBadge';
 import { ServiceBadge } from '../components/ServiceBadge';
@@ -26,11 +26,11 @@ export const Dashboard = () => {
     useEffect(() => {
         const fetchData = async () => {
             try {
-                const [statsRes, ordersRes, appointmentsRes] = await Promise.all([
-                    dashboardAPI.getStats(),
-                    serviceOrdersAPI.getAll({}),
-                    appointmentsAPI.getAll(new Date().toISOString().split('T')[0]),
-                ]);
+                const { stats: statsRes, orders: ordersRes, appointments: appointmentsRes } = await batchAPI.get({
+                    stats: ['/dashboard/stats'],
+                    orders: ['/service-orders'],
+                    appointments: ['/appointments', { date: new Date().toISOString().split('T')[0] }],
+                });
                 setStats(statsRes.data);
                 setRecentOrders(ordersRes.data.slice(0, 5));
                 setTodayAppointments(appointmentsRes.data);
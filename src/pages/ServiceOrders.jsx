@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useAuth } from '../context/AuthContext';
-import { serviceOrdersAPI, vehiclesAPI, usersAPI } from '../lib/api';
+import { serviceOrdersAPI, batchAPI } from '../lib/api';
 import { Card, CardContent, CardHeader, CardTitle } from '../components/ui/card';
 import { Button } from '../components/ui/button';
 import { Input } from '../components/ui/input';
@@ -43,11 +43,11 @@ export const ServiceOrders = () => {
                 params.status = activeTab;
             }
             
-            const [ordersRes, vehiclesRes, techniciansRes] = await Promise.all([
-                serviceOrdersAPI.getAll(params),
-                vehiclesAPI.getAll(),
-                usersAPI.getTechnicians(),
-            ]);
+            const { orders: ordersRes, vehicles: vehiclesRes, technicians: techniciansRes } = await batchAPI.get({
+                orders: ['/service-orders', params],
+                vehicles: ['/vehicles'],
+                technicians: ['/users/technicians'],
+            });
             setOrders(ordersRes.data);
             setVehicles(vehiclesRes.data);
             setTechnicians(techniciansRes.data);
@@ -0,0 +1,91 @@
+"""Fixtures shared by the API tests.
+
+Every test gets its own app on an in-memory mongomock-motor database, so the
+suite needs no MongoDB. The outbox consumer doesn't run in the background:
+tests deliver side effects themselves with ``deliver_outbox``.
+"""
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import pytest
+
+# The backend is run from its own directory and imports its modules flat
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+from api import core  # noqa: E402
+from api.app import create_app  # noqa: E402
+from api.security import create_token  # noqa: E402
+from settings import Settings  # noqa: E402
+
+MAIN_BRANCH = "principal"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def settings():
+    return Settings(mongo_url="mongodb://unused", db_name="polarizadosya_test", jwt_secret="test-" + "s" * 32,
+                    outbox_enabled=False, shared_state_url="memory", auth_rate_limit_enabled=False,
+                    default_branch_id=MAIN_BRANCH)
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["polarizadosya_test"]
+
+
+@pytest.fixture
+async def client(settings, db):
+    """An httpx client on a fresh app; startup (indexes, backfills) has run when the test starts."""
+    app = create_app(settings, database=db)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            yield http
+
+
+@pytest.fixture
+def login(db):
+    """``user, headers = await login("tecnico")``: a new user of that role and an access token for it."""
+    async def make(role: str = "admin", branch_id: str = MAIN_BRANCH, **fields):
+        user = {
+            "id": str(uuid.uuid4()),
+            "email": f"{role}-{uuid.uuid4().hex[:8]}@test.example.com",
+            "name": f"{role.title()} Test",
+            "role": role,
+            "phone": "3000000000",
+            "branch_id": branch_id,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        }
+        await db.users.insert_one(dict(user))
+        return user, {"Authorization": f"Bearer {create_token(user)}"}
+    return make
+
+
+@pytest.fixture
+def new_vehicle(client):
+    """``vehicle = await new_vehicle(headers)``: registers a vehicle through the API."""
+    async def make(headers: dict, **fields):
+        body = {"plate": f"T{uuid.uuid4().hex[:5].upper()}", "brand": "Mazda", "model": "3", "year": 2022,
+                "color": "Gris", "client_name": "Cliente Prueba", "client_phone": "3001234567", **fields}
+        response = await client.post("/api/vehicles", headers=headers, json=body)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make
+
+
+@pytest.fixture
+def deliver_outbox():
+    """``await deliver_outbox()``: run every pending side effect once, as the consumer's next poll would."""
+    async def run():
+        return await core.outbox_consumer.run_once()
+    return run
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import archive
+import events
+import outbox
+import sync
+from api.app import status_event_sources
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+LONG_AGO = (datetime.now(timezone.utc) - timedelta(days=archive.DEFAULT_AFTER_DAYS * 2)).isoformat()
+
+
+async def finished_order(client, headers, new_vehicle, db) -> dict:
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/service-orders", headers=headers,
+                                 json={"vehicle_id": vehicle["id"], "services": ["polarizado"]})
+    assert response.status_code == 200, response.text
+    order_id = response.json()["id"]
+    for status in ("en_proceso", "en_revision", "terminado"):
+        response = await client.put(f"/api/service-orders/{order_id}/status", headers=headers, json={"status": status})
+        assert response.status_code == 200, response.text
+    # Finished long enough ago to be archived
+    await db.service_orders.update_one({"id": order_id}, {"$set": {"completed_at": LONG_AGO}})
+    return await db.service_orders.find_one({"id": order_id}, {"_id": 0, **outbox.HIDDEN_FIELDS})
+
+
+def unstamped(doc: dict) -> dict:
+    return {field: value for field, value in doc.items() if field not in (sync.SEQ_FIELD, sync.UPDATED_FIELD)}
+
+
+async def terminados(client, headers) -> int:
+    response = await client.get("/api/dashboard/stats", headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["orders_by_status"]["terminado"]
+
+
+async def test_archive_round_trip(client, login, new_vehicle, deliver_outbox, db):
+    _, headers = await login()
+    order = await finished_order(client, headers, new_vehicle, db)
+    await deliver_outbox()
+
+    assert await archive.run(db, collections=["service_orders"]) == {"service_orders": 1}
+    assert await db.service_orders.count_documents({"id": order["id"]}) == 0
+    assert await archive.find_one(db, "service_orders", order["id"]) == order
+    assert await db[sync.TOMBSTONES_COLLECTION].count_documents({"id": order["id"]}) == 1
+
+    assert await archive.restore(db, "service_orders", [order["id"]]) == 1
+    restored = await db.service_orders.find_one({"id": order["id"]}, {"_id": 0, **outbox.HIDDEN_FIELDS})
+    # Back as it was, with a new sync stamp so devices that dropped it pick it up again
+    assert unstamped(restored) == {**unstamped(order), archive.RESTORED_FIELD: restored[archive.RESTORED_FIELD]}
+    assert restored[sync.SEQ_FIELD] > order[sync.SEQ_FIELD]
+    assert await db[archive.archive_name("service_orders")].count_documents({}) == 0
+    assert await db[sync.TOMBSTONES_COLLECTION].count_documents({"id": order["id"]}) == 0
+    # Restored documents stay hot for another full period
+    assert await archive.run(db, collections=["service_orders"]) == {"service_orders": 0}
+
+
+async def test_pending_side_effects_keep_the_order_hot(client, login, new_vehicle, db):
+    _, headers = await login()
+    order = await finished_order(client, headers, new_vehicle, db)
+
+    assert await archive.run(db, collections=["service_orders"]) == {"service_orders": 0}
+    assert await db.service_orders.count_documents({"id": order["id"]}) == 1
+
+
+async def test_reads_by_id_fall_back_to_the_archive(client, login, new_vehicle, deliver_outbox, db):
+    _, headers = await login()
+    order = await finished_order(client, headers, new_vehicle, db)
+    await deliver_outbox()
+    await archive.run(db, collections=["service_orders"])
+
+    response = await client.get(f"/api/service-orders/{order['id']}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["completed_at"] == LONG_AGO
+    found = await archive.find_by_ids(db, "service_orders", [order["id"], "no-existe"])
+    assert list(found) == [order["id"]]
+    # Collections that aren't archived have nothing to fall back to
+    assert await archive.find_by_ids(db, "vehicles", [order["vehicle_id"]]) == {}
+
+
+async def test_archived_orders_stay_counted_as_terminado(client, login, new_vehicle, deliver_outbox, db):
+    _, headers = await login()
+    await finished_order(client, headers, new_vehicle, db)
+    await deliver_outbox()
+    assert await terminados(client, headers) == 1
+
+    await archive.run(db, collections=["service_orders"])
+    assert await terminados(client, headers) == 1
+
+
+async def test_backfill_counts_orders_archived_before_the_log(db):
+    doc = {"id": "orden-antigua", "branch_id": MAIN_BRANCH, "status": "terminado", "created_at": LONG_AGO,
+           "completed_at": LONG_AGO}
+    await db[archive.archive_name("service_orders")].insert_one(
+        archive.record("service_orders", doc, datetime.now(timezone.utc)))
+
+    assert await events.backfill(db, status_event_sources()) == 1
+    logged = await db[events.EVENTS_COLLECTION].find_one({"entity_id": doc["id"]}, {"_id": 0})
+    assert (logged["entity_type"], logged["from_status"], logged["to_status"]) == ("service_order", None, "terminado")
+    assert logged["branch_id"] == MAIN_BRANCH
@@ -0,0 +1,65 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def batch(client, headers, *paths, ids=None):
+    ids = ids or [str(n) for n in range(len(paths))]
+    requests = [{"id": item_id, "path": path} for item_id, path in zip(ids, paths)]
+    return await client.post("/api/batch", headers=headers, json={"requests": requests})
+
+
+def answers(response) -> list:
+    assert response.status_code == 200, response.text
+    return [(r["id"], r["status"]) for r in response.json()["responses"]]
+
+
+async def test_responses_come_back_in_request_order(client, login, new_vehicle):
+    _, headers = await login()
+    vehicles = [await new_vehicle(headers) for _ in range(2)]
+
+    response = await batch(client, headers, f"/vehicles/{vehicles[1]['id']}", "/no-existe",
+                           f"/vehicles/{vehicles[0]['id']}", "/dashboard/stats", ids=["b", "a", "c", "d"])
+    assert answers(response) == [("b", 200), ("a", 404), ("c", 200), ("d", 200)]
+    bodies = [r["body"] for r in response.json()["responses"]]
+    assert [bodies[0]["id"], bodies[2]["id"]] == [vehicles[1]["id"], vehicles[0]["id"]]
+    assert bodies[1] == {"detail": "Not Found"}
+    assert "orders_by_status" in bodies[3]
+
+
+async def test_query_strings_reach_the_sub_request(client, login, new_vehicle):
+    _, headers = await login()
+    vehicle = await new_vehicle(headers)
+
+    response = await batch(client, headers, f"/vehicles/plate/{vehicle['plate'].lower()}",
+                           "/service-orders?status=nada")
+    assert answers(response) == [("0", 200), ("1", 400)]
+    assert response.json()["responses"][0]["body"]["id"] == vehicle["id"]
+
+
+async def test_sub_requests_keep_their_role_checks(client, login):
+    _, admin = await login()
+    _, technician = await login("tecnico")
+
+    assert answers(await batch(client, admin, "/events")) == [("0", 200)]
+    response = await batch(client, technician, "/events", "/dashboard/stats")
+    assert answers(response) == [("0", 403), ("1", 200)]
+    assert response.json()["responses"][0]["body"]["detail"] == "Acceso denegado"
+
+
+async def test_items_that_cannot_run_fail_alone(client, login):
+    _, headers = await login()
+
+    response = await batch(client, headers, "/batch", "vehicles", "/exports/quotes", "/dashboard/stats")
+    assert answers(response) == [("0", 400), ("1", 400), ("2", 406), ("3", 200)]
+    details = [r["body"].get("detail") for r in response.json()["responses"][:3]]
+    assert details == ["Un lote no puede contener otro lote", "La ruta debe comenzar con /", "La respuesta no es JSON"]
+
+
+async def test_batch_itself_is_validated(client, login):
+    _, headers = await login()
+
+    response = await batch(client, headers, "/dashboard/stats", "/dashboard/stats", ids=["x", "x"])
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Identificadores repetidos en el lote"
+    assert (await batch(client, {}, "/dashboard/stats")).status_code == 403
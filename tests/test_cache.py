@@ -0,0 +1,53 @@
+import pytest
+
+from api import core
+from cache import DocumentCache, last_modified, not_modified_since
+
+pytestmark = pytest.mark.anyio
+
+
+def test_last_modified_comes_from_the_document():
+    doc = {"created_at": "2025-03-01T10:00:00+00:00", "updated_at": "2025-03-02T08:30:15.123456+00:00"}
+    assert last_modified(doc) == "Sun, 02 Mar 2025 08:30:15 GMT"
+    assert last_modified({"created_at": "2025-03-01T10:00:00+00:00"}) == "Sat, 01 Mar 2025 10:00:00 GMT"
+
+
+def test_refilled_entry_keeps_its_last_modified():
+    cache = DocumentCache(max_entries=1)
+    doc = {"created_at": "2025-03-01T10:00:00+00:00"}
+    first = cache.put("vehicles", "a", b"{}", cache.begin(), last_modified(doc))
+    cache.put("vehicles", "b", b"{}", cache.begin(), last_modified(doc))  # evicts "a"
+    assert cache.get("vehicles", "a") is None
+    again = cache.put("vehicles", "a", b"{}", cache.begin(), last_modified(doc))
+    assert again.last_modified == first.last_modified
+
+
+def test_not_modified_since():
+    modified = "Sun, 02 Mar 2025 08:30:15 GMT"
+    assert not_modified_since(modified, modified)
+    assert not_modified_since("Mon, 03 Mar 2025 00:00:00 GMT", modified)
+    assert not not_modified_since("Sat, 01 Mar 2025 00:00:00 GMT", modified)
+    assert not not_modified_since("not a date", modified)
+    assert not not_modified_since(None, modified)
+
+
+async def test_detail_revalidates_after_eviction(client, login, new_vehicle):
+    _, headers = await login("asesor")
+    vehicle = await new_vehicle(headers)
+    path = f"/api/vehicles/{vehicle['id']}"
+
+    first = await client.get(path, headers=headers)
+    assert first.status_code == 200
+    core.document_cache.clear()
+    second = await client.get(path, headers=headers)
+    assert second.headers["last-modified"] == first.headers["last-modified"]
+    assert second.headers["etag"] == first.headers["etag"]
+
+    by_date = await client.get(path, headers={**headers, "If-Modified-Since": first.headers["last-modified"]})
+    assert by_date.status_code == 304
+    by_etag = await client.get(path, headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert by_etag.status_code == 304
+    # If-None-Match wins over If-Modified-Since
+    stale_etag = await client.get(path, headers={**headers, "If-None-Match": '"stale"',
+                                                "If-Modified-Since": first.headers["last-modified"]})
+    assert stale_etag.status_code == 200
@@ -0,0 +1,68 @@
+import pytest
+
+import channels
+import jobs
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def queue_db(db):
+    await channels.create_indexes(db)
+    await jobs.create_indexes(db)
+    return db
+
+
+def test_normalize_phone():
+    assert channels.normalize_phone("300 123 4567") == "573001234567"
+    assert channels.normalize_phone("+57 (300) 123-4567") == "573001234567"
+    assert channels.normalize_phone("12") is None
+
+
+async def test_queue_is_idempotent(queue_db):
+    messages = [channels.new_message(channels.EMAIL, "cliente@test.example.com", "Hola", "", message_id=f"m{n}")
+                for n in range(3)]
+
+    await channels.queue(queue_db, messages)
+    await channels.queue(queue_db, messages)
+    assert await queue_db[channels.MESSAGES_COLLECTION].count_documents({}) == 3
+    assert await queue_db[jobs.JOBS_COLLECTION].count_documents({"kind": channels.DISPATCH_JOB}) == 1
+
+
+async def test_retryable_failures_stay_queued_until_sent(queue_db):
+    email = channels.FakeTransport(channels.EMAIL, fail_every=2, max_batch=2)
+    dispatcher = channels.Dispatcher({channels.EMAIL: email})
+    messages = [channels.new_message(channels.EMAIL, f"c{n}@test.example.com", "Hola", "", message_id=f"m{n}")
+                for n in range(4)]
+    await channels.queue(queue_db, messages)
+    ids = [m["id"] for m in messages]
+
+    with pytest.raises(channels.DispatchIncomplete):
+        await channels.dispatch(queue_db, dispatcher, ids)
+    assert await channels.stats(queue_db) == {channels.EMAIL: {channels.SENT: 2, channels.QUEUED: 2}}
+
+    email.fail_every = 0
+    assert await channels.dispatch(queue_db, dispatcher, ids) == {"sent": 2, "failed": 0, "retry": 0}
+    # Already sent: a repeated job has nothing left to claim
+    assert await channels.dispatch(queue_db, dispatcher, ids) == {"sent": 0, "failed": 0, "retry": 0}
+    assert sorted(m["id"] for m in email.sent) == ids
+
+
+async def test_unconfigured_channel_fails_without_retry(queue_db):
+    dispatcher = channels.Dispatcher({})
+    message = channels.new_message(channels.WHATSAPP, "573001234567", "Hola", "Listo")
+    await channels.queue(queue_db, [message])
+
+    assert await channels.dispatch(queue_db, dispatcher, [message["id"]]) == {"sent": 0, "failed": 1, "retry": 0}
+    stored = await queue_db[channels.MESSAGES_COLLECTION].find_one({"id": message["id"]})
+    assert stored["last_error"] == "Canal 'whatsapp' no configurado"
+
+
+async def test_internal_redelivery_keeps_one_notification(queue_db):
+    transport = channels.InternalTransport(queue_db)
+    await queue_db.notifications.create_index("id", unique=True)
+    message = channels.new_message(channels.INTERNAL, "user-1", "Orden lista", "Tu orden terminó")
+
+    for _ in range(2):
+        assert (await transport.send_batch([message]))[0].ok
+    assert await queue_db.notifications.count_documents({"recipient_id": "user-1"}) == 1
@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import archive
+import damage
+import outbox
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+
+def inspection(inspection_id: str, created_at: str, **areas) -> dict:
+    """``areas`` maps an area to whether it was found damaged."""
+    return {"id": inspection_id, "branch_id": MAIN_BRANCH, "vehicle_id": "v1", "created_at": created_at,
+            "items": [{"area": area, "condition": "rayado" if damaged else "bien", "has_damage": damaged}
+                      for area, damaged in areas.items()]}
+
+
+@pytest.fixture
+async def inspections(db):
+    await db.vehicles.insert_one({"id": "v1", "branch_id": MAIN_BRANCH, "brand": "Mazda", "model": "3"})
+    return [inspection("i1", "2026-01-01T10:00:00+00:00", puerta=True, capo=False),
+            inspection("i2", "2026-02-01T10:00:00+00:00", puerta=False),
+            inspection("i3", "2026-03-01T10:00:00+00:00", puerta=True, capo=True)]
+
+
+async def index_docs(db) -> dict:
+    return {doc["area"]: doc async for doc in db[damage.DAMAGE_COLLECTION].find({}, {"_id": 0})}
+
+
+async def test_indexing_twice_counts_once(db, inspections):
+    await db.inspections.insert_many([dict(i) for i in inspections])
+    ids = [i["id"] for i in inspections]
+
+    assert await damage.index_by_ids(db, ids) == 3
+    first = await index_docs(db)
+    await damage.index_by_ids(db, ids)
+    await damage.index_by_ids(db, ids[:1])
+    assert await index_docs(db) == first
+
+    door = first["puerta"]
+    assert (door["inspections"], door["damaged_inspections"]) == (3, 2)
+    assert door["first_damaged_at"] == inspections[0]["created_at"]
+    assert door["last_damaged_at"] == inspections[2]["created_at"]
+    assert door["latest"]["inspection_id"] == "i3"
+    assert (door["brand"], door["model"]) == ("Mazda", "3")
+
+
+async def test_late_delivery_keeps_latest_and_history_in_order(db, inspections):
+    for i in reversed(inspections):
+        await damage.index(db, [i])
+
+    door = (await index_docs(db))["puerta"]
+    assert door["latest"]["inspection_id"] == "i3"
+    assert [seen["inspection_id"] for seen in door["history"]] == ["i1", "i2", "i3"]
+    assert door["first_damaged_at"] == inspections[0]["created_at"]
+
+
+async def test_rebuild_matches_incremental_indexing(db, inspections):
+    await db.inspections.insert_many([dict(i) for i in inspections])
+    await damage.index_by_ids(db, [i["id"] for i in inspections])
+    incremental = await index_docs(db)
+
+    await db[damage.DAMAGE_COLLECTION].delete_many({})
+    # The oldest inspection is in the archive by now
+    await db.inspections.delete_one({"id": "i1"})
+    await db[archive.archive_name("inspections")].insert_one(
+        archive.record("inspections", inspections[0], datetime.now(timezone.utc)))
+    assert await damage.rebuild(db) == 3
+    assert await index_docs(db) == incremental
+
+
+async def test_backfill_only_fills_an_empty_index(db, inspections):
+    await db.inspections.insert_many([dict(i) for i in inspections[:2]])
+    assert await damage.backfill(db) == 2
+
+    # Later inspections come through the outbox; the backfill leaves a filled index alone
+    await db.inspections.insert_one(dict(inspections[2]))
+    assert await damage.backfill(db) == 0
+    assert (await index_docs(db))["puerta"]["inspections"] == 2
+
+
+async def test_redelivered_inspection_is_indexed_once(client, login, new_vehicle, deliver_outbox, db):
+    _, headers = await login()
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/inspections", headers=headers, json={
+        "vehicle_id": vehicle["id"], "items": [{"area": "puerta", "condition": "rayado", "has_damage": True}],
+    })
+    assert response.status_code == 200, response.text
+    inspection_id = response.json()["id"]
+    pending = (await db.inspections.find_one({"id": inspection_id}))[outbox.OUTBOX_FIELD]
+
+    await deliver_outbox()
+    await db.inspections.update_one({"id": inspection_id}, outbox.push(pending))
+    await deliver_outbox()
+
+    areas = (await client.get(f"/api/inspections/vehicle/{vehicle['id']}/damage", headers=headers)).json()
+    assert [(area["area"], area["inspections"], area["damaged_inspections"]) for area in areas] == [("puerta", 1, 1)]
+    assert [seen["inspection_id"] for seen in areas[0]["history"]] == [inspection_id]
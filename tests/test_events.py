@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import events
+import state_machine
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+ORDERS = [(state_machine.SERVICE_ORDER.collection, state_machine.SERVICE_ORDER.entity_type)]
+
+
+async def new_order(client, headers, new_vehicle) -> dict:
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/service-orders", headers=headers,
+                                 json={"vehicle_id": vehicle["id"], "services": ["polarizado"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def age_log(db, by: timedelta = events.GAP_TIMEOUT * 2):
+    # Moves every logged event back in time, past the point where a rebuild folds it
+    async for event in db[events.EVENTS_COLLECTION].find({}, {"_id": 0, "id": 1, "logged_at": 1}):
+        logged = datetime.fromisoformat(event["logged_at"]) - by
+        await db[events.EVENTS_COLLECTION].update_one({"id": event["id"]}, {"$set": {"logged_at": logged.isoformat()}})
+
+
+def order(status: str) -> dict:
+    return {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": status,
+            "created_at": datetime.now(timezone.utc).isoformat()}
+
+
+async def test_conflicting_transitions_apply_once(client, login, new_vehicle):
+    _, headers = await login()
+    order_id = (await new_order(client, headers, new_vehicle))["id"]
+
+    responses = await asyncio.gather(*(
+        client.put(f"/api/service-orders/{order_id}/status", headers=headers, json={"status": "en_proceso"})
+        for _ in range(2)
+    ))
+    assert sorted(r.status_code for r in responses) == [200, 409]
+    # A move the current status doesn't allow is refused the same way
+    response = await client.put(f"/api/service-orders/{order_id}/status", headers=headers, json={"status": "terminado"})
+    assert response.status_code == 409
+
+
+async def test_created_event_in_the_outbox_is_counted_once(client, login, new_vehicle, deliver_outbox, db):
+    _, headers = await login()
+    await new_order(client, headers, new_vehicle)
+    projection = events.StatusCountProjection(state_machine.SERVICE_ORDER.entity_type)
+
+    # The order is written, its creation event still waits in the outbox
+    assert (await projection.refresh(db)).get(MAIN_BRANCH, {}).get("agendado", 0) == 0
+    await deliver_outbox()
+    assert (await projection.refresh(db))[MAIN_BRANCH]["agendado"] == 1
+    await projection.rebuild(db)
+    assert (await projection.refresh(db))[MAIN_BRANCH]["agendado"] == 1
+
+    response = await client.get("/api/dashboard/stats", headers=headers)
+    assert response.json()["orders_by_status"]["agendado"] == 1
+
+
+async def test_rebuild_folds_settled_events_and_applies_the_rest(db):
+    order_id = str(uuid.uuid4())
+    await events.append_events(db, [events.new_event("service_order", order_id, None, "agendado", None, branch_id=MAIN_BRANCH)])
+    await age_log(db)
+    await events.append_events(db, [events.new_event("service_order", order_id, "agendado", "en_proceso", None, branch_id=MAIN_BRANCH)])
+
+    assert await events.settled_seq(db) == 1
+    projection = events.StatusCountProjection("service_order")
+    await projection.rebuild(db)
+    assert projection.counts == {MAIN_BRANCH: {"agendado": 1}}
+    assert projection.seq == 1
+    assert await projection.refresh(db) == {MAIN_BRANCH: {"agendado": 0, "en_proceso": 1}}
+
+
+async def test_backfill_logs_creations_from_before_the_log(db):
+    untouched, moved, logged = order("agendado"), order("en_proceso"), order("agendado")
+    await db.service_orders.insert_many([dict(untouched), dict(moved), dict(logged)])
+    # Moved after the log existed, created before it; the other one has its own creation event
+    await events.append_events(db, [
+        events.new_event("service_order", moved["id"], "agendado", "en_proceso", None),
+        events.new_event("service_order", logged["id"], None, "agendado", None, branch_id=MAIN_BRANCH),
+    ])
+
+    assert await events.backfill(db, ORDERS) == 2
+    assert await events.backfill(db, ORDERS) == 0
+    assert await db[events.EVENTS_COLLECTION].count_documents({"branch_id": None}) == 0
+    await age_log(db)
+    projection = events.StatusCountProjection("service_order")
+    await projection.rebuild(db)
+    assert projection.counts == {MAIN_BRANCH: {"agendado": 2, "en_proceso": 1}}
+
+
+async def test_backfill_leaves_pending_creations_to_the_outbox(client, login, new_vehicle, db):
+    _, headers = await login()
+    await new_order(client, headers, new_vehicle)
+    await db.counters.delete_one({"_id": events.BACKFILL_MARKER})
+
+    assert await events.backfill(db, ORDERS) == 0
+
+
+async def test_refresh_folds_forward_from_the_saved_checkpoint(db, monkeypatch):
+    monkeypatch.setattr(events, "COUNTS_PAGE_SIZE", 2)
+    created = [events.new_event("service_order", str(uuid.uuid4()), None, "agendado", None, branch_id=MAIN_BRANCH)
+               for _ in range(5)]
+    quote = events.new_event("quote", "q1", None, "pending", None, branch_id=MAIN_BRANCH)
+    await events.append_events(db, created + [quote])
+    await age_log(db)
+
+    # Every page is read, and only this projection's entity type counts
+    first = events.StatusCountProjection("service_order")
+    assert await first.refresh(db) == {MAIN_BRANCH: {"agendado": 5}}
+    assert (await db[events.COUNTS_COLLECTION].find_one({"_id": "service_order"}))["seq"] == 6
+
+    # Another worker starts from the checkpoint, not from the start of the log
+    await db[events.EVENTS_COLLECTION].delete_many({"seq": {"$lte": 6}})
+    await events.append_events(db, [events.new_event("service_order", created[0]["entity_id"], "agendado", "en_proceso",
+                                                     None, branch_id=MAIN_BRANCH)])
+    other = events.StatusCountProjection("service_order")
+    assert await other.refresh(db) == {MAIN_BRANCH: {"agendado": 4, "en_proceso": 1}}
+    # Still inside the gap window: applied, not saved
+    assert other.seq == 6
+
+
+async def test_stale_worker_takes_the_newer_checkpoint(db):
+    await events.append_events(db, [events.new_event("service_order", "o1", None, "agendado", None,
+                                                     branch_id=MAIN_BRANCH)])
+    await age_log(db)
+    stale = events.StatusCountProjection("service_order")
+    await stale.refresh(db)
+    await events.append_events(db, [events.new_event("service_order", "o1", "agendado", "en_proceso", None,
+                                                     branch_id=MAIN_BRANCH)])
+    await age_log(db)
+    await events.StatusCountProjection("service_order").refresh(db)
+
+    # Its save over seq 1 loses to the one at seq 2; it continues from that one instead
+    await events.append_events(db, [events.new_event("service_order", "o2", None, "agendado", None,
+                                                     branch_id=MAIN_BRANCH)])
+    await age_log(db)
+    assert await stale.refresh(db) == {MAIN_BRANCH: {"agendado": 1, "en_proceso": 1}}
+    assert stale.seq == 2
@@ -0,0 +1,114 @@
+import csv
+import io
+import uuid
+import zipfile
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+import pytest
+
+import archive
+import exports
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def quote(approved_at: str, client_name: str = "Cliente Prueba", **fields) -> dict:
+    return {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": "approved", "vehicle_id": "v1",
+            "created_at": "2026-01-01T00:00:00+00:00", "approved_at": approved_at, "client_name": client_name,
+            "client_email": "cliente@test.example.com", "items": [{"service": "polarizado"}, {"service": "ppf"}],
+            "subtotal": 1000, "tax": 190.0, "total": 1190.0, **fields}
+
+
+@pytest.fixture
+async def quotes(db):
+    """An archived quote, two hot ones, and one still pending, on a vehicle with plate ABC123."""
+    await db.vehicles.insert_one({"id": "v1", "branch_id": MAIN_BRANCH, "plate": "ABC123"})
+    old = quote("2025-01-10T10:00:00+00:00", "Cliente Archivado")
+    await db[archive.archive_name("quotes")].insert_one(archive.record("quotes", old, datetime.now(timezone.utc)))
+    hot = [quote("2026-03-02T10:00:00+00:00", "=HYPERLINK(\"http://x\")"),
+           quote("2026-03-01T10:00:00+00:00", "Ñandú \x01Pérez")]
+    await db.quotes.insert_many([dict(doc) for doc in hot] + [quote(None, status="pending")])
+    return [old, hot[1], hot[0]]
+
+
+async def export(client, headers, kind: str = "quotes", **params):
+    return await client.get(f"/api/exports/{kind}", headers=headers, params=params)
+
+
+def xlsx_rows(content: bytes) -> list:
+    with zipfile.ZipFile(io.BytesIO(content)) as book:
+        assert book.testzip() is None
+        assert {"[Content_Types].xml", "_rels/.rels", "xl/workbook.xml", "xl/_rels/workbook.xml.rels",
+                "xl/worksheets/sheet1.xml"} <= set(book.namelist())
+        sheet = ElementTree.fromstring(book.read("xl/worksheets/sheet1.xml"))
+    rows = []
+    for row in sheet.iter(f"{SHEET}row"):
+        cells = []
+        for cell in row:
+            value = cell.find(f"{SHEET}v")
+            text = cell.find(f"{SHEET}is/{SHEET}t")
+            cells.append(float(value.text) if value is not None else text.text if text is not None else None)
+        rows.append(cells)
+    return rows
+
+
+async def test_csv_lists_archived_then_hot_in_date_order(client, login, quotes, monkeypatch):
+    _, headers = await login()
+    # Batches smaller than the export: rows keep coming across chunks
+    monkeypatch.setattr(exports, "BATCH_SIZE", 2)
+
+    response = await export(client, headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == exports.CSV_CONTENT_TYPE
+    assert response.headers["content-disposition"] == 'attachment; filename="cotizaciones.csv"'
+    assert "content-length" not in response.headers
+    assert response.content.startswith("\ufeff".encode("utf-8"))
+    table = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert table[0] == exports.EXPORTS["quotes"].headers
+    assert [row[0] for row in table[1:]] == [doc["id"] for doc in quotes]
+    assert table[1][5:] == ["ABC123", "polarizado; ppf", "1000", "190.0", "1190.0"]
+    # A typed-in formula is exported as text
+    assert table[3][3] == "'=HYPERLINK(\"http://x\")"
+
+
+async def test_date_range_filters_the_export(client, login, quotes):
+    _, headers = await login()
+
+    response = await export(client, headers, **{"from": "2026-03-01", "to": "2026-03-01"})
+    assert response.headers["content-disposition"] == 'attachment; filename="cotizaciones_2026-03-01_2026-03-01.csv"'
+    table = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert [row[0] for row in table[1:]] == [quotes[1]["id"]]
+    assert (await export(client, headers, **{"from": "2026-03-02", "to": "2026-03-01"})).status_code == 400
+
+
+async def test_xlsx_is_a_readable_workbook(client, login, quotes, monkeypatch):
+    _, headers = await login()
+    monkeypatch.setattr(exports, "BATCH_SIZE", 2)
+
+    response = await export(client, headers, format="xlsx")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == exports.XLSX_CONTENT_TYPE
+    rows = xlsx_rows(response.content)
+    assert rows[0] == exports.EXPORTS["quotes"].headers
+    assert [row[0] for row in rows[1:]] == [doc["id"] for doc in quotes]
+    assert rows[1][5:] == ["ABC123", "polarizado; ppf", 1000.0, 190.0, 1190.0]
+    # Control characters XML can't carry are dropped; accents go through
+    assert rows[2][3] == "Ñandú Pérez"
+
+
+async def test_xlsx_refuses_more_rows_than_a_sheet_holds(client, login, quotes, monkeypatch):
+    _, headers = await login()
+    monkeypatch.setattr(exports, "XLSX_MAX_ROWS", 3)
+
+    response = await export(client, headers, format="xlsx")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "3 filas no caben en una hoja XLSX; use CSV o acote las fechas"
+
+
+async def test_technicians_cannot_export(client, login):
+    _, headers = await login("tecnico")
+    assert (await export(client, headers, "service_orders")).status_code == 403
@@ -0,0 +1,42 @@
+import pytest
+
+import filters
+
+pytestmark = pytest.mark.anyio
+
+ROUTES = {"/api/service-orders": filters.SERVICE_ORDERS, "/api/quotes": filters.QUOTES,
+          "/api/appointments": filters.APPOINTMENTS, "/api/vehicles": filters.VEHICLES}
+
+
+def test_compile_uses_the_whitelist():
+    query = filters.SERVICE_ORDERS.compile({"status": "agendado,en_proceso", "created_from": "2025-01-01", "sort": "-created_at"})
+    assert query.filter == {"status": {"$in": ["agendado", "en_proceso"]}, "created_at": {"$gte": "2025-01-01"}}
+    assert query.sort == [("created_at", -1)]
+    with pytest.raises(filters.FilterError):
+        filters.SERVICE_ORDERS.compile({"client_name": "x"})
+    with pytest.raises(filters.FilterError):
+        filters.SERVICE_ORDERS.compile({"status": "perdido"})
+
+
+async def test_openapi_lists_exactly_what_the_filters_accept(client):
+    schema = (await client.get("/openapi.json")).json()
+    for path, spec in ROUTES.items():
+        query = [p["name"] for p in schema["paths"][path]["get"].get("parameters", []) if p["in"] == "query"]
+        assert sorted(query) == sorted([*spec.filters, *filters.PAGINATION_PARAMS]), path
+
+
+async def test_list_filters(client, login, new_vehicle):
+    _, headers = await login("asesor")
+    technician, _ = await login("tecnico")
+    assigned = await new_vehicle(headers)
+    await new_vehicle(headers)
+    response = await client.put(f"/api/vehicles/{assigned['id']}/assign-technician", headers=headers,
+                                json={"technician_id": technician["id"]})
+    assert response.status_code == 200
+
+    response = await client.get("/api/vehicles", headers=headers, params={"technician_id": technician["id"]})
+    assert [v["id"] for v in response.json()] == [assigned["id"]]
+    response = await client.get("/api/vehicles", headers=headers, params={"status": "volando"})
+    assert response.status_code == 400
+    response = await client.get("/api/service-orders", headers=headers, params={"client_name": "x"})
+    assert response.status_code == 400
@@ -0,0 +1,126 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+import forecast
+import state_machine
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+SERVICES = ("polarizado", "nanoceramica", "ultrasecure")
+
+
+def forecaster(**options) -> forecast.DurationForecaster:
+    return forecast.DurationForecaster(SERVICES, **options)
+
+
+def add(fit: forecast.DurationForecaster, services, hours: float, count: int, key: str = "") -> None:
+    fit.add([fit.mask(services)] * count, [hours] * count, [key] * count)
+
+
+def ago(hours: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+
+
+async def finished_order(db, services, hours: float, brand: str = "Mazda", model: str = "CX-5") -> dict:
+    vehicle_id = str(uuid.uuid4())
+    await db.vehicles.insert_one({"id": vehicle_id, "branch_id": MAIN_BRANCH, "brand": brand, "model": model})
+    order = {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": "terminado", "vehicle_id": vehicle_id,
+             "services": list(services), "started_at": ago(hours), "completed_at": ago(0)}
+    await db.service_orders.insert_one(dict(order))
+    return order
+
+
+def test_fit_recovers_hours_per_service():
+    fit = forecaster()
+    assert fit.suggest_us(["polarizado"]) is None
+
+    add(fit, ["polarizado"], 2, 6)
+    add(fit, ["nanoceramica"], 3, 6)
+    add(fit, ["polarizado", "nanoceramica"], 5, 6)
+    assert fit.snapshot()["hours_per_service"]["polarizado"] == 2.0
+    assert fit.suggest_hours(["nanoceramica", "polarizado"]) == 5.0
+    assert fit.suggest_us(["polarizado"]) == pytest.approx(2 * forecast.US_PER_HOUR, abs=1)
+    # Services outside the catalogue don't count towards the mask
+    assert fit.suggest_hours(["polarizado", "otro"]) == 2.0
+
+
+def test_services_need_enough_history():
+    fit = forecaster()
+    add(fit, ["polarizado"], 2, 6)
+    add(fit, ["ultrasecure"], 4, forecast.MIN_SAMPLES - 1)
+
+    assert fit.suggest_hours(["ultrasecure"]) is None
+    # One service short of history holds back every combination that has it
+    assert fit.suggest_hours(["polarizado", "ultrasecure"]) is None
+    add(fit, ["ultrasecure"], 4, 1)
+    assert fit.suggest_hours(["ultrasecure"]) == 4.0
+    assert fit.suggest_hours(["polarizado", "ultrasecure"]) == 6.0
+
+
+def test_implausible_durations_are_left_out():
+    fit = forecaster()
+    add(fit, ["polarizado"], 2, 6)
+    add(fit, ["polarizado"], forecast.MIN_HOURS / 2, 3)
+    add(fit, ["polarizado"], forecast.MAX_HOURS + 1, 3)
+    add(fit, [], 2, 3)
+
+    assert fit.samples == 6
+    assert fit.suggest_hours(["polarizado"]) == 2.0
+
+
+def test_vehicle_model_is_shrunk_towards_the_fit():
+    fit = forecaster()
+    add(fit, ["polarizado"], 2, 20, "mazda cx-5")
+    add(fit, ["polarizado"], 4, 2, "toyota hilux")
+
+    plain = 48 / 22
+    # Two slow orders move the model only part of the way: it still counts as MODEL_PRIOR orders at the fit
+    prior = forecast.MODEL_PRIOR * plain
+    expected = plain * (8 + prior) / (2 * plain + prior)
+    assert fit.suggest_hours(["polarizado"], "Toyota", "Hilux") == round(expected, 2)
+    assert plain < expected < 4
+    # A model without orders gets the plain fit
+    assert fit.suggest_hours(["polarizado"], "Kia", "Rio") == round(plain, 2)
+    assert fit.suggest_hours(["polarizado"]) == round(plain, 2)
+
+
+async def test_refresh_adds_new_orders_like_a_rebuild(db, monkeypatch):
+    monkeypatch.setattr(forecast, "SETTLE_WINDOW", timedelta(0))
+    for _ in range(5):
+        await finished_order(db, ["polarizado"], 2)
+    fit = forecaster()
+    await fit.refresh(db)
+    assert (fit.samples, fit.suggest_hours(["polarizado"])) == (5, 2.0)
+
+    for _ in range(5):
+        await finished_order(db, ["polarizado"], 3, "Toyota", "Hilux")
+    await finished_order(db, ["nanoceramica"], 1)
+    await fit.refresh(db)
+    assert fit.samples == 11
+    assert fit.suggest_hours(["polarizado"]) == 2.5
+    assert fit.suggest_hours(["nanoceramica"]) is None
+
+    rebuilt = forecaster()
+    await rebuilt.rebuild(db)
+    assert rebuilt.models == fit.models
+    assert np.allclose(rebuilt.table, fit.table, rtol=0, atol=1)
+    # Nothing has finished since
+    await fit.refresh(db)
+    assert fit.samples == 11
+
+
+async def test_finished_order_gets_its_hours_with_the_move(db):
+    orders = [{"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": "en_revision", "started_at": started}
+              for started in (ago(3), ago(1.5), None)]
+    await db.service_orders.insert_many([dict(order) for order in orders])
+    completed = {"completed_at": datetime.now(timezone.utc).isoformat()}
+
+    await state_machine.transition_service_order(db, orders[0]["id"], "terminado", "u1", set_fields=completed)
+    await state_machine.transition_service_orders(
+        db, [state_machine.StatusChange(order["id"], "terminado", completed) for order in orders[1:]], "u1")
+    hours = [(await db.service_orders.find_one({"id": order["id"]})).get("actual_hours") for order in orders]
+    assert hours == [3.0, 1.5, None]
@@ -0,0 +1,51 @@
+import pytest
+
+import events
+import outbox
+from api import core
+
+pytestmark = pytest.mark.anyio
+
+
+async def new_assigned_order(client, login, new_vehicle) -> dict:
+    _, headers = await login()
+    technician, _ = await login("tecnico")
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/service-orders", headers=headers, json={
+        "vehicle_id": vehicle["id"], "services": ["polarizado"], "assigned_technician_id": technician["id"],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_redelivered_entries_have_no_further_effect(client, login, new_vehicle, deliver_outbox, db):
+    order = await new_assigned_order(client, login, new_vehicle)
+    pending = (await db.service_orders.find_one({"id": order["id"]}))[outbox.OUTBOX_FIELD]
+    assert sorted(e["kind"] for e in pending) == ["notification", "status_event"]
+
+    assert await deliver_outbox() == 2
+    # A consumer that died after its handlers ran but before pulling the entries: they come round again
+    await db.service_orders.update_one({"id": order["id"]}, outbox.push(pending))
+    assert await deliver_outbox() == 2
+
+    assert await db.notifications.count_documents({"related_entity_id": order["id"]}) == 1
+    assert await db[events.EVENTS_COLLECTION].count_documents({"entity_id": order["id"]}) == 1
+    assert not (await db.service_orders.find_one({"id": order["id"]})).get(outbox.OUTBOX_FIELD)
+
+
+async def test_failed_handler_leaves_its_entries_pending(client, login, new_vehicle, deliver_outbox, db):
+    order = await new_assigned_order(client, login, new_vehicle)
+
+    async def fail(database, entries):
+        raise RuntimeError("boom")
+
+    deliver = core.outbox_consumer.handlers["notification"]
+    core.outbox_consumer.register("notification", fail)
+    # The other kind of the same document is still delivered
+    assert await deliver_outbox() == 1
+    left = (await db.service_orders.find_one({"id": order["id"]}))[outbox.OUTBOX_FIELD]
+    assert [e["kind"] for e in left] == ["notification"]
+
+    core.outbox_consumer.register("notification", deliver)
+    assert await deliver_outbox() == 1
+    assert await db.notifications.count_documents({"related_entity_id": order["id"]}) == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+import blobs
+import quote_pdf
+
+pytestmark = pytest.mark.anyio
+
+
+class SlowPool:
+    """Stands in for the process pool: every render waits until all callers have started one."""
+
+    def __init__(self, callers: int):
+        self.started = 0
+        self.all_started = asyncio.Event()
+        self.callers = callers
+
+    async def render(self, quote, vehicle, images) -> bytes:
+        self.started += 1
+        if self.started == self.callers:
+            self.all_started.set()
+        await self.all_started.wait()
+        return b"%PDF-1.4 " + quote["id"].encode()
+
+
+async def new_quote(client, headers, new_vehicle) -> dict:
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/quotes", headers=headers, json={
+        "vehicle_id": vehicle["id"], "client_name": "Cliente Prueba",
+        "items": [{"service": "polarizado", "description": "Polarizado completo", "price": 350000}],
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_concurrent_first_renders_store_one_copy(client, login, new_vehicle, db):
+    _, headers = await login()
+    quote = await db.quotes.find_one({"id": (await new_quote(client, headers, new_vehicle))["id"]}, {"_id": 0})
+    pool = SlowPool(3)
+
+    stored = await asyncio.gather(*(quote_pdf.render_and_store(db, pool, quote, None, {}, "digest") for _ in range(3)))
+    assert pool.started == 3
+    assert len({doc["_id"] for doc in stored}) == 1
+    assert await db[blobs.FILES].count_documents({"metadata.quote_id": quote["id"]}) == 1
+    # The losers' chunks were removed with their failed insert
+    assert await db[blobs.CHUNKS].count_documents({}) == 1
+
+
+async def test_duplicates_from_before_the_index_are_removed(db):
+    for _ in range(3):
+        await blobs.put(db, b"%PDF", "cotizacion.pdf", quote_pdf.CONTENT_TYPE,
+                        {"kind": quote_pdf.KIND, "quote_id": "q1", "content_hash": "h1"})
+    await blobs.put(db, b"%PDF", "cotizacion.pdf", quote_pdf.CONTENT_TYPE,
+                    {"kind": quote_pdf.KIND, "quote_id": "q1", "content_hash": "h2"})
+
+    await quote_pdf.create_indexes(db)
+    assert await db[blobs.FILES].count_documents({"metadata.content_hash": "h1"}) == 1
+    assert await db[blobs.CHUNKS].count_documents({}) == 2
+
+
+async def test_pdf_download_is_rendered_once(client, login, new_vehicle, db):
+    _, headers = await login()
+    quote = await new_quote(client, headers, new_vehicle)
+
+    first = await client.get(f"/api/quotes/{quote['id']}/pdf", headers=headers)
+    assert first.status_code == 200
+    assert first.content.startswith(b"%PDF")
+    again = await client.get(f"/api/quotes/{quote['id']}/pdf", headers={**headers, "If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+    assert (await client.get(f"/api/quotes/{quote['id']}/pdf", headers=headers)).content == first.content
+    assert await db[blobs.FILES].count_documents({"metadata.quote_id": quote["id"]}) == 1
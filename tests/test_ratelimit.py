@@ -0,0 +1,144 @@
+import dataclasses
+
+import pytest
+
+import metrics
+import ratelimit
+import shared_state
+
+pytestmark = pytest.mark.anyio
+
+IP, EMAIL = "10.0.0.1", "asesor@test.example.com"
+
+
+class Clock:
+    """Stands in for the ``time`` module: wall and monotonic time move only when told to."""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class CountingState(shared_state.MemoryState):
+    def __init__(self):
+        super().__init__()
+        self.takes = 0
+
+    async def take(self, key, capacity, refill_per_second, tokens=1):
+        self.takes += 1
+        return await super().take(key, capacity, refill_per_second, tokens)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    monkeypatch.setattr(shared_state, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def shared():
+    return CountingState()
+
+
+def guard(shared, ip_burst: float = 100, email_burst: float = 100, **options) -> ratelimit.AuthGuard:
+    # Bursts refill at one attempt per 30 s
+    policies = {}
+    for action in ("login", "register"):
+        policies[f"{action}_ip"] = ratelimit.BucketPolicy.per_minute(ip_burst, 2)
+        policies[f"{action}_email"] = ratelimit.BucketPolicy.per_minute(email_burst, 2)
+    return ratelimit.AuthGuard(shared, metrics.Counters(), policies, **options)
+
+
+async def rejection(auth: ratelimit.AuthGuard, ip: str = IP, email: str = EMAIL) -> ratelimit.RateLimited:
+    with pytest.raises(ratelimit.RateLimited) as raised:
+        await auth.check("login", ip, email)
+    return raised.value
+
+
+async def test_local_bucket_turns_a_flood_away_without_shared_state(clock, shared):
+    auth = guard(shared, ip_burst=2)
+    for _ in range(2):
+        await auth.check("login", IP, EMAIL)
+    takes = shared.takes
+
+    rejected = await rejection(auth)
+    assert (rejected.reason, rejected.retry_after) == ("rejected_ip", 30)
+    assert shared.takes == takes
+    assert auth.counters.snapshot()["auth.login.rejected_ip"] == 1
+    # Another address isn't held back by this one
+    await auth.check("login", "10.0.0.2", "otro@test.example.com")
+
+
+async def test_shared_bucket_holds_across_workers(clock, shared):
+    first, second = guard(shared, email_burst=3), guard(shared, email_burst=3)
+    for auth in (first, first, second):
+        await auth.check("login", IP, EMAIL)
+
+    # The second worker's own bucket still has room; the cluster-wide one doesn't
+    rejected = await rejection(second)
+    assert (rejected.reason, rejected.retry_after) == ("rejected_email", 30)
+    # Emails are compared case-insensitively
+    assert (await rejection(first, email=EMAIL.upper())).reason == "rejected_email"
+
+    clock.advance(30)
+    await second.check("login", IP, EMAIL)
+
+
+async def test_retry_after_rounds_up_to_whole_seconds(clock, shared):
+    auth = guard(shared, ip_burst=1)
+    await auth.check("login", IP, EMAIL)
+    clock.advance(29.5)
+
+    assert (await rejection(auth)).retry_after == 1
+    assert ratelimit.RateLimited("x", 0.001).retry_after == 1
+
+
+async def test_failed_logins_lock_the_email_out_until_it_expires(clock, shared):
+    auth = guard(shared, max_failures=3, lockout_base=30, lockout_max=90)
+    assert [await auth.record_failure(EMAIL) for _ in range(3)] == [0, 0, 30]
+
+    rejected = await rejection(auth)
+    assert (rejected.reason, rejected.retry_after) == ("locked_out", 30)
+    # Another worker learns of it from shared state
+    assert (await rejection(guard(shared))).reason == "locked_out"
+
+    clock.advance(31)
+    await auth.check("login", IP, EMAIL)
+    # Failures keep counting within the window: each one doubles the lockout, up to the cap
+    assert [await auth.record_failure(EMAIL) for _ in range(3)] == [60, 90, 90]
+
+
+async def test_success_clears_the_failures(clock, shared):
+    auth = guard(shared, max_failures=3)
+    for _ in range(2):
+        await auth.record_failure(EMAIL)
+    await auth.record_success(EMAIL)
+
+    assert await auth.record_failure(EMAIL) == 0
+
+
+@pytest.fixture
+def settings(settings):
+    # Limits on, with two login attempts per email per minute
+    return dataclasses.replace(settings, auth_rate_limit_enabled=True, login_rate_email="2/2")
+
+
+async def test_login_is_answered_with_429(client):
+    for _ in range(2):
+        response = await client.post("/api/auth/login", json={"email": EMAIL, "password": "incorrecta"})
+        assert response.status_code == 401
+
+    response = await client.post("/api/auth/login", json={"email": EMAIL, "password": "incorrecta"})
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "30"
+    assert response.json()["detail"] == "Demasiados intentos. Intenta de nuevo en 30 segundos."
@@ -0,0 +1,80 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import search
+from api.app import backfill_search_terms
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+
+def vehicle(plate: str, client_name: str, client_phone: str = "3000000000", **fields) -> dict:
+    doc = {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "plate": plate, "brand": "Kia", "model": "Rio",
+           "year": 2020, "color": "Rojo", "client_name": client_name, "client_phone": client_phone,
+           "created_at": datetime.now(timezone.utc).isoformat(), "created_by": "test", **fields}
+    return {**doc, **search.search_fields(doc)}
+
+
+def test_terms_are_tagged_by_field():
+    terms = search.search_terms({"plate": "abc-123", "client_name": "José Pérez", "client_phone": "+57 300 123 4567"})
+    assert terms == sorted(["p:abc123", "w:jose", "w:perez", "n:joseperez", "i:573001234567", "i:3001234567"])
+
+
+async def test_best_matches_are_not_cut_by_weaker_ones(client, login, db):
+    _, headers = await login("asesor")
+    # More name matches than a page can reach, all written before the plate match
+    await db.vehicles.insert_many([vehicle(f"ZZZ{n:03d}", f"Abc1 Cliente {n:03d}") for n in range(search.MAX_DEPTH + 100)])
+    await db.vehicles.insert_one(vehicle("ABC123", "Zoe Zapata"))
+
+    response = await client.get("/api/vehicles/search", headers=headers, params={"q": "abc1", "limit": 5})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["items"][0]["plate"] == "ABC123"
+    assert [v["client_name"] for v in body["items"][1:]] == [f"Abc1 Cliente {n:03d}" for n in range(4)]
+    assert body["total"] == search.MAX_DEPTH + 101
+    assert body["has_more"] is True
+
+
+async def test_rank_tiers(client, login, db):
+    _, headers = await login("asesor")
+    await db.vehicles.insert_many([
+        vehicle("KLM300", "Ana Ruiz"),
+        vehicle("KLM301", "Beto Gil", client_phone="3001112222"),
+        vehicle("XYZ999", "Carla Diaz", client_phone="300"),
+        vehicle("AAA111", "Dario 300 Mesa"),
+    ])
+
+    async def plates(q, **params):
+        response = await client.get("/api/vehicles/search", headers=headers, params={"q": q, **params})
+        assert response.status_code == 200
+        return [v["plate"] for v in response.json()["items"]]
+
+    # Exact phone, then phone prefixes (by client name), then the name word
+    assert await plates("300") == ["XYZ999", "KLM300", "KLM301", "AAA111"]
+    # Exact plate, then "klm" on the plate and "300" on the phone
+    assert await plates("klm 300") == ["KLM300", "KLM301"]
+    assert await plates("klm3") == ["KLM300", "KLM301"]
+    # Pages continue across tiers
+    assert await plates("300", skip=1, limit=2) == ["KLM300", "KLM301"]
+
+
+async def test_pages_stop_at_the_ranking_depth(client, login):
+    _, headers = await login("asesor")
+    response = await client.get("/api/vehicles/search", headers=headers,
+                                params={"q": "abc", "skip": search.MAX_DEPTH, "limit": 10})
+    assert response.status_code == 400
+
+
+async def test_backfill_tags_terms_written_before_the_tiers(client, db):
+    legacy = vehicle("OLD123", "Viejo Cliente")
+    legacy["search_terms"] = ["old123", "viejo", "cliente", "viejocliente", "3000000000"]
+    del legacy["search_name"]
+    await db.vehicles.insert_one(legacy)
+
+    await backfill_search_terms()
+
+    stored = await db.vehicles.find_one({"id": legacy["id"]})
+    assert stored["search_terms"] == search.search_terms(legacy)
+    assert stored["search_name"] == "viejo cliente"
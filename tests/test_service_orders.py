@@ -0,0 +1,100 @@
+import pytest
+
+import events
+import outbox
+from api import core
+
+pytestmark = pytest.mark.anyio
+
+
+async def new_order(client, headers, new_vehicle) -> dict:
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/service-orders", headers=headers,
+                                 json={"vehicle_id": vehicle["id"], "services": ["polarizado"]})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def outcomes(response) -> list:
+    assert response.status_code == 200, response.text
+    return [(r["order_id"], r["status_code"]) for r in response.json()["results"]]
+
+
+async def test_bulk_status_reports_each_item_in_request_order(client, login, new_vehicle, db):
+    _, headers = await login()
+    first, second = [await new_order(client, headers, new_vehicle) for _ in range(2)]
+
+    response = await client.post("/api/service-orders/bulk-status", headers=headers, json={"items": [
+        {"order_id": first["id"], "status": "en_proceso"},
+        {"order_id": "no-existe", "status": "en_proceso"},
+        {"order_id": second["id"], "status": "terminado"},
+        {"order_id": first["id"], "status": "en_proceso"},
+    ]})
+    assert outcomes(response) == [(first["id"], 200), ("no-existe", 404), (second["id"], 409), (first["id"], 400)]
+    assert response.json()["updated"] == 1
+    results = response.json()["results"]
+    assert results[2]["detail"] == "Transición de estado no permitida: agendado → terminado"
+    assert results[3]["detail"] == "Orden repetida en la solicitud"
+
+    # The repeat wasn't applied: the order, and its vehicle after it, moved once
+    stored = await db.service_orders.find_one({"id": first["id"]})
+    assert (stored["status"], stored["started_at"] is not None) == ("en_proceso", True)
+    assert (await db.vehicles.find_one({"id": first["vehicle_id"]}))["status"] == "en_proceso"
+    assert await db[events.EVENTS_COLLECTION].count_documents({"entity_id": first["vehicle_id"]}) == 1
+    assert await db[events.EVENTS_COLLECTION].count_documents({"entity_id": first["id"]}) == 1
+    assert (await db.service_orders.find_one({"id": second["id"]}))["status"] == "agendado"
+
+
+async def test_bulk_status_finishes_orders_and_their_vehicles(client, login, new_vehicle, db):
+    _, headers = await login()
+    orders = [await new_order(client, headers, new_vehicle) for _ in range(2)]
+
+    for status in ("en_proceso", "en_revision", "terminado"):
+        response = await client.post("/api/service-orders/bulk-status", headers=headers, json={
+            "items": [{"order_id": order["id"], "status": status} for order in orders]})
+        assert [code for _, code in outcomes(response)] == [200, 200]
+    for order in orders:
+        stored = await db.service_orders.find_one({"id": order["id"]})
+        assert stored["actual_hours"] is not None
+        assert (await db.vehicles.find_one({"id": order["vehicle_id"]}))["status"] == "finalizado"
+
+
+async def test_bulk_assign_reports_each_item(client, login, new_vehicle, db):
+    _, headers = await login()
+    technician, _ = await login("tecnico")
+    asesor, _ = await login("asesor")
+    orders = [await new_order(client, headers, new_vehicle) for _ in range(3)]
+    # Someone else is assigning the last one right now
+    await core.shared.acquire(f"assign:service_order:{orders[2]['id']}", "otro", ttl=10)
+
+    response = await client.post("/api/service-orders/bulk-assign", headers=headers, json={"items": [
+        {"order_id": orders[0]["id"], "technician_id": technician["id"]},
+        {"order_id": orders[1]["id"], "technician_id": asesor["id"]},
+        {"order_id": orders[2]["id"], "technician_id": technician["id"]},
+        {"order_id": "no-existe", "technician_id": technician["id"]},
+        {"order_id": orders[0]["id"], "technician_id": technician["id"]},
+    ]})
+    assert outcomes(response) == [(orders[0]["id"], 200), (orders[1]["id"], 404), (orders[2]["id"], 409),
+                                  ("no-existe", 404), (orders[0]["id"], 400)]
+    assert response.json()["results"][1]["detail"] == "Técnico no encontrado"
+    assert response.json()["results"][3]["detail"] == "Orden no encontrada"
+
+    assigned = await db.service_orders.find_one({"id": orders[0]["id"]})
+    assert assigned["assigned_technician_id"] == technician["id"]
+    assert assigned["assigned_technician_name"] == technician["name"]
+    # One notification queued for the technician, despite the repeat
+    notifications = [e for e in assigned[outbox.OUTBOX_FIELD] if e["kind"] == "notification"]
+    assert len(notifications) == 1
+    for order in orders[1:]:
+        assert (await db.service_orders.find_one({"id": order["id"]}))["assigned_technician_id"] is None
+
+
+async def test_bulk_endpoints_validate_the_request(client, login):
+    _, headers = await login()
+    _, technician_headers = await login("tecnico")
+
+    response = await client.post("/api/service-orders/bulk-status", headers=headers, json={"items": []})
+    assert response.status_code == 422
+    response = await client.post("/api/service-orders/bulk-assign", headers=technician_headers, json={
+        "items": [{"order_id": "o1", "technician_id": "t1"}]})
+    assert response.status_code == 403
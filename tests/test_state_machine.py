@@ -0,0 +1,119 @@
+import uuid
+
+import pytest
+
+import events
+import state_machine
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def order_with_booking(db):
+    """``order = await order_with_booking()``: an agendado order, its appointment, and a vehicle without status."""
+    async def make(vehicle_status=None) -> dict:
+        vehicle_id, appointment_id = str(uuid.uuid4()), str(uuid.uuid4())
+        await db.vehicles.insert_one({"id": vehicle_id, "branch_id": MAIN_BRANCH, "status": vehicle_status})
+        await db.appointments.insert_one({"id": appointment_id, "branch_id": MAIN_BRANCH, "status": "agendado"})
+        order = {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": "agendado", "vehicle_id": vehicle_id,
+                 "appointment_id": appointment_id}
+        await db.service_orders.insert_one(dict(order))
+        return order
+    return make
+
+
+async def statuses(db, order: dict) -> tuple:
+    vehicle = await db.vehicles.find_one({"id": order["vehicle_id"]})
+    appointment = await db.appointments.find_one({"id": order["appointment_id"]})
+    return vehicle["status"], appointment["status"]
+
+
+def test_edges():
+    assert state_machine.SERVICE_ORDER.can("en_revision", "terminado")
+    assert not state_machine.SERVICE_ORDER.can("agendado", "terminado")
+    # A vehicle registered without a booking follows its first order
+    assert state_machine.VEHICLE.can(None, "en_proceso")
+    assert state_machine.VEHICLE.can(None, "finalizado")
+    assert not state_machine.VEHICLE.can("finalizado", "en_proceso")
+
+
+async def test_single_transition_carries_vehicle_and_appointment(db, order_with_booking):
+    order = await order_with_booking()
+
+    result = await state_machine.transition_service_order(db, order["id"], "en_proceso", "u1")
+    assert await statuses(db, order) == ("en_proceso", "en_proceso")
+    assert set(result.related) == {"vehicle", "appointment"}
+    assert (await db.vehicles.find_one({"id": order["vehicle_id"]}))["current_service_order_id"] == order["id"]
+
+    await state_machine.transition_service_order(db, order["id"], "en_revision", "u1")
+    assert await statuses(db, order) == ("en_proceso", "en_revision")
+    result = await state_machine.transition_service_order(db, order["id"], "terminado", "u1")
+    assert await statuses(db, order) == ("finalizado", "terminado")
+    assert (await db.vehicles.find_one({"id": order["vehicle_id"]}))["current_service_order_id"] is None
+    # The order's event caused the two that followed it
+    assert [(e["entity_type"], e["cause"]) for e in result.events[1:]] == [("vehicle", result.events[0]["id"]),
+                                                                           ("appointment", result.events[0]["id"])]
+    assert await db[events.EVENTS_COLLECTION].count_documents({}) == 8
+
+
+async def test_order_finished_without_starting_finishes_a_statusless_vehicle(db, order_with_booking):
+    order = await order_with_booking()
+    await db.service_orders.update_one({"id": order["id"]}, {"$set": {"status": "en_revision"}})
+
+    await state_machine.transition_service_order(db, order["id"], "terminado", "u1")
+    assert await statuses(db, order) == ("finalizado", "terminado")
+
+
+async def test_related_document_that_cannot_move_stays_put(db, order_with_booking):
+    order = await order_with_booking(vehicle_status="finalizado")
+
+    result = await state_machine.transition_service_order(db, order["id"], "en_proceso", "u1")
+    assert await statuses(db, order) == ("finalizado", "en_proceso")
+    assert set(result.related) == {"appointment"}
+
+
+async def test_bulk_transition_carries_each_order_once(db, order_with_booking):
+    orders = [await order_with_booking() for _ in range(2)]
+    changes = [state_machine.StatusChange(order["id"], "en_proceso") for order in orders]
+    changes.append(state_machine.StatusChange("no-existe", "en_proceso"))
+
+    result = await state_machine.transition_service_orders(db, changes, "u1")
+    assert set(result.applied) == {order["id"] for order in orders}
+    assert isinstance(result.errors["no-existe"], state_machine.EntityNotFound)
+    for order in orders:
+        assert await statuses(db, order) == ("en_proceso", "en_proceso")
+        assert len(result.applied[order["id"]].events) == 3
+
+    # Already there: refused per order, and nothing related moves again
+    again = await state_machine.transition_service_orders(db, changes[:2], "u1")
+    assert again.applied == {}
+    assert all(isinstance(error, state_machine.TransitionError) for error in again.errors.values())
+    assert await db[events.EVENTS_COLLECTION].count_documents({}) == 6
+
+
+async def test_bulk_transition_finishes_vehicles(db, order_with_booking):
+    order = await order_with_booking()
+    await db.service_orders.update_one({"id": order["id"]}, {"$set": {"status": "en_revision"}})
+
+    result = await state_machine.transition_service_orders(db, [state_machine.StatusChange(order["id"], "terminado")],
+                                                           "u1")
+    assert set(result.applied[order["id"]].related) == {"vehicle", "appointment"}
+    assert await statuses(db, order) == ("finalizado", "terminado")
+
+
+async def test_registered_vehicle_follows_its_order(client, login, new_vehicle, db):
+    _, headers = await login()
+    technician, _ = await login("tecnico")
+    vehicle = await new_vehicle(headers)
+    response = await client.post("/api/service-orders", headers=headers, json={
+        "vehicle_id": vehicle["id"], "services": ["polarizado"], "assigned_technician_id": technician["id"],
+    })
+    order_id = response.json()["id"]
+
+    for status in ("en_proceso", "en_revision", "terminado"):
+        response = await client.put(f"/api/service-orders/{order_id}/status", headers=headers, json={"status": status})
+        assert response.status_code == 200
+        if status == "en_proceso":
+            assert (await db.vehicles.find_one({"id": vehicle["id"]}))["status"] == "en_proceso"
+    assert (await db.vehicles.find_one({"id": vehicle["id"]}))["status"] == "finalizado"
@@ -0,0 +1,101 @@
+import uuid
+from datetime import timedelta
+
+import pytest
+
+import sync
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+
+async def pull(client, headers, since=None, **params) -> dict:
+    if since is not None:
+        params["since"] = since
+    response = await client.get("/api/sync", headers=headers, params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def vehicle_seq(page: dict) -> int:
+    return page["changes"]["vehicles"][0][sync.SEQ_FIELD]
+
+
+def order(technician_id: str, seq: int) -> dict:
+    return {"id": str(uuid.uuid4()), "branch_id": MAIN_BRANCH, "status": "agendado", "services": ["polarizado"],
+            "vehicle_id": str(uuid.uuid4()), "assigned_technician_id": technician_id, "created_at": "2026-01-01T00:00:00+00:00",
+            sync.SEQ_FIELD: seq, sync.UPDATED_FIELD: "2026-01-01T00:00:00+00:00", sync.AUDIENCE_FIELD: [technician_id]}
+
+
+def test_next_token_stops_at_a_full_page():
+    assert sync.next_token(10, {"vehicles": None, "quotes": None}, settled=100) == 100
+    assert sync.next_token(10, {"vehicles": 40, "quotes": None}, settled=100) == 40
+    # Never goes back
+    assert sync.next_token(50, {"vehicles": None}, settled=30) == 50
+
+
+def test_settled_seq_trails_the_clock():
+    assert sync.settled_seq(now=1000.0) == int((1000.0 - sync.SETTLE_WINDOW.total_seconds()) * 1_000_000)
+
+
+async def test_token_waits_out_the_settle_window(client, login, new_vehicle, monkeypatch):
+    _, headers = await login("asesor")
+    first = await pull(client, headers)
+    vehicle = await new_vehicle(headers)
+
+    # Stamped after the settled point: sent, and sent again until the window has passed
+    again = await pull(client, headers, first["token"])
+    assert [v["id"] for v in again["changes"]["vehicles"]] == [vehicle["id"]]
+    assert [v["id"] for v in (await pull(client, headers, again["token"]))["changes"]["vehicles"]] == [vehicle["id"]]
+    assert int(again["token"]) <= vehicle_seq(again)
+
+    monkeypatch.setattr(sync, "SETTLE_WINDOW", timedelta(0))
+    settled = await pull(client, headers, again["token"])
+    assert "vehicles" in settled["changes"]
+    assert (await pull(client, headers, settled["token"]))["changes"] == {}
+
+
+async def test_full_page_holds_the_token_back(client, login, db):
+    technician, headers = await login("tecnico")
+    settled = sync.settled_seq()
+    await db.service_orders.insert_many([order(technician["id"], settled - n) for n in (30, 20, 10)])
+
+    page = await pull(client, headers, limit=2)
+    assert len(page["changes"]["service_orders"]) == 2
+    assert page["has_more"] is True
+    assert int(page["token"]) == settled - 20
+    rest = await pull(client, headers, page["token"], limit=2)
+    assert [o[sync.SEQ_FIELD] for o in rest["changes"]["service_orders"]] == [settled - 10]
+    assert rest["has_more"] is False
+
+
+async def test_reassigned_order_is_removed_from_the_old_technician(client, login, db):
+    before, before_headers = await login("tecnico")
+    after, after_headers = await login("tecnico")
+    doc = order(before["id"], sync.settled_seq() - 100)
+    await db.service_orders.insert_one(doc)
+    token = (await pull(client, before_headers))["token"]
+
+    await db.service_orders.update_one({"id": doc["id"]}, {
+        "$set": {"assigned_technician_id": after["id"], sync.SEQ_FIELD: int(token) + 1},
+        "$addToSet": {sync.AUDIENCE_FIELD: after["id"]},
+    })
+    assert (await pull(client, before_headers, token))["removed"] == {"service_orders": [doc["id"]]}
+    assert [o["id"] for o in (await pull(client, after_headers, token))["changes"]["service_orders"]] == [doc["id"]]
+
+
+async def test_tombstones_reach_their_audience(client, login, db):
+    technician, headers = await login("tecnico")
+    _, other_headers = await login("tecnico")
+    _, asesor_headers = await login("asesor")
+    token = str(sync.settled_seq() - 1000)
+    stones = [sync.tombstone("service_orders", "orden-archivada", [technician["id"]]),
+              sync.tombstone("quotes", "cotizacion-archivada")]
+    for stone in stones:
+        stone.update(branch_id=MAIN_BRANCH, **{sync.SEQ_FIELD: sync.settled_seq() - 500})
+    await sync.record_tombstones(db, stones)
+
+    assert (await pull(client, headers, token))["removed"] == {"service_orders": ["orden-archivada"]}
+    assert (await pull(client, other_headers, token))["removed"] == {}
+    # Quotes aren't synced to technicians; a tombstone without audience reaches every device that syncs its collection
+    assert (await pull(client, asesor_headers, token))["removed"] == {"quotes": ["cotizacion-archivada"]}
@@ -0,0 +1,95 @@
+import pytest
+from pymongo import UpdateOne
+
+import blobs
+import tenancy
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+OTHER_BRANCH = "norte"
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+async def other_branch(db):
+    await db[tenancy.BRANCHES_COLLECTION].insert_one(tenancy.new_branch("Norte", OTHER_BRANCH))
+    return OTHER_BRANCH
+
+
+async def upload(client, headers, kind: str = "signature") -> dict:
+    response = await client.post(f"/api/uploads/{kind}", headers=headers,
+                                 files={"file": ("firma.png", PNG, "image/png")})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def test_scoped_collection_stays_in_its_branch(db):
+    main = tenancy.ScopedDatabase(db, MAIN_BRANCH)
+    other = tenancy.ScopedDatabase(db, OTHER_BRANCH)
+    await main.vehicles.insert_one({"id": "v1", "plate": "AAA111"})
+    await other.vehicles.insert_many([{"id": "v2", "plate": "AAA111"}, {"id": "v3", "plate": "BBB222"}])
+
+    assert (await db.vehicles.find_one({"id": "v1"}))["branch_id"] == MAIN_BRANCH
+    assert await main.vehicles.count_documents({}) == 1
+    assert [v["id"] for v in await other.vehicles.find({"plate": "AAA111"}).to_list(None)] == ["v2"]
+    assert await main.vehicles.find_one({"id": "v2"}) is None
+    assert [row["_id"] for row in await other.vehicles.aggregate([{"$group": {"_id": "$plate"}}, {"$sort": {"_id": 1}}]).to_list(None)] \
+        == ["AAA111", "BBB222"]
+
+    # Writes through one branch never touch another's documents
+    await main.vehicles.update_many({}, {"$set": {"color": "Rojo"}})
+    await main.vehicles.bulk_write([UpdateOne({"id": "v2"}, {"$set": {"color": "Azul"}})])
+    await main.vehicles.delete_many({"plate": "BBB222"})
+    assert await db.vehicles.count_documents({"color": {"$exists": True}}) == 1
+    assert await other.vehicles.count_documents({}) == 2
+    # Collections that aren't branch data pass through
+    assert not isinstance(main.notifications, tenancy.ScopedCollection)
+
+
+async def test_files_keep_their_branch_in_metadata(db):
+    main = tenancy.ScopedDatabase(db, MAIN_BRANCH)
+    stored = await blobs.put(main, PNG, "firma.png", "image/png", {"kind": "signature"})
+
+    assert stored["metadata"]["branch_id"] == MAIN_BRANCH
+    assert await blobs.find(main, stored["_id"]) is not None
+    assert await blobs.find(tenancy.ScopedDatabase(db, OTHER_BRANCH), stored["_id"]) is None
+
+
+async def test_uploads_of_another_branch_are_not_found(client, login, other_branch):
+    _, main_headers = await login()
+    _, other_headers = await login("asesor", branch_id=other_branch)
+    stored = await upload(client, main_headers)
+
+    assert (await client.get(stored["url"], headers=main_headers)).content == PNG
+    response = await client.get(stored["url"], headers=other_headers)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Archivo no encontrado"
+
+
+async def test_quote_cannot_attach_another_branch_upload(client, login, new_vehicle, other_branch):
+    _, main_headers = await login()
+    _, other_headers = await login("admin", branch_id=other_branch)
+    signature = await upload(client, main_headers)
+    vehicle = await new_vehicle(other_headers)
+    quote = (await client.post("/api/quotes", headers=other_headers, json={
+        "vehicle_id": vehicle["id"], "client_name": "Cliente Norte",
+        "items": [{"service": "polarizado", "description": "Polarizado", "price": 200000}],
+    })).json()
+
+    response = await client.put(f"/api/quotes/{quote['id']}/approve", headers=other_headers,
+                                json={"signature_id": signature["id"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Archivo adjunto no encontrado: {signature['id']}"
+
+
+async def test_backfill_gives_files_their_owner_branch(db, other_branch):
+    await db.users.insert_one({"id": "u-norte", "branch_id": other_branch})
+    await db.quotes.insert_one({"id": "q-norte", "branch_id": other_branch})
+    upload_doc = await blobs.put(db, PNG, "firma.png", "image/png", {"kind": "signature", "uploaded_by": "u-norte"})
+    render = await blobs.put(db, b"%PDF", "cotizacion.pdf", "application/pdf", {"kind": "quote_pdf", "quote_id": "q-norte"})
+    orphan = await blobs.put(db, PNG, "firma.png", "image/png", {"kind": "signature"})
+
+    await tenancy.backfill(db, MAIN_BRANCH)
+    branches = {doc["_id"]: doc["metadata"]["branch_id"] async for doc in db[blobs.FILES].find()}
+    assert branches == {upload_doc["_id"]: other_branch, render["_id"]: other_branch, orphan["_id"]: MAIN_BRANCH}
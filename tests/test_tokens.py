@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import tokens
+
+pytestmark = pytest.mark.anyio
+
+
+async def register(client, email: str = "asesor@test.example.com") -> dict:
+    response = await client.post("/api/auth/register", json={"email": email, "password": "clave-segura", "name": "Asesor"})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+async def refresh(client, refresh_token: str):
+    return await client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+
+
+async def backdate_rotation(db, refresh_token: str):
+    # As if the token had been rotated longer ago than the grace for racing tabs
+    rotated = (datetime.now(timezone.utc) - tokens.REUSE_GRACE * 2).isoformat()
+    await db[tokens.REFRESH_COLLECTION].update_one({"token_hash": tokens.hash_refresh(refresh_token)},
+                                                   {"$set": {"rotated_at": rotated}})
+
+
+async def test_refresh_rotates_the_token(client):
+    session = await register(client)
+
+    response = await refresh(client, session["refresh_token"])
+    assert response.status_code == 200
+    rotated = response.json()
+    assert rotated["refresh_token"] != session["refresh_token"]
+    me = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+    assert me.json()["email"] == "asesor@test.example.com"
+    assert (await refresh(client, rotated["refresh_token"])).status_code == 200
+
+
+async def test_reuse_within_grace_is_refused_without_revoking(client):
+    session = await register(client)
+    rotated = (await refresh(client, session["refresh_token"])).json()
+
+    # A second tab racing the first: refused, but the session it raced lives on
+    assert (await refresh(client, session["refresh_token"])).status_code == 401
+    assert (await refresh(client, rotated["refresh_token"])).status_code == 200
+
+
+async def test_replayed_token_revokes_the_family(client, db):
+    session = await register(client)
+    rotated = (await refresh(client, session["refresh_token"])).json()
+    other = await register(client, "otro@test.example.com")
+    await backdate_rotation(db, session["refresh_token"])
+
+    response = await refresh(client, session["refresh_token"])
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Sesión expirada, inicia sesión nuevamente"
+    # The thief's replay ended the legitimate session too; other logins are untouched
+    assert (await refresh(client, rotated["refresh_token"])).status_code == 401
+    assert (await refresh(client, other["refresh_token"])).status_code == 200
+
+
+async def test_logout_revokes_the_refresh_token(client):
+    session = await register(client)
+
+    assert (await client.post("/api/auth/logout", json={"refresh_token": session["refresh_token"]})).status_code == 200
+    assert (await refresh(client, session["refresh_token"])).status_code == 401
+
+
+async def test_role_change_revokes_older_access_tokens(client, login):
+    _, admin = await login()
+    session = await register(client)
+    headers = {"Authorization": f"Bearer {session['access_token']}"}
+
+    response = await client.put(f"/api/users/{session['user']['id']}/role", headers=admin, params={"role": "tecnico"})
+    assert response.status_code == 200
+    me = await client.get("/api/auth/me", headers=headers)
+    assert me.status_code == 401
+    assert me.json()["detail"] == "Token revocado"
+
+    # The refresh token still works and brings the new role
+    renewed = (await refresh(client, session["refresh_token"])).json()
+    me = await client.get("/api/auth/me", headers={"Authorization": f"Bearer {renewed['access_token']}"})
+    assert me.status_code == 200
+    assert me.json()["role"] == "tecnico"
+
+
+async def test_revocations_are_loaded_at_startup(db):
+    service = tokens.TokenService("test-" + "s" * 32, "HS256", timedelta(minutes=15), timedelta(days=30))
+    now = datetime.now(timezone.utc).isoformat()
+    await db.users.insert_many([
+        {"id": "recent", "token_version": 3, "token_version_changed_at": now},
+        {"id": "never", "token_version": 0},
+    ])
+
+    assert await service.load_recent_versions(db) == 1
+    assert service.min_versions == {"recent": 3}
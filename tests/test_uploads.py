@@ -0,0 +1,105 @@
+import dataclasses
+import hashlib
+
+import pytest
+
+import blobs
+from tests.conftest import MAIN_BRANCH
+
+pytestmark = pytest.mark.anyio
+
+MAX_BYTES = 2 * blobs.CHUNK_SIZE
+BOUNDARY = "limite-de-prueba"
+PNG = b"\x89PNG\r\n\x1a\n"
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 16
+
+
+@pytest.fixture
+def settings(settings):
+    return dataclasses.replace(settings, upload_max_bytes=MAX_BYTES)
+
+
+def image(size: int, magic: bytes = PNG) -> bytes:
+    return magic + bytes(n % 251 for n in range(size - len(magic)))
+
+
+def form(data: bytes, content_type: str = "image/png") -> bytes:
+    return (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nfirma del cliente\r\n"
+            f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"firma.png\"\r\n"
+            f"Content-Type: {content_type}\r\n\r\n").encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def streamed(body: bytes, piece: int = 64 * 1024):
+    # No Content-Length: the size is only known once it has been read
+    for start in range(0, len(body), piece):
+        yield body[start:start + piece]
+
+
+async def upload(client, headers, body, kind: str = "signature"):
+    return await client.post(f"/api/uploads/{kind}", content=body,
+                             headers={**headers, "Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+
+async def stored(db) -> tuple:
+    return await db[blobs.FILES].count_documents({}), await db[blobs.CHUNKS].count_documents({})
+
+
+async def test_streamed_upload_round_trip(client, login, db):
+    _, headers = await login()
+    data = image(blobs.CHUNK_SIZE + 1000)
+
+    response = await upload(client, headers, streamed(form(data)))
+    assert response.status_code == 200, response.text
+    uploaded = response.json()
+    assert (uploaded["kind"], uploaded["content_type"], uploaded["size"]) == ("signature", "image/png", len(data))
+    assert await stored(db) == (1, 2)
+    assert (await db[blobs.FILES].find_one())["metadata"]["branch_id"] == MAIN_BRANCH
+
+    download = await client.get(uploaded["url"], headers=headers)
+    assert download.content == data
+    assert download.headers["etag"] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert download.headers["content-length"] == str(len(data))
+
+
+async def test_oversized_stream_is_aborted_without_leftovers(client, login, db):
+    _, headers = await login()
+
+    response = await upload(client, headers, streamed(form(image(MAX_BYTES + 1))))
+    assert response.status_code == 413
+    assert response.json()["detail"] == "El archivo supera el máximo de 0.5 MB"
+    # Two full chunks were written before the limit was crossed, and removed with the upload
+    assert await stored(db) == (0, 0)
+
+
+async def test_declared_oversize_is_refused_before_reading(client, login, db):
+    _, headers = await login()
+
+    response = await upload(client, headers, form(image(MAX_BYTES * 2)))
+    assert response.status_code == 413
+    assert await stored(db) == (0, 0)
+
+
+async def test_content_must_match_its_type(client, login, db):
+    _, headers = await login()
+
+    response = await upload(client, headers, form(image(1000, JPEG), "image/png"))
+    assert response.status_code == 415
+    assert response.json()["detail"] == "El contenido no corresponde al tipo de archivo"
+    response = await upload(client, headers, form(b"%PDF-1.4", "application/pdf"))
+    assert response.status_code == 415
+    assert response.json()["detail"] == "Tipo de archivo no permitido; usa PNG, JPEG o WebP"
+    # Too short to sniff, but still checked once the whole file is in
+    assert (await upload(client, headers, form(b"\x89PN"))).status_code == 415
+    assert await stored(db) == (0, 0)
+    assert (await upload(client, headers, form(image(1000, JPEG), "image/jpeg"))).status_code == 200
+
+
+async def test_form_without_a_file_is_refused(client, login):
+    _, headers = await login()
+
+    body = f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"note\"\r\n\r\nhola\r\n--{BOUNDARY}--\r\n".encode()
+    response = await upload(client, headers, body)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "No se recibió ningún archivo"
+    response = await client.post("/api/uploads/signature", headers=headers, json={"file": "no"})
+    assert response.json()["detail"] == "Se esperaba un formulario multipart con un archivo"